@@ -0,0 +1,22 @@
+from django.contrib import admin, messages
+from django.utils import timezone
+from .models import Tarea
+
+
+@admin.register(Tarea)
+class TareaAdmin(admin.ModelAdmin):
+    list_display = ('nombre', 'estado', 'intentos', 'max_intentos', 'disponible_en', 'created_at')
+    list_filter = ('estado', 'nombre')
+    readonly_fields = ('created_at', 'iniciada_en', 'finalizada_en', 'ultimo_error')
+    ordering = ('-created_at',)
+    actions = ('reintentar',)
+
+    def reintentar(self, request, queryset):
+        """Vuelve a encolar las tareas fallidas seleccionadas"""
+        total = queryset.filter(estado=Tarea.FALLIDA).update(
+            estado=Tarea.PENDIENTE,
+            intentos=0,
+            disponible_en=timezone.now(),
+        )
+        self.message_user(request, f'Se reencolaron {total} tareas.', messages.SUCCESS)
+    reintentar.short_description = 'Reintentar tareas fallidas seleccionadas'
@@ -0,0 +1,12 @@
+from django.apps import AppConfig
+from django.utils.module_loading import autodiscover_modules
+
+
+class ColaTareasConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'cola_tareas'
+    verbose_name = 'Cola de tareas'
+
+    def ready(self):
+        # Registrar las tareas definidas en el módulo tareas.py de cada app.
+        autodiscover_modules('tareas')
@@ -0,0 +1 @@
+# Archivo para hacer que commands sea un paquete Python
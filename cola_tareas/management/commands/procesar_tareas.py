@@ -0,0 +1,68 @@
+import signal
+
+from django.core.management.base import BaseCommand, CommandError
+
+from cola_tareas.registro import REGISTRO
+from cola_tareas.worker import Worker
+
+
+class Command(BaseCommand):
+    help = 'Inicia el worker que ejecuta las tareas diferidas de la cola'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrencia',
+            type=int,
+            default=4,
+            help='Cantidad máxima de tareas ejecutándose a la vez (por defecto 4)',
+        )
+        parser.add_argument(
+            '--intervalo',
+            type=float,
+            default=1.0,
+            help='Segundos de espera cuando no hay tareas disponibles (por defecto 1)',
+        )
+        parser.add_argument(
+            '--recuperar-despues',
+            type=int,
+            default=600,
+            help='Segundos tras los cuales una tarea en proceso se considera colgada',
+        )
+        parser.add_argument(
+            '--recuperar-cada',
+            type=int,
+            default=60,
+            help='Cada cuántos segundos se buscan tareas colgadas (por defecto 60)',
+        )
+        parser.add_argument(
+            '--una-vez',
+            action='store_true',
+            help='Procesar las tareas disponibles y terminar (útil para cron)',
+        )
+
+    def handle(self, *args, **options):
+        if options['concurrencia'] < 1:
+            raise CommandError('La concurrencia debe ser mayor a cero.')
+
+        worker = Worker(
+            concurrencia=options['concurrencia'],
+            intervalo=options['intervalo'],
+            recuperar_despues=options['recuperar_despues'],
+            recuperar_cada=options['recuperar_cada'],
+        )
+
+        def detener(signum, frame):
+            self.stdout.write(self.style.WARNING('Deteniendo worker, esperando tareas en curso...'))
+            worker.detener.set()
+
+        signal.signal(signal.SIGINT, detener)
+        signal.signal(signal.SIGTERM, detener)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Worker iniciado con {options["concurrencia"]} hilos. '
+                f'Tareas registradas: {", ".join(sorted(REGISTRO)) or "ninguna"}'
+            )
+        )
+        worker.iniciar(una_vez=options['una_vez'])
+        self.stdout.write(self.style.SUCCESS('Worker detenido'))
@@ -0,0 +1,43 @@
+from django.db import models
+from django.utils import timezone
+
+
+class Tarea(models.Model):
+    """
+    Modelo para la cola de tareas diferidas.
+    Cada fila es un trabajo pendiente de ejecutar por el worker
+    (comando procesar_tareas), con su estado, reintentos y último error.
+    """
+    PENDIENTE = 'pendiente'
+    EN_PROCESO = 'en_proceso'
+    COMPLETADA = 'completada'
+    FALLIDA = 'fallida'
+    ESTADOS = (
+        (PENDIENTE, 'Pendiente'),
+        (EN_PROCESO, 'En proceso'),
+        (COMPLETADA, 'Completada'),
+        (FALLIDA, 'Fallida'),
+    )
+
+    nombre = models.CharField(max_length=100, verbose_name="Tarea")
+    argumentos = models.JSONField(default=dict, blank=True, verbose_name="Argumentos")
+    estado = models.CharField(max_length=20, choices=ESTADOS, default=PENDIENTE, verbose_name="Estado")
+    intentos = models.PositiveIntegerField(default=0, verbose_name="Intentos")
+    max_intentos = models.PositiveIntegerField(default=3, verbose_name="Máximo de intentos")
+    disponible_en = models.DateTimeField(default=timezone.now, verbose_name="Disponible desde")
+    iniciada_en = models.DateTimeField(null=True, blank=True, verbose_name="Inicio")
+    finalizada_en = models.DateTimeField(null=True, blank=True, verbose_name="Fin")
+    ultimo_error = models.TextField(blank=True, verbose_name="Último error")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Fecha de creación")
+
+    class Meta:
+        verbose_name = "Tarea"
+        verbose_name_plural = "Tareas"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['estado', 'disponible_en'], name='tarea_estado_disponible_idx'),
+            models.Index(fields=['nombre', 'estado'], name='tarea_nombre_estado_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.nombre} #{self.pk} ({self.get_estado_display()})"
@@ -0,0 +1,61 @@
+from datetime import timedelta
+
+from django.utils import timezone
+
+
+# Tareas registradas: nombre -> DefinicionTarea.
+REGISTRO = {}
+
+
+class DefinicionTarea:
+    """
+    Datos de una tarea registrada con el decorador @tarea.
+    Features:
+        - max_intentos: ejecuciones antes de marcarla como fallida.
+        - concurrencia: ejecuciones simultáneas permitidas por worker.
+        - cada: período en segundos para tareas periódicas.
+    """
+    def __init__(self, funcion, nombre, max_intentos, concurrencia, cada):
+        self.funcion = funcion
+        self.nombre = nombre
+        self.max_intentos = max_intentos
+        self.concurrencia = concurrencia
+        self.cada = cada
+
+    def __call__(self, **argumentos):
+        return self.funcion(**argumentos)
+
+
+def tarea(nombre=None, max_intentos=3, concurrencia=None, cada=None):
+    """
+    Decorador para registrar una función como tarea diferida.
+    Los argumentos de la función deben ser serializables a JSON.
+    """
+    def decorador(funcion):
+        definicion = DefinicionTarea(
+            funcion,
+            nombre or funcion.__name__,
+            max_intentos,
+            concurrencia,
+            cada,
+        )
+        REGISTRO[definicion.nombre] = definicion
+        return funcion
+    return decorador
+
+
+def encolar(nombre, retraso=0, **argumentos):
+    """
+    Encola una tarea para que la ejecute el worker y retorna de inmediato.
+    Ejemplo: encolar('procesar_avatar', usuario_id=user.pk)
+    """
+    from .models import Tarea
+
+    if nombre not in REGISTRO:
+        raise ValueError(f'La tarea "{nombre}" no está registrada.')
+    return Tarea.objects.create(
+        nombre=nombre,
+        argumentos=argumentos,
+        max_intentos=REGISTRO[nombre].max_intentos,
+        disponible_en=timezone.now() + timedelta(seconds=retraso),
+    )
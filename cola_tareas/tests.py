@@ -0,0 +1,123 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TransactionTestCase
+from django.utils import timezone
+
+from .models import Tarea
+from .registro import REGISTRO, encolar, tarea
+from .worker import Worker, espera_reintento
+
+
+class WorkerTests(TransactionTestCase):
+    """Verifica reintentos, backoff, límites de concurrencia y recuperación de tareas colgadas."""
+
+    def setUp(self):
+        self.ejecuciones = []
+
+        def falla(**argumentos):
+            self.ejecuciones.append(argumentos)
+            raise RuntimeError('fallo de prueba')
+
+        def anota(**argumentos):
+            self.ejecuciones.append(argumentos)
+
+        tarea(nombre='prueba_falla', max_intentos=2)(falla)
+        tarea(nombre='prueba_unica', concurrencia=1)(anota)
+        tarea(nombre='prueba_libre')(anota)
+        self.worker = Worker(concurrencia=4, recuperar_despues=600)
+
+    def tearDown(self):
+        self.worker._pool.shutdown(wait=True)
+        for nombre in ('prueba_falla', 'prueba_unica', 'prueba_libre'):
+            REGISTRO.pop(nombre)
+
+    def test_backoff_exponencial_acotado(self):
+        with mock.patch('random.uniform', return_value=1):
+            self.assertEqual([espera_reintento(intentos) for intentos in range(1, 6)], [5, 10, 20, 40, 80])
+            self.assertEqual(espera_reintento(20), 600)
+        for _ in range(20):
+            self.assertTrue(8 <= espera_reintento(2) <= 12)
+
+    def test_reintenta_con_backoff_y_falla_al_agotar_intentos(self):
+        pendiente = encolar('prueba_falla', dato=1)
+        [reclamada] = self.worker.reclamar(1)
+        antes = timezone.now()
+        with self.assertLogs('cola_tareas.worker', 'WARNING'):
+            self.worker.ejecutar(reclamada)
+
+        pendiente.refresh_from_db()
+        self.assertEqual((pendiente.estado, pendiente.intentos), (Tarea.PENDIENTE, 1))
+        self.assertIn('fallo de prueba', pendiente.ultimo_error)
+        espera = (pendiente.disponible_en - antes).total_seconds()
+        self.assertTrue(3.9 <= espera <= 6.1, espera)
+        # Mientras no pasa el backoff no se vuelve a reclamar.
+        self.assertEqual(self.worker.reclamar(1), [])
+
+        Tarea.objects.filter(pk=pendiente.pk).update(disponible_en=timezone.now())
+        [reclamada] = self.worker.reclamar(1)
+        with self.assertLogs('cola_tareas.worker', 'WARNING'):
+            self.worker.ejecutar(reclamada)
+        pendiente.refresh_from_db()
+        self.assertEqual((pendiente.estado, pendiente.intentos), (Tarea.FALLIDA, 2))
+        self.assertIsNotNone(pendiente.finalizada_en)
+        self.assertEqual(self.ejecuciones, [{'dato': 1}, {'dato': 1}])
+
+    def test_limite_de_concurrencia_por_tarea(self):
+        for numero in range(3):
+            encolar('prueba_unica', numero=numero)
+        encolar('prueba_libre', numero=9)
+
+        reclamadas = self.worker.reclamar(4)
+        self.assertEqual(sorted(t.nombre for t in reclamadas), ['prueba_libre', 'prueba_unica'])
+        self.assertEqual(self.worker.reclamar(4), [])
+
+        for reclamada in reclamadas:
+            self.worker.ejecutar(reclamada)
+        self.assertEqual([t.nombre for t in self.worker.reclamar(4)], ['prueba_unica'])
+        self.assertEqual(Tarea.objects.filter(estado=Tarea.COMPLETADA).count(), 2)
+
+    def test_tarea_colgada_cuenta_como_intento(self):
+        viejo = timezone.now() - timedelta(seconds=700)
+        reintento = Tarea.objects.create(
+            nombre='prueba_libre', estado=Tarea.EN_PROCESO, intentos=1, max_intentos=3, iniciada_en=viejo,
+        )
+        veneno = Tarea.objects.create(
+            nombre='prueba_libre', estado=Tarea.EN_PROCESO, intentos=3, max_intentos=3, iniciada_en=viejo,
+        )
+        reciente = Tarea.objects.create(
+            nombre='prueba_libre', estado=Tarea.EN_PROCESO, intentos=1, iniciada_en=timezone.now(),
+        )
+
+        with self.assertLogs('cola_tareas.worker', 'WARNING'):
+            self.assertEqual(self.worker.recuperar_colgadas(), 2)
+        reintento.refresh_from_db()
+        veneno.refresh_from_db()
+        reciente.refresh_from_db()
+        self.assertEqual(reintento.estado, Tarea.PENDIENTE)
+        self.assertGreater(reintento.disponible_en, timezone.now())
+        self.assertIn('sin terminar', reintento.ultimo_error)
+        self.assertEqual(veneno.estado, Tarea.FALLIDA)
+        self.assertEqual(reciente.estado, Tarea.EN_PROCESO)
+
+    def test_no_recupera_las_propias_y_recupera_en_el_bucle(self):
+        encolar('prueba_libre')
+        [propia] = self.worker.reclamar(1)
+        Tarea.objects.filter(pk=propia.pk).update(iniciada_en=timezone.now() - timedelta(seconds=700))
+        self.assertEqual(self.worker.recuperar_colgadas(), 0)
+
+        ajena = Worker(recuperar_despues=600, recuperar_cada=60)
+        self.addCleanup(ajena._pool.shutdown)
+        with mock.patch.object(ajena, 'programar_periodicas'), mock.patch('time.monotonic', return_value=1000), \
+                self.assertLogs('cola_tareas.worker', 'WARNING'):
+            ajena.mantenimiento()
+        self.assertEqual(Tarea.objects.get(pk=propia.pk).estado, Tarea.PENDIENTE)
+
+        with mock.patch.object(ajena, 'programar_periodicas'), \
+                mock.patch.object(ajena, 'recuperar_colgadas') as recuperar:
+            with mock.patch('time.monotonic', return_value=1030):
+                ajena.mantenimiento()
+            recuperar.assert_not_called()
+            with mock.patch('time.monotonic', return_value=1061):
+                ajena.mantenimiento()
+            recuperar.assert_called_once()
@@ -0,0 +1,202 @@
+import logging
+import random
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.db import close_old_connections
+from django.db.models import F, Max
+from django.utils import timezone
+
+from .models import Tarea
+from .registro import REGISTRO
+
+
+logger = logging.getLogger(__name__)
+
+
+def espera_reintento(intentos, base=5, maximo=600):
+    """Backoff exponencial con jitter para el siguiente reintento (en segundos)."""
+    espera = min(maximo, base * 2 ** max(0, intentos - 1))
+    return espera * random.uniform(0.8, 1.2)
+
+
+class Worker:
+    """
+    Worker de la cola de tareas basado en un pool de hilos.
+    Features:
+        - Reclama tareas con un UPDATE condicional, seguro entre varios workers.
+        - Límite de concurrencia global y por tipo de tarea.
+        - Reintentos con backoff exponencial y registro del último error.
+        - Programa las tareas periódicas registradas con `cada`.
+        - Recupera periódicamente las tareas colgadas de workers que murieron,
+          contándolas como un intento fallido.
+        - Detención ordenada: espera a las tareas en curso.
+    """
+
+    def __init__(self, concurrencia=4, intervalo=1.0, recuperar_despues=600, recuperar_cada=60):
+        self.concurrencia = concurrencia
+        self.intervalo = intervalo
+        self.recuperar_despues = recuperar_despues
+        self.recuperar_cada = recuperar_cada
+        self.detener = threading.Event()
+        self._lock = threading.Lock()
+        self._en_curso = {}
+        # Ids de las tareas que ejecuta este worker: nunca están colgadas.
+        self._ids_en_curso = set()
+        self._proxima_recuperacion = 0
+        self._pool = ThreadPoolExecutor(max_workers=concurrencia, thread_name_prefix='tarea')
+
+    # Reclamo de tareas.
+
+    def total_en_curso(self):
+        with self._lock:
+            return sum(self._en_curso.values())
+
+    def _admite(self, nombre):
+        definicion = REGISTRO.get(nombre)
+        limite = definicion.concurrencia if definicion else None
+        return limite is None or self._en_curso.get(nombre, 0) < limite
+
+    def reclamar(self, cantidad):
+        """Marca hasta `cantidad` tareas disponibles como en proceso y las devuelve."""
+        ahora = timezone.now()
+        candidatas = (
+            Tarea.objects
+            .filter(estado=Tarea.PENDIENTE, disponible_en__lte=ahora)
+            .order_by('disponible_en')
+            .values_list('pk', 'nombre')[:cantidad * 4]
+        )
+        reclamadas = []
+        for pk, nombre in candidatas:
+            if len(reclamadas) >= cantidad:
+                break
+            with self._lock:
+                if not self._admite(nombre):
+                    continue
+                actualizadas = Tarea.objects.filter(pk=pk, estado=Tarea.PENDIENTE).update(
+                    estado=Tarea.EN_PROCESO,
+                    intentos=F('intentos') + 1,
+                    iniciada_en=ahora,
+                )
+                if actualizadas:
+                    self._en_curso[nombre] = self._en_curso.get(nombre, 0) + 1
+                    self._ids_en_curso.add(pk)
+                    reclamadas.append(Tarea.objects.get(pk=pk))
+        return reclamadas
+
+    # Ejecución.
+
+    def ejecutar(self, tarea):
+        """Ejecuta una tarea reclamada y registra el resultado."""
+        try:
+            definicion = REGISTRO.get(tarea.nombre)
+            if definicion is None:
+                raise LookupError(f'La tarea "{tarea.nombre}" no está registrada.')
+            definicion(**tarea.argumentos)
+        except Exception:
+            logger.warning('Falló la tarea %s (intento %s)', tarea, tarea.intentos)
+            filas = Tarea.objects.filter(pk=tarea.pk)
+            self.registrar_fallo(filas, tarea.intentos, tarea.max_intentos, traceback.format_exc())
+        else:
+            Tarea.objects.filter(pk=tarea.pk).update(
+                estado=Tarea.COMPLETADA,
+                finalizada_en=timezone.now(),
+            )
+        finally:
+            with self._lock:
+                self._en_curso[tarea.nombre] -= 1
+                self._ids_en_curso.discard(tarea.pk)
+            close_old_connections()
+
+    def registrar_fallo(self, filas, intentos, max_intentos, error):
+        """
+        Registra un intento fallido: la tarea vuelve a la cola con backoff
+        o, si agotó sus intentos, queda fallida. Retorna las filas actualizadas.
+        """
+        if intentos < max_intentos:
+            return filas.update(
+                estado=Tarea.PENDIENTE,
+                disponible_en=timezone.now() + timedelta(seconds=espera_reintento(intentos)),
+                ultimo_error=error,
+            )
+        return filas.update(
+            estado=Tarea.FALLIDA,
+            finalizada_en=timezone.now(),
+            ultimo_error=error,
+        )
+
+    # Mantenimiento.
+
+    def recuperar_colgadas(self):
+        """
+        Trata como intento fallido las tareas en proceso de un worker que murió
+        (sin terminar tras recuperar_despues segundos): se reintentan con
+        backoff o quedan fallidas si agotaron sus intentos. Así una tarea que
+        mata al worker no se reintenta para siempre. Retorna cuántas recuperó.
+        """
+        limite = timezone.now() - timedelta(seconds=self.recuperar_despues)
+        colgadas = (
+            Tarea.objects.filter(estado=Tarea.EN_PROCESO, iniciada_en__lt=limite)
+            .exclude(pk__in=list(self._ids_en_curso))
+            .values_list('pk', 'iniciada_en', 'intentos', 'max_intentos')
+        )
+        error = f'El worker se detuvo sin terminar la tarea (más de {self.recuperar_despues} s en proceso).'
+        recuperadas = 0
+        for pk, iniciada_en, intentos, max_intentos in colgadas:
+            logger.warning('Tarea #%s colgada (intento %s), se cuenta como fallida', pk, intentos)
+            # iniciada_en identifica el intento: otro worker pudo recuperarla primero.
+            filas = Tarea.objects.filter(pk=pk, estado=Tarea.EN_PROCESO, iniciada_en=iniciada_en)
+            recuperadas += self.registrar_fallo(filas, intentos, max_intentos, error)
+        return recuperadas
+
+    def mantenimiento(self):
+        """Recupera las tareas colgadas cada recuperar_cada segundos y programa las periódicas."""
+        if time.monotonic() >= self._proxima_recuperacion:
+            self.recuperar_colgadas()
+            self._proxima_recuperacion = time.monotonic() + self.recuperar_cada
+        self.programar_periodicas()
+
+    def programar_periodicas(self):
+        """Encola las tareas periódicas que no tienen una ejecución pendiente."""
+        ahora = timezone.now()
+        for definicion in REGISTRO.values():
+            if not definicion.cada:
+                continue
+            tareas = Tarea.objects.filter(nombre=definicion.nombre)
+            if tareas.filter(estado__in=[Tarea.PENDIENTE, Tarea.EN_PROCESO]).exists():
+                continue
+            ultima = tareas.aggregate(ultima=Max('created_at'))['ultima']
+            proxima = ultima + timedelta(seconds=definicion.cada) if ultima else ahora
+            Tarea.objects.create(
+                nombre=definicion.nombre,
+                max_intentos=definicion.max_intentos,
+                disponible_en=max(proxima, ahora),
+            )
+
+    # Bucle principal.
+
+    def procesar_disponibles(self):
+        """Reclama y envía al pool tantas tareas como hilos libres haya."""
+        libres = self.concurrencia - self.total_en_curso()
+        if libres <= 0:
+            return 0
+        tareas = self.reclamar(libres)
+        for tarea in tareas:
+            self._pool.submit(self.ejecutar, tarea)
+        return len(tareas)
+
+    def iniciar(self, una_vez=False):
+        try:
+            while not self.detener.is_set():
+                self.mantenimiento()
+                enviadas = self.procesar_disponibles()
+                if una_vez and not enviadas and not self.total_en_curso():
+                    break
+                if not enviadas:
+                    self.detener.wait(self.intervalo)
+        finally:
+            self._pool.shutdown(wait=True)
+            close_old_connections()
@@ -1,30 +1,368 @@
-from django.contrib import admin
-from .models import Cliente, Producto
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin import helpers
+from django.http import HttpResponseRedirect
+from django.shortcuts import render
+from django.urls import reverse
+from django.utils.html import format_html, format_html_join
+from .admin_rapido import AdminRapidoMixin, CamposDiferidosAdminMixin
+from .forms import formularioAjusteMasivo
+from .mixins import ConflictoVersion
+from .models import (
+    Agregado, Cliente, ClienteArchivado, MovimientoStock, Producto, RegistroAuditoria, SnapshotStock,
+)
+from . import duplicados, operaciones, stock
+
+
+class VersionWidget(forms.HiddenInput):
+    """Versión en un input oculto, mostrando además el número (columna del listado)."""
+
+    def render(self, name, value, attrs=None, renderer=None):
+        return format_html('{}{}', super().render(name, value, attrs, renderer), value if value is not None else '')
+
+
+class CampoVersion(forms.IntegerField):
+    """
+    Versión con la que se cargó el objeto. Nunca cuenta como cambio: una
+    fila del listado que el usuario no tocó no se guarda aunque su versión
+    haya quedado vieja.
+    """
+    widget = VersionWidget
+
+    def has_changed(self, initial, data):
+        return False
+
+
+class VersionOptimistaAdminMixin:
+    """
+    Admin de un modelo con VersionOptimistaMixin: los formularios (incluido
+    list_editable, si lista 'version') envían la versión cargada y un
+    ConflictoVersion revierte todo el envío en lugar de pisar los cambios
+    de otro usuario, informando las diferencias.
+    """
+
+    def formfield_for_dbfield(self, db_field, request, **kwargs):
+        if db_field.name == 'version':
+            return CampoVersion(label=db_field.verbose_name, min_value=0)
+        return super().formfield_for_dbfield(db_field, request, **kwargs)
+
+    def changelist_view(self, request, extra_context=None):
+        try:
+            return super().changelist_view(request, extra_context)
+        except ConflictoVersion as conflicto:
+            self.informar_conflicto(request, conflicto)
+            return HttpResponseRedirect(request.get_full_path())
+
+    def changeform_view(self, request, object_id=None, form_url='', extra_context=None):
+        try:
+            return super().changeform_view(request, object_id, form_url, extra_context)
+        except ConflictoVersion as conflicto:
+            self.informar_conflicto(request, conflicto)
+            if conflicto.actual is None:
+                opts = self.model._meta
+                return HttpResponseRedirect(reverse(f'admin:{opts.app_label}_{opts.model_name}_changelist'))
+            return HttpResponseRedirect(request.get_full_path())
+
+    def informar_conflicto(self, request, conflicto):
+        objeto = conflicto.actual or conflicto.instancia
+        if conflicto.actual is None:
+            self.message_user(
+                request,
+                f'No se guardaron los cambios: otro usuario eliminó «{objeto}» mientras lo editaba.',
+                messages.ERROR,
+            )
+            return
+        campos = [
+            campo.name for campo in self.model._meta.concrete_fields
+            if campo.editable and not campo.primary_key and campo.name != 'version'
+        ]
+        detalle = '; '.join(
+            f'{campo.verbose_name}: suyo {propio}, vigente {vigente}'
+            for campo, propio, vigente in conflicto.diferencias(campos)
+        )
+        self.message_user(
+            request,
+            f'No se guardaron los cambios: otro usuario modificó «{objeto}» mientras lo editaba.'
+            + (f' Diferencias: {detalle}.' if detalle else '')
+            + ' Revise los valores vigentes y vuelva a aplicar sus cambios.',
+            messages.ERROR,
+        )
+
+
+class ClienteVipFilter(admin.SimpleListFilter):
+    """Filtro VIP resuelto con una única consulta sobre el índice de edad"""
+    title = 'VIP'
+    parameter_name = 'vip'
+
+    def lookups(self, request, model_admin):
+        return (
+            ('si', 'Clientes VIP'),
+            ('no', 'Clientes regulares'),
+        )
+
+    def queryset(self, request, queryset):
+        if self.value() == 'si':
+            return queryset.vip()
+        if self.value() == 'no':
+            return queryset.non_vip()
+        return queryset
 
 
 @admin.register(Cliente)
-class ClienteAdmin(admin.ModelAdmin):
+class ClienteAdmin(VersionOptimistaAdminMixin, AdminRapidoMixin, admin.ModelAdmin):
     list_display = ('name', 'age', 'email', 'created_at', 'is_vip')
-    list_filter = ('age', 'created_at')
-    search_fields = ('name', 'email')
+    list_filter = (ClienteVipFilter,)
+    search_fields = ('^name', '=email')
+    busqueda_sin_mayusculas = ('name', 'email')
+    search_help_text = 'Busca por inicio del nombre o por email completo (sin distinguir mayúsculas).'
+    date_hierarchy = 'created_at'
     readonly_fields = ('created_at', 'updated_at')
     ordering = ('-created_at',)
+    actions = ('fusionar_clientes',)
+    # Clientes que se pueden fusionar de una vez.
+    max_fusion = 20
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).anotar_vip()
+
+    def fusionar_clientes(self, request, queryset):
+        """
+        Fusiona clientes duplicados (ver el comando buscar_duplicados).
+        Muestra primero una página para elegir el cliente que se conserva;
+        los demás se borran y la fusión queda auditada.
+        """
+        clientes = list(queryset.order_by('created_at', 'pk')[:self.max_fusion + 1])
+        if len(clientes) < 2:
+            self.message_user(request, 'Seleccione al menos dos clientes para fusionar.', messages.WARNING)
+            return None
+        if len(clientes) > self.max_fusion:
+            self.message_user(
+                request, f'Se pueden fusionar hasta {self.max_fusion} clientes por vez.', messages.ERROR,
+            )
+            return None
+
+        if 'conservar' in request.POST:
+            conservado = next((cliente for cliente in clientes if str(cliente.pk) == request.POST['conservar']), None)
+            if conservado is not None:
+                borrados = duplicados.fusionar(conservado, clientes)
+                self.message_user(
+                    request, f'Se fusionaron {borrados} clientes en «{conservado}».', messages.SUCCESS,
+                )
+                return None
+
+        context = {
+            **self.admin_site.each_context(request),
+            'title': 'Fusionar clientes duplicados',
+            'opts': self.model._meta,
+            'clientes': clientes,
+            'seleccion': request.POST.getlist(helpers.ACTION_CHECKBOX_NAME),
+            'select_across': request.POST.get('select_across', '0'),
+            'action_checkbox_name': helpers.ACTION_CHECKBOX_NAME,
+        }
+        return render(request, 'admin/ecommerce/cliente/fusionar.html', context)
+    fusionar_clientes.short_description = 'Fusionar clientes duplicados seleccionados'
+    fusionar_clientes.allowed_permissions = ('delete',)
     
     def is_vip(self, obj):
         """Mostrar si es cliente VIP"""
-        return obj.age > 40
+        return obj.is_vip
     is_vip.boolean = True
     is_vip.short_description = 'Es VIP'
+    is_vip.admin_order_field = 'is_vip'
 
 
 @admin.register(Producto)
-class ProductoAdmin(admin.ModelAdmin):
-    list_display = ('nombre', 'precio', 'stock', 'activo', 'created_at')
+class ProductoAdmin(VersionOptimistaAdminMixin, CamposDiferidosAdminMixin, admin.ModelAdmin):
+    list_display = ('nombre', 'descripcion_snippet', 'precio', 'stock', 'activo', 'version', 'created_at')
     list_filter = ('activo', 'created_at')
     search_fields = ('nombre', 'descripcion')
-    readonly_fields = ('created_at',)
+    readonly_fields = ('created_at', 'historial_stock')
     ordering = ('nombre',)
-    list_editable = ('precio', 'stock', 'activo')
+    list_editable = ('precio', 'stock', 'activo', 'version')
+    campos_diferidos = ('descripcion',)
+    actions = ('ajuste_masivo', 'activar_productos', 'desactivar_productos')
+
+    def ajuste_masivo(self, request, queryset):
+        """
+        Ajusta precio o stock de la selección con UPDATE masivos por lotes.
+        Muestra primero una página intermedia con la cantidad de productos
+        afectados y el formulario del ajuste.
+        """
+        form = None
+        if 'aplicar' in request.POST:
+            form = formularioAjusteMasivo(request.POST)
+            if form.is_valid():
+                tipo = form.cleaned_data['tipo']
+                valor = form.cleaned_data['valor']
+                if tipo == 'precio_porcentaje':
+                    total = operaciones.ajustar_precio_porcentaje(queryset, valor)
+                elif tipo == 'precio_monto':
+                    total = operaciones.ajustar_precio_monto(queryset, valor)
+                else:
+                    total = operaciones.ajustar_stock(queryset, int(valor))
+                self.message_user(request, f'Se ajustaron {total} productos.', messages.SUCCESS)
+                return None
+        if form is None:
+            form = formularioAjusteMasivo()
+        return self.confirmacion_masiva(
+            request, queryset, 'ajuste_masivo', 'Ajuste masivo de productos',
+            'admin/ecommerce/producto/ajuste_masivo.html', form=form,
+        )
+    ajuste_masivo.short_description = 'Ajustar precio o stock de los productos seleccionados'
+
+    def historial_stock(self, obj):
+        """Últimos movimientos del libro de stock (los compactados, como cierres diarios)"""
+        if obj.pk is None:
+            return '-'
+        entradas = stock.historial(obj.pk)[-20:]
+        if not entradas:
+            return 'Sin movimientos'
+        filas = format_html_join(
+            '',
+            '<tr><td>{}</td><td>{:+}</td><td>{}</td><td>{}</td></tr>',
+            (
+                (entrada['fecha'].strftime('%Y-%m-%d %H:%M'), entrada['cantidad'], entrada['stock'], entrada['motivo'])
+                for entrada in reversed(entradas)
+            ),
+        )
+        return format_html(
+            '<table><tr><th>Fecha</th><th>Cantidad</th><th>Stock</th><th>Motivo</th></tr>{}</table>', filas
+        )
+    historial_stock.short_description = 'Historial de stock'
+
+    def confirmacion_masiva(self, request, queryset, accion, titulo, plantilla, **extra):
+        """
+        Página intermedia de una acción masiva: muestra cuántos productos
+        afectará y reenvía la selección (o "seleccionar todos") al confirmar.
+        """
+        context = {
+            **self.admin_site.each_context(request),
+            'title': titulo,
+            'opts': self.model._meta,
+            'accion': accion,
+            'cantidad': queryset.count(),
+            'seleccion': request.POST.getlist(helpers.ACTION_CHECKBOX_NAME),
+            'select_across': request.POST.get('select_across', '0'),
+            'action_checkbox_name': helpers.ACTION_CHECKBOX_NAME,
+            **extra,
+        }
+        return render(request, plantilla, context)
+
+    def cambiar_estado_masivo(self, request, queryset, activo):
+        """
+        Activa o desactiva la selección tras confirmar en una página que
+        muestra cuántos productos cambian de estado.
+        """
+        if 'aplicar' in request.POST:
+            total = operaciones.cambiar_estado(queryset, activo)
+            verbo = 'activaron' if activo else 'desactivaron'
+            self.message_user(request, f'Se {verbo} {total} productos.', messages.SUCCESS)
+            return None
+        return self.confirmacion_masiva(
+            request,
+            # Solo cuentan los productos que realmente cambian de estado.
+            queryset.exclude(activo=activo),
+            'activar_productos' if activo else 'desactivar_productos',
+            'Activar productos' if activo else 'Desactivar productos',
+            'admin/ecommerce/producto/cambiar_estado.html',
+            activo=activo,
+            seleccionados=queryset.count(),
+        )
+
+    def activar_productos(self, request, queryset):
+        return self.cambiar_estado_masivo(request, queryset, True)
+    activar_productos.short_description = 'Activar productos seleccionados'
+
+    def desactivar_productos(self, request, queryset):
+        return self.cambiar_estado_masivo(request, queryset, False)
+    desactivar_productos.short_description = 'Desactivar productos seleccionados'
+
+
+@admin.register(Agregado)
+class AgregadoAdmin(admin.ModelAdmin):
+    list_display = ('grupo', 'clave', 'valor')
+    list_filter = ('grupo',)
+    ordering = ('grupo', 'clave')
+
+    def has_add_permission(self, request):
+        """Los agregados se mantienen por señales o con recalcular_estadisticas"""
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ClienteArchivado)
+class ClienteArchivadoAdmin(AdminRapidoMixin, admin.ModelAdmin):
+    list_display = ('name', 'age', 'email', 'updated_at', 'archivado_en')
+    search_fields = ('^name', '=email')
+    busqueda_sin_mayusculas = ('name', 'email')
+    search_help_text = 'Busca por inicio del nombre o por email completo (sin distinguir mayúsculas).'
+    date_hierarchy = 'archivado_en'
+
+    def has_add_permission(self, request):
+        """Los clientes se archivan con el comando archivar_clientes"""
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(RegistroAuditoria)
+class RegistroAuditoriaAdmin(CamposDiferidosAdminMixin, AdminRapidoMixin, admin.ModelAdmin):
+    list_display = ('fecha', 'accion', 'modelo', 'objeto_id', 'usuario_texto', 'origen')
+    campos_diferidos = ('cambios',)
+    list_filter = ('accion', 'modelo')
+    search_fields = ('=objeto_id', '=usuario_texto')
+    search_help_text = 'Busca por id del objeto o por usuario exacto.'
+    date_hierarchy = 'fecha'
+    ordering = ('-fecha',)
+
+    def has_add_permission(self, request):
+        """Los registros se generan automáticamente al modificar clientes y productos"""
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(MovimientoStock)
+class MovimientoStockAdmin(AdminRapidoMixin, admin.ModelAdmin):
+    list_display = ('fecha', 'producto_id', 'cantidad', 'motivo', 'usuario_texto', 'origen')
+    list_filter = ('motivo',)
+    search_fields = ('=producto_id',)
+    search_help_text = 'Busca por id del producto.'
+    date_hierarchy = 'fecha'
+    ordering = ('-fecha',)
+
+    def has_add_permission(self, request):
+        """Los movimientos se registran automáticamente al cambiar el stock"""
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(SnapshotStock)
+class SnapshotStockAdmin(AdminRapidoMixin, admin.ModelAdmin):
+    list_display = ('fecha', 'producto_id', 'stock', 'movimientos')
+    search_fields = ('=producto_id',)
+    search_help_text = 'Busca por id del producto.'
+    date_hierarchy = 'fecha'
+    ordering = ('producto_id', '-fecha')
 
+    def has_add_permission(self, request):
+        """Los cierres se generan con el comando compactar_stock"""
+        return False
 
+    def has_change_permission(self, request, obj=None):
+        return False
 
+    def has_delete_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,258 @@
+import json
+import operator
+from functools import reduce
+
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ChangeList
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Max, Q, Value
+from django.db.models.functions import Lower
+from django.db.models.lookups import Exact, GreaterThanOrEqual, LessThan
+from django.utils.functional import cached_property
+
+
+# Filas que se cuentan exactamente antes de pasar a un conteo estimado.
+LIMITE_CONTEO = 10000
+
+# Carácter más alto de Unicode, usado como cota superior de los prefijos.
+FIN_PREFIJO = '\U0010ffff'
+
+# Parámetro del changelist con la última fila vista (paginación por clave).
+CURSOR_VAR = 'despues'
+
+
+def estimar_filas(queryset):
+    """
+    Estima la cantidad de filas de una tabla sin recorrerla.
+    En PostgreSQL usa las estadísticas del planificador (pg_class.reltuples);
+    en el resto de motores usa el máximo id, que se resuelve con el índice
+    de la clave primaria.
+    """
+    modelo = queryset.model
+    conexion = connections[queryset.db]
+    if conexion.vendor == 'postgresql':
+        with conexion.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class WHERE relname = %s',
+                [modelo._meta.db_table],
+            )
+            fila = cursor.fetchone()
+        if fila and fila[0] > 0:
+            return fila[0]
+    return modelo._default_manager.using(queryset.db).aggregate(maximo=Max('pk'))['maximo'] or 0
+
+
+class ConteoEstimadoPaginator(Paginator):
+    """
+    Paginador para changelists grandes que evita el COUNT(*) completo.
+    Cuenta exactamente hasta LIMITE_CONTEO filas con una subconsulta acotada
+    y por encima de ese valor usa una estimación. Las páginas numeradas se
+    limitan a las que caben en LIMITE_CONTEO, así ninguna necesita saltar
+    más de LIMITE_CONTEO filas con OFFSET; las filas siguientes se recorren
+    por clave (ver ListadoRapido).
+    """
+    limite = LIMITE_CONTEO
+
+    @cached_property
+    def count(self):
+        acotado = self.object_list[:self.limite + 1].count()
+        if acotado <= self.limite:
+            return acotado
+        if not self.object_list.query.has_filters():
+            return max(estimar_filas(self.object_list), acotado)
+        return acotado
+
+    @cached_property
+    def num_pages(self):
+        paginas = super().num_pages
+        return min(paginas, max(1, self.limite // self.per_page))
+
+
+def filtro_posterior(orden, valores):
+    """
+    Filas posteriores a `valores` en el orden indicado (lista de (campo,
+    descendente)), como comparación lexicográfica expandida en objetos Q:
+    a >= x AND ((a > x) OR (a = x AND b > y) ...). La cota sobre el primer
+    campo permite que la base empiece a leer el índice desde el cursor.
+    """
+    condiciones = []
+    for posicion, (campo, descendente) in enumerate(orden):
+        iguales = {nombre: valores[indice] for indice, (nombre, _) in enumerate(orden[:posicion])}
+        operador = 'lt' if descendente else 'gt'
+        condiciones.append(Q(**iguales, **{f'{campo}__{operador}': valores[posicion]}))
+    primero, descendente = orden[0]
+    cota = Q(**{f'{primero}__{"lte" if descendente else "gte"}': valores[0]})
+    return cota & reduce(operator.or_, condiciones)
+
+
+class ListadoRapido(ChangeList):
+    """
+    ChangeList que continúa la paginación por clave pasado LIMITE_CONTEO.
+    Features:
+        - Las páginas numeradas (OFFSET acotado) cubren las primeras
+          LIMITE_CONTEO filas.
+        - Desde la última página numerada, "Siguiente" filtra las filas
+          posteriores a la última vista (?despues=[valores del orden]), que
+          se resuelve con el índice del orden sin importar la profundidad.
+        - Funciona con cualquier orden de campos concretos no nulos; con
+          otros órdenes (columnas calculadas) solo hay páginas numeradas.
+    """
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(CURSOR_VAR, None)
+        return lookup_params
+
+    def get_query_string(self, new_params=None, remove=None):
+        # Los enlaces de páginas, filtros y orden vuelven al recorrido numerado.
+        new_params = {CURSOR_VAR: None, **(new_params or {})}
+        return super().get_query_string(new_params, remove)
+
+    def orden_por_clave(self):
+        """[(campo, descendente)] del orden del listado, o None si no admite clave."""
+        orden = []
+        for criterio in self.queryset.query.order_by:
+            if not isinstance(criterio, str):
+                return None
+            nombre = criterio.lstrip('-')
+            try:
+                campo = self.opts.pk if nombre == 'pk' else self.opts.get_field(nombre)
+            except FieldDoesNotExist:
+                return None
+            if not getattr(campo, 'concrete', False) or campo.null:
+                return None
+            if any(nombre == campo.attname for nombre, _ in orden):
+                # Repetido (ej: el orden del admin más el del modelo): no cambia el resultado.
+                continue
+            orden.append((campo.attname, criterio.startswith('-')))
+        return orden or None
+
+    def cursor(self, valores):
+        # str() conserva los microsegundos de las fechas (DjangoJSONEncoder los recorta).
+        return self.get_query_string({CURSOR_VAR: json.dumps(valores, default=str)})
+
+    def leer_cursor(self, orden, texto):
+        try:
+            valores = json.loads(texto)
+            if len(valores) != len(orden):
+                raise ValueError
+            return [self.opts.get_field(campo).to_python(valor) for (campo, _), valor in zip(orden, valores)]
+        except (TypeError, ValueError, ValidationError):
+            raise IncorrectLookupParameters
+
+    def siguiente(self, queryset, orden):
+        """Enlace a las filas posteriores a la página `queryset`, o None si es la última."""
+        limites = list(
+            queryset.values_list(*(campo for campo, _ in orden))[self.list_per_page - 1:self.list_per_page + 1]
+        )
+        if len(limites) < 2:
+            return None
+        return self.cursor(list(limites[0]))
+
+    def get_results(self, request):
+        texto = request.GET.get(CURSOR_VAR)
+        orden = self.orden_por_clave() if issubclass(self.model_admin.paginator, ConteoEstimadoPaginator) else None
+        self.pagina_siguiente = None
+        self.por_clave = bool(texto and orden)
+        if not self.por_clave:
+            super().get_results(request)
+            ultima = self.multi_page and self.page_num == self.paginator.num_pages
+            if orden and ultima and not (self.show_all and self.can_show_all):
+                inicio = (self.page_num - 1) * self.list_per_page
+                self.pagina_siguiente = self.siguiente(self.queryset[inicio:], orden)
+            return
+
+        # Recorrido por clave: sin OFFSET ni páginas numeradas.
+        posteriores = self.queryset.filter(filtro_posterior(orden, self.leer_cursor(orden, texto)))
+        self.paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+        self.result_count = self.paginator.count
+        self.full_result_count = None
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.result_list = posteriores[:self.list_per_page]
+        self.can_show_all = False
+        self.multi_page = False
+        self.pagina_siguiente = self.siguiente(posteriores, orden)
+        self.pagina_primera = self.get_query_string()
+
+
+class AdminRapidoMixin:
+    """
+    Mixin para ModelAdmin que mantiene el changelist rápido en tablas grandes.
+    Features:
+        - Sin COUNT(*) adicional del total sin filtrar.
+        - Conteo acotado o estimado mediante ConteoEstimadoPaginator.
+        - Páginas numeradas hasta LIMITE_CONTEO filas y, después, paginación
+          por clave (ListadoRapido): todas las filas quedan accesibles.
+        - Búsquedas '=campo' por igualdad y '^campo' por rango de prefijo,
+          ambas resueltas con el índice B-tree del campo en lugar de LIKE.
+        - Campos de busqueda_sin_mayusculas comparados como LOWER(campo),
+          para usar un índice funcional sobre Lower(campo).
+        - Tamaño de página y "Mostrar todo" acotados.
+    """
+    busqueda_sin_mayusculas = ()
+    show_full_result_count = False
+    paginator = ConteoEstimadoPaginator
+    list_per_page = 50
+    list_max_show_all = 200
+
+    def get_changelist(self, request, **kwargs):
+        return ListadoRapido
+
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+
+        condiciones = []
+        for campo in self.get_search_fields(request):
+            if campo.startswith('=') and campo[1:] in self.busqueda_sin_mayusculas:
+                condiciones.append(Q(Exact(Lower(campo[1:]), Lower(Value(search_term)))))
+            elif campo.startswith('='):
+                try:
+                    # Un término no convertible (ej: texto en un campo numérico) no coincide.
+                    valor = self.model._meta.get_field(campo[1:]).to_python(search_term)
+                except ValidationError:
+                    continue
+                condiciones.append(Q(**{campo[1:]: valor}))
+            elif campo.startswith('^') and campo[1:] in self.busqueda_sin_mayusculas:
+                # Rango de prefijo sobre el índice funcional de Lower(campo).
+                prefijo = search_term.lower()
+                condiciones.append(Q(
+                    GreaterThanOrEqual(Lower(campo[1:]), Value(prefijo)),
+                    LessThan(Lower(campo[1:]), Value(prefijo + FIN_PREFIJO)),
+                ))
+            elif campo.startswith('^'):
+                campo = campo[1:]
+                condiciones.append(Q(**{
+                    f'{campo}__gte': search_term,
+                    f'{campo}__lt': search_term + FIN_PREFIJO,
+                }))
+            else:
+                return super().get_search_results(request, queryset, search_term)
+
+        if not condiciones:
+            return queryset.none(), False
+        return queryset.filter(reduce(operator.or_, condiciones)), False
+
+
+class ListadoDiferido(ListadoRapido):
+    """ChangeList que no carga los campos_diferidos del ModelAdmin."""
+
+    def get_queryset(self, request, exclude_parameters=None):
+        queryset = super().get_queryset(request, exclude_parameters)
+        return queryset.defer(*self.model_admin.campos_diferidos)
+
+
+class CamposDiferidosAdminMixin:
+    """
+    Mixin para ModelAdmin cuyo changelist no lee las columnas de texto
+    largo (campos_diferidos), que el listado no muestra. El formulario de
+    edición las sigue cargando completas.
+    """
+    campos_diferidos = ()
+
+    def get_changelist(self, request, **kwargs):
+        return ListadoDiferido
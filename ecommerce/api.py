@@ -0,0 +1,386 @@
+import json
+
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.db import IntegrityError
+from django.db.models import Value
+from django.db.models.functions import Lower
+from django.http import Http404, JsonResponse
+from django.views import View
+
+from . import buscador, operaciones
+from .forms import formularioCliente, formularioProductos
+from .limite_tasa import LimiteTasaMixin
+from .models import Cliente, ClienteArchivado, Producto
+
+
+# Tamaño de página por defecto y máximo de los listados.
+POR_PAGINA = 50
+MAX_POR_PAGINA = 500
+
+# Objetos por request en las operaciones masivas.
+MAX_LOTE = 1000
+
+
+class ErrorApi(Exception):
+    """Error de la petición, respondido como JSON con el status indicado."""
+
+    def __init__(self, datos, status=400):
+        super().__init__(datos)
+        self.datos = datos if isinstance(datos, dict) else {'error': datos}
+        self.status = status
+
+
+class ApiLoginRequeridoMixin(LoginRequiredMixin):
+    """
+    Misma autenticación por sesión que LoginRequiredMixin, pero sin sesión
+    responde 401 en JSON en lugar de redirigir al login. Los errores de la
+    petición (ErrorApi, Http404) también se responden en JSON.
+    """
+
+    def handle_no_permission(self):
+        return JsonResponse({'error': 'Autenticación requerida.'}, status=401)
+
+    def dispatch(self, request, *args, **kwargs):
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        except ErrorApi as error:
+            return JsonResponse(error.datos, status=error.status)
+        except Http404:
+            return JsonResponse({'error': 'No encontrado.'}, status=404)
+
+
+def leer_json(request):
+    try:
+        return json.loads(request.body)
+    except (UnicodeDecodeError, ValueError):
+        raise ErrorApi('El cuerpo de la petición no es JSON válido.')
+
+
+def entero(request, nombre, por_defecto, minimo=0, maximo=None):
+    valor = request.GET.get(nombre)
+    if valor is None:
+        return por_defecto
+    try:
+        valor = int(valor)
+    except ValueError:
+        raise ErrorApi(f'El parámetro "{nombre}" debe ser un número entero.')
+    if valor < minimo:
+        raise ErrorApi(f'El parámetro "{nombre}" debe ser mayor o igual a {minimo}.')
+    return min(valor, maximo) if maximo is not None else valor
+
+
+def clave_error(indice):
+    return 'objeto' if indice is None else str(indice)
+
+
+class RecursoApiMixin(ApiLoginRequeridoMixin):
+    """
+    Base de los endpoints JSON de un modelo.
+    Features:
+        - Campos dispersos con ?fields=a,b: solo esas columnas se leen de
+          la base (values() en listados, only() en el detalle).
+        - Validación de cada objeto con el formulario HTML del modelo: los
+          campos del formulario son los únicos escribibles.
+        - Validaciones contra la base (ej: unicidad) hechas una vez por lote.
+    """
+    model = None
+    form_class = None
+    # Campos expuestos en las respuestas; 'id' siempre se incluye.
+    campos = ()
+
+    def campos_pedidos(self):
+        pedidos = self.request.GET.get('fields')
+        if not pedidos:
+            return list(self.campos)
+        campos = [campo.strip() for campo in pedidos.split(',') if campo.strip() not in ('', 'id')]
+        desconocidos = sorted(set(campos) - set(self.campos))
+        if desconocidos:
+            raise ErrorApi({
+                'error': f'Campos desconocidos: {", ".join(desconocidos)}.',
+                'campos_disponibles': ['id', *self.campos],
+            })
+        return list(dict.fromkeys(campos))
+
+    def serializar(self, objeto, campos):
+        return {'id': objeto.pk, **{campo: getattr(objeto, campo) for campo in campos}}
+
+    def validar(self, datos, indice=None):
+        """Valida los datos de un objeto con el formulario; retorna cleaned_data."""
+        if not isinstance(datos, dict):
+            raise ErrorApi({'errores': {clave_error(indice): {'__all__': ['Se esperaba un objeto JSON.']}}})
+        form = self.form_class(data=datos)
+        extra = sorted(set(datos) - set(form.fields) - {'id'})
+        if extra or not form.is_valid():
+            errores = {campo: list(mensajes) for campo, mensajes in form.errors.items()}
+            for campo in extra:
+                errores[campo] = ['Campo desconocido o de solo lectura.']
+            raise ErrorApi({'errores': {clave_error(indice): errores}})
+        return form.cleaned_data
+
+    def nuevo(self, datos, indice=None):
+        """Objeto sin guardar; los campos omitidos toman el valor inicial del formulario."""
+        if isinstance(datos, dict):
+            iniciales = {
+                nombre: campo.initial for nombre, campo in self.form_class.base_fields.items()
+                if campo.initial is not None
+            }
+            datos = {**iniciales, **datos}
+        return self.model(**self.validar(datos, indice))
+
+    def aplicar_cambios(self, objeto, datos, indice=None):
+        """Valida y asigna cambios parciales: los campos omitidos conservan su valor."""
+        if not isinstance(datos, dict):
+            self.validar(datos, indice)
+        completos = {campo: getattr(objeto, campo) for campo in self.form_class.base_fields}
+        completos.update(datos)
+        limpios = self.validar(completos, indice)
+        for campo in datos:
+            if campo in limpios:
+                setattr(objeto, campo, limpios[campo])
+        return objeto
+
+    def validar_lote(self, objetos, claves=None):
+        """
+        Validaciones que requieren consultar la base, para todo el lote.
+        `claves` identifica cada objeto en los errores (por defecto su índice).
+        """
+
+    def guardar(self, funcion, *args):
+        try:
+            return funcion(*args)
+        except IntegrityError:
+            raise ErrorApi('Los datos entran en conflicto con registros existentes.', status=409)
+
+
+class RecursoListaApiView(RecursoApiMixin, View):
+    """
+    Listado y operaciones masivas de un modelo.
+        GET: listado paginado por clave (?despues=<último id>&limite=N).
+        POST: alta de un arreglo de objetos.
+        PATCH: edición de un arreglo de objetos con "id" y los campos a cambiar.
+        DELETE: baja de los objetos de {"ids": [...]}.
+    Las operaciones masivas validan todo el arreglo antes de escribir y
+    se aplican en una transacción: se guardan todos los objetos o ninguno.
+    """
+
+    def get(self, request):
+        campos = self.campos_pedidos()
+        despues = entero(request, 'despues', 0)
+        limite = entero(request, 'limite', POR_PAGINA, minimo=1, maximo=MAX_POR_PAGINA)
+        # Paginación por clave: cada página cuesta lo mismo sin importar cuántas la preceden.
+        filas = list(
+            self.model.objects.filter(pk__gt=despues).order_by('pk').values('id', *campos)[:limite + 1]
+        )
+        siguiente = None
+        if len(filas) > limite:
+            filas = filas[:limite]
+            parametros = request.GET.copy()
+            parametros['despues'] = filas[-1]['id']
+            siguiente = f'{request.path}?{parametros.urlencode()}'
+        return JsonResponse({'resultados': filas, 'siguiente': siguiente})
+
+    def arreglo(self, request):
+        datos = leer_json(request)
+        if not isinstance(datos, list) or not datos:
+            raise ErrorApi('Se esperaba un arreglo JSON no vacío.')
+        if len(datos) > MAX_LOTE:
+            raise ErrorApi(f'Se admiten hasta {MAX_LOTE} objetos por petición.')
+        return datos
+
+    def cada_uno(self, funcion, datos):
+        """Aplica `funcion(item, indice)` a cada elemento y reúne los errores de todos."""
+        resultados = []
+        errores = {}
+        for indice, item in enumerate(datos):
+            try:
+                resultados.append(funcion(item, indice))
+            except ErrorApi as error:
+                if 'errores' not in error.datos:
+                    raise
+                errores.update(error.datos['errores'])
+        if errores:
+            raise ErrorApi({'errores': errores})
+        return resultados
+
+    def post(self, request):
+        objetos = self.cada_uno(self.nuevo, self.arreglo(request))
+        self.validar_lote(objetos)
+        creados = self.guardar(operaciones.crear_objetos, self.model, objetos)
+        campos = self.campos_pedidos()
+        return JsonResponse({'creados': [self.serializar(objeto, campos) for objeto in creados]}, status=201)
+
+    def patch(self, request):
+        datos = self.arreglo(request)
+        ids = [item.get('id') if isinstance(item, dict) else None for item in datos]
+        if not all(isinstance(pk, int) for pk in ids):
+            raise ErrorApi('Cada objeto debe incluir su "id" numérico.')
+        if len(set(ids)) != len(ids):
+            raise ErrorApi('Hay ids repetidos en el arreglo.')
+        existentes = self.model.objects.in_bulk(ids)
+        faltantes = [pk for pk in ids if pk not in existentes]
+        if faltantes:
+            raise ErrorApi({'error': 'Objetos inexistentes.', 'ids': faltantes}, status=404)
+
+        objetos = self.cada_uno(
+            lambda item, indice: self.aplicar_cambios(existentes[item['id']], item, indice), datos
+        )
+        self.validar_lote(objetos)
+        actualizados = self.guardar(operaciones.actualizar_objetos, self.model, objetos)
+        campos = self.campos_pedidos()
+        return JsonResponse({
+            'actualizados': actualizados,
+            'objetos': [self.serializar(objeto, campos) for objeto in objetos],
+        })
+
+    def delete(self, request):
+        datos = leer_json(request)
+        ids = datos.get('ids') if isinstance(datos, dict) else None
+        if not isinstance(ids, list) or not ids or not all(isinstance(pk, int) for pk in ids):
+            raise ErrorApi('Se esperaba {"ids": [...]} con ids numéricos.')
+        if len(ids) > MAX_LOTE:
+            raise ErrorApi(f'Se admiten hasta {MAX_LOTE} objetos por petición.')
+        objetos = list(self.model.objects.filter(pk__in=ids))
+        borrados = self.guardar(operaciones.borrar_objetos, self.model, objetos)
+        encontrados = {objeto.pk for objeto in objetos}
+        return JsonResponse({
+            'borrados': borrados,
+            'no_encontrados': [pk for pk in dict.fromkeys(ids) if pk not in encontrados],
+        })
+
+
+class RecursoDetalleApiView(RecursoApiMixin, View):
+    """Detalle (GET), edición parcial (PATCH) y baja (DELETE) de un objeto."""
+
+    def obtener(self, pk, campos=None):
+        queryset = self.model.objects.all()
+        if campos is not None:
+            queryset = queryset.only(*campos)
+        try:
+            return queryset.get(pk=pk)
+        except self.model.DoesNotExist:
+            raise Http404
+
+    def get(self, request, pk):
+        campos = self.campos_pedidos()
+        return JsonResponse(self.serializar(self.obtener(pk, campos), campos))
+
+    def patch(self, request, pk):
+        objeto = self.aplicar_cambios(self.obtener(pk), leer_json(request))
+        self.validar_lote([objeto], [clave_error(None)])
+        self.guardar(operaciones.actualizar_objetos, self.model, [objeto])
+        return JsonResponse(self.serializar(objeto, self.campos_pedidos()))
+
+    def delete(self, request, pk):
+        self.guardar(operaciones.borrar_objetos, self.model, [self.obtener(pk)])
+        return JsonResponse({'borrados': 1})
+
+
+class ClienteApiMixin:
+    model = Cliente
+    form_class = formularioCliente
+    campos = ('name', 'age', 'email', 'created_at', 'updated_at', 'version')
+
+    def validar_lote(self, objetos, claves=None):
+        """
+        Unicidad del email (sin distinguir mayúsculas) con una sola consulta,
+        entre los clientes y los clientes archivados (su email sigue reservado).
+        """
+        claves = claves or [clave_error(indice) for indice in range(len(objetos))]
+        errores = {}
+        vistos = {}
+        for clave, objeto in zip(claves, objetos):
+            email = objeto.email.lower()
+            if email in vistos:
+                errores[clave] = {'email': ['Email repetido dentro del arreglo.']}
+            vistos.setdefault(email, clave)
+        activos = (
+            Cliente.objects
+            .annotate(email_minusculas=Lower('email'), archivado=Value(False))
+            .filter(email_minusculas__in=list(vistos))
+            .exclude(pk__in=[objeto.pk for objeto in objetos if objeto.pk])
+            .order_by()
+            .values_list('email_minusculas', 'archivado')
+        )
+        archivados = (
+            ClienteArchivado.objects
+            .annotate(email_minusculas=Lower('email'), archivado=Value(True))
+            .filter(email_minusculas__in=list(vistos))
+            .order_by()
+            .values_list('email_minusculas', 'archivado')
+        )
+        for email, archivado in activos.union(archivados, all=True):
+            mensaje = 'Ya existe un cliente archivado con este email.' if archivado else None
+            errores[vistos[email]] = {'email': [mensaje or 'Ya existe un cliente con este email.']}
+        if errores:
+            raise ErrorApi({'errores': errores})
+
+
+class ProductoApiMixin:
+    model = Producto
+    form_class = formularioProductos
+    campos = ('nombre', 'precio', 'descripcion', 'descripcion_snippet', 'stock', 'activo', 'created_at', 'version')
+
+
+class ClienteListaApiView(ClienteApiMixin, RecursoListaApiView):
+    pass
+
+
+class ClienteDetalleApiView(ClienteApiMixin, RecursoDetalleApiView):
+    pass
+
+
+class ProductoListaApiView(ProductoApiMixin, RecursoListaApiView):
+    pass
+
+
+class ProductoDetalleApiView(ProductoApiMixin, RecursoDetalleApiView):
+    pass
+
+
+class BusquedaApiView(ApiLoginRequeridoMixin, LimiteTasaMixin, View):
+    """
+    Resultados de /busqueda/ en JSON, con los mismos parámetros
+    (q, tipo, difusa, archivados), el mismo cache y el mismo límite de tasa.
+    Retorna hasta LIMITE_RESULTADOS de cada tipo; `hay_mas` indica si había más.
+    """
+    limite_nombre = 'busqueda'
+    limite_capacidad = 20
+    limite_por_segundo = 0.5
+
+    def get(self, request):
+        query = request.GET.get('q', '').strip()
+        tipo_busqueda = request.GET.get('tipo', 'todos')
+        difusa = request.GET.get('difusa') == '1'
+        archivados = request.GET.get('archivados') == '1'
+        clientes, productos, hay_mas = [], [], False
+        if query:
+            encontrados = buscador.resultados_cacheados(query, tipo_busqueda, difusa, archivados)
+            clientes = buscador.cargar_clientes(encontrados['clientes'])
+            productos = buscador.cargar_productos(encontrados['productos'])
+            hay_mas = encontrados['hay_mas']
+        return JsonResponse({
+            'hay_mas': hay_mas,
+            'clientes': [
+                {
+                    'id': cliente.pk,
+                    'name': cliente.name,
+                    'email': cliente.email,
+                    'age': cliente.age,
+                    'archivado': isinstance(cliente, ClienteArchivado),
+                    'similitud': getattr(cliente, 'similitud', None),
+                }
+                for cliente in clientes
+            ],
+            'productos': [
+                {
+                    'id': producto.pk,
+                    'nombre': producto.nombre,
+                    'precio': producto.precio,
+                    'stock': producto.stock,
+                    'activo': producto.activo,
+                    'descripcion_snippet': producto.descripcion_snippet,
+                    'similitud': getattr(producto, 'similitud', None),
+                }
+                for producto in productos
+            ],
+        })
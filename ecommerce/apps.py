@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class EcommerceConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'ecommerce'
+
+    def ready(self):
+        # Registrar las señales que mantienen los agregados del panel.
+        from . import signals  # noqa: F401
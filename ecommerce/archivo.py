@@ -0,0 +1,77 @@
+import calendar
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import auditoria, buscador, estadisticas
+from .models import Cliente, ClienteArchivado, RegistroAuditoria, Trigrama
+from .operaciones import borrar_por_ids, lotes_de_ids
+
+
+# Clientes movidos por transacción.
+TAMANO_LOTE = 1000
+
+# Campos copiados de Cliente a ClienteArchivado.
+CAMPOS = ('id', 'name', 'age', 'email', 'created_at', 'updated_at')
+
+
+def restar_meses(fecha, meses):
+    """Misma fecha `meses` meses antes (el día se ajusta al último del mes si no existe)."""
+    anios, mes = divmod(fecha.month - 1 - meses, 12)
+    anio = fecha.year + anios
+    dia = min(fecha.day, calendar.monthrange(anio, mes + 1)[1])
+    return fecha.replace(year=anio, month=mes + 1, day=dia)
+
+
+def inactivos(meses):
+    """Clientes sin actualizaciones en los últimos `meses` meses."""
+    return Cliente.objects.filter(updated_at__lt=restar_meses(timezone.now(), meses))
+
+
+def archivar_lote(ids, limite):
+    """
+    Mueve a la tabla de archivo los clientes del lote que siguen inactivos.
+    Copia y borrado ocurren en la misma transacción: un cliente nunca
+    queda en ambas tablas ni en ninguna.
+    """
+    with transaction.atomic():
+        filas = list(
+            Cliente.objects
+            .select_for_update()
+            .filter(pk__in=ids, updated_at__lt=limite)
+            .values(*CAMPOS)
+        )
+        if not filas:
+            return 0
+        movidos = [fila['id'] for fila in filas]
+        ClienteArchivado.objects.bulk_create([ClienteArchivado(**fila) for fila in filas])
+        Trigrama.objects.filter(tipo=Trigrama.CLIENTE, objeto_id__in=movidos).delete()
+        # Borrado directo, sin cargar los clientes ni disparar señales por fila:
+        # agregados, índice y cache se actualizan una sola vez al final.
+        borrar_por_ids(Cliente, movidos)
+    return len(movidos)
+
+
+def archivar(meses, lote=TAMANO_LOTE):
+    """
+    Archiva por lotes los clientes inactivos hace más de `meses` meses.
+    Features:
+        - Lotes recorridos por clave primaria, cada uno en su transacción.
+        - Un cliente actualizado mientras corre el proceso no se archiva.
+        - Agregados del panel y resultados de búsqueda actualizados al final.
+        - Un registro de auditoría con la cantidad de clientes archivados.
+    """
+    limite = restar_meses(timezone.now(), meses)
+    total = 0
+    for ids in lotes_de_ids(Cliente.objects.filter(updated_at__lt=limite), lote):
+        total += archivar_lote(ids, limite)
+    if total:
+        estadisticas.recalcular_clientes()
+        buscador.invalidar()
+        auditoria.registrar(
+            RegistroAuditoria.CLIENTE,
+            RegistroAuditoria.MASIVO,
+            cambios={'detalle': f'archivar inactivos hace {meses} meses', 'clientes': total},
+        )
+    return total
+
@@ -0,0 +1,263 @@
+import atexit
+import logging
+import os
+import threading
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DataError, IntegrityError, close_old_connections, transaction
+from django.db.models.fields.files import FieldFile
+
+from .models import Cliente, Producto, RegistroAuditoria
+
+
+logger = logging.getLogger(__name__)
+
+MODELOS = {
+    Cliente: RegistroAuditoria.CLIENTE,
+    Producto: RegistroAuditoria.PRODUCTO,
+}
+
+# Petición en curso del hilo (o tarea async): de ella salen usuario y origen.
+_peticion = ContextVar('auditoria_peticion', default=None)
+
+
+def configuracion(nombre, por_defecto):
+    return getattr(settings, f'AUDITORIA_{nombre}', por_defecto)
+
+
+@contextmanager
+def peticion_actual(request):
+    """Asocia los registros generados dentro del bloque a la petición."""
+    token = _peticion.set(request)
+    try:
+        yield
+    finally:
+        _peticion.reset(token)
+
+
+def autor():
+    """(usuario, texto del usuario, origen) de la petición en curso, si la hay."""
+    request = _peticion.get()
+    if request is None:
+        return None, '', ''
+    usuario = getattr(request, 'user', None)
+    if usuario is None or not usuario.is_authenticated:
+        usuario = None
+    coincidencia = getattr(request, 'resolver_match', None)
+    origen = coincidencia.view_name if coincidencia else request.path
+    return usuario, usuario.get_username() if usuario else '', origen[:100]
+
+
+class ColaAuditoria:
+    """
+    Cola en memoria de registros de auditoría pendientes de escribir.
+    Features:
+        - encolar() solo agrega a un deque: no toca la base de datos.
+        - Un hilo en segundo plano escribe lotes con bulk_create cada
+          AUDITORIA_INTERVALO segundos o al juntar AUDITORIA_LOTE registros.
+        - Si la escritura falla, el lote vuelve a la cola y se reintenta; los
+          registros que la base rechaza se descartan (con log) sin bloquearla.
+        - Con más de AUDITORIA_MAX_PENDIENTES registros sin escribir, quien
+          encola escribe en el momento (contrapresión en lugar de descartar).
+        - Vaciado al terminar el proceso (atexit) para no perder registros
+          en un apagado ordenado.
+    """
+
+    def __init__(self):
+        self._pendientes = deque()
+        self._hay_lote = threading.Event()
+        self._lock_hilo = threading.Lock()
+        self._lock_escritura = threading.Lock()
+        self._hilo = None
+        self._pid = None
+        self._detenida = False
+
+    def __len__(self):
+        return len(self._pendientes)
+
+    def encolar(self, registro, en_segundo_plano=True):
+        """
+        Agrega un registro a la cola. Con en_segundo_plano=False no se inicia
+        el hilo: quien encola es responsable de llamar a vaciar().
+        """
+        if en_segundo_plano:
+            self._asegurar_hilo()
+        self._pendientes.append(registro)
+        pendientes = len(self._pendientes)
+        if pendientes > configuracion('MAX_PENDIENTES', 100000):
+            self.vaciar()
+        elif pendientes >= configuracion('LOTE', 200):
+            self._hay_lote.set()
+
+    def _asegurar_hilo(self):
+        if self._pid == os.getpid() and self._hilo is not None and self._hilo.is_alive():
+            return
+        with self._lock_hilo:
+            if self._pid != os.getpid():
+                # Proceso hijo tras un fork: los pendientes heredados los escribe el padre.
+                self._pendientes.clear()
+                self._hilo = None
+                self._pid = os.getpid()
+            if self._hilo is None or not self._hilo.is_alive():
+                self._hilo = threading.Thread(target=self._bucle, name='auditoria', daemon=True)
+                self._hilo.start()
+
+    def _bucle(self):
+        while not self._detenida:
+            self._hay_lote.wait(configuracion('INTERVALO', 1.0))
+            self._hay_lote.clear()
+            if self._pendientes:
+                self.vaciar()
+                close_old_connections()
+
+    def vaciar(self):
+        """Escribe todos los registros pendientes. Retorna cuántos se escribieron."""
+        lote_maximo = configuracion('LOTE', 200)
+        escritos = 0
+        with self._lock_escritura:
+            while self._pendientes:
+                lote = []
+                while self._pendientes and len(lote) < lote_maximo:
+                    lote.append(self._pendientes.popleft())
+                try:
+                    RegistroAuditoria.objects.bulk_create(lote)
+                except (IntegrityError, DataError, ValueError):
+                    # Algún registro es inválido (ej: su usuario se borró mientras
+                    # esperaba en la cola): se escriben de a uno para aislarlo.
+                    escribibles, fallo = self._escribir_de_a_uno(lote)
+                    escritos += escribibles
+                    if fallo:
+                        break
+                    continue
+                except Exception:
+                    logger.exception('No se pudieron escribir %d registros de auditoría', len(lote))
+                    self._pendientes.extendleft(reversed(lote))
+                    break
+                escritos += len(lote)
+        return escritos
+
+    def _escribir_de_a_uno(self, lote):
+        """
+        Escribe el lote registro por registro: los que la base rechaza se
+        registran en el log y se descartan, así no bloquean la cola. Ante
+        otro error (ej: la base no responde) el resto vuelve a la cola.
+        Retorna (escritos, hubo_fallo).
+        """
+        escritos = 0
+        for posicion, registro in enumerate(lote):
+            try:
+                with transaction.atomic():
+                    registro.save(force_insert=True)
+            except (IntegrityError, DataError, ValueError):
+                logger.exception(
+                    'Se descarta el registro de auditoría de %s %s (%s por %s)',
+                    registro.modelo, registro.objeto_id, registro.accion, registro.usuario_texto or 'sistema',
+                )
+            except Exception:
+                logger.exception('No se pudieron escribir %d registros de auditoría', len(lote) - posicion)
+                self._pendientes.extendleft(reversed(lote[posicion:]))
+                return escritos, True
+            else:
+                escritos += 1
+        return escritos, False
+
+    def detener(self):
+        """Detiene el hilo y escribe lo pendiente (se llama al terminar el proceso)."""
+        self._detenida = True
+        self._hay_lote.set()
+        if self._pid == os.getpid():
+            self.vaciar()
+
+
+cola = ColaAuditoria()
+atexit.register(cola.detener)
+
+
+def _valor(instancia, campo):
+    valor = getattr(instancia, campo.attname)
+    # Los archivos se registran por nombre.
+    return valor.name if isinstance(valor, FieldFile) else valor
+
+
+def _campos_auditados(instancia):
+    # Los campos auto_now y la versión cambian en cada guardado y no aportan
+    # información; el extracto se deriva de la descripción, que ya se audita.
+    return [
+        campo for campo in instancia._meta.concrete_fields
+        if not campo.primary_key and not getattr(campo, 'auto_now', False)
+        and campo.name not in ('version', 'descripcion_snippet')
+    ]
+
+
+def valores(instancia):
+    """Valores actuales de los campos auditados, indexados por nombre."""
+    return {campo.name: _valor(instancia, campo) for campo in _campos_auditados(instancia)}
+
+
+def diferencias(instancia):
+    """
+    Campos modificados como {campo: [antes, después]}, tomando el estado
+    cargado por CamposModificadosMixin. None si no se conoce el estado previo.
+    """
+    originales = instancia.valores_originales
+    if originales is None:
+        return None
+    cambios = {}
+    for campo in _campos_auditados(instancia):
+        if campo.attname not in originales or campo.attname not in instancia.__dict__:
+            continue
+        actual = _valor(instancia, campo)
+        if originales[campo.attname] != actual:
+            cambios[campo.name] = [originales[campo.attname], actual]
+    return cambios
+
+
+def registrar(modelo, accion, objeto_id=None, cambios=None):
+    """
+    Registra una acción sobre un objeto (o una operación masiva si no hay
+    objeto_id). El registro se encola recién al confirmarse la transacción,
+    así los cambios revertidos no quedan auditados.
+    """
+    modo = configuracion('MODO', 'cola')
+    if modo == 'desactivado':
+        return
+    usuario, usuario_texto, origen = autor()
+    registro = RegistroAuditoria(
+        modelo=modelo,
+        objeto_id=objeto_id,
+        accion=accion,
+        usuario=usuario,
+        usuario_texto=usuario_texto,
+        origen=origen,
+        cambios=cambios or {},
+    )
+
+    def encolar():
+        # En modo sincrono no hay hilo: escribe la misma conexión que guardó el objeto.
+        cola.encolar(registro, en_segundo_plano=modo == 'cola')
+        if modo == 'sincrono':
+            cola.vaciar()
+
+    transaction.on_commit(encolar)
+
+
+def guardado(instancia, creado):
+    """Registra el alta o la edición de un cliente o producto."""
+    if creado:
+        registrar(MODELOS[type(instancia)], RegistroAuditoria.CREAR, instancia.pk, valores(instancia))
+        return
+    cambios = diferencias(instancia)
+    if cambios is None:
+        # Guardado de una instancia no cargada de la base: se registra el estado final.
+        cambios = {'valores': valores(instancia)}
+    elif not cambios:
+        return
+    registrar(MODELOS[type(instancia)], RegistroAuditoria.EDITAR, instancia.pk, cambios)
+
+
+def borrado(instancia):
+    """Registra la baja de un cliente o producto con sus últimos valores."""
+    registrar(MODELOS[type(instancia)], RegistroAuditoria.BORRAR, instancia.pk, valores(instancia))
@@ -0,0 +1,165 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+
+from . import snippets, trigramas
+from .models import Cliente, ClienteArchivado, Producto, Trigrama
+
+
+# Grupo de cache de los resultados; se invalida al modificar clientes o productos.
+GRUPO_BUSQUEDA = 'busqueda'
+
+# Resultados de cada tipo por página de /busqueda/.
+POR_PAGINA = 25
+
+# Resultados de cada tipo que se guardan por búsqueda (como el límite de la
+# búsqueda por trigramas): el cache guarda solo sus ids.
+LIMITE_RESULTADOS = 50
+
+# Columnas de texto completo que los resultados no cargan (se muestra el extracto).
+CAMPOS_DIFERIDOS_PRODUCTO = ('descripcion',)
+
+
+def resultados(query, tipo_busqueda, difusa, archivados=False):
+    """
+    Ids de los clientes y productos que coinciden con la consulta, hasta
+    LIMITE_RESULTADOS de cada tipo. Retorna un diccionario con:
+        - clientes: lista de (pk, similitud, archivado).
+        - productos: lista de (pk, similitud).
+        - hay_mas: True si algún tipo tenía más resultados que el límite.
+    Con `archivados`, los clientes archivados que coinciden se agregan al
+    final de los clientes (siempre por texto: el índice de trigramas solo
+    cubre la tabla principal). Son listas chicas de ids, así que se pueden
+    cachear sin importar cuántas filas coincidan.
+    """
+    clientes, productos = resultados_principales(query, tipo_busqueda, difusa)
+    clientes = [(pk, similitud, False) for pk, similitud in clientes]
+    if archivados and (tipo_busqueda == 'clientes' or tipo_busqueda == 'todos'):
+        clientes += [
+            (pk, None, True) for pk in ClienteArchivado.objects.filter(
+                Q(name__icontains=query) |
+                Q(email__icontains=query)
+            ).order_by('name').values_list('pk', flat=True)[:LIMITE_RESULTADOS + 1 - len(clientes)]
+        ]
+    return {
+        'clientes': clientes[:LIMITE_RESULTADOS],
+        'productos': productos[:LIMITE_RESULTADOS],
+        'hay_mas': len(clientes) > LIMITE_RESULTADOS or len(productos) > LIMITE_RESULTADOS,
+    }
+
+
+def resultados_principales(query, tipo_busqueda, difusa):
+    """
+    Listas de (pk, similitud) de clientes y productos, con hasta
+    LIMITE_RESULTADOS + 1 elementos (el de más indica que hay más). La
+    similitud es un porcentaje en la búsqueda difusa y None en la exacta.
+    """
+    clientes = []
+    productos = []
+    limite = LIMITE_RESULTADOS + 1
+
+    if difusa:
+        # Búsqueda tolerante a errores de tipeo, ordenada por similitud.
+        if tipo_busqueda == 'clientes' or tipo_busqueda == 'todos':
+            clientes = [
+                (pk, round(similitud * 100))
+                for pk, similitud in trigramas.buscar(Trigrama.CLIENTE, query, limite)
+            ]
+        if tipo_busqueda == 'productos' or tipo_busqueda == 'todos':
+            productos = [
+                (pk, round(similitud * 100))
+                for pk, similitud in trigramas.buscar(Trigrama.PRODUCTO, query, limite)
+            ]
+        return clientes, productos
+
+    if tipo_busqueda == 'clientes' or tipo_busqueda == 'todos':
+        # Buscar en clientes por nombre o email.
+        clientes = [(pk, None) for pk in Cliente.objects.filter(
+            Q(name__icontains=query) |
+            Q(email__icontains=query)
+        ).order_by('name').values_list('pk', flat=True)[:limite]]
+
+    if tipo_busqueda == 'productos' or tipo_busqueda == 'todos':
+        # Buscar en productos por nombre o descripción.
+        productos = [(pk, None) for pk in Producto.objects.filter(
+            Q(nombre__icontains=query) |
+            Q(descripcion__icontains=query)
+        ).order_by('nombre').values_list('pk', flat=True)[:limite]]
+
+    return clientes, productos
+
+
+def resultados_cacheados(query, tipo_busqueda, difusa, archivados=False):
+    """
+    Como resultados(), pero desde el cache. Búsquedas idénticas simultáneas
+    calculan el resultado una sola vez (get_or_set con protección contra
+    estampidas del cache escalonado).
+    """
+    firma = hashlib.md5(
+        f'{tipo_busqueda}|{int(difusa)}|{int(archivados)}|{query}'.encode(), usedforsecurity=False
+    ).hexdigest()
+    return cache.get_or_set(
+        cache.clave_grupo(GRUPO_BUSQUEDA, firma),
+        lambda: resultados(query, tipo_busqueda, difusa, archivados),
+        getattr(settings, 'BUSQUEDA_CACHE_SEGUNDOS', 300),
+    )
+
+
+def cargar_clientes(clientes):
+    """
+    Objetos de una lista de (pk, similitud, archivado), en el mismo orden y
+    con el atributo `similitud`. Se omiten los que ya no existen.
+    """
+    activos = Cliente.objects.in_bulk([pk for pk, _, archivado in clientes if not archivado])
+    archivados = ClienteArchivado.objects.in_bulk([pk for pk, _, archivado in clientes if archivado])
+    objetos = []
+    for pk, similitud, archivado in clientes:
+        cliente = (archivados if archivado else activos).get(pk)
+        if cliente is not None:
+            cliente.similitud = similitud
+            objetos.append(cliente)
+    return objetos
+
+
+def cargar_productos(productos):
+    """Como cargar_clientes(), para una lista de (pk, similitud); sin la descripción completa."""
+    encontrados = Producto.objects.defer(*CAMPOS_DIFERIDOS_PRODUCTO).in_bulk([pk for pk, _ in productos])
+    objetos = []
+    for pk, similitud in productos:
+        producto = encontrados.get(pk)
+        if producto is not None:
+            producto.similitud = similitud
+            objetos.append(producto)
+    return objetos
+
+
+def resaltar_productos(productos, query):
+    """
+    Asigna a cada producto (solo los de la página que se muestra) el
+    atributo `extracto`: la parte de la descripción con las palabras de la
+    consulta resaltadas. Si el extracto guardado no las contiene, se lee la
+    descripción completa de esos productos en una sola consulta; si tampoco
+    (coincidió el nombre) se muestra el extracto guardado.
+    """
+    patron = snippets.patron_terminos(query)
+    pendientes = []
+    for producto in productos:
+        producto.extracto = snippets.resaltar(producto.descripcion_snippet, patron)
+        if producto.extracto is None:
+            pendientes.append(producto)
+    if patron is not None and pendientes:
+        descripciones = dict(
+            Producto.objects.filter(pk__in=[producto.pk for producto in pendientes]).values_list('pk', 'descripcion')
+        )
+        for producto in pendientes:
+            producto.extracto = snippets.resaltar(descripciones.get(producto.pk), patron)
+    for producto in pendientes:
+        if producto.extracto is None:
+            producto.extracto = producto.descripcion_snippet
+    return productos
+
+
+def invalidar():
+    cache.invalidar_grupo(GRUPO_BUSQUEDA)
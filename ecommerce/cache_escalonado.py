@@ -0,0 +1,282 @@
+import pickle
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+
+# Marca de valor ausente (None es un valor válido en el cache).
+_AUSENTE = object()
+
+# Cantidad de locks entre los que se reparten las claves para evitar estampidas.
+CANDADOS_POR_PROCESO = 64
+
+
+class NivelLocal:
+    """
+    Cache LRU acotado en memoria del proceso, con TTL por entrada.
+    Guarda los valores serializados para que mutar un objeto obtenido
+    no altere la copia cacheada (igual que LocMemCache).
+    """
+
+    def __init__(self, max_entradas):
+        self.max_entradas = max_entradas
+        self.entradas = OrderedDict()
+        self.lock = threading.Lock()
+        self.estadisticas = dict.fromkeys(
+            ('aciertos_local', 'aciertos_compartido', 'fallos', 'desalojos', 'escrituras', 'esperas'), 0
+        )
+        self.candados = [threading.Lock() for _ in range(CANDADOS_POR_PROCESO)]
+
+    def obtener(self, clave):
+        with self.lock:
+            entrada = self.entradas.get(clave)
+            if entrada is None:
+                return _AUSENTE
+            expira, valor = entrada
+            if expira is not None and expira <= time.monotonic():
+                del self.entradas[clave]
+                return _AUSENTE
+            self.entradas.move_to_end(clave)
+        return pickle.loads(valor)
+
+    def guardar(self, clave, valor, ttl):
+        if ttl is not None and ttl <= 0:
+            self.borrar(clave)
+            return
+        serializado = pickle.dumps(valor, pickle.HIGHEST_PROTOCOL)
+        expira = None if ttl is None else time.monotonic() + ttl
+        with self.lock:
+            self.entradas[clave] = (expira, serializado)
+            self.entradas.move_to_end(clave)
+            while len(self.entradas) > self.max_entradas:
+                self.entradas.popitem(last=False)
+                self.estadisticas['desalojos'] += 1
+
+    def borrar(self, clave):
+        with self.lock:
+            return self.entradas.pop(clave, None) is not None
+
+    def limpiar(self):
+        with self.lock:
+            self.entradas.clear()
+
+    def contar(self, estadistica):
+        with self.lock:
+            self.estadisticas[estadistica] += 1
+
+    def candado(self, clave):
+        return self.candados[zlib.crc32(clave.encode()) % CANDADOS_POR_PROCESO]
+
+
+# Django crea una instancia del backend por hilo: el nivel local se comparte
+# entre todas las del proceso, indexado por LOCATION (como LocMemCache).
+_niveles = {}
+_niveles_lock = threading.Lock()
+
+
+class CacheEscalonado(BaseCache):
+    """
+    Backend de cache en dos niveles: un LRU acotado en memoria del proceso
+    delante de un cache compartido entre procesos (archivos o base de datos).
+    Features:
+        - Lecturas frecuentes resueltas sin salir del proceso.
+        - TTL local corto (TTL_LOCAL) para acotar la desactualización
+          entre procesos; las escrituras y borrados del propio proceso
+          se ven de inmediato.
+        - Prefijos que solo se guardan en el nivel compartido (EXCLUIR_LOCAL),
+          para datos que deben ser consistentes entre procesos (ej: sesiones).
+        - get_or_set con protección contra estampidas: un solo cálculo por
+          clave, con lock por proceso y marca de cálculo en el nivel compartido.
+        - Invalidación por grupos versionados (clave_grupo / invalidar_grupo).
+        - Estadísticas de aciertos, fallos y desalojos del proceso.
+
+    OPTIONS:
+        SEGUNDO_NIVEL: alias del cache compartido (obligatorio).
+        MAX_ENTRADAS: entradas del nivel local (por defecto 1000).
+        TTL_LOCAL: segundos máximos en el nivel local (por defecto 10).
+        EXCLUIR_LOCAL: prefijos de clave que no pasan por el nivel local.
+        ESPERA_CALCULO: segundos que get_or_set espera el cálculo de otro
+            proceso antes de calcular por su cuenta (por defecto 5).
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        opciones = params.get('OPTIONS', {})
+        self.segundo_nivel = opciones['SEGUNDO_NIVEL']
+        self.ttl_local = opciones.get('TTL_LOCAL', 10)
+        self.excluir_local = tuple(opciones.get('EXCLUIR_LOCAL', ()))
+        self.espera_calculo = opciones.get('ESPERA_CALCULO', 5)
+        with _niveles_lock:
+            if location not in _niveles:
+                _niveles[location] = NivelLocal(opciones.get('MAX_ENTRADAS', 1000))
+            self.local = _niveles[location]
+
+    @property
+    def compartido(self):
+        return caches[self.segundo_nivel]
+
+    def _usa_local(self, key):
+        return not key.startswith(self.excluir_local) if self.excluir_local else True
+
+    def _ttl_local(self, timeout):
+        """TTL del nivel local: el del valor, acotado por TTL_LOCAL."""
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        if timeout is None:
+            return self.ttl_local
+        return min(timeout, self.ttl_local)
+
+    # API estándar de cache.
+
+    def get(self, key, default=None, version=None):
+        clave = self.make_and_validate_key(key, version=version)
+        if self._usa_local(key):
+            valor = self.local.obtener(clave)
+            if valor is not _AUSENTE:
+                self.local.contar('aciertos_local')
+                return valor
+        valor = self.compartido.get(key, _AUSENTE, version=version)
+        if valor is _AUSENTE:
+            self.local.contar('fallos')
+            return default
+        self.local.contar('aciertos_compartido')
+        if self._usa_local(key):
+            self.local.guardar(clave, valor, self.ttl_local)
+        return valor
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        clave = self.make_and_validate_key(key, version=version)
+        self.compartido.set(key, value, self._timeout_compartido(timeout), version=version)
+        self.local.contar('escrituras')
+        if self._usa_local(key):
+            self.local.guardar(clave, value, self._ttl_local(timeout))
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        clave = self.make_and_validate_key(key, version=version)
+        if not self.compartido.add(key, value, self._timeout_compartido(timeout), version=version):
+            return False
+        self.local.contar('escrituras')
+        if self._usa_local(key):
+            self.local.guardar(clave, value, self._ttl_local(timeout))
+        return True
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        self.make_and_validate_key(key, version=version)
+        return self.compartido.touch(key, self._timeout_compartido(timeout), version=version)
+
+    def delete(self, key, version=None):
+        clave = self.make_and_validate_key(key, version=version)
+        self.local.borrar(clave)
+        return self.compartido.delete(key, version=version)
+
+    def has_key(self, key, version=None):
+        clave = self.make_and_validate_key(key, version=version)
+        if self._usa_local(key) and self.local.obtener(clave) is not _AUSENTE:
+            return True
+        return self.compartido.has_key(key, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        clave = self.make_and_validate_key(key, version=version)
+        # El contador vive solo en el nivel compartido para no divergir entre procesos.
+        self.local.borrar(clave)
+        return self.compartido.incr(key, delta, version=version)
+
+    def clear(self):
+        self.local.limpiar()
+        self.compartido.clear()
+
+    def close(self, **kwargs):
+        self.compartido.close(**kwargs)
+
+    def _timeout_compartido(self, timeout):
+        return self.default_timeout if timeout is DEFAULT_TIMEOUT else timeout
+
+    # Protección contra estampidas.
+
+    def get_or_set(self, key, default, timeout=DEFAULT_TIMEOUT, version=None):
+        """
+        Como el get_or_set de Django, pero si varios hilos o procesos piden
+        a la vez una clave ausente solo uno ejecuta `default`; el resto
+        espera su resultado.
+        """
+        valor = self.get(key, _AUSENTE, version=version)
+        if valor is not _AUSENTE:
+            return valor
+
+        clave = self.make_and_validate_key(key, version=version)
+        with self.local.candado(clave):
+            # Otro hilo del proceso pudo haberlo calculado mientras esperábamos.
+            valor = self.get(key, _AUSENTE, version=version)
+            if valor is not _AUSENTE:
+                return valor
+
+            marca = f'{key}:calculando'
+            propia = self.compartido.add(marca, 1, self.espera_calculo, version=version)
+            if not propia:
+                valor = self._esperar_calculo(key, version)
+                if valor is not _AUSENTE:
+                    return valor
+            try:
+                valor = default() if callable(default) else default
+                self.set(key, valor, timeout, version=version)
+            finally:
+                if propia:
+                    self.compartido.delete(marca, version=version)
+            return valor
+
+    def _esperar_calculo(self, key, version):
+        """Espera a que otro proceso publique el valor, hasta ESPERA_CALCULO segundos."""
+        self.local.contar('esperas')
+        limite = time.monotonic() + self.espera_calculo
+        while time.monotonic() < limite:
+            time.sleep(0.05)
+            valor = self.compartido.get(key, _AUSENTE, version=version)
+            if valor is not _AUSENTE:
+                return valor
+        return _AUSENTE
+
+    # Invalidación por grupos.
+
+    def version_grupo(self, grupo):
+        """
+        Versión actual de un grupo de claves. Se usa un timestamp y no un
+        contador: si el cache descarta la versión, la nueva nunca coincide
+        con una anterior y no reaparecen valores viejos.
+        """
+        version = self.get(f'grupo:{grupo}')
+        if version is None:
+            version = time.time_ns()
+            if not self.add(f'grupo:{grupo}', version, None):
+                version = self.get(f'grupo:{grupo}', version)
+        return version
+
+    def clave_grupo(self, grupo, clave):
+        """Clave versionada: deja de usarse en cuanto se invalida el grupo."""
+        return f'{grupo}:{self.version_grupo(grupo)}:{clave}'
+
+    def invalidar_grupo(self, grupo):
+        self.set(f'grupo:{grupo}', time.time_ns(), None)
+
+    # Estadísticas.
+
+    def estadisticas(self):
+        with self.local.lock:
+            datos = dict(self.local.estadisticas)
+            datos['entradas_local'] = len(self.local.entradas)
+        datos['max_entradas_local'] = self.local.max_entradas
+        lecturas = datos['aciertos_local'] + datos['aciertos_compartido'] + datos['fallos']
+        datos['lecturas'] = lecturas
+        datos['tasa_aciertos'] = (
+            round((datos['aciertos_local'] + datos['aciertos_compartido']) * 100 / lecturas, 1)
+            if lecturas else 0
+        )
+        return datos
+
+    def reiniciar_estadisticas(self):
+        with self.local.lock:
+            for nombre in self.local.estadisticas:
+                self.local.estadisticas[nombre] = 0
@@ -0,0 +1,48 @@
+from functools import wraps
+
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import cache
+from django.http import HttpResponse
+
+
+def cacheable(request):
+    """
+    Solo se cachean GET sin parámetros de visitantes anónimos sin mensajes
+    pendientes: cualquier otra respuesta depende del usuario o de la sesión.
+    """
+    if request.method != 'GET' or request.GET:
+        return False
+    if request.user.is_authenticated:
+        return False
+    # len() no marca los mensajes como leídos; solo iterarlos los consume.
+    return not len(messages.get_messages(request))
+
+
+def cache_anonimo(vista):
+    """
+    Decorador que cachea la respuesta completa de páginas estáticas para
+    visitantes anónimos.
+    Features:
+        - Un acierto evita la vista y el render de la plantilla completa.
+        - Usuarios autenticados y visitantes con mensajes pendientes
+          siempre obtienen la página renderizada.
+        - Duración configurable en CACHE_PAGINAS_SEGUNDOS (0 lo desactiva).
+    """
+    @wraps(vista)
+    def wrapper(request, *args, **kwargs):
+        segundos = getattr(settings, 'CACHE_PAGINAS_SEGUNDOS', 600)
+        if not segundos or not cacheable(request):
+            return vista(request, *args, **kwargs)
+
+        clave = f'pagina:{request.path}'
+        guardada = cache.get(clave)
+        if guardada is not None:
+            contenido, tipo = guardada
+            return HttpResponse(contenido, content_type=tipo)
+
+        respuesta = vista(request, *args, **kwargs)
+        if respuesta.status_code == 200 and not respuesta.streaming:
+            cache.set(clave, (respuesta.content, respuesta['Content-Type']), segundos)
+        return respuesta
+    return wrapper
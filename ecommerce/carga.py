@@ -0,0 +1,265 @@
+import io
+import json
+import math
+import random
+import statistics
+import threading
+import time
+import uuid
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode
+
+from django.db import connections
+
+
+# Campo y cookie del token CSRF de Django.
+CAMPO_CSRF = 'csrfmiddlewaretoken'
+COOKIE_CSRF = 'csrftoken'
+
+# Dominio de los usuarios y clientes generados por las pruebas de carga.
+DOMINIO_CARGA = 'carga.example.com'
+
+
+class ClienteWsgi:
+    """
+    Cliente HTTP mínimo que llama a la aplicación WSGI en el mismo proceso,
+    sin sockets: mide el costo de Django (middleware, vistas, plantillas y
+    base de datos) sin el del servidor ni la red. Guarda las cookies
+    como un navegador, así cada instancia es una sesión independiente.
+    """
+
+    def __init__(self, aplicacion, host='localhost'):
+        self.aplicacion = aplicacion
+        self.host = host
+        self.cookies = {}
+
+    def _entorno(self, metodo, ruta, parametros=None, cuerpo=b'', tipo=''):
+        entorno = {
+            'REQUEST_METHOD': metodo,
+            'PATH_INFO': ruta,
+            'QUERY_STRING': urlencode(parametros or {}, doseq=True),
+            'SERVER_NAME': self.host,
+            'SERVER_PORT': '80',
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'HTTP_HOST': self.host,
+            'REMOTE_ADDR': '127.0.0.1',
+            'CONTENT_TYPE': tipo,
+            'CONTENT_LENGTH': str(len(cuerpo)),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': io.BytesIO(cuerpo),
+            'wsgi.errors': io.StringIO(),
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False,
+        }
+        if self.cookies:
+            entorno['HTTP_COOKIE'] = '; '.join(f'{nombre}={valor}' for nombre, valor in self.cookies.items())
+        return entorno
+
+    def pedir(self, metodo, ruta, parametros=None, datos=None):
+        """Ejecuta una petición. Retorna (status, cuerpo)."""
+        cuerpo = urlencode(datos or {}, doseq=True).encode() if metodo == 'POST' else b''
+        tipo = 'application/x-www-form-urlencoded' if metodo == 'POST' else ''
+        respuesta = {}
+
+        def start_response(status, headers, exc_info=None):
+            respuesta['status'] = int(status.split(' ', 1)[0])
+            respuesta['headers'] = headers
+
+        resultado = self.aplicacion(self._entorno(metodo, ruta, parametros, cuerpo, tipo), start_response)
+        try:
+            contenido = b''.join(resultado)
+        finally:
+            if hasattr(resultado, 'close'):
+                resultado.close()
+        for nombre, valor in respuesta['headers']:
+            if nombre.lower() == 'set-cookie':
+                for cookie in SimpleCookie(valor).values():
+                    if cookie['max-age'] == '0' or not cookie.value:
+                        self.cookies.pop(cookie.key, None)
+                    else:
+                        self.cookies[cookie.key] = cookie.value
+        return respuesta['status'], contenido
+
+
+class Escenario:
+    """
+    Escenario de carga leído de un archivo JSON:
+        {
+          "usuarios": {"email": "carga{i}@carga.example.com", "password": "...", "cantidad": 8},
+          "pasos": [
+            {"nombre": "busqueda", "peso": 3, "metodo": "GET", "ruta": "/busqueda/",
+             "parametros": {"q": ["ana", "lopez"], "tipo": "todos"}},
+            {"nombre": "crear_cliente", "peso": 1, "metodo": "POST", "ruta": "/crear_cliente/",
+             "datos": {"name": "Carga {n}", "email": "carga-{aleatorio}@carga.example.com"}}
+          ]
+        }
+    Cada paso se elige al azar según su peso. Los valores que son listas se
+    eligen al azar; en los textos, {n} es un contador y {aleatorio} un
+    identificador único. Los POST obtienen primero el token CSRF con un
+    GET a la misma ruta (o a "formulario") si la sesión aún no lo tiene.
+    El paso "login" se ejecuta además al iniciar cada usuario virtual.
+    Con "esperado" (lista de status) una respuesta distinta cuenta como
+    error aunque sea 2xx (ej: un formulario rechazado vuelve con 200).
+    """
+
+    def __init__(self, datos):
+        self.datos = datos
+        self.usuarios = datos.get('usuarios', {})
+        self.pasos = [paso for paso in datos['pasos'] if paso.get('peso', 1) > 0]
+        if not self.pasos:
+            raise ValueError('El escenario no tiene pasos con peso mayor a cero.')
+        for paso in self.pasos:
+            if 'nombre' not in paso or 'ruta' not in paso:
+                raise ValueError('Cada paso necesita "nombre" y "ruta".')
+        self.pesos = [paso.get('peso', 1) for paso in self.pasos]
+        self.login = next((paso for paso in self.pasos if paso['nombre'] == 'login'), None)
+        self._contador = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def desde_archivo(cls, ruta):
+        with open(ruta, encoding='utf-8') as archivo:
+            return cls(json.load(archivo))
+
+    def credenciales(self, indice):
+        cantidad = max(1, self.usuarios.get('cantidad', 1))
+        i = indice % cantidad
+        return self.usuarios.get('email', '').format(i=i), self.usuarios.get('password', '').format(i=i)
+
+    def _siguiente(self):
+        with self._lock:
+            self._contador += 1
+            return self._contador
+
+    def expandir(self, valores, azar, extra=None):
+        resultado = {}
+        for nombre, valor in (valores or {}).items():
+            if isinstance(valor, list):
+                valor = azar.choice(valor)
+            if isinstance(valor, str):
+                valor = valor.format(n=self._siguiente(), aleatorio=uuid.uuid4().hex[:12])
+            resultado[nombre] = valor
+        resultado.update(extra or {})
+        return resultado
+
+
+class UsuarioVirtual:
+    """Una sesión que ejecuta pasos del escenario y registra sus tiempos."""
+
+    def __init__(self, aplicacion, escenario, indice, semilla, host):
+        self.cliente = ClienteWsgi(aplicacion, host)
+        self.escenario = escenario
+        self.azar = random.Random(semilla)
+        self.email, self.password = escenario.credenciales(indice)
+        self.muestras = []
+
+    def ejecutar(self, paso):
+        metodo = paso.get('metodo', 'GET').upper()
+        extra = {}
+        if paso is self.escenario.login:
+            extra = {'email': self.email, 'password': self.password}
+        if metodo == 'POST' and COOKIE_CSRF not in self.cliente.cookies:
+            # Como un navegador: primero se carga el formulario (no se mide).
+            self.cliente.pedir('GET', paso.get('formulario', paso['ruta']))
+        if metodo == 'POST':
+            extra[CAMPO_CSRF] = self.cliente.cookies.get(COOKIE_CSRF, '')
+        parametros = self.escenario.expandir(paso.get('parametros'), self.azar)
+        datos = self.escenario.expandir(paso.get('datos'), self.azar, extra)
+
+        inicio = time.perf_counter()
+        try:
+            status, _ = self.cliente.pedir(metodo, paso['ruta'], parametros, datos)
+        except Exception:
+            status = 0
+        ms = (time.perf_counter() - inicio) * 1000
+        esperado = paso.get('esperado')
+        correcto = 0 < status < 400 and (not esperado or status in esperado)
+        self.muestras.append((paso['nombre'], status, ms, correcto))
+
+    def correr(self, hasta, maximo):
+        try:
+            if self.escenario.login is not None:
+                self.ejecutar(self.escenario.login)
+            while time.monotonic() < hasta and (maximo is None or len(self.muestras) < maximo):
+                self.ejecutar(self.azar.choices(self.escenario.pasos, self.escenario.pesos)[0])
+        finally:
+            connections.close_all()
+
+
+def correr_proceso(aplicacion, escenario, hilos, duracion, peticiones, semilla, host, primer_usuario=0):
+    """
+    Ejecuta `hilos` usuarios virtuales concurrentes durante `duracion`
+    segundos (o hasta `peticiones` por usuario). Retorna (muestras, segundos).
+    """
+    hasta = time.monotonic() + duracion
+    usuarios = [
+        UsuarioVirtual(aplicacion, escenario, primer_usuario + i, semilla + primer_usuario + i, host)
+        for i in range(hilos)
+    ]
+    inicio = time.perf_counter()
+    trabajadores = [
+        threading.Thread(target=usuario.correr, args=(hasta, peticiones), name=f'carga-{i}')
+        for i, usuario in enumerate(usuarios)
+    ]
+    for trabajador in trabajadores:
+        trabajador.start()
+    for trabajador in trabajadores:
+        trabajador.join()
+    segundos = time.perf_counter() - inicio
+    return [muestra for usuario in usuarios for muestra in usuario.muestras], segundos
+
+
+def correr_en_hijo(datos_escenario, hilos, duracion, peticiones, semilla, host, primer_usuario):
+    """Punto de entrada de cada proceso hijo (los argumentos deben ser serializables)."""
+    from entrega_final.wsgi import application
+    connections.close_all()
+    return correr_proceso(
+        application, Escenario(datos_escenario), hilos, duracion, peticiones, semilla, host, primer_usuario,
+    )
+
+
+def percentil(ordenados, p):
+    """Percentil por rango más cercano de una lista ya ordenada."""
+    if not ordenados:
+        return 0
+    return ordenados[max(0, math.ceil(len(ordenados) * p / 100) - 1)]
+
+
+def resumir_tiempos(tiempos, errores, segundos):
+    tiempos = sorted(tiempos)
+    return {
+        'peticiones': len(tiempos),
+        'errores': errores,
+        'por_segundo': round(len(tiempos) / segundos, 2) if segundos else 0,
+        'media_ms': round(statistics.mean(tiempos), 2) if tiempos else 0,
+        'p50_ms': round(percentil(tiempos, 50), 2),
+        'p95_ms': round(percentil(tiempos, 95), 2),
+        'p99_ms': round(percentil(tiempos, 99), 2),
+        'max_ms': round(tiempos[-1], 2) if tiempos else 0,
+    }
+
+
+def resumir(muestras, segundos):
+    """
+    Totales y estadísticas por ruta. Cuenta como error cualquier status
+    4xx/5xx, excepción (status 0) o status distinto del esperado; los
+    status de cada ruta se informan aparte.
+    """
+    por_ruta = {}
+    for nombre, status, ms, correcto in muestras:
+        ruta = por_ruta.setdefault(nombre, {'tiempos': [], 'errores': 0, 'status': {}})
+        ruta['tiempos'].append(ms)
+        ruta['status'][str(status)] = ruta['status'].get(str(status), 0) + 1
+        if not correcto:
+            ruta['errores'] += 1
+
+    rutas = {}
+    for nombre, ruta in sorted(por_ruta.items()):
+        rutas[nombre] = resumir_tiempos(ruta['tiempos'], ruta['errores'], segundos)
+        rutas[nombre]['status'] = dict(sorted(ruta['status'].items()))
+    total = resumir_tiempos(
+        [ms for _, _, ms, _ in muestras], sum(ruta['errores'] for ruta in por_ruta.values()), segundos,
+    )
+    return {'segundos': round(segundos, 2), 'total': total, 'rutas': rutas}
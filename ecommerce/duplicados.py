@@ -0,0 +1,267 @@
+import multiprocessing
+import re
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+from difflib import SequenceMatcher
+
+from django.db import connections, transaction
+
+from . import auditoria
+from .models import Cliente, RegistroAuditoria
+
+
+# Registros contiguos que se comparan en cada pasada (ventana deslizante).
+VENTANA = 10
+
+# Puntaje mínimo (0 a 1) para considerar dos clientes duplicados.
+UMBRAL = 0.8
+
+# Registros ordenados que procesa cada tarea de comparación.
+TAMANO_TAREA = 20000
+
+# Dominios que son alias del mismo proveedor de correo.
+ALIAS_DOMINIOS = {
+    'googlemail.com': 'gmail.com',
+    'hotmail.es': 'hotmail.com',
+}
+
+# Reglas fonéticas para nombres en español, aplicadas en orden.
+REGLAS_FONETICAS = [
+    (re.compile(r'ch'), 'C'),
+    (re.compile(r'll'), 'y'),
+    (re.compile(r'qu'), 'k'),
+    (re.compile(r'gu(?=[ei])'), 'g'),
+    (re.compile(r'g(?=[ei])'), 'j'),
+    (re.compile(r'c(?=[ei])'), 's'),
+    (re.compile(r'[cq]'), 'k'),
+    (re.compile(r'z'), 's'),
+    (re.compile(r'v'), 'b'),
+    (re.compile(r'w'), 'u'),
+    (re.compile(r'x'), 'ks'),
+    (re.compile(r'h'), ''),
+    (re.compile(r'y(?![aeiou])'), 'i'),
+]
+
+
+def sin_acentos(texto):
+    descompuesto = unicodedata.normalize('NFKD', texto or '')
+    return ''.join(letra for letra in descompuesto if not unicodedata.combining(letra)).lower()
+
+
+def palabras(nombre):
+    return re.findall(r'[a-z]+', sin_acentos(nombre))
+
+
+def fonetica(palabra):
+    """
+    Clave fonética de una palabra: "Gonzalez", "Gonsales" y "Gonzáles"
+    dan la misma. Conserva la primera letra, quita las vocales siguientes
+    y las letras repetidas.
+    """
+    for patron, reemplazo in REGLAS_FONETICAS:
+        palabra = patron.sub(reemplazo, palabra)
+    if not palabra:
+        return ''
+    clave = palabra[0]
+    for letra in palabra[1:]:
+        if letra not in 'aeiou' and letra != clave[-1]:
+            clave += letra
+    return clave[:6]
+
+
+def clave_nombre(nombre):
+    """Claves fonéticas de las palabras del nombre, ordenadas (el orden no importa)."""
+    return ' '.join(sorted(fonetica(palabra) for palabra in palabras(nombre) if len(palabra) > 1))
+
+
+def nombre_normalizado(nombre):
+    """
+    Palabras del nombre sin acentos, ordenadas por su clave fonética: el
+    orden no depende de errores de tipeo ("Baleria" y "Valeria").
+    """
+    return ' '.join(sorted(palabras(nombre), key=lambda palabra: (fonetica(palabra), palabra)))
+
+
+def partes_email(email):
+    """
+    (parte local, dominio) normalizados: sin mayúsculas ni acentos, sin el
+    sufijo "+etiqueta" ni puntos, guiones o guiones bajos en la parte local.
+    """
+    local, _, dominio = sin_acentos(email).partition('@')
+    local = re.sub(r'[._-]', '', local.split('+', 1)[0])
+    return local, ALIAS_DOMINIOS.get(dominio, dominio)
+
+
+def registro(pk, nombre, email, edad):
+    """Datos normalizados de un cliente para compararlo (tupla serializable)."""
+    local, dominio = partes_email(email)
+    digitos = ''.join(re.findall(r'\d', local))
+    return (pk, nombre_normalizado(nombre), clave_nombre(nombre), local, dominio, edad, digitos)
+
+
+# Pasadas del vecindario ordenado: cada una ordena por una clave de bloqueo
+# distinta, así un error en un campo no impide encontrar el duplicado.
+PASADAS = {
+    'email': lambda r: (r[3], r[2]),
+    'nombre': lambda r: (r[2], r[5] if r[5] is not None else -1),
+    'edad': lambda r: (r[5] if r[5] is not None else -1, r[3]),
+}
+
+
+PESO_NOMBRE = 0.45
+PESO_EMAIL = 0.4
+PESO_EDAD = 0.15
+
+
+def similitud(texto_a, texto_b):
+    if not texto_a or not texto_b:
+        return 0.0
+    if texto_a == texto_b:
+        return 1.0
+    return SequenceMatcher(None, texto_a, texto_b).ratio()
+
+
+def cota(texto_a, texto_b):
+    """Cota superior de similitud() calculada solo con las longitudes."""
+    if not texto_a or not texto_b:
+        return 0.0
+    return 2.0 * min(len(texto_a), len(texto_b)) / (len(texto_a) + len(texto_b))
+
+
+def puntaje(a, b, umbral=0.0):
+    """
+    Similitud entre dos registros, de 0 a 1 (nombre 45%, email 40%,
+    edad 15%). Con `umbral`, los pares que no pueden alcanzarlo retornan 0
+    sin calcular las similitudes de texto (la parte costosa).
+    """
+    if a[5] is None or b[5] is None:
+        edad = 0.5
+    else:
+        diferencia = abs(a[5] - b[5])
+        edad = 1.0 if diferencia == 0 else 0.5 if diferencia == 1 else 0.0
+
+    if a[3] and a[3] == b[3]:
+        email = 1.0 if a[4] == b[4] else 0.9
+    elif a[6] and b[6] and a[6] != b[6]:
+        # juan.perez1 y juan.perez2 suelen ser cuentas distintas.
+        email = 0.0
+    else:
+        email = None
+
+    maximo_email = cota(a[3], b[3]) if email is None else email
+    maximo_nombre = 1.0 if a[2] and a[2] == b[2] else cota(a[1], b[1])
+    if PESO_NOMBRE * maximo_nombre + PESO_EMAIL * maximo_email + PESO_EDAD * edad < umbral:
+        return 0.0
+    nombre = similitud(a[1], b[1])
+    if a[2] and a[2] == b[2]:
+        # Suenan igual: errores de tipeo u ortografía.
+        nombre = max(nombre, 0.9)
+    if PESO_NOMBRE * nombre + PESO_EMAIL * maximo_email + PESO_EDAD * edad < umbral:
+        return 0.0
+    if email is None:
+        email = similitud(a[3], b[3])
+    return PESO_NOMBRE * nombre + PESO_EMAIL * email + PESO_EDAD * edad
+
+
+def comparar_tramo(pasada, registros, propios, ventana, umbral):
+    """
+    Compara cada uno de los primeros `propios` registros (ya ordenados) con
+    los `ventana - 1` siguientes. Los registros extra al final son el solape
+    con el tramo siguiente. Retorna [(id menor, id mayor, puntaje, pasada)].
+    """
+    coincidencias = []
+    for i in range(min(propios, len(registros))):
+        a = registros[i]
+        for b in registros[i + 1:i + ventana]:
+            valor = puntaje(a, b, umbral)
+            if valor >= umbral:
+                menor, mayor = sorted((a[0], b[0]))
+                coincidencias.append((menor, mayor, round(valor, 3), pasada))
+    return coincidencias
+
+
+def tramos(registros, ventana, tamano):
+    """Divide los registros ordenados en tareas que se solapan en ventana - 1."""
+    for inicio in range(0, len(registros), tamano):
+        yield registros[inicio:inicio + tamano + ventana - 1], min(tamano, len(registros) - inicio)
+
+
+def cargar_registros(queryset=None):
+    queryset = Cliente.objects.all() if queryset is None else queryset
+    filas = queryset.order_by().values_list('pk', 'name', 'email', 'age').iterator(chunk_size=5000)
+    return [registro(*fila) for fila in filas]
+
+
+def buscar_pares(registros, ventana=VENTANA, umbral=UMBRAL, procesos=1, tamano=TAMANO_TAREA):
+    """
+    Pares de clientes candidatos a duplicados por vecindario ordenado: en
+    cada pasada se ordena por una clave de bloqueo y solo se compara cada
+    registro con sus vecinos, O(n log n + n * ventana) en lugar de todos
+    los pares. Las comparaciones se reparten entre `procesos` procesos.
+    Retorna {(id menor, id mayor): (puntaje, [pasadas])}.
+    """
+    tareas = [
+        (pasada, tramo, propios, ventana, umbral)
+        for pasada, clave in PASADAS.items()
+        for tramo, propios in tramos(sorted(registros, key=clave), ventana, tamano)
+    ]
+    if procesos > 1 and len(tareas) > 1:
+        # Los hijos heredan el código por fork; solo reciben tuplas y no usan
+        # la base. Se cierran las conexiones para que no compartan sockets,
+        # salvo las que están dentro de una transacción (ej: un TestCase o
+        # una vista ATOMIC_REQUESTS): cerrarlas descartaría la transacción.
+        for conexion in connections.all(initialized_only=True):
+            if not conexion.in_atomic_block:
+                conexion.close()
+        contexto = multiprocessing.get_context('fork')
+        with ProcessPoolExecutor(max_workers=procesos, mp_context=contexto) as pool:
+            resultados = list(pool.map(comparar_tramo, *zip(*tareas)))
+    else:
+        resultados = [comparar_tramo(*tarea) for tarea in tareas]
+
+    pares = {}
+    for coincidencias in resultados:
+        for menor, mayor, valor, pasada in coincidencias:
+            previo, pasadas = pares.get((menor, mayor), (0, []))
+            pares[(menor, mayor)] = (max(previo, valor), pasadas + [pasada])
+    return pares
+
+
+def agrupar(pares):
+    """Agrupa los pares en conjuntos de clientes duplicados (unión-búsqueda)."""
+    padre = {}
+
+    def raiz(pk):
+        padre.setdefault(pk, pk)
+        while padre[pk] != pk:
+            padre[pk] = padre[padre[pk]]
+            pk = padre[pk]
+        return pk
+
+    for menor, mayor in pares:
+        padre[raiz(mayor)] = raiz(menor)
+    grupos = {}
+    for pk in padre:
+        grupos.setdefault(raiz(pk), []).append(pk)
+    return sorted((sorted(grupo) for grupo in grupos.values()), key=lambda grupo: (-len(grupo), grupo[0]))
+
+
+def fusionar(conservado, duplicados):
+    """
+    Fusiona clientes duplicados en `conservado`: los demás se borran (con
+    sus señales: agregados, índice de búsqueda y auditoría de la baja) y
+    se audita la fusión en el cliente conservado. Retorna cuántos se borraron.
+    """
+    ids = [cliente.pk for cliente in duplicados if cliente.pk != conservado.pk]
+    if not ids:
+        return 0
+    with transaction.atomic():
+        emails = list(Cliente.objects.filter(pk__in=ids).values_list('email', flat=True))
+        borrados, _ = Cliente.objects.filter(pk__in=ids).delete()
+        auditoria.registrar(
+            RegistroAuditoria.CLIENTE,
+            RegistroAuditoria.EDITAR,
+            conservado.pk,
+            {'fusionados': ids, 'emails': emails},
+        )
+    return borrados
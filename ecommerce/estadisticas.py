@@ -0,0 +1,179 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Agregado, Cliente, Producto, filtro_vip
+
+
+# Grupos de agregados mantenidos en la tabla Agregado.
+GRUPO_CLIENTES = 'clientes'
+GRUPO_EDADES = 'edades'
+GRUPO_ALTAS = 'altas'
+GRUPO_PRODUCTOS = 'productos'
+# Sesiones activas (total, autenticadas y usuario:<id>), ver main_usuarios/sesiones.py.
+GRUPO_SESIONES = 'sesiones'
+
+# Días de altas que se muestran en el panel.
+DIAS_ALTAS = 30
+
+
+def tramo_edad(edad):
+    """Devuelve la clave del tramo de edad (décadas) para el histograma."""
+    inicio = (edad // 10) * 10
+    return f"{inicio:03d}-{inicio + 9:03d}"
+
+
+def fecha_alta(created_at):
+    """Devuelve la clave del día de alta en la zona horaria local."""
+    return timezone.localdate(created_at).isoformat()
+
+
+def incrementar(grupo, clave, delta):
+    """
+    Suma un delta a un agregado con un único UPDATE atómico.
+    Si la fila aún no existe se crea antes de aplicar el incremento.
+    """
+    if not delta:
+        return
+    actualizados = Agregado.objects.filter(grupo=grupo, clave=clave).update(valor=F('valor') + delta)
+    if not actualizados:
+        Agregado.objects.get_or_create(grupo=grupo, clave=clave)
+        Agregado.objects.filter(grupo=grupo, clave=clave).update(valor=F('valor') + delta)
+
+
+def deltas_cliente(cliente, signo):
+    """Contribución de un cliente a los agregados (signo +1 alta, -1 baja)."""
+    deltas = {
+        (GRUPO_CLIENTES, 'total'): signo,
+        (GRUPO_EDADES, tramo_edad(cliente.age)): signo,
+        (GRUPO_ALTAS, fecha_alta(cliente.created_at)): signo,
+    }
+    if cliente.es_vip:
+        deltas[(GRUPO_CLIENTES, 'vip')] = signo
+    return deltas
+
+
+def deltas_producto(activo, precio, stock, signo):
+    """Contribución de un producto a los agregados (signo +1 alta, -1 baja)."""
+    estado = 'activos' if activo else 'inactivos'
+    return {
+        (GRUPO_PRODUCTOS, estado): signo,
+        (GRUPO_PRODUCTOS, 'valor_stock'): signo * Decimal(precio) * stock,
+    }
+
+
+def aplicar(*grupos_deltas):
+    """
+    Combina varios diccionarios de deltas y los aplica en una transacción.
+    Las contribuciones que se anulan (por ejemplo, una edición sin cambios
+    relevantes) no generan ninguna escritura.
+    """
+    total = {}
+    for deltas in grupos_deltas:
+        for clave, delta in deltas.items():
+            total[clave] = total.get(clave, 0) + delta
+    with transaction.atomic():
+        for (grupo, clave), delta in total.items():
+            incrementar(grupo, clave, delta)
+
+
+def recalcular_clientes():
+    """Reconstruye desde cero los agregados de clientes, edades y altas."""
+    filas = []
+    resumen = Cliente.objects.aggregate(
+        total=Count('id'),
+        vip=Count('id', filter=filtro_vip()),
+    )
+    filas.append(Agregado(grupo=GRUPO_CLIENTES, clave='total', valor=resumen['total']))
+    filas.append(Agregado(grupo=GRUPO_CLIENTES, clave='vip', valor=resumen['vip']))
+
+    edades = {}
+    for edad, cantidad in Cliente.objects.values_list('age').annotate(n=Count('id')).order_by():
+        clave = tramo_edad(edad)
+        edades[clave] = edades.get(clave, 0) + cantidad
+    filas.extend(Agregado(grupo=GRUPO_EDADES, clave=clave, valor=n) for clave, n in edades.items())
+
+    altas = (
+        Cliente.objects
+        .annotate(dia=TruncDate('created_at', tzinfo=timezone.get_current_timezone()))
+        .values_list('dia')
+        .annotate(n=Count('id'))
+        .order_by()
+    )
+    filas.extend(Agregado(grupo=GRUPO_ALTAS, clave=dia.isoformat(), valor=n) for dia, n in altas)
+
+    with transaction.atomic():
+        Agregado.objects.filter(grupo__in=[GRUPO_CLIENTES, GRUPO_EDADES, GRUPO_ALTAS]).delete()
+        Agregado.objects.bulk_create(filas)
+    return len(filas)
+
+
+def recalcular_productos():
+    """Reconstruye desde cero los agregados de productos."""
+    resumen = Producto.objects.aggregate(
+        activos=Count('id', filter=Q(activo=True)),
+        inactivos=Count('id', filter=Q(activo=False)),
+        valor_stock=Sum(F('precio') * F('stock')),
+    )
+    filas = [
+        Agregado(grupo=GRUPO_PRODUCTOS, clave=clave, valor=resumen[clave] or 0)
+        for clave in ('activos', 'inactivos', 'valor_stock')
+    ]
+    with transaction.atomic():
+        Agregado.objects.filter(grupo=GRUPO_PRODUCTOS).delete()
+        Agregado.objects.bulk_create(filas)
+    return len(filas)
+
+
+def recalcular():
+    """Reconstrucción completa de todos los agregados."""
+    return recalcular_clientes() + recalcular_productos()
+
+
+def obtener_resumen():
+    """
+    Lee todos los agregados del panel con una sola consulta.
+    Features:
+        - Totales de clientes y clientes VIP.
+        - Histograma de edades por décadas.
+        - Altas por día de los últimos DIAS_ALTAS días.
+        - Productos activos/inactivos y valor total del stock.
+    """
+    desde = (timezone.localdate() - timedelta(days=DIAS_ALTAS - 1)).isoformat()
+    filas = Agregado.objects.filter(
+        Q(grupo__in=[GRUPO_CLIENTES, GRUPO_EDADES, GRUPO_PRODUCTOS]) |
+        Q(grupo=GRUPO_ALTAS, clave__gte=desde)
+    )
+
+    valores = {GRUPO_CLIENTES: {}, GRUPO_EDADES: {}, GRUPO_ALTAS: {}, GRUPO_PRODUCTOS: {}}
+    for fila in filas:
+        valores[fila.grupo][fila.clave] = fila.valor
+
+    clientes = valores[GRUPO_CLIENTES]
+    productos = valores[GRUPO_PRODUCTOS]
+    edades = []
+    for clave, n in sorted(valores[GRUPO_EDADES].items()):
+        if n:
+            inicio, fin = clave.split('-')
+            edades.append({'tramo': f"{int(inicio)} - {int(fin)}", 'total': int(n)})
+    altas = [
+        {'dia': clave, 'total': int(n)}
+        for clave, n in sorted(valores[GRUPO_ALTAS].items()) if n
+    ]
+    maximo_edades = max((e['total'] for e in edades), default=0)
+    for edad in edades:
+        edad['porcentaje'] = round(edad['total'] * 100 / maximo_edades) if maximo_edades else 0
+
+    return {
+        'total_clientes': int(clientes.get('total', 0)),
+        'clientes_vip': int(clientes.get('vip', 0)),
+        'edades': edades,
+        'altas': altas,
+        'productos_activos': int(productos.get('activos', 0)),
+        'productos_inactivos': int(productos.get('inactivos', 0)),
+        'valor_stock': productos.get('valor_stock', Decimal('0')),
+    }
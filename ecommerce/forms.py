@@ -1,4 +1,9 @@
+import json
+
 from django import forms
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Cliente, ClienteArchivado
 
 class formularioCliente(forms.Form):
     """
@@ -34,6 +39,49 @@ class formularioCliente(forms.Form):
     )
 
 
+class formularioEdicionCliente(forms.ModelForm):
+    """
+    Formulario de edición de clientes con control de concurrencia optimista.
+    Features:
+        - Versión del cliente en un campo oculto: si otro usuario guardó
+          mientras tanto, el guardado se rechaza (ConflictoVersion).
+        - Valores con los que se abrió el formulario en un campo oculto,
+          para mostrar qué cambió el otro usuario.
+    """
+    CAMPOS = ['name', 'age', 'email']
+
+    base = forms.CharField(widget=forms.HiddenInput, required=False)
+
+    class Meta:
+        model = Cliente
+        fields = ['name', 'age', 'email', 'version']
+        widgets = {'version': forms.HiddenInput}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if not self.is_bound and self.instance.pk:
+            self.initial['base'] = self.serializar_base(self.instance)
+
+    @classmethod
+    def serializar_base(cls, cliente):
+        return json.dumps({campo: getattr(cliente, campo) for campo in cls.CAMPOS}, cls=DjangoJSONEncoder)
+
+    def clean_email(self):
+        # La unicidad entre clientes la valida el modelo; el archivo, aquí.
+        email = self.cleaned_data['email']
+        if 'email' in self.changed_data and ClienteArchivado.objects.por_email(email).exists():
+            raise forms.ValidationError('Ya existe un cliente archivado con este email.')
+        return email
+
+    def valores_base(self):
+        """Valores con los que se abrió el formulario ({} si no llegaron)."""
+        try:
+            valores = json.loads(self.data.get('base') or '{}')
+        except ValueError:
+            return {}
+        return valores if isinstance(valores, dict) else {}
+
+
 class formularioProductos(forms.Form):
     """
     Formulario para la creación y edición de productos en el catálogo.
@@ -91,6 +139,43 @@ class formularioProductos(forms.Form):
     )
 
 
+class formularioAjusteMasivo(forms.Form):
+    """
+    Formulario para ajustes masivos de productos desde el admin.
+    Define el tipo de ajuste y el valor a aplicar sobre la selección.
+    Features:
+        - Ajuste de precio por porcentaje o por monto fijo.
+        - Ajuste de stock en unidades (positivo o negativo).
+        - Valores negativos para bajar precios o descontar stock.
+    """
+    TIPOS = (
+        ('precio_porcentaje', 'Precio: variación porcentual (%)'),
+        ('precio_monto', 'Precio: sumar/restar monto fijo'),
+        ('stock', 'Stock: sumar/restar unidades'),
+    )
+
+    tipo = forms.ChoiceField(
+        choices=TIPOS,
+        label='Tipo de ajuste'
+    )
 
+    valor = forms.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        label='Valor',
+        widget=forms.NumberInput(attrs={
+            'placeholder': 'Ej: 10 para subir, -10 para bajar',
+            'step': '0.01'
+        })
+    )
 
+    def clean(self):
+        cleaned_data = super().clean()
+        tipo = cleaned_data.get('tipo')
+        valor = cleaned_data.get('valor')
+        if tipo == 'stock' and valor is not None and valor != int(valor):
+            raise forms.ValidationError('El ajuste de stock debe ser un número entero de unidades.')
+        if tipo == 'precio_porcentaje' and valor is not None and valor <= -100:
+            raise forms.ValidationError('La variación porcentual debe ser mayor a -100%.')
+        return cleaned_data
 
@@ -0,0 +1,56 @@
+from django.shortcuts import render
+from django.utils.cache import patch_vary_headers
+
+
+# Header con el id del bloque que pide static/js/fragmentos.js; la respuesta
+# lo repite para que el script sepa que recibió el fragmento y no una
+# página completa (ej: la redirección al login).
+CABECERA = 'X-Fragmento'
+
+
+def pide_fragmento(request, fragmento):
+    return request.headers.get(CABECERA) == fragmento
+
+
+def marcar(respuesta, fragmento=None):
+    """
+    Agrega Vary: X-Fragmento (la misma URL responde la página o el bloque)
+    y, si se respondió el bloque, el header con su id.
+    """
+    patch_vary_headers(respuesta, [CABECERA])
+    if fragmento:
+        respuesta[CABECERA] = fragmento
+    return respuesta
+
+
+def render_fragmento(request, plantilla, parcial, fragmento, context):
+    """
+    Como render(), pero si la petición pide el bloque `fragmento` renderiza
+    solo la plantilla `parcial` (sin base.html).
+    """
+    if pide_fragmento(request, fragmento):
+        return marcar(render(request, parcial, {**context, 'fragmento': True}), fragmento)
+    return marcar(render(request, plantilla, context))
+
+
+class FragmentoMixin:
+    """
+    Mixin para vistas basadas en clases con plantilla: si la petición pide el
+    bloque `fragmento` (header X-Fragmento) se responde solo `plantilla_fragmento`.
+    """
+    fragmento = None
+    plantilla_fragmento = None
+
+    def get_template_names(self):
+        if pide_fragmento(self.request, self.fragmento):
+            return [self.plantilla_fragmento]
+        return super().get_template_names()
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['fragmento'] = pide_fragmento(self.request, self.fragmento)
+        return context
+
+    def render_to_response(self, context, **response_kwargs):
+        respuesta = super().render_to_response(context, **response_kwargs)
+        return marcar(respuesta, self.fragmento if context['fragmento'] else None)
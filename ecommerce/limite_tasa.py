@@ -0,0 +1,245 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.http import HttpResponse
+
+
+# Máximo de claves en memoria por proceso; al llegar se desaloja la menos usada.
+MAX_CLAVES_LOCALES = 10000
+
+
+class AlmacenLocal:
+    """
+    Token buckets en memoria del proceso, protegidos por un lock.
+    Cada clave guarda [tokens disponibles, instante de la última recarga,
+    instante en que el bucket vuelve a estar lleno]; los tokens se recargan
+    en forma perezosa al consultar la clave.
+    Features:
+        - Orden LRU (OrderedDict): cada consulta mueve la clave al final.
+        - Los buckets ya recargados por completo vencen (equivalen a no
+          tenerlos) y se descartan desde el frente sin recorrer el resto.
+        - Tope estricto de `max_claves`: al insertar una clave nueva con el
+          almacén lleno se desaloja la menos usada, en O(1).
+    """
+
+    def __init__(self, max_claves=None):
+        self.max_claves = max_claves or MAX_CLAVES_LOCALES
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consumir(self, clave, capacidad, por_segundo):
+        """Consume un token. Retorna (permitido, segundos hasta el próximo token)."""
+        ahora = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(clave)
+            if bucket is None:
+                self._purgar(ahora)
+                bucket = self._buckets[clave] = [capacidad, ahora, ahora]
+            else:
+                self._buckets.move_to_end(clave)
+                bucket[0] = min(capacidad, bucket[0] + (ahora - bucket[1]) * por_segundo)
+                bucket[1] = ahora
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                bucket[2] = ahora + (capacidad - bucket[0]) / por_segundo
+                return True, 0
+            return False, (1 - bucket[0]) / por_segundo
+
+    def _purgar(self, ahora):
+        # Descarta los buckets vencidos del frente (los menos usados); cada
+        # uno se descarta una sola vez, así el costo amortizado es O(1).
+        buckets = self._buckets
+        while buckets:
+            clave, bucket = next(iter(buckets.items()))
+            if bucket[2] > ahora:
+                break
+            del buckets[clave]
+        # Si sigue lleno se desaloja el menos usado aunque no haya vencido:
+        # ese cliente recupera su ráfaga, a cambio de acotar la memoria.
+        if len(buckets) >= self.max_claves:
+            buckets.popitem(last=False)
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def limpiar(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class AlmacenCache:
+    """
+    Límite compartido entre procesos sobre el cache de Django.
+    El cache no permite leer y escribir un bucket de forma atómica, así que
+    se usa el equivalente con contadores: una ventana deslizante de
+    capacidad/por_segundo segundos (add + incr por ventana).
+    Admite la misma ráfaga (capacidad) y la misma tasa sostenida que el bucket.
+
+    El incremento es atómico entre procesos solo si el incr del backend lo es
+    (Memcached, Redis). Con el cache en archivos, en memoria o en base de
+    datos (incluido CacheEscalonado, que delega en su nivel compartido) incr
+    es un get + set: dentro del proceso se serializa con un lock, pero entre
+    procesos dos solicitudes simultáneas pueden contar como una, y el límite
+    pasa a ser aproximado (puede admitir algunas solicitudes de más).
+    """
+
+    def __init__(self, alias='default'):
+        self.alias = alias
+        self._lock = threading.Lock()
+
+    def consumir(self, clave, capacidad, por_segundo):
+        cache = caches[self.alias]
+        periodo = capacidad / por_segundo
+        ahora = time.time()
+        ventana = int(ahora // periodo)
+        actual = f'limite:{clave}:{ventana}'
+        anterior = f'limite:{clave}:{ventana - 1}'
+
+        with self._lock:
+            cache.add(actual, 0, timeout=math.ceil(periodo * 2))
+            try:
+                usados = cache.incr(actual)
+            except ValueError:
+                # La clave expiró entre add e incr.
+                cache.add(actual, 1, timeout=math.ceil(periodo * 2))
+                usados = 1
+        transcurrido = (ahora % periodo) / periodo
+        estimado = usados + (cache.get(anterior) or 0) * (1 - transcurrido)
+        if estimado <= capacidad:
+            return True, 0
+        return False, max(1 / por_segundo, periodo * (1 - transcurrido))
+
+
+_almacen = None
+_almacen_lock = threading.Lock()
+
+
+def obtener_almacen():
+    """Almacén configurado en LIMITE_TASA_ALMACEN ('local' o alias de cache)."""
+    global _almacen
+    if _almacen is None:
+        with _almacen_lock:
+            if _almacen is None:
+                destino = getattr(settings, 'LIMITE_TASA_ALMACEN', 'local')
+                _almacen = AlmacenLocal() if destino == 'local' else AlmacenCache(destino)
+    return _almacen
+
+
+def clave_ip(request):
+    return request.META.get('REMOTE_ADDR', 'desconocida')
+
+
+def clave_usuario(request):
+    """Identifica al usuario autenticado o, si no hay sesión, a su IP."""
+    usuario = getattr(request, 'user', None)
+    if usuario is not None and usuario.is_authenticated:
+        return f'u{usuario.pk}'
+    return f'ip{clave_ip(request)}'
+
+
+CLAVES = {
+    'ip': clave_ip,
+    'usuario': clave_usuario,
+}
+
+
+def respuesta_limite(espera):
+    respuesta = HttpResponse(
+        'Demasiadas solicitudes. Espera unos segundos antes de volver a intentarlo.',
+        status=429,
+        content_type='text/plain; charset=utf-8',
+    )
+    respuesta['Retry-After'] = str(max(1, math.ceil(espera)))
+    return respuesta
+
+
+# Reglas ya resueltas contra settings: nombre -> (habilitado, capacidad, por_segundo, función de clave).
+_reglas = {}
+
+
+@receiver(setting_changed)
+def reiniciar_configuracion(setting, **kwargs):
+    global _almacen
+    if setting.startswith('LIMITE_TASA'):
+        _reglas.clear()
+        _almacen = None
+
+
+def resolver_regla(nombre, capacidad, por_segundo, clave):
+    """Combina los valores del decorador con settings.LIMITE_TASA[nombre]."""
+    regla = _reglas.get(nombre)
+    if regla is None:
+        config = getattr(settings, 'LIMITE_TASA', {}).get(nombre, {})
+        regla = _reglas[nombre] = (
+            getattr(settings, 'LIMITE_TASA_HABILITADO', True),
+            config.get('capacidad', capacidad),
+            config.get('por_segundo', por_segundo),
+            CLAVES[config.get('clave', clave)],
+        )
+    return regla
+
+
+def verificar(request, nombre, capacidad, por_segundo, clave='usuario', metodos=None):
+    """
+    Consume un token para el request. Retorna None si está permitido o
+    la respuesta 429 con Retry-After si se superó el límite.
+    Los valores pueden sobrescribirse en settings.LIMITE_TASA[nombre].
+    """
+    if metodos and request.method not in metodos:
+        return None
+    habilitado, capacidad, por_segundo, obtener_clave = resolver_regla(nombre, capacidad, por_segundo, clave)
+    if not habilitado:
+        return None
+
+    permitido, espera = obtener_almacen().consumir(f'{nombre}:{obtener_clave(request)}', capacidad, por_segundo)
+    return None if permitido else respuesta_limite(espera)
+
+
+def limitar_tasa(nombre, capacidad, por_segundo, clave='usuario', metodos=None):
+    """
+    Decorador de vistas con límite de tasa por token bucket.
+    Features:
+        - Ráfaga máxima de `capacidad` solicitudes.
+        - Recarga sostenida de `por_segundo` solicitudes por segundo.
+        - Clave por usuario autenticado ('usuario') o por IP ('ip').
+        - Limitar solo algunos métodos HTTP (ej: metodos=('POST',)).
+        - Respuesta 429 con cabecera Retry-After.
+    """
+    def decorador(vista):
+        @wraps(vista)
+        def wrapper(request, *args, **kwargs):
+            rechazo = verificar(request, nombre, capacidad, por_segundo, clave, metodos)
+            if rechazo is not None:
+                return rechazo
+            return vista(request, *args, **kwargs)
+        return wrapper
+    return decorador
+
+
+class LimiteTasaMixin:
+    """Versión para vistas basadas en clases de limitar_tasa."""
+    limite_nombre = None
+    limite_capacidad = 30
+    limite_por_segundo = 0.5
+    limite_clave = 'usuario'
+    limite_metodos = None
+
+    def dispatch(self, request, *args, **kwargs):
+        rechazo = verificar(
+            request,
+            self.limite_nombre or type(self).__name__,
+            self.limite_capacidad,
+            self.limite_por_segundo,
+            self.limite_clave,
+            self.limite_metodos,
+        )
+        if rechazo is not None:
+            return rechazo
+        return super().dispatch(request, *args, **kwargs)
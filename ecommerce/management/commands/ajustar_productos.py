@@ -0,0 +1,111 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ecommerce import operaciones
+from ecommerce.models import Producto
+
+
+class Command(BaseCommand):
+    help = 'Aplica ajustes masivos de precio, stock o estado a productos con UPDATE por lotes'
+
+    def add_arguments(self, parser):
+        ajuste = parser.add_mutually_exclusive_group(required=True)
+        ajuste.add_argument(
+            '--precio-porcentaje',
+            type=Decimal,
+            help='Variación porcentual del precio (ej: 10 o -5.5)',
+        )
+        ajuste.add_argument(
+            '--precio-monto',
+            type=Decimal,
+            help='Monto fijo a sumar o restar al precio',
+        )
+        ajuste.add_argument(
+            '--stock',
+            type=int,
+            help='Unidades a sumar o restar al stock',
+        )
+        ajuste.add_argument(
+            '--activar',
+            action='store_true',
+            help='Activar los productos filtrados',
+        )
+        ajuste.add_argument(
+            '--desactivar',
+            action='store_true',
+            help='Desactivar los productos filtrados',
+        )
+
+        parser.add_argument(
+            '--nombre',
+            help='Filtrar productos cuyo nombre contenga este texto',
+        )
+        estado = parser.add_mutually_exclusive_group()
+        estado.add_argument(
+            '--solo-activos',
+            action='store_true',
+            help='Filtrar solo productos activos',
+        )
+        estado.add_argument(
+            '--solo-inactivos',
+            action='store_true',
+            help='Filtrar solo productos inactivos',
+        )
+        parser.add_argument(
+            '--stock-menor',
+            type=int,
+            help='Filtrar productos con stock menor a este valor',
+        )
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=operaciones.TAMANO_LOTE,
+            help=f'Productos por transacción (por defecto {operaciones.TAMANO_LOTE})',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Solo mostrar cuántos productos serían afectados',
+        )
+
+    def handle(self, *args, **options):
+        if options['lote'] < 1:
+            raise CommandError('El tamaño de lote debe ser mayor a cero.')
+        if options['precio_porcentaje'] is not None and options['precio_porcentaje'] <= -100:
+            raise CommandError('La variación porcentual debe ser mayor a -100%.')
+
+        queryset = Producto.objects.all()
+        if options['nombre']:
+            queryset = queryset.filter(nombre__icontains=options['nombre'])
+        if options['solo_activos']:
+            queryset = queryset.filter(activo=True)
+        if options['solo_inactivos']:
+            queryset = queryset.filter(activo=False)
+        if options['stock_menor'] is not None:
+            queryset = queryset.filter(stock__lt=options['stock_menor'])
+        if options['activar'] or options['desactivar']:
+            # Solo cuentan los productos que realmente cambian de estado.
+            queryset = queryset.exclude(activo=options['activar'])
+
+        # Vista previa de la cantidad de productos afectados.
+        cantidad = queryset.count()
+        self.stdout.write(f'Productos afectados: {cantidad}')
+        if options['dry_run'] or not cantidad:
+            return
+
+        lote = options['lote']
+        if options['precio_porcentaje'] is not None:
+            total = operaciones.ajustar_precio_porcentaje(queryset, options['precio_porcentaje'], lote)
+        elif options['precio_monto'] is not None:
+            total = operaciones.ajustar_precio_monto(queryset, options['precio_monto'], lote)
+        elif options['stock'] is not None:
+            total = operaciones.ajustar_stock(queryset, options['stock'], lote)
+        else:
+            total = operaciones.cambiar_estado(queryset, options['activar'], lote)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Se actualizaron {total} productos'
+            )
+        )
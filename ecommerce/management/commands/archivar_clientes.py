@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from ecommerce import archivo
+
+
+class Command(BaseCommand):
+    help = 'Mueve a la tabla de archivo los clientes sin actualizaciones en los últimos N meses'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--meses',
+            type=int,
+            default=24,
+            help='Meses sin actualizaciones para archivar un cliente (por defecto 24)',
+        )
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=archivo.TAMANO_LOTE,
+            help=f'Clientes por transacción (por defecto {archivo.TAMANO_LOTE})',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Solo mostrar cuántos clientes serían archivados',
+        )
+
+    def handle(self, *args, **options):
+        if options['meses'] < 1:
+            raise CommandError('La cantidad de meses debe ser mayor a cero.')
+        if options['lote'] < 1:
+            raise CommandError('El tamaño de lote debe ser mayor a cero.')
+
+        cantidad = archivo.inactivos(options['meses']).count()
+        self.stdout.write(f'Clientes inactivos hace más de {options["meses"]} meses: {cantidad}')
+        if options['dry_run'] or not cantidad:
+            return
+
+        total = archivo.archivar(options['meses'], options['lote'])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Se archivaron {total} clientes'
+            )
+        )
@@ -0,0 +1,136 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+
+from ecommerce import trigramas
+from ecommerce.models import Cliente, Trigrama
+
+
+NOMBRES = [
+    'Ana', 'Bruno', 'Carla', 'Daniel', 'Elena', 'Facundo', 'Gabriela', 'Hernán', 'Inés', 'Julián',
+    'Karina', 'Lucas', 'María', 'Nicolás', 'Olga', 'Pablo', 'Quimey', 'Romina', 'Sergio', 'Tomás',
+    'Valeria', 'Walter', 'Ximena', 'Yanina', 'Zoe',
+]
+APELLIDOS = [
+    'Agresta', 'Benítez', 'Castro', 'Domínguez', 'Escobar', 'Fernández', 'Giménez', 'Herrera',
+    'Ibáñez', 'Juárez', 'Kowalski', 'López', 'Martínez', 'Núñez', 'Ortiz', 'Pereyra', 'Quiroga',
+    'Romero', 'Sosa', 'Torres', 'Urquiza', 'Vázquez', 'Williams', 'Yáñez', 'Zárate',
+]
+DOMINIOS = ['mail.com', 'correo.com.ar', 'empresa.net', 'gmail.com']
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Compara la búsqueda icontains con la búsqueda por trigramas sobre clientes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--generar',
+            type=int,
+            default=0,
+            help='Clientes sintéticos a generar antes de medir (se descartan al final)',
+        )
+        parser.add_argument(
+            '--conservar',
+            action='store_true',
+            help='Conservar los clientes sintéticos generados',
+        )
+        parser.add_argument(
+            '--consultas',
+            type=int,
+            default=50,
+            help='Consultas con errores de tipeo a medir (por defecto 50)',
+        )
+        parser.add_argument(
+            '--semilla',
+            type=int,
+            default=42,
+            help='Semilla aleatoria para resultados reproducibles',
+        )
+
+    def handle(self, *args, **options):
+        random.seed(options['semilla'])
+        try:
+            with transaction.atomic():
+                if options['generar']:
+                    self.generar(options['generar'])
+                self.medir(options['consultas'])
+                if not options['conservar']:
+                    raise Rollback
+        except Rollback:
+            self.stdout.write('Datos sintéticos descartados.')
+        else:
+            if options['generar']:
+                self.stdout.write(self.style.WARNING(
+                    'Datos sintéticos conservados: ejecuta recalcular_estadisticas para actualizar el panel.'
+                ))
+
+    def generar(self, cantidad, lote=5000):
+        inicio = time.perf_counter()
+        base = (Cliente.objects.order_by('-pk').values_list('pk', flat=True).first() or 0) + 1
+        for desde in range(0, cantidad, lote):
+            clientes = []
+            for i in range(desde, min(cantidad, desde + lote)):
+                nombre = random.choice(NOMBRES)
+                apellido = random.choice(APELLIDOS)
+                clientes.append(Cliente(
+                    name=f'{nombre} {apellido}',
+                    age=random.randint(18, 90),
+                    email=f'{nombre.lower()}.{apellido.lower()}{base + i}@{random.choice(DOMINIOS)}',
+                ))
+            creados = Cliente.objects.bulk_create(clientes)
+            trigramas.indexar_lote(Trigrama.CLIENTE, creados)
+        self.stdout.write(f'Generados {cantidad} clientes en {time.perf_counter() - inicio:.1f} s')
+
+    def con_error(self, texto):
+        """Introduce un error de tipeo: letra cambiada, faltante o intercambiada."""
+        posicion = random.randrange(1, len(texto) - 1)
+        error = random.choice(['cambio', 'falta', 'intercambio'])
+        if error == 'cambio':
+            return texto[:posicion] + random.choice('aeiourstln') + texto[posicion + 1:]
+        if error == 'falta':
+            return texto[:posicion] + texto[posicion + 1:]
+        return texto[:posicion - 1] + texto[posicion] + texto[posicion - 1] + texto[posicion + 1:]
+
+    def medir(self, consultas):
+        total = Cliente.objects.count()
+        if not total:
+            raise CommandError('No hay clientes: usa --generar para crear datos sintéticos.')
+
+        muestra = list(Cliente.objects.order_by('?').values_list('pk', 'name')[:consultas])
+        tiempos = {'icontains': [], 'trigramas': []}
+        aciertos = {'icontains': 0, 'trigramas': 0}
+
+        for pk, nombre in muestra:
+            consulta = self.con_error(nombre)
+
+            inicio = time.perf_counter()
+            ids = list(
+                Cliente.objects.filter(Q(name__icontains=consulta) | Q(email__icontains=consulta))
+                .order_by('name').values_list('pk', flat=True)[:50]
+            )
+            tiempos['icontains'].append((time.perf_counter() - inicio) * 1000)
+            aciertos['icontains'] += pk in ids
+
+            inicio = time.perf_counter()
+            ids = [objeto_id for objeto_id, _ in trigramas.buscar(Trigrama.CLIENTE, consulta, limite=50)]
+            tiempos['trigramas'].append((time.perf_counter() - inicio) * 1000)
+            # Con muchos homónimos basta con encontrar alguno con el mismo nombre.
+            aciertos['trigramas'] += pk in ids or Cliente.objects.filter(pk__in=ids, name=nombre).exists()
+
+        self.stdout.write(f'Clientes en la tabla: {total}, consultas con error de tipeo: {len(muestra)}')
+        for metodo, valores in tiempos.items():
+            valores.sort()
+            p95 = valores[min(len(valores) - 1, int(len(valores) * 0.95))]
+            self.stdout.write(
+                f'{metodo:10s} media {statistics.mean(valores):8.2f} ms | '
+                f'p50 {statistics.median(valores):8.2f} ms | p95 {p95:8.2f} ms | '
+                f'encontrados {aciertos[metodo]}/{len(muestra)}'
+            )
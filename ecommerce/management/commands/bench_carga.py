@@ -0,0 +1,224 @@
+import json
+import multiprocessing
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from ecommerce import carga
+from ecommerce.models import Cliente
+from main_usuarios.models import UsuarioSistema
+
+
+ESCENARIO_BASICO = Path(__file__).resolve().parents[2] / 'escenarios' / 'basico.json'
+
+
+def commit_actual():
+    """Commit de git del árbol medido, para comparar corridas entre versiones."""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Reproduce un escenario de carga contra la aplicación WSGI en el mismo proceso '
+        'y reporta throughput y latencias p50/p95/p99 por ruta'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--escenario',
+            default=str(ESCENARIO_BASICO),
+            help='Archivo JSON con los pasos ponderados (por defecto ecommerce/escenarios/basico.json)',
+        )
+        parser.add_argument(
+            '--hilos',
+            type=int,
+            default=8,
+            help='Usuarios virtuales concurrentes por proceso (por defecto 8)',
+        )
+        parser.add_argument(
+            '--procesos',
+            type=int,
+            default=1,
+            help='Procesos, cada uno con sus propios hilos (por defecto 1)',
+        )
+        parser.add_argument(
+            '--duracion',
+            type=float,
+            default=10,
+            help='Segundos de carga (por defecto 10)',
+        )
+        parser.add_argument(
+            '--peticiones',
+            type=int,
+            default=None,
+            help='Máximo de peticiones por usuario virtual (termina antes si se alcanza)',
+        )
+        parser.add_argument(
+            '--semilla',
+            type=int,
+            default=42,
+            help='Semilla aleatoria para elegir los mismos pasos en cada corrida',
+        )
+        parser.add_argument(
+            '--host',
+            default='localhost',
+            help='Header Host de las peticiones (debe estar en ALLOWED_HOSTS)',
+        )
+        parser.add_argument(
+            '--sembrar',
+            action='store_true',
+            help='Crear los usuarios del escenario si no existen',
+        )
+        parser.add_argument(
+            '--limpiar',
+            action='store_true',
+            help=f'Borrar al terminar los clientes creados con emails de @{carga.DOMINIO_CARGA}',
+        )
+        parser.add_argument(
+            '--con-limite-tasa',
+            action='store_true',
+            help='Mantener los límites de tasa (por defecto se desactivan durante la carga)',
+        )
+        parser.add_argument(
+            '--json',
+            help='Guardar el resultado en este archivo JSON ("-" para la salida estándar)',
+        )
+        parser.add_argument(
+            '--comparar',
+            help='Resultado JSON de una corrida anterior para mostrar las diferencias',
+        )
+
+    def handle(self, *args, **options):
+        if options['hilos'] < 1 or options['procesos'] < 1:
+            raise CommandError('Hilos y procesos deben ser mayores a cero.')
+        try:
+            escenario = carga.Escenario.desde_archivo(options['escenario'])
+        except (OSError, ValueError, KeyError) as error:
+            raise CommandError(f'No se pudo leer el escenario: {error}')
+        anterior = None
+        if options['comparar']:
+            try:
+                with open(options['comparar'], encoding='utf-8') as archivo:
+                    anterior = json.load(archivo)
+            except (OSError, ValueError) as error:
+                raise CommandError(f'No se pudo leer la corrida a comparar: {error}')
+
+        # Con --json - la salida estándar queda reservada para el JSON.
+        self.avisos = self.stderr if options['json'] == '-' else self.stdout
+
+        if options['sembrar']:
+            self.sembrar(escenario)
+
+        ajustes = {} if options['con_limite_tasa'] else {'LIMITE_TASA_HABILITADO': False}
+        with override_settings(**ajustes):
+            muestras, segundos = self.correr(escenario, options)
+        resultado = {
+            'fecha': timezone.now().isoformat(),
+            'commit': commit_actual(),
+            'configuracion': {
+                'escenario': options['escenario'],
+                'hilos': options['hilos'],
+                'procesos': options['procesos'],
+                'duracion': options['duracion'],
+                'peticiones': options['peticiones'],
+                'semilla': options['semilla'],
+                'limite_tasa': options['con_limite_tasa'],
+                'base_de_datos': settings.DATABASES['default']['ENGINE'].rsplit('.', 1)[-1],
+            },
+            **carga.resumir(muestras, segundos),
+        }
+
+        if options['limpiar']:
+            borrados, _ = Cliente.objects.filter(email__iendswith=f'@{carga.DOMINIO_CARGA}').delete()
+            self.avisos.write(f'Clientes de prueba borrados: {borrados}')
+
+        if options['json'] == '-':
+            self.stdout.write(json.dumps(resultado, indent=2, ensure_ascii=False))
+        else:
+            self.mostrar(resultado, anterior)
+            if options['json']:
+                with open(options['json'], 'w', encoding='utf-8') as archivo:
+                    json.dump(resultado, archivo, indent=2, ensure_ascii=False)
+                self.stdout.write(self.style.SUCCESS(f'Resultado guardado en {options["json"]}'))
+
+    def sembrar(self, escenario):
+        cantidad = escenario.usuarios.get('cantidad', 1)
+        creados = 0
+        for indice in range(cantidad):
+            email, password = escenario.credenciales(indice)
+            if not email or UsuarioSistema.objects.por_email(email).exists():
+                continue
+            UsuarioSistema.objects.create_user(
+                email=email, username=email.split('@')[0], password=password,
+            )
+            creados += 1
+        self.avisos.write(f'Usuarios de carga creados: {creados} (de {cantidad})')
+
+    def correr(self, escenario, options):
+        from entrega_final.wsgi import application
+
+        argumentos = (options['duracion'], options['peticiones'], options['semilla'], options['host'])
+        if options['procesos'] == 1:
+            return carga.correr_proceso(application, escenario, options['hilos'], *argumentos)
+
+        # Los hijos heredan la aplicación ya cargada; las conexiones abiertas no se comparten.
+        connections.close_all()
+        contexto = multiprocessing.get_context('fork')
+        with ProcessPoolExecutor(max_workers=options['procesos'], mp_context=contexto) as pool:
+            futuros = [
+                pool.submit(
+                    carga.correr_en_hijo, escenario.datos, options['hilos'], *argumentos,
+                    indice * options['hilos'],
+                )
+                for indice in range(options['procesos'])
+            ]
+            partes = [futuro.result() for futuro in futuros]
+        muestras = [muestra for parte, _ in partes for muestra in parte]
+        return muestras, max(segundos for _, segundos in partes)
+
+    def mostrar(self, resultado, anterior=None):
+        configuracion = resultado['configuracion']
+        self.stdout.write(
+            f'{configuracion["procesos"]} proceso(s) x {configuracion["hilos"]} hilo(s), '
+            f'{resultado["segundos"]} s, commit {resultado["commit"] or "desconocido"}'
+        )
+        previas = (anterior or {}).get('rutas', {})
+        self.stdout.write(
+            f'{"Ruta":20s} {"pet.":>7s} {"err.":>5s} {"pet/s":>8s} '
+            f'{"p50 ms":>9s} {"p95 ms":>9s} {"p99 ms":>9s} {"máx ms":>9s}'
+        )
+        filas = list(resultado['rutas'].items()) + [('TOTAL', resultado['total'])]
+        for nombre, datos in filas:
+            self.stdout.write(
+                f'{nombre:20s} {datos["peticiones"]:7d} {datos["errores"]:5d} {datos["por_segundo"]:8.1f} '
+                f'{datos["p50_ms"]:9.2f} {datos["p95_ms"]:9.2f} {datos["p99_ms"]:9.2f} {datos["max_ms"]:9.2f}'
+            )
+            previo = anterior.get('total') if anterior and nombre == 'TOTAL' else previas.get(nombre)
+            if previo:
+                self.stdout.write(
+                    f'{"  vs. anterior":20s} {"":7s} {datos["errores"] - previo["errores"]:+5d} '
+                    f'{self.variacion(datos["por_segundo"], previo["por_segundo"]):>8s} '
+                    f'{self.variacion(datos["p50_ms"], previo["p50_ms"]):>9s} '
+                    f'{self.variacion(datos["p95_ms"], previo["p95_ms"]):>9s} '
+                    f'{self.variacion(datos["p99_ms"], previo["p99_ms"]):>9s}'
+                )
+            if datos.get('status') and datos['errores']:
+                self.stdout.write(self.style.WARNING(f'{"  status":20s} {datos["status"]}'))
+        self.stdout.write(self.style.SUCCESS('Medición finalizada.'))
+
+    def variacion(self, actual, previo):
+        if not previo:
+            return '-'
+        return f'{(actual - previo) * 100 / previo:+.0f}%'
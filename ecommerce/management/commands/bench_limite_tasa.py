@@ -0,0 +1,90 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+
+from ecommerce.limite_tasa import AlmacenCache, AlmacenLocal, verificar
+import ecommerce.limite_tasa as limite_tasa
+
+
+class Command(BaseCommand):
+    help = 'Mide el costo por verificación del límite de tasa (en microsegundos)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--iteraciones',
+            type=int,
+            default=200000,
+            help='Cantidad de verificaciones por medición (por defecto 200000)',
+        )
+        parser.add_argument(
+            '--claves',
+            type=int,
+            default=1000,
+            help='Cantidad de clientes distintos simulados (por defecto 1000)',
+        )
+        parser.add_argument(
+            '--presupuesto-us',
+            type=float,
+            default=5.0,
+            help='Costo máximo aceptable por verificación local, en µs (por defecto 5)',
+        )
+        parser.add_argument(
+            '--cache',
+            default='default',
+            help='Alias de cache para medir el almacén compartido (por defecto "default")',
+        )
+
+    def medir(self, funcion, iteraciones):
+        inicio = time.perf_counter()
+        funcion(iteraciones)
+        return (time.perf_counter() - inicio) / iteraciones * 1e6
+
+    def handle(self, *args, **options):
+        iteraciones = options['iteraciones']
+        claves = [f'bench:ip{i}' for i in range(options['claves'])]
+        total_claves = len(claves)
+
+        def bucle_vacio(n):
+            for i in range(n):
+                claves[i % total_claves]
+
+        def bucle_local(n):
+            almacen = AlmacenLocal()
+            consumir = almacen.consumir
+            for i in range(n):
+                consumir(claves[i % total_claves], 1e9, 1e9)
+
+        cache_iteraciones = max(1, iteraciones // 20)
+
+        def bucle_cache(n):
+            almacen = AlmacenCache(options['cache'])
+            for i in range(n):
+                almacen.consumir(claves[i % total_claves], 1e9, 1e9)
+
+        request = RequestFactory().post('/usuarios/login/', REMOTE_ADDR='10.0.0.1')
+        almacen_anterior = limite_tasa._almacen
+
+        def bucle_vista(n):
+            limite_tasa._almacen = AlmacenLocal()
+            for _ in range(n):
+                verificar(request, 'bench', 1e9, 1e9, clave='ip')
+
+        try:
+            base = self.medir(bucle_vacio, iteraciones)
+            local = self.medir(bucle_local, iteraciones) - base
+            vista = self.medir(bucle_vista, iteraciones) - base
+            compartido = self.medir(bucle_cache, cache_iteraciones) - base
+        finally:
+            limite_tasa._almacen = almacen_anterior
+
+        self.stdout.write(f'Verificaciones: {iteraciones} ({total_claves} claves distintas)')
+        self.stdout.write(f'Almacén local (token bucket):        {local:8.3f} µs/verificación')
+        self.stdout.write(f'verificar() completo, almacén local: {vista:8.3f} µs/verificación')
+        self.stdout.write(f'Almacén cache "{options["cache"]}" (contadores): {compartido:8.3f} µs/verificación')
+
+        presupuesto = options['presupuesto_us']
+        if vista <= presupuesto:
+            self.stdout.write(self.style.SUCCESS(f'Dentro del presupuesto de {presupuesto} µs'))
+        else:
+            self.stdout.write(self.style.ERROR(f'Supera el presupuesto de {presupuesto} µs'))
@@ -0,0 +1,100 @@
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from main_usuarios.models import UsuarioSistema
+
+
+# (nombre de la URL, requiere usuario autenticado)
+PAGINAS = [
+    ('home', False),
+    ('about', False),
+    ('login', False),
+    ('home', True),
+    ('crear_cliente', True),
+    ('busqueda', True),
+    ('estadisticas', True),
+]
+
+
+class Rollback(Exception):
+    pass
+
+
+def sin_caches():
+    """Configuración sin cache de plantillas compiladas, de fragmentos ni de páginas."""
+    plantillas = [dict(motor, OPTIONS=dict(motor['OPTIONS'])) for motor in settings.TEMPLATES]
+    for motor in plantillas:
+        motor['OPTIONS']['loaders'] = [
+            'django.template.loaders.filesystem.Loader',
+            'django.template.loaders.app_directories.Loader',
+        ]
+    return override_settings(
+        TEMPLATES=plantillas,
+        CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+        CACHE_PAGINAS_SEGUNDOS=0,
+    )
+
+
+class Command(BaseCommand):
+    help = 'Mide el tiempo de respuesta de cada página con y sin los caches de plantillas'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repeticiones',
+            type=int,
+            default=200,
+            help='Requests por página y configuración (por defecto 200)',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic(), override_settings(ALLOWED_HOSTS=['testserver'], LIMITE_TASA_HABILITADO=False):
+                self.comparar(options['repeticiones'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def comparar(self, repeticiones):
+        usuario = UsuarioSistema.objects.create_user(
+            email='bench.plantillas@example.com', username='bench_plantillas', password=None,
+        )
+        anonimo = Client()
+        autenticado = Client()
+        autenticado.force_login(usuario)
+
+        with sin_caches():
+            base = {pagina: self.medir(anonimo, autenticado, pagina, repeticiones) for pagina in PAGINAS}
+        cacheado = {pagina: self.medir(anonimo, autenticado, pagina, repeticiones) for pagina in PAGINAS}
+
+        self.stdout.write(f'{"Página":32s} {"sin cache":>12s} {"con cache":>12s} {"mejora":>8s}')
+        for pagina in PAGINAS:
+            nombre, requiere_login = pagina
+            etiqueta = f'{nombre} ({"autenticado" if requiere_login else "anónimo"})'
+            antes, despues = base[pagina], cacheado[pagina]
+            self.stdout.write(
+                f'{etiqueta:32s} {antes:9.3f} ms {despues:9.3f} ms {antes / despues:7.1f}x'
+            )
+        self.stdout.write(self.style.SUCCESS('Medición finalizada (mediana por request).'))
+
+    def medir(self, anonimo, autenticado, pagina, repeticiones):
+        """Mediana en milisegundos de `repeticiones` GET a la página, tras un request de calentamiento."""
+        nombre, requiere_login = pagina
+        cliente = autenticado if requiere_login else anonimo
+        url = reverse(nombre)
+        cliente.get(url)
+        tiempos = []
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            respuesta = cliente.get(url)
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+            if respuesta.status_code != 200:
+                self.stderr.write(f'{url} respondió {respuesta.status_code}')
+                break
+        return statistics.median(tiempos)
@@ -0,0 +1,122 @@
+import csv
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from ecommerce import duplicados
+from ecommerce.models import Cliente
+
+
+class Command(BaseCommand):
+    help = (
+        'Busca clientes candidatos a duplicados (variantes de email, errores en el nombre) '
+        'y escribe un reporte CSV para revisarlos y fusionarlos desde el admin'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--salida',
+            default='duplicados_clientes.csv',
+            help='Archivo CSV del reporte (por defecto duplicados_clientes.csv)',
+        )
+        parser.add_argument(
+            '--umbral',
+            type=float,
+            default=duplicados.UMBRAL,
+            help=f'Puntaje mínimo entre 0 y 1 para reportar un par (por defecto {duplicados.UMBRAL})',
+        )
+        parser.add_argument(
+            '--ventana',
+            type=int,
+            default=duplicados.VENTANA,
+            help=f'Vecinos comparados en cada pasada ordenada (por defecto {duplicados.VENTANA})',
+        )
+        parser.add_argument(
+            '--procesos',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Procesos para calcular los puntajes (por defecto, uno por CPU)',
+        )
+        parser.add_argument(
+            '--tamano-tarea',
+            type=int,
+            default=duplicados.TAMANO_TAREA,
+            help=f'Registros por tarea de comparación (por defecto {duplicados.TAMANO_TAREA})',
+        )
+
+    def handle(self, *args, **options):
+        if not 0 < options['umbral'] <= 1:
+            raise CommandError('El umbral debe estar entre 0 y 1.')
+        if options['ventana'] < 2:
+            raise CommandError('La ventana debe ser de al menos 2 registros.')
+        if options['procesos'] < 1 or options['tamano_tarea'] < 1:
+            raise CommandError('Procesos y tamaño de tarea deben ser mayores a cero.')
+
+        inicio = time.perf_counter()
+        registros = duplicados.cargar_registros()
+        self.stdout.write(f'Clientes cargados: {len(registros)} ({time.perf_counter() - inicio:.1f} s)')
+
+        pares = duplicados.buscar_pares(
+            registros,
+            ventana=options['ventana'],
+            umbral=options['umbral'],
+            procesos=options['procesos'],
+            tamano=options['tamano_tarea'],
+        )
+        grupos = duplicados.agrupar(pares)
+        self.stdout.write(
+            f'Pares candidatos: {len(pares)}, grupos: {len(grupos)} ({time.perf_counter() - inicio:.1f} s)'
+        )
+
+        filas = self.escribir(options['salida'], grupos, pares)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Reporte con {filas} clientes en {len(grupos)} grupos guardado en {options["salida"]}'
+            )
+        )
+
+    def escribir(self, salida, grupos, pares):
+        """
+        Una fila por cliente, agrupadas. Se sugiere conservar el cliente más
+        antiguo de cada grupo; la columna admin abre el grupo en el listado
+        del admin, donde la acción "Fusionar" lo resuelve.
+        """
+        mejores = {}
+        for (menor, mayor), (valor, _) in pares.items():
+            mejores[menor] = max(mejores.get(menor, 0), valor)
+            mejores[mayor] = max(mejores.get(mayor, 0), valor)
+        listado = reverse('admin:ecommerce_cliente_changelist')
+        ids = [pk for grupo in grupos for pk in grupo]
+        cargados = {}
+        for inicio in range(0, len(ids), 900):
+            cargados.update(Cliente.objects.in_bulk(ids[inicio:inicio + 900]))
+
+        filas = 0
+        with open(salida, 'w', newline='', encoding='utf-8') as archivo:
+            escritor = csv.writer(archivo)
+            escritor.writerow(
+                ['grupo', 'cliente_id', 'nombre', 'email', 'edad', 'creado', 'puntaje', 'sugerencia', 'admin']
+            )
+            for numero, grupo in enumerate(grupos, start=1):
+                clientes = [cargados[pk] for pk in grupo if pk in cargados]
+                if len(clientes) < 2:
+                    # Borrados o fusionados mientras corría el comando.
+                    continue
+                ordenados = sorted(clientes, key=lambda cliente: (cliente.created_at, cliente.pk))
+                enlace = f'{listado}?id__in={",".join(str(cliente.pk) for cliente in clientes)}'
+                for cliente in ordenados:
+                    escritor.writerow([
+                        numero,
+                        cliente.pk,
+                        cliente.name,
+                        cliente.email,
+                        cliente.age,
+                        cliente.created_at.isoformat(),
+                        mejores.get(cliente.pk, ''),
+                        'conservar' if cliente is ordenados[0] else 'fusionar',
+                        enlace,
+                    ])
+                    filas += 1
+        return filas
@@ -1,6 +1,9 @@
+from django.conf import settings
+from django.core.cache import caches
 from django.core.management.base import BaseCommand
-from django.contrib.sessions.models import Session
-from django.utils import timezone
+from django.contrib.sessions.backends.cached_db import KEY_PREFIX
+
+from main_usuarios import sesiones
 
 
 class Command(BaseCommand):
@@ -14,10 +17,16 @@ class Command(BaseCommand):
         )
 
     def handle(self, *args, **options):
+        modelo = sesiones.SessionStore.get_model_class()
         if options['all']:
             # Eliminar todas las sesiones
-            count = Session.objects.all().count()
-            Session.objects.all().delete()
+            claves = list(modelo.objects.values_list('session_key', flat=True))
+            # Con sesiones cached_db también hay que quitar la copia en cache.
+            caches[settings.SESSION_CACHE_ALIAS].delete_many([KEY_PREFIX + clave for clave in claves])
+            count = len(claves)
+            modelo.objects.all().delete()
+            # Sin sesiones, la conciliación deja los contadores en cero.
+            sesiones.conciliar()
             self.stdout.write(
                 self.style.SUCCESS(
                     f'Se eliminaron {count} sesiones (todas)'
@@ -25,10 +34,9 @@ class Command(BaseCommand):
             )
         else:
             # Eliminar solo sesiones expiradas (comportamiento por defecto)
-            count_before = Session.objects.all().count()
-            Session.objects.filter(expire_date__lt=timezone.now()).delete()
-            count_after = Session.objects.all().count()
-            deleted = count_before - count_after
+            deleted = sesiones.purgar_vencidas()
+            # Las restantes salen del contador, sin contar la tabla.
+            count_after = sesiones.activas()['total']
             
             self.stdout.write(
                 self.style.SUCCESS(
@@ -0,0 +1,64 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from ecommerce import stock
+from ecommerce.models import MovimientoStock
+
+
+class Command(BaseCommand):
+    help = 'Compacta los movimientos de stock viejos en cierres diarios por producto'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dias',
+            type=int,
+            default=getattr(settings, 'STOCK_RETENCION_DIAS', 90),
+            help='Días de movimientos que se conservan sin compactar (por defecto STOCK_RETENCION_DIAS)',
+        )
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=stock.TAMANO_LOTE,
+            help=f'Productos por transacción (por defecto {stock.TAMANO_LOTE})',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Solo mostrar cuántos movimientos serían compactados',
+        )
+        parser.add_argument(
+            '--verificar',
+            action='store_true',
+            help='Comparar al terminar el stock de cada producto con el libro',
+        )
+
+    def handle(self, *args, **options):
+        if options['dias'] < 0:
+            raise CommandError('La cantidad de días no puede ser negativa.')
+        if options['lote'] < 1:
+            raise CommandError('El tamaño de lote debe ser mayor a cero.')
+
+        antes_de = timezone.localdate() - timedelta(days=options['dias'])
+        cantidad = MovimientoStock.objects.filter(fecha__lt=stock.inicio_del_dia(antes_de)).count()
+        self.stdout.write(f'Movimientos anteriores al {antes_de}: {cantidad}')
+        if not options['dry_run'] and cantidad:
+            cierres, compactados = stock.compactar(antes_de, options['lote'])
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f'Se compactaron {compactados} movimientos en {cierres} cierres diarios'
+                )
+            )
+
+        if options['verificar']:
+            descuadres = stock.descuadres(options['lote'])
+            for producto_id, actual, libro in descuadres[:20]:
+                self.stdout.write(self.style.WARNING(
+                    f'Producto {producto_id}: stock {actual}, según el libro {libro}'
+                ))
+            if descuadres:
+                self.stdout.write(self.style.WARNING(f'Productos con diferencias: {len(descuadres)}'))
+            else:
+                self.stdout.write(self.style.SUCCESS('El libro coincide con el stock de todos los productos'))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from ecommerce import estadisticas
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye desde cero los agregados del panel de estadísticas'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--solo',
+            choices=['clientes', 'productos'],
+            help='Reconstruir únicamente los agregados de clientes o de productos',
+        )
+
+    def handle(self, *args, **options):
+        if options['solo'] == 'clientes':
+            filas = estadisticas.recalcular_clientes()
+        elif options['solo'] == 'productos':
+            filas = estadisticas.recalcular_productos()
+        else:
+            filas = estadisticas.recalcular()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Se reconstruyeron {filas} agregados'
+            )
+        )
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from ecommerce.models import Producto
+from ecommerce.snippets import snippet
+
+
+class Command(BaseCommand):
+    help = (
+        'Calcula el extracto de la descripción (descripcion_snippet) de los productos '
+        'que no lo tienen o lo tienen desactualizado'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=1000,
+            help='Productos leídos y actualizados por transacción (por defecto 1000)',
+        )
+
+    def handle(self, *args, **options):
+        if options['lote'] < 1:
+            raise CommandError('El lote debe ser mayor a cero.')
+
+        revisados = actualizados = 0
+        ultimo = 0
+        while True:
+            filas = list(
+                Producto.objects.filter(pk__gt=ultimo).order_by('pk')
+                .values_list('pk', 'descripcion', 'descripcion_snippet')[:options['lote']]
+            )
+            if not filas:
+                break
+            cambios = []
+            for pk, descripcion, actual in filas:
+                extracto = snippet(descripcion)
+                if extracto != actual:
+                    cambios.append(Producto(pk=pk, descripcion_snippet=extracto))
+            # El extracto se deriva de la descripción: no cambia la versión ni se audita.
+            with transaction.atomic():
+                Producto.objects.bulk_update(cambios, ['descripcion_snippet'])
+            revisados += len(filas)
+            actualizados += len(cambios)
+            ultimo = filas[-1][0]
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Se actualizaron {actualizados} extractos de {revisados} productos')
+        )
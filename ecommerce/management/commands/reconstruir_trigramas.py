@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from ecommerce import trigramas
+from ecommerce.models import Trigrama
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye el índice de trigramas de la búsqueda tolerante a errores'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--solo',
+            choices=['clientes', 'productos'],
+            help='Reconstruir únicamente el índice de clientes o de productos',
+        )
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=1000,
+            help='Objetos indexados por transacción (por defecto 1000)',
+        )
+
+    def handle(self, *args, **options):
+        tipos = {
+            'clientes': Trigrama.CLIENTE,
+            'productos': Trigrama.PRODUCTO,
+        }
+        if options['solo']:
+            tipos = {options['solo']: tipos[options['solo']]}
+
+        for nombre, tipo in tipos.items():
+            total = trigramas.reconstruir(tipo, options['lote'])
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f'Se indexaron {total} {nombre}'
+                )
+            )
@@ -0,0 +1,35 @@
+from . import auditoria, perfilador
+
+
+class AuditoriaMiddleware:
+    """
+    Asocia cada petición a los registros de auditoría que genere, así las
+    señales de Cliente y Producto conocen al usuario y la vista (formularios,
+    vistas genéricas y admin) sin recibir el request como parámetro.
+    El usuario se resuelve solo si la petición modifica algo.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with auditoria.peticion_actual(request):
+            return self.get_response(request)
+
+
+class PerfiladorMiddleware:
+    """
+    Perfila las peticiones que un usuario staff pide con su firma (parámetro
+    _perfil o header X-Perfil) y una fracción al azar del tráfico
+    (PERFILADOR_MUESTREO). Va después de AuthenticationMiddleware; el resto
+    de la petición no paga nada si no se perfila. Ver ecommerce/perfilador.py.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        razon = perfilador.motivo(request)
+        if razon is None:
+            return self.get_response(request)
+        return perfilador.perfilar(request, self.get_response, razon)
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.4 on 2026-10-19 12:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Agregado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('grupo', models.CharField(max_length=20, verbose_name='Grupo')),
+                ('clave', models.CharField(max_length=40, verbose_name='Clave')),
+                ('valor', models.DecimalField(decimal_places=2, default=0, max_digits=16, verbose_name='Valor')),
+            ],
+            options={
+                'verbose_name': 'Agregado',
+                'verbose_name_plural': 'Agregados',
+                'ordering': ['grupo', 'clave'],
+                'constraints': [models.UniqueConstraint(fields=('grupo', 'clave'), name='agregado_grupo_clave_unico')],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-19 12:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0002_agregado'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cliente',
+            index=models.Index(fields=['age'], name='cliente_age_idx'),
+        ),
+    ]
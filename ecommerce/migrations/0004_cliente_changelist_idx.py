@@ -0,0 +1,21 @@
+# Generated by Django 5.2.4 on 2026-10-19 12:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0003_cliente_age_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cliente',
+            index=models.Index(fields=['name'], name='cliente_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cliente',
+            index=models.Index(fields=['created_at'], name='cliente_created_at_idx'),
+        ),
+    ]
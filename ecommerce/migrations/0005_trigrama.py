@@ -0,0 +1,28 @@
+# Generated by Django 5.2.4 on 2026-10-19 12:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0004_cliente_changelist_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Trigrama',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('c', 'Cliente'), ('p', 'Producto')], max_length=1, verbose_name='Tipo')),
+                ('objeto_id', models.BigIntegerField(verbose_name='Id del objeto')),
+                ('trigrama', models.CharField(max_length=3, verbose_name='Trigrama')),
+            ],
+            options={
+                'verbose_name': 'Trigrama',
+                'verbose_name_plural': 'Trigramas',
+                'indexes': [models.Index(fields=['trigrama', 'tipo', 'objeto_id'], name='trigrama_busqueda_idx')],
+                'constraints': [models.UniqueConstraint(fields=('tipo', 'objeto_id', 'trigrama'), name='trigrama_objeto_unico')],
+            },
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.4 on 2026-10-19 12:39
+
+import logging
+
+import django.db.models.functions.text
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import Lower
+
+logger = logging.getLogger(__name__)
+
+
+def fusionar_clientes_duplicados(apps, schema_editor):
+    """
+    Fusiona los clientes cuyo email solo difiere en mayúsculas: se conserva
+    el más antiguo con el nombre y la edad de la versión más reciente.
+    """
+    Cliente = apps.get_model('ecommerce', 'Cliente')
+    Trigrama = apps.get_model('ecommerce', 'Trigrama')
+    clientes = Cliente.objects.annotate(email_minusculas=Lower('email'))
+    duplicados = (
+        clientes.values('email_minusculas')
+        .annotate(cantidad=Count('id'))
+        .filter(cantidad__gt=1)
+        .values_list('email_minusculas', flat=True)
+    )
+    fusionados = 0
+    for email in list(duplicados):
+        grupo = list(clientes.filter(email_minusculas=email).order_by('pk'))
+        conservado = grupo[0]
+        reciente = max(grupo, key=lambda cliente: cliente.updated_at)
+        sobrantes = [cliente.pk for cliente in grupo[1:]]
+        Trigrama.objects.filter(tipo='c', objeto_id__in=sobrantes).delete()
+        Cliente.objects.filter(pk__in=sobrantes).delete()
+        conservado.name = reciente.name
+        conservado.age = reciente.age
+        conservado.save(update_fields=['name', 'age'])
+        fusionados += len(sobrantes)
+    if fusionados:
+        logger.warning(
+            'Se fusionaron %s clientes con emails duplicados. '
+            'Ejecuta recalcular_estadisticas y reconstruir_trigramas.',
+            fusionados,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0005_trigrama'),
+    ]
+
+    operations = [
+        migrations.RunPython(fusionar_clientes_duplicados, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='cliente',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('email'), name='cliente_email_minusculas_unico', violation_error_message='Ya existe un cliente con este email.'),
+        ),
+    ]
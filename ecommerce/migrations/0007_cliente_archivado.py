@@ -0,0 +1,32 @@
+# Generated by Django 5.2.4 on 2026-10-19 12:44
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0006_cliente_email_minusculas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClienteArchivado',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='ID original')),
+                ('name', models.CharField(max_length=100, verbose_name='Nombre')),
+                ('age', models.PositiveIntegerField(verbose_name='Edad')),
+                ('email', models.EmailField(max_length=254, verbose_name='Correo electrónico')),
+                ('created_at', models.DateTimeField(verbose_name='Fecha de registro')),
+                ('updated_at', models.DateTimeField(verbose_name='Última actualización')),
+                ('archivado_en', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de archivo')),
+            ],
+            options={
+                'verbose_name': 'Cliente archivado',
+                'verbose_name_plural': 'Clientes archivados',
+                'ordering': ['-archivado_en'],
+                'indexes': [models.Index(fields=['name'], name='archivado_name_idx'), models.Index(django.db.models.functions.text.Lower('email'), name='archivado_email_idx'), models.Index(fields=['archivado_en'], name='archivado_fecha_idx')],
+            },
+        ),
+    ]
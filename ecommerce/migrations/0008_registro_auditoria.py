@@ -0,0 +1,38 @@
+# Generated by Django 5.2.4 on 2026-10-19 12:46
+
+import django.core.serializers.json
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0007_cliente_archivado'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RegistroAuditoria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('modelo', models.CharField(choices=[('cliente', 'Cliente'), ('producto', 'Producto')], max_length=20, verbose_name='Modelo')),
+                ('objeto_id', models.BigIntegerField(blank=True, null=True, verbose_name='Id del objeto')),
+                ('accion', models.CharField(choices=[('crear', 'Alta'), ('editar', 'Edición'), ('borrar', 'Baja'), ('masivo', 'Operación masiva')], max_length=10, verbose_name='Acción')),
+                ('usuario_texto', models.CharField(blank=True, max_length=254, verbose_name='Usuario (texto)')),
+                ('origen', models.CharField(blank=True, max_length=100, verbose_name='Origen')),
+                ('cambios', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder, verbose_name='Cambios')),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Fecha')),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Usuario')),
+            ],
+            options={
+                'verbose_name': 'Registro de auditoría',
+                'verbose_name_plural': 'Registros de auditoría',
+                'ordering': ['-fecha'],
+                'indexes': [models.Index(fields=['modelo', 'objeto_id', 'fecha'], name='auditoria_objeto_idx'), models.Index(fields=['fecha'], name='auditoria_fecha_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.2.4 on 2026-10-19 13:03
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def registrar_stock_inicial(apps, schema_editor):
+    """Un movimiento 'inicial' por producto con el stock actual, base del libro."""
+    Producto = apps.get_model('ecommerce', 'Producto')
+    MovimientoStock = apps.get_model('ecommerce', 'MovimientoStock')
+    productos = Producto.objects.exclude(stock=0).order_by('pk').values_list('pk', 'stock')
+    lote = []
+    for producto_id, stock in productos.iterator(chunk_size=2000):
+        lote.append(MovimientoStock(producto_id=producto_id, cantidad=stock, motivo='inicial', origen='migracion'))
+        if len(lote) == 2000:
+            MovimientoStock.objects.bulk_create(lote)
+            lote = []
+    MovimientoStock.objects.bulk_create(lote)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0009_version_optimista'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MovimientoStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('producto_id', models.BigIntegerField(verbose_name='Id del producto')),
+                ('cantidad', models.IntegerField(verbose_name='Cantidad')),
+                ('motivo', models.CharField(choices=[('inicial', 'Stock inicial'), ('alta', 'Alta del producto'), ('edicion', 'Edición'), ('masivo', 'Ajuste masivo'), ('baja', 'Baja del producto'), ('pedido', 'Pedido')], max_length=10, verbose_name='Motivo')),
+                ('usuario_texto', models.CharField(blank=True, max_length=254, verbose_name='Usuario')),
+                ('origen', models.CharField(blank=True, max_length=100, verbose_name='Origen')),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Fecha')),
+            ],
+            options={
+                'verbose_name': 'Movimiento de stock',
+                'verbose_name_plural': 'Movimientos de stock',
+                'ordering': ['-fecha', '-id'],
+                'indexes': [models.Index(fields=['producto_id', 'fecha'], name='movimiento_producto_idx'), models.Index(fields=['fecha'], name='movimiento_fecha_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='SnapshotStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('producto_id', models.BigIntegerField(verbose_name='Id del producto')),
+                ('fecha', models.DateField(verbose_name='Día')),
+                ('stock', models.IntegerField(verbose_name='Stock al cierre')),
+                ('movimientos', models.PositiveIntegerField(default=0, verbose_name='Movimientos compactados')),
+            ],
+            options={
+                'verbose_name': 'Cierre de stock',
+                'verbose_name_plural': 'Cierres de stock',
+                'ordering': ['producto_id', '-fecha'],
+                'constraints': [models.UniqueConstraint(fields=('producto_id', 'fecha'), name='snapshot_producto_fecha_unico')],
+            },
+        ),
+        migrations.RunPython(registrar_stock_inicial, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-19 13:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0010_stock_movimientos'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='descripcion_snippet',
+            field=models.CharField(blank=True, editable=False, max_length=160, verbose_name='Extracto de la descripción'),
+        ),
+    ]
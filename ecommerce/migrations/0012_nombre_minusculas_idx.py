@@ -0,0 +1,22 @@
+# Generated by Django 5.2.4 on 2026-10-19 13:36
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0011_producto_descripcion_snippet'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cliente',
+            index=models.Index(django.db.models.functions.text.Lower('name'), name='cliente_name_lower_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='clientearchivado',
+            index=models.Index(django.db.models.functions.text.Lower('name'), name='archivado_name_lower_idx'),
+        ),
+    ]
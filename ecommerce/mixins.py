@@ -0,0 +1,184 @@
+from django.db.models import Q, Value
+from django.db.models.fields.files import FieldFile
+from django.db.models.functions import Lower
+from django.db.models.lookups import Exact
+
+
+def filtro_email(email, campo='email'):
+    """
+    Igualdad de email sin distinguir mayúsculas, como objeto Q.
+    Compara LOWER(campo) para que la base use el índice único funcional.
+    """
+    return Q(Exact(Lower(campo), Lower(Value(email))))
+
+
+class CamposModificadosMixin:
+    """
+    Mixin de modelo que registra los valores cargados desde la base de datos
+    y hace que save() escriba solo las columnas modificadas.
+    Features:
+        - UPDATE con update_fields limitado a los campos que cambiaron.
+        - Sin escritura (ni señales) cuando no cambió ningún campo.
+        - Campos auto_now (ej: updated_at) incluidos solo si hay cambios.
+        - Altas, guardados con update_fields explícito y force_insert
+          mantienen el comportamiento estándar de Django.
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        instancia._registrar_estado_cargado()
+        return instancia
+
+    def _valor_registrado(self, campo):
+        valor = self.__dict__[campo.attname]
+        # Los archivos se comparan por nombre, no por el objeto FieldFile.
+        if isinstance(valor, FieldFile):
+            return valor.name
+        return valor
+
+    def _campos_persistentes(self):
+        return [campo for campo in self._meta.concrete_fields if not campo.primary_key]
+
+    def _registrar_estado_cargado(self, nombres=None):
+        """Guarda el valor actual de los campos cargados (o solo de los indicados)."""
+        estado = getattr(self, '_estado_cargado', None)
+        if estado is None or nombres is None:
+            estado = {}
+        for campo in self._campos_persistentes():
+            if nombres is not None and campo.name not in nombres and campo.attname not in nombres:
+                continue
+            if campo.attname in self.__dict__:
+                estado[campo.attname] = self._valor_registrado(campo)
+        self._estado_cargado = estado
+
+    @property
+    def valores_originales(self):
+        """
+        Valores de los campos tal como se cargaron de la base de datos,
+        o None si la instancia todavía no fue guardada ni cargada.
+        """
+        estado = getattr(self, '_estado_cargado', None)
+        if estado is None or self._state.adding:
+            return None
+        return dict(estado)
+
+    def campos_modificados(self):
+        """Nombres de los campos cuyo valor difiere del cargado."""
+        estado = getattr(self, '_estado_cargado', None) or {}
+        modificados = []
+        for campo in self._campos_persistentes():
+            if campo.attname not in self.__dict__:
+                # Campo diferido que nunca se cargó: no pudo cambiar.
+                continue
+            if campo.attname not in estado or estado[campo.attname] != self._valor_registrado(campo):
+                modificados.append(campo.name)
+        return modificados
+
+    def save(self, *args, **kwargs):
+        seguimiento = (
+            not args
+            and not self._state.adding
+            and getattr(self, '_estado_cargado', None) is not None
+            and kwargs.get('update_fields') is None
+            and not kwargs.get('force_insert')
+        )
+        if seguimiento:
+            modificados = self.campos_modificados()
+            if not modificados:
+                return
+            auto_now = [
+                campo.name for campo in self._campos_persistentes()
+                if getattr(campo, 'auto_now', False) and campo.name not in modificados
+            ]
+            kwargs['update_fields'] = modificados + auto_now
+
+        super().save(*args, **kwargs)
+        self._registrar_estado_cargado(kwargs.get('update_fields'))
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        fields = kwargs.get('fields')
+        if fields is None and len(args) > 1:
+            fields = args[1]
+        self._registrar_estado_cargado(fields)
+
+
+class ConflictoVersion(Exception):
+    """
+    El objeto se modificó (o se borró) en la base desde que se cargó:
+    guardarlo pisaría los cambios de otro usuario.
+    """
+
+    def __init__(self, instancia, actual):
+        self.instancia = instancia
+        # Estado vigente en la base, o None si el objeto fue borrado.
+        self.actual = actual
+        super().__init__(
+            f'{instancia._meta.verbose_name} {instancia.pk} fue modificado por otro usuario'
+            if actual is not None else
+            f'{instancia._meta.verbose_name} {instancia.pk} fue borrado por otro usuario'
+        )
+
+    def diferencias(self, campos):
+        """
+        Campos cuyo valor vigente en la base difiere del que se intentó
+        guardar, como [(campo del modelo, valor propio, valor vigente)].
+        """
+        if self.actual is None:
+            return []
+        resultado = []
+        for nombre in campos:
+            campo = self.instancia._meta.get_field(nombre)
+            propio = campo.value_from_object(self.instancia)
+            vigente = campo.value_from_object(self.actual)
+            if propio != vigente:
+                resultado.append((campo, propio, vigente))
+        return resultado
+
+
+class VersionOptimistaMixin:
+    """
+    Mixin de modelo con control de concurrencia optimista sobre el campo
+    `version`: cada guardado es un UPDATE ... WHERE version = n que además
+    la incrementa. Si otro guardado ganó la carrera el UPDATE no encuentra
+    la fila y se lanza ConflictoVersion, sin bloqueos mientras se edita.
+    Features:
+        - La versión esperada es la del objeto: un formulario que envía la
+          versión con la que se abrió detecta ediciones posteriores.
+        - Compatible con CamposModificadosMixin (se declara antes que él):
+          un guardado sin cambios no escribe ni incrementa la versión.
+        - Las altas no se ven afectadas.
+    """
+
+    def save(self, *args, **kwargs):
+        if args or self._state.adding or kwargs.get('force_insert'):
+            return super().save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None and getattr(self, '_estado_cargado', None) is not None:
+            if not set(self.campos_modificados()) - {'version'}:
+                return
+        elif update_fields is not None:
+            kwargs['update_fields'] = [*update_fields, 'version']
+
+        esperada = self.version
+        self.version = esperada + 1
+        self._version_esperada = esperada
+        try:
+            super().save(*args, **kwargs)
+        except BaseException:
+            self.version = esperada
+            raise
+        finally:
+            self._version_esperada = None
+
+    def _do_update(self, base_qs, using, pk_val, values, update_fields, forced_update):
+        esperada = getattr(self, '_version_esperada', None)
+        if esperada is None:
+            return super()._do_update(base_qs, using, pk_val, values, update_fields, forced_update)
+        if super()._do_update(
+            base_qs.filter(version=esperada), using, pk_val, values, update_fields, forced_update
+        ):
+            return True
+        # Sin filas actualizadas: otro guardado cambió la versión o borró el objeto.
+        raise ConflictoVersion(self, base_qs.filter(pk=pk_val).first())
@@ -1,25 +1,84 @@
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.db.models import BooleanField, ExpressionWrapper, Q
+from django.db.models.functions import Lower
 from django.core.validators import MinValueValidator
+from django.utils import timezone
+from .mixins import CamposModificadosMixin, VersionOptimistaMixin, filtro_email
+from .snippets import LARGO_SNIPPET, snippet
 
 
+def edad_vip():
+    """Edad a partir de la cual (exclusive) un cliente es VIP."""
+    return getattr(settings, 'CLIENTE_EDAD_VIP', 40)
 
 
+def filtro_vip():
+    """Condición VIP como objeto Q, para filtros, anotaciones y agregados."""
+    return Q(age__gt=edad_vip())
 
-class Cliente(models.Model):
+
+class ClienteQuerySet(models.QuerySet):
+    """
+    QuerySet de clientes con segmentación VIP resuelta en la base de datos.
+    Todas las operaciones usan el umbral único de edad_vip() y filtran
+    sobre el índice de edad, sin recorrer los clientes en Python.
+    """
+    def vip(self):
+        return self.filter(filtro_vip())
+
+    def non_vip(self):
+        return self.exclude(filtro_vip())
+
+    def anotar_vip(self):
+        """Agrega el campo calculado is_vip a cada cliente."""
+        return self.annotate(is_vip=ExpressionWrapper(filtro_vip(), output_field=BooleanField()))
+
+    def por_email(self, email):
+        """Clientes con el email indicado, sin distinguir mayúsculas."""
+        return self.filter(filtro_email(email))
+
+
+class Cliente(VersionOptimistaMixin, CamposModificadosMixin, models.Model):
     """
     Modelo para gestionar clientes del sistema e-commerce.
     Incluye funcionalidad para determinar estatus VIP basado en edad.
+    Al guardar solo se escriben las columnas modificadas, y un guardado
+    sobre una versión desactualizada lanza ConflictoVersion.
     """
     name = models.CharField(max_length=100, verbose_name="Nombre")
     age = models.PositiveIntegerField(verbose_name="Edad")
     email = models.EmailField(unique=True, verbose_name="Correo electrónico")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Fecha de registro")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Última actualización")
+    version = models.PositiveIntegerField(default=1, verbose_name="Versión")
+
+    objects = ClienteQuerySet.as_manager()
 
     class Meta:
         verbose_name = "Cliente"
         verbose_name_plural = "Clientes"
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['age'], name='cliente_age_idx'),
+            models.Index(fields=['name'], name='cliente_name_idx'),
+            # Búsqueda por prefijo del nombre sin distinguir mayúsculas (admin).
+            models.Index(Lower('name'), name='cliente_name_lower_idx'),
+            models.Index(fields=['created_at'], name='cliente_created_at_idx'),
+        ]
+        constraints = [
+            # "Ana@x.com" y "ana@x.com" son el mismo cliente.
+            models.UniqueConstraint(
+                Lower('email'),
+                name='cliente_email_minusculas_unico',
+                violation_error_message='Ya existe un cliente con este email.',
+            ),
+        ]
+
+    @property
+    def es_vip(self):
+        return self.age > edad_vip()
 
     def mostrar_datos_cliente(self):
         return f"nombre: {self.name}, edad: {self.age}, correo: {self.email}"
@@ -30,7 +89,7 @@ class Cliente(models.Model):
         return f"Correo actualizado correctamente a: {self.email}"
     
     def cliente_vip(self):
-        if self.age > 40:
+        if self.es_vip:
             return f"{self.name} es un cliente VIP."
         else:
             return f"{self.name} aún no es cliente VIP."
@@ -39,17 +98,76 @@ class Cliente(models.Model):
         return f"{self.name}, es un nuevo cliente."
 
 
-class Producto(models.Model):
+class ClienteArchivadoQuerySet(models.QuerySet):
+    def por_email(self, email):
+        """Clientes archivados con el email indicado, sin distinguir mayúsculas."""
+        return self.filter(filtro_email(email))
+
+
+class ClienteArchivado(models.Model):
+    """
+    Modelo para los clientes sin actividad movidos fuera de la tabla principal.
+    Conserva el id original del cliente, así las URLs de detalle siguen
+    funcionando. Se completa con el comando archivar_clientes.
+    El email de un cliente archivado sigue reservado: la restricción única
+    de Cliente no alcanza a esta tabla, así que el alta (crear_cliente y la
+    API) y la edición de clientes también lo validan contra el archivo.
+    """
+    id = models.BigIntegerField(primary_key=True, verbose_name="ID original")
+    name = models.CharField(max_length=100, verbose_name="Nombre")
+    age = models.PositiveIntegerField(verbose_name="Edad")
+    email = models.EmailField(verbose_name="Correo electrónico")
+    created_at = models.DateTimeField(verbose_name="Fecha de registro")
+    updated_at = models.DateTimeField(verbose_name="Última actualización")
+    archivado_en = models.DateTimeField(auto_now_add=True, verbose_name="Fecha de archivo")
+
+    # Permite distinguirlo de Cliente en plantillas y resultados de búsqueda.
+    archivado = True
+
+    objects = ClienteArchivadoQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = "Cliente archivado"
+        verbose_name_plural = "Clientes archivados"
+        ordering = ['-archivado_en']
+        indexes = [
+            models.Index(fields=['name'], name='archivado_name_idx'),
+            models.Index(Lower('name'), name='archivado_name_lower_idx'),
+            models.Index(Lower('email'), name='archivado_email_idx'),
+            models.Index(fields=['archivado_en'], name='archivado_fecha_idx'),
+        ]
+
+    @property
+    def es_vip(self):
+        return self.age > edad_vip()
+
+    def cliente_vip(self):
+        if self.es_vip:
+            return f"{self.name} es un cliente VIP."
+        return f"{self.name} aún no es cliente VIP."
+
+    def __str__(self):
+        return f"{self.name} (archivado)"
+
+
+class Producto(VersionOptimistaMixin, CamposModificadosMixin, models.Model):
     """
     Modelo para gestionar productos en el catálogo e-commerce.
     Incluye control de stock, precios y estado activo/inactivo.
+    Al guardar solo se escriben las columnas modificadas, y un guardado
+    sobre una versión desactualizada lanza ConflictoVersion.
     """
     nombre = models.CharField(max_length=200, verbose_name="Nombre del producto")
     precio = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)], verbose_name="Precio")
     descripcion = models.TextField(blank=True, verbose_name="Descripción")
+    # Comienzo de la descripción para los listados, que difieren la columna completa.
+    descripcion_snippet = models.CharField(
+        max_length=LARGO_SNIPPET, blank=True, editable=False, verbose_name="Extracto de la descripción",
+    )
     stock = models.PositiveIntegerField(default=0, verbose_name="Stock disponible")
     activo = models.BooleanField(default=True, verbose_name="Producto activo")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Fecha de creación")
+    version = models.PositiveIntegerField(default=1, verbose_name="Versión")
 
     class Meta:
         verbose_name = "Producto"
@@ -59,4 +177,187 @@ class Producto(models.Model):
     def __str__(self):
         return self.nombre
 
+    def save(self, *args, **kwargs):
+        """Recalcula el extracto si la descripción está cargada (no diferida)."""
+        if 'descripcion' in self.__dict__:
+            self.descripcion_snippet = snippet(self.descripcion)
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None and 'descripcion' in update_fields:
+                kwargs['update_fields'] = [*update_fields, 'descripcion_snippet']
+        super().save(*args, **kwargs)
+
+
+
+class Agregado(models.Model):
+    """
+    Modelo para almacenar valores agregados del panel de estadísticas.
+    Cada fila es un contador identificado por grupo y clave que se
+    mantiene de forma incremental desde las señales de Cliente y Producto.
+    """
+    grupo = models.CharField(max_length=20, verbose_name="Grupo")
+    clave = models.CharField(max_length=40, verbose_name="Clave")
+    valor = models.DecimalField(max_digits=16, decimal_places=2, default=0, verbose_name="Valor")
+
+    class Meta:
+        verbose_name = "Agregado"
+        verbose_name_plural = "Agregados"
+        ordering = ['grupo', 'clave']
+        constraints = [
+            models.UniqueConstraint(fields=['grupo', 'clave'], name='agregado_grupo_clave_unico'),
+        ]
+
+    def __str__(self):
+        return f"{self.grupo}/{self.clave}: {self.valor}"
+
+
+class Trigrama(models.Model):
+    """
+    Índice invertido de trigramas para la búsqueda tolerante a errores.
+    Cada fila indica que un trigrama aparece en el texto de un cliente
+    o producto; se mantiene de forma incremental desde las señales.
+    """
+    CLIENTE = 'c'
+    PRODUCTO = 'p'
+    TIPOS = (
+        (CLIENTE, 'Cliente'),
+        (PRODUCTO, 'Producto'),
+    )
+
+    tipo = models.CharField(max_length=1, choices=TIPOS, verbose_name="Tipo")
+    objeto_id = models.BigIntegerField(verbose_name="Id del objeto")
+    trigrama = models.CharField(max_length=3, verbose_name="Trigrama")
+
+    class Meta:
+        verbose_name = "Trigrama"
+        verbose_name_plural = "Trigramas"
+        constraints = [
+            models.UniqueConstraint(fields=['tipo', 'objeto_id', 'trigrama'], name='trigrama_objeto_unico'),
+        ]
+        indexes = [
+            # Índice de cobertura para contar coincidencias sin leer la tabla.
+            models.Index(fields=['trigrama', 'tipo', 'objeto_id'], name='trigrama_busqueda_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.tipo}{self.objeto_id}: {self.trigrama}"
+
+
+class RegistroAuditoria(models.Model):
+    """
+    Registro de auditoría de altas, ediciones y bajas de clientes y productos.
+    Las filas se escriben en lotes desde un hilo en segundo plano
+    (ver ecommerce/auditoria.py); el usuario se guarda también como texto
+    para conservarlo aunque la cuenta se elimine.
+    """
+    CLIENTE = 'cliente'
+    PRODUCTO = 'producto'
+    MODELOS = (
+        (CLIENTE, 'Cliente'),
+        (PRODUCTO, 'Producto'),
+    )
+
+    CREAR = 'crear'
+    EDITAR = 'editar'
+    BORRAR = 'borrar'
+    MASIVO = 'masivo'
+    ACCIONES = (
+        (CREAR, 'Alta'),
+        (EDITAR, 'Edición'),
+        (BORRAR, 'Baja'),
+        (MASIVO, 'Operación masiva'),
+    )
+
+    modelo = models.CharField(max_length=20, choices=MODELOS, verbose_name="Modelo")
+    objeto_id = models.BigIntegerField(null=True, blank=True, verbose_name="Id del objeto")
+    accion = models.CharField(max_length=10, choices=ACCIONES, verbose_name="Acción")
+    usuario = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name='+',
+        verbose_name="Usuario",
+    )
+    usuario_texto = models.CharField(max_length=254, blank=True, verbose_name="Usuario (texto)")
+    origen = models.CharField(max_length=100, blank=True, verbose_name="Origen")
+    cambios = models.JSONField(default=dict, encoder=DjangoJSONEncoder, verbose_name="Cambios")
+    fecha = models.DateTimeField(default=timezone.now, verbose_name="Fecha")
+
+    class Meta:
+        verbose_name = "Registro de auditoría"
+        verbose_name_plural = "Registros de auditoría"
+        ordering = ['-fecha']
+        indexes = [
+            models.Index(fields=['modelo', 'objeto_id', 'fecha'], name='auditoria_objeto_idx'),
+            models.Index(fields=['fecha'], name='auditoria_fecha_idx'),
+        ]
 
+    def __str__(self):
+        objeto = f"{self.modelo} {self.objeto_id}" if self.objeto_id else self.modelo
+        return f"{self.get_accion_display()} {objeto} por {self.usuario_texto or 'sistema'}"
+
+
+class MovimientoStock(models.Model):
+    """
+    Movimiento del libro de stock: cada cambio del stock de un producto
+    agrega una fila con la cantidad que entró (positiva) o salió (negativa).
+    Las filas no se editan; los movimientos viejos se compactan en cierres
+    diarios (SnapshotStock, ver ecommerce/stock.py). El producto se guarda
+    como id para conservar la historia de productos borrados.
+    """
+    INICIAL = 'inicial'
+    ALTA = 'alta'
+    EDICION = 'edicion'
+    MASIVO = 'masivo'
+    BAJA = 'baja'
+    PEDIDO = 'pedido'
+    MOTIVOS = (
+        (INICIAL, 'Stock inicial'),
+        (ALTA, 'Alta del producto'),
+        (EDICION, 'Edición'),
+        (MASIVO, 'Ajuste masivo'),
+        (BAJA, 'Baja del producto'),
+        (PEDIDO, 'Pedido'),
+    )
+
+    producto_id = models.BigIntegerField(verbose_name="Id del producto")
+    cantidad = models.IntegerField(verbose_name="Cantidad")
+    motivo = models.CharField(max_length=10, choices=MOTIVOS, verbose_name="Motivo")
+    usuario_texto = models.CharField(max_length=254, blank=True, verbose_name="Usuario")
+    origen = models.CharField(max_length=100, blank=True, verbose_name="Origen")
+    fecha = models.DateTimeField(default=timezone.now, verbose_name="Fecha")
+
+    class Meta:
+        verbose_name = "Movimiento de stock"
+        verbose_name_plural = "Movimientos de stock"
+        ordering = ['-fecha', '-id']
+        indexes = [
+            models.Index(fields=['producto_id', 'fecha'], name='movimiento_producto_idx'),
+            models.Index(fields=['fecha'], name='movimiento_fecha_idx'),
+        ]
+
+    def __str__(self):
+        return f"Producto {self.producto_id}: {self.cantidad:+} ({self.get_motivo_display()})"
+
+
+class SnapshotStock(models.Model):
+    """
+    Cierre diario del stock de un producto, generado al compactar los
+    movimientos de ese día: el stock al terminar el día y cuántos
+    movimientos lo componían. Solo hay cierres de días con movimientos.
+    """
+    producto_id = models.BigIntegerField(verbose_name="Id del producto")
+    fecha = models.DateField(verbose_name="Día")
+    stock = models.IntegerField(verbose_name="Stock al cierre")
+    movimientos = models.PositiveIntegerField(default=0, verbose_name="Movimientos compactados")
+
+    class Meta:
+        verbose_name = "Cierre de stock"
+        verbose_name_plural = "Cierres de stock"
+        ordering = ['producto_id', '-fecha']
+        constraints = [
+            models.UniqueConstraint(fields=['producto_id', 'fecha'], name='snapshot_producto_fecha_unico'),
+        ]
+
+    def __str__(self):
+        return f"Producto {self.producto_id} al {self.fecha}: {self.stock}"
@@ -0,0 +1,227 @@
+from decimal import Decimal
+
+from django.db import connections, router, transaction
+from django.db.models import DecimalField, F, Value
+from django.db.models.functions import Greatest, Round
+from django.utils import timezone
+
+from . import auditoria, buscador, estadisticas, stock, trigramas
+from .models import Cliente, MovimientoStock, Producto, RegistroAuditoria, Trigrama
+from .snippets import snippet
+
+
+# Cantidad de productos modificados por transacción.
+TAMANO_LOTE = 1000
+
+
+def lotes_de_ids(queryset, lote=TAMANO_LOTE):
+    """
+    Recorre los ids del queryset en lotes ordenados por clave primaria.
+    Usa paginación por clave (pk > último) en lugar de OFFSET, así cada
+    lote cuesta lo mismo sin importar cuántos se hayan procesado antes.
+    """
+    ids = queryset.order_by('pk').values_list('pk', flat=True)
+    ultimo = None
+    while True:
+        pagina = ids.filter(pk__gt=ultimo) if ultimo is not None else ids
+        bloque = list(pagina[:lote])
+        if not bloque:
+            return
+        yield bloque
+        ultimo = bloque[-1]
+
+
+def borrar_por_ids(modelo, ids):
+    """
+    Borra las filas con esos ids con un único DELETE, sin cargar los objetos
+    ni disparar señales: el llamador actualiza agregados, índice y auditoría.
+    Retorna la cantidad de filas borradas.
+    """
+    if not ids:
+        return 0
+    conexion = connections[router.db_for_write(modelo)]
+    tabla = conexion.ops.quote_name(modelo._meta.db_table)
+    columna = conexion.ops.quote_name(modelo._meta.pk.column)
+    marcas = ', '.join(['%s'] * len(ids))
+    with conexion.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {tabla} WHERE {columna} IN ({marcas})', list(ids))
+        return cursor.rowcount
+
+
+def actualizar_en_lotes(queryset, valores, lote=TAMANO_LOTE, detalle=''):
+    """
+    Aplica un UPDATE masivo por lotes, cada uno en su propia transacción.
+    Features:
+        - Un único UPDATE ... SET por lote, sin cargar los productos.
+        - Incrementa la versión de cada producto, así un formulario abierto
+          antes del ajuste detecta el conflicto en lugar de deshacerlo.
+        - Transacciones cortas para no bloquear la tabla en selecciones grandes.
+        - Reconstrucción de los agregados del panel al finalizar.
+        - Invalidación de los resultados de búsqueda cacheados.
+        - Un único registro de auditoría con el detalle de la operación
+          (el UPDATE no dispara las señales por producto).
+        - Si cambia el stock, un movimiento por producto en el libro de
+          stock, escritos con un INSERT por lote en la misma transacción.
+    """
+    total = 0
+    for ids in lotes_de_ids(queryset, lote):
+        with transaction.atomic():
+            productos = Producto.objects.filter(pk__in=ids)
+            if 'stock' in valores:
+                antes = dict(productos.select_for_update().values_list('pk', 'stock'))
+            total += productos.update(**valores, version=F('version') + 1)
+            if 'stock' in valores:
+                stock.registrar(
+                    stock.movimiento(producto_id, nuevo - antes[producto_id], MovimientoStock.MASIVO)
+                    for producto_id, nuevo in productos.values_list('pk', 'stock')
+                )
+    if total:
+        estadisticas.recalcular_productos()
+        buscador.invalidar()
+        auditoria.registrar(
+            RegistroAuditoria.PRODUCTO,
+            RegistroAuditoria.MASIVO,
+            cambios={'campos': sorted(valores), 'detalle': detalle, 'productos': total},
+        )
+    return total
+
+
+def ajustar_precio_porcentaje(queryset, porcentaje, lote=TAMANO_LOTE):
+    """Sube (o baja, con porcentaje negativo) el precio en un porcentaje."""
+    factor = Value(1 + Decimal(porcentaje) / 100, output_field=DecimalField())
+    nuevo_precio = Greatest(Round(F('precio') * factor, 2), Value(Decimal('0'), output_field=DecimalField()))
+    return actualizar_en_lotes(queryset, {'precio': nuevo_precio}, lote, f'precio {porcentaje:+}%')
+
+
+def ajustar_precio_monto(queryset, monto, lote=TAMANO_LOTE):
+    """Suma (o resta, con monto negativo) un importe fijo al precio."""
+    detalle = f'precio {Decimal(monto):+}'
+    monto = Value(Decimal(monto), output_field=DecimalField())
+    nuevo_precio = Greatest(F('precio') + monto, Value(Decimal('0'), output_field=DecimalField()))
+    return actualizar_en_lotes(queryset, {'precio': nuevo_precio}, lote, detalle)
+
+
+def ajustar_stock(queryset, cantidad, lote=TAMANO_LOTE):
+    """Suma (o resta) unidades al stock sin dejarlo por debajo de cero."""
+    return actualizar_en_lotes(
+        queryset, {'stock': Greatest(F('stock') + cantidad, 0)}, lote, f'stock {cantidad:+}'
+    )
+
+
+def cambiar_estado(queryset, activo, lote=TAMANO_LOTE):
+    """Activa o desactiva los productos que aún no están en ese estado."""
+    return actualizar_en_lotes(
+        queryset.exclude(activo=activo), {'activo': activo}, lote, 'activar' if activo else 'desactivar'
+    )
+
+
+# Altas, ediciones y bajas masivas de objetos (API JSON). Las escrituras
+# masivas no disparan las señales por objeto: índice de trigramas, agregados,
+# libro de stock, auditoría y cache de búsqueda se actualizan aquí una vez
+# por lote.
+
+TIPOS_TRIGRAMA = {
+    Cliente: Trigrama.CLIENTE,
+    Producto: Trigrama.PRODUCTO,
+}
+
+
+def deltas(objeto, signo):
+    """Contribución de un cliente o producto a los agregados del panel."""
+    if isinstance(objeto, Cliente):
+        return estadisticas.deltas_cliente(objeto, signo)
+    return estadisticas.deltas_producto(objeto.activo, objeto.precio, objeto.stock, signo)
+
+
+def crear_objetos(modelo, objetos, lote=TAMANO_LOTE):
+    """
+    Inserta objetos nuevos con bulk_create en una sola transacción.
+    Retorna los objetos creados, con su clave primaria asignada.
+    """
+    if modelo is Producto:
+        # bulk_create no llama a save(), que mantiene el extracto.
+        for objeto in objetos:
+            objeto.descripcion_snippet = snippet(objeto.descripcion)
+    with transaction.atomic():
+        creados = modelo.objects.bulk_create(objetos, batch_size=lote)
+        trigramas.indexar_lote(TIPOS_TRIGRAMA[modelo], creados)
+        estadisticas.aplicar(*(deltas(objeto, +1) for objeto in creados))
+        if modelo is Producto:
+            stock.registrar(stock.movimiento(objeto.pk, objeto.stock, MovimientoStock.ALTA) for objeto in creados)
+        for objeto in creados:
+            auditoria.guardado(objeto, True)
+    buscador.invalidar()
+    for objeto in creados:
+        objeto._registrar_estado_cargado()
+    return creados
+
+
+def actualizar_objetos(modelo, objetos, lote=TAMANO_LOTE):
+    """
+    Guarda con bulk_update (un UPDATE ... CASE por lote) los objetos cargados
+    de la base y modificados en memoria. Solo se escriben las columnas que
+    cambiaron en alguno de ellos; los objetos sin cambios se ignoran.
+    La versión se incrementa sin compararla (gana la última escritura).
+    Retorna la cantidad de objetos actualizados.
+    """
+    if modelo is Producto:
+        for objeto in objetos:
+            if 'descripcion' in objeto.__dict__:
+                objeto.descripcion_snippet = snippet(objeto.descripcion)
+    modificados = [objeto for objeto in objetos if objeto.campos_modificados()]
+    if not modificados:
+        return 0
+    campos = sorted({campo for objeto in modificados for campo in objeto.campos_modificados()} | {'version'})
+    for objeto in modificados:
+        objeto.version += 1
+    # bulk_update no aplica auto_now: se asigna aquí.
+    ahora = timezone.now()
+    for campo in modelo._meta.concrete_fields:
+        if getattr(campo, 'auto_now', False):
+            campos.append(campo.name)
+            for objeto in modificados:
+                setattr(objeto, campo.attname, ahora)
+
+    tipo = TIPOS_TRIGRAMA[modelo]
+    reindexar = [
+        objeto for objeto in modificados
+        if set(objeto.campos_modificados()) & set(trigramas.CAMPOS[tipo])
+    ]
+    anteriores = [modelo(**objeto.valores_originales) for objeto in modificados]
+    with transaction.atomic():
+        modelo.objects.bulk_update(modificados, campos, batch_size=lote)
+        if reindexar:
+            Trigrama.objects.filter(tipo=tipo, objeto_id__in=[objeto.pk for objeto in reindexar]).delete()
+            trigramas.indexar_lote(tipo, reindexar)
+        estadisticas.aplicar(
+            *(deltas(anterior, -1) for anterior in anteriores),
+            *(deltas(objeto, +1) for objeto in modificados),
+        )
+        if modelo is Producto:
+            stock.registrar(
+                stock.movimiento(objeto.pk, objeto.stock - anterior.stock, MovimientoStock.EDICION)
+                for objeto, anterior in zip(modificados, anteriores)
+            )
+        for objeto in modificados:
+            auditoria.guardado(objeto, False)
+    buscador.invalidar()
+    for objeto in modificados:
+        objeto._registrar_estado_cargado()
+    return len(modificados)
+
+
+def borrar_objetos(modelo, objetos):
+    """Borra los objetos con un único DELETE, sin cargarlos de nuevo."""
+    if not objetos:
+        return 0
+    ids = [objeto.pk for objeto in objetos]
+    with transaction.atomic():
+        Trigrama.objects.filter(tipo=TIPOS_TRIGRAMA[modelo], objeto_id__in=ids).delete()
+        borrar_por_ids(modelo, ids)
+        estadisticas.aplicar(*(deltas(objeto, -1) for objeto in objetos))
+        if modelo is Producto:
+            stock.registrar(stock.movimiento(objeto.pk, -objeto.stock, MovimientoStock.BAJA) for objeto in objetos)
+        for objeto in objetos:
+            auditoria.borrado(objeto)
+    buscador.invalidar()
+    return len(ids)
@@ -0,0 +1,252 @@
+import cProfile
+import json
+import logging
+import os
+import pstats
+import random
+import re
+import sysconfig
+import time
+import uuid
+from contextlib import ExitStack
+from pathlib import Path
+
+from django.conf import settings
+from django.core import signing
+from django.db import connections
+from django.utils import timezone
+
+
+logger = logging.getLogger(__name__)
+
+# Parámetro de la URL y header con la firma que activa el perfilador.
+PARAMETRO = '_perfil'
+CABECERA = 'X-Perfil'
+SAL = 'ecommerce.perfilador'
+
+# Funciones y consultas que se guardan en el resumen de cada perfil.
+FUNCIONES = 40
+CONSULTAS = 500
+
+# Nombre de los perfiles guardados: fecha (ordena cronológicamente) e id.
+NOMBRE = re.compile(r'^\d{8}-\d{6}-\d{6}-[0-9a-f]{8}$')
+
+
+def directorio():
+    return Path(getattr(settings, 'PERFILADOR_DIRECTORIO', Path(settings.BASE_DIR) / 'perfiles'))
+
+
+def firmar(usuario):
+    """Firma que activa el perfilador para `usuario`; vence en PERFILADOR_FIRMA_SEGUNDOS."""
+    return signing.TimestampSigner(salt=SAL).sign(str(usuario.pk))
+
+
+def firma_valida(firma, usuario):
+    if not firma or not getattr(usuario, 'is_staff', False):
+        return False
+    try:
+        pk = signing.TimestampSigner(salt=SAL).unsign(
+            firma, max_age=getattr(settings, 'PERFILADOR_FIRMA_SEGUNDOS', 3600),
+        )
+    except signing.BadSignature:
+        return False
+    return pk == str(usuario.pk)
+
+
+def motivo(request):
+    """
+    'firma' si un usuario staff pidió perfilar la petición con su firma
+    (parámetro _perfil o header X-Perfil), 'muestreo' si la eligió el
+    muestreo al azar (PERFILADOR_MUESTREO) o None para no perfilarla.
+    """
+    firma = request.GET.get(PARAMETRO) or request.headers.get(CABECERA)
+    if firma and firma_valida(firma, getattr(request, 'user', None)):
+        return 'firma'
+    muestreo = getattr(settings, 'PERFILADOR_MUESTREO', 0)
+    if muestreo and random.random() < muestreo:
+        return 'muestreo'
+    return None
+
+
+class LineaDeTiempoSQL:
+    """
+    execute_wrapper que registra cada consulta con su inicio relativo al de
+    la petición y su duración. Se guarda el SQL sin los parámetros, que
+    pueden tener datos personales de los clientes.
+    """
+
+    def __init__(self, inicio):
+        self.inicio = inicio
+        self.consultas = []
+        self.total = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        comienzo = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            fin = time.perf_counter()
+            self.total += 1
+            if len(self.consultas) < CONSULTAS:
+                self.consultas.append({
+                    'inicio_ms': round((comienzo - self.inicio) * 1000, 3),
+                    'duracion_ms': round((fin - comienzo) * 1000, 3),
+                    'sql': sql,
+                    'alias': context['connection'].alias,
+                    'many': many,
+                })
+
+
+def nombre_funcion(clave):
+    archivo, linea, funcion = clave
+    if archivo == '~':
+        # Funciones implementadas en C (ej: <built-in method time.sleep>).
+        return funcion
+    base = str(settings.BASE_DIR)
+    if archivo.startswith(base):
+        archivo = os.path.relpath(archivo, base)
+    elif 'site-packages' in archivo:
+        archivo = archivo.split('site-packages' + os.sep, 1)[1]
+    elif archivo.startswith(sysconfig.get_paths()['stdlib']):
+        archivo = os.path.relpath(archivo, sysconfig.get_paths()['stdlib'])
+    return f'{archivo}:{linea}({funcion})'
+
+
+def funciones(estadisticas, columna, cantidad=FUNCIONES):
+    """
+    Las `cantidad` funciones con más tiempo según la columna de pstats:
+    2 para el tiempo propio y 3 para el acumulado (incluye lo que llaman).
+    """
+    filas = sorted(estadisticas.items(), key=lambda item: item[1][columna], reverse=True)[:cantidad]
+    return [
+        {
+            'funcion': nombre_funcion(clave),
+            'llamadas': llamadas,
+            'propio_ms': round(propio * 1000, 3),
+            'acumulado_ms': round(acumulado * 1000, 3),
+        }
+        for clave, (_, llamadas, propio, acumulado, _) in filas
+    ]
+
+
+def perfilar(request, get_response, razon):
+    """
+    Atiende la petición bajo cProfile y con la línea de tiempo SQL de todas
+    las bases de datos, y guarda el perfil. Retorna la respuesta con el
+    nombre del perfil en el header X-Perfil-Id.
+    """
+    perfil = cProfile.Profile()
+    inicio = time.perf_counter()
+    linea = LineaDeTiempoSQL(inicio)
+    with ExitStack() as pila:
+        for conexion in connections.all():
+            pila.enter_context(conexion.execute_wrapper(linea))
+        perfil.enable()
+        try:
+            respuesta = get_response(request)
+        finally:
+            perfil.disable()
+    duracion = time.perf_counter() - inicio
+
+    estadisticas = pstats.Stats(perfil).stats
+    usuario = getattr(request, 'user', None)
+    query = request.GET.copy()
+    query.pop(PARAMETRO, None)
+    datos = {
+        'fecha': timezone.now().isoformat(),
+        'metodo': request.method,
+        'ruta': request.path + (f'?{query.urlencode()}' if query else ''),
+        'status': respuesta.status_code,
+        'motivo': razon,
+        'usuario': str(usuario) if usuario is not None and usuario.is_authenticated else '',
+        'duracion_ms': round(duracion * 1000, 3),
+        'sql_ms': round(sum(consulta['duracion_ms'] for consulta in linea.consultas), 3),
+        'total_consultas': linea.total,
+        'consultas': linea.consultas,
+        'acumuladas': funciones(estadisticas, 3),
+        'propias': funciones(estadisticas, 2),
+    }
+    try:
+        respuesta['X-Perfil-Id'] = guardar(datos, perfil)
+    except OSError:
+        # Un perfil que no se pudo guardar no debe romper la petición.
+        logger.exception('No se pudo guardar el perfil de %s', request.path)
+    return respuesta
+
+
+def guardar(datos, perfil):
+    """
+    Guarda el resumen (JSON) y las estadísticas completas (.prof, para
+    pstats o snakeviz) y borra los más viejos si hay más de PERFILADOR_MAXIMO.
+    Retorna el nombre del perfil.
+    """
+    carpeta = directorio()
+    carpeta.mkdir(parents=True, exist_ok=True)
+    nombre = f'{timezone.now():%Y%m%d-%H%M%S-%f}-{uuid.uuid4().hex[:8]}'
+    perfil.dump_stats(carpeta / f'{nombre}.prof')
+    temporal = carpeta / f'{nombre}.json.tmp'
+    with open(temporal, 'w', encoding='utf-8') as archivo:
+        json.dump(datos, archivo, ensure_ascii=False)
+    # El listado solo ve perfiles completos.
+    os.replace(temporal, carpeta / f'{nombre}.json')
+    rotar(carpeta)
+    return nombre
+
+
+def rotar(carpeta):
+    maximo = getattr(settings, 'PERFILADOR_MAXIMO', 200)
+    guardados = sorted(carpeta.glob('*.json'))
+    for viejo in guardados[:max(0, len(guardados) - maximo)]:
+        # missing_ok: otro proceso pudo rotarlo primero.
+        viejo.unlink(missing_ok=True)
+        viejo.with_suffix('.prof').unlink(missing_ok=True)
+
+
+def ruta(nombre, extension='json'):
+    """Archivo de un perfil, o None si el nombre no es válido."""
+    if not NOMBRE.match(nombre):
+        return None
+    return directorio() / f'{nombre}.{extension}'
+
+
+def cargar(nombre):
+    archivo = ruta(nombre)
+    if archivo is None:
+        return None
+    try:
+        with open(archivo, encoding='utf-8') as entrada:
+            return {**json.load(entrada), 'nombre': nombre}
+    except (OSError, ValueError):
+        return None
+
+
+def recientes(cantidad=50):
+    """Los últimos perfiles guardados, del más reciente al más viejo, sin el detalle."""
+    carpeta = directorio()
+    if not carpeta.is_dir():
+        return []
+    resultado = []
+    for archivo in sorted(carpeta.glob('*.json'), reverse=True)[:cantidad]:
+        datos = cargar(archivo.stem)
+        if datos is None:
+            continue
+        propias = datos.pop('propias')
+        datos['funcion_principal'] = propias[0] if propias else None
+        del datos['acumuladas']
+        datos['consulta_mas_lenta_ms'] = max(
+            (consulta['duracion_ms'] for consulta in datos.pop('consultas')), default=0,
+        )
+        resultado.append(datos)
+    return resultado
+
+
+def borrar_todos():
+    carpeta = directorio()
+    if not carpeta.is_dir():
+        return 0
+    borrados = 0
+    for archivo in carpeta.glob('*.json'):
+        archivo.unlink(missing_ok=True)
+        archivo.with_suffix('.prof').unlink(missing_ok=True)
+        borrados += 1
+    return borrados
@@ -0,0 +1,134 @@
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from . import auditoria, buscador, estadisticas, stock, trigramas
+from .models import Cliente, MovimientoStock, Producto, Trigrama
+
+
+def estado_previo(instance, campos):
+    """
+    Valores previos de los campos indicados, tomados del estado cargado
+    por CamposModificadosMixin o, si no está disponible, de la base de datos.
+    """
+    originales = instance.valores_originales
+    if originales is not None and all(campo in originales for campo in campos):
+        return {campo: originales[campo] for campo in campos}
+    return type(instance).objects.filter(pk=instance.pk).values(*campos).first()
+
+
+@receiver(pre_save, sender=Cliente)
+def cliente_estado_previo(sender, instance, raw, **kwargs):
+    """Guarda la edad previa del cliente para calcular los deltas del panel."""
+    instance._estado_previo = None
+    if instance.pk and not raw:
+        instance._estado_previo = estado_previo(instance, ['age', 'created_at'])
+
+
+@receiver(post_save, sender=Cliente)
+def cliente_guardado(sender, instance, created, raw, **kwargs):
+    """Actualiza los agregados de clientes tras un alta o una edición."""
+    previo = getattr(instance, '_estado_previo', None)
+    if created:
+        estadisticas.aplicar(estadisticas.deltas_cliente(instance, +1))
+    elif previo is not None:
+        anterior = Cliente(age=previo['age'], created_at=previo['created_at'])
+        estadisticas.aplicar(
+            estadisticas.deltas_cliente(anterior, -1),
+            estadisticas.deltas_cliente(instance, +1),
+        )
+
+
+@receiver(post_delete, sender=Cliente)
+def cliente_borrado(sender, instance, **kwargs):
+    estadisticas.aplicar(estadisticas.deltas_cliente(instance, -1))
+
+
+@receiver(pre_save, sender=Producto)
+def producto_estado_previo(sender, instance, raw, **kwargs):
+    """Guarda precio, stock y estado previos del producto."""
+    instance._estado_previo = None
+    if instance.pk and not raw:
+        instance._estado_previo = estado_previo(instance, ['activo', 'precio', 'stock'])
+
+
+@receiver(post_save, sender=Producto)
+def producto_guardado(sender, instance, created, raw, **kwargs):
+    """Actualiza los agregados de productos tras un alta o una edición."""
+    previo = getattr(instance, '_estado_previo', None)
+    actual = estadisticas.deltas_producto(instance.activo, instance.precio, instance.stock, +1)
+    if created:
+        estadisticas.aplicar(actual)
+    elif previo is not None:
+        estadisticas.aplicar(
+            estadisticas.deltas_producto(previo['activo'], previo['precio'], previo['stock'], -1),
+            actual,
+        )
+
+
+@receiver(post_delete, sender=Producto)
+def producto_borrado(sender, instance, **kwargs):
+    estadisticas.aplicar(
+        estadisticas.deltas_producto(instance.activo, instance.precio, instance.stock, -1)
+    )
+
+
+@receiver(post_save, sender=Producto)
+def producto_movimiento_stock(sender, instance, created, raw, **kwargs):
+    """Registra en el libro de stock el alta del producto o el cambio de stock."""
+    if raw:
+        return
+    previo = getattr(instance, '_estado_previo', None)
+    if created:
+        stock.registrar([stock.movimiento(instance.pk, instance.stock, MovimientoStock.ALTA)])
+    elif previo is not None:
+        stock.registrar([stock.movimiento(instance.pk, instance.stock - previo['stock'], MovimientoStock.EDICION)])
+
+
+@receiver(post_delete, sender=Producto)
+def producto_baja_stock(sender, instance, **kwargs):
+    stock.registrar([stock.movimiento(instance.pk, -instance.stock, MovimientoStock.BAJA)])
+
+
+def actualizar_trigramas(tipo, instance, update_fields):
+    """Reindexa el objeto solo si cambió alguno de sus campos de texto."""
+    if update_fields is None or set(update_fields) & set(trigramas.CAMPOS[tipo]):
+        trigramas.indexar(tipo, instance)
+
+
+@receiver(post_save, sender=Cliente)
+def cliente_trigramas(sender, instance, update_fields, **kwargs):
+    actualizar_trigramas(Trigrama.CLIENTE, instance, update_fields)
+
+
+@receiver(post_delete, sender=Cliente)
+def cliente_trigramas_borrado(sender, instance, **kwargs):
+    trigramas.desindexar(Trigrama.CLIENTE, instance.pk)
+
+
+@receiver(post_save, sender=Producto)
+def producto_trigramas(sender, instance, update_fields, **kwargs):
+    actualizar_trigramas(Trigrama.PRODUCTO, instance, update_fields)
+
+
+@receiver(post_delete, sender=Producto)
+def producto_trigramas_borrado(sender, instance, **kwargs):
+    trigramas.desindexar(Trigrama.PRODUCTO, instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Cliente)
+@receiver([post_save, post_delete], sender=Producto)
+def invalidar_busqueda(sender, **kwargs):
+    buscador.invalidar()
+
+
+@receiver(post_save, sender=Cliente)
+@receiver(post_save, sender=Producto)
+def auditar_guardado(sender, instance, created, raw, **kwargs):
+    if not raw:
+        auditoria.guardado(instance, created)
+
+
+@receiver(post_delete, sender=Cliente)
+@receiver(post_delete, sender=Producto)
+def auditar_borrado(sender, instance, **kwargs):
+    auditoria.borrado(instance)
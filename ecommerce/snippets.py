@@ -0,0 +1,66 @@
+import re
+
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+
+# Largo máximo del extracto guardado en Producto.descripcion_snippet.
+LARGO_SNIPPET = 160
+
+# Caracteres que se muestran antes de la primera coincidencia al resaltar.
+CONTEXTO = 50
+
+
+def snippet(texto, largo=LARGO_SNIPPET):
+    """
+    Comienzo del texto en una sola línea, de a lo sumo `largo` caracteres,
+    cortado entre palabras y terminado en '…' si el texto sigue.
+    """
+    texto = ' '.join((texto or '').split())
+    if len(texto) <= largo:
+        return texto
+    corte = texto[:largo - 1]
+    espacio = corte.rfind(' ')
+    if texto[largo - 1] != ' ' and espacio > largo // 2:
+        corte = corte[:espacio]
+    return corte.rstrip() + '…'
+
+
+def patron_terminos(query):
+    """Expresión que encuentra las palabras de la consulta (sin distinguir mayúsculas) o None."""
+    terminos = sorted({termino for termino in query.lower().split() if len(termino) > 1}, key=len, reverse=True)
+    if not terminos:
+        return None
+    return re.compile('|'.join(re.escape(termino) for termino in terminos), re.IGNORECASE)
+
+
+def resaltar(texto, patron, largo=LARGO_SNIPPET, contexto=CONTEXTO):
+    """
+    Fragmento de `largo` caracteres alrededor de la primera coincidencia de
+    `patron`, escapado y con las coincidencias entre <mark>. None si el
+    texto no contiene ninguna.
+    """
+    texto = ' '.join((texto or '').split())
+    primera = patron.search(texto) if patron else None
+    if primera is None:
+        return None
+    inicio = max(0, primera.start() - contexto)
+    if inicio:
+        # Empieza en una palabra completa.
+        espacio = texto.find(' ', inicio, primera.start())
+        inicio = espacio + 1 if espacio != -1 else inicio
+    fin = min(len(texto), inicio + largo)
+    if fin < len(texto):
+        espacio = texto.rfind(' ', primera.end(), fin)
+        fin = espacio if espacio != -1 else fin
+
+    partes = ['…'] if inicio else []
+    posicion = inicio
+    for coincidencia in patron.finditer(texto, inicio, fin):
+        partes.append(escape(texto[posicion:coincidencia.start()]))
+        partes.append(f'<mark>{escape(coincidencia.group())}</mark>')
+        posicion = coincidencia.end()
+    partes.append(escape(texto[posicion:fin]))
+    if fin < len(texto):
+        partes.append('…')
+    return mark_safe(''.join(partes))
@@ -0,0 +1,201 @@
+import datetime
+
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from . import auditoria
+from .models import MovimientoStock, Producto, SnapshotStock
+
+
+# Productos por transacción al compactar y filas por INSERT al registrar.
+TAMANO_LOTE = 1000
+
+
+def movimiento(producto_id, cantidad, motivo):
+    """Movimiento sin guardar, con el usuario y el origen de la petición en curso."""
+    _, usuario_texto, origen = auditoria.autor()
+    return MovimientoStock(
+        producto_id=producto_id,
+        cantidad=cantidad,
+        motivo=motivo,
+        usuario_texto=usuario_texto,
+        origen=origen,
+    )
+
+
+def registrar(movimientos):
+    """
+    Agrega los movimientos al libro con un INSERT por lote. Los de cantidad
+    cero se omiten. Retorna cuántos se escribieron.
+    """
+    movimientos = [movimiento for movimiento in movimientos if movimiento.cantidad]
+    if movimientos:
+        MovimientoStock.objects.bulk_create(movimientos, batch_size=TAMANO_LOTE)
+    return len(movimientos)
+
+
+def inicio_del_dia(dia):
+    return timezone.make_aware(datetime.datetime.combine(dia, datetime.time.min))
+
+
+def ultimos_cierres(ids):
+    """Último cierre de cada producto, indexado por id (una sola consulta)."""
+    ultima_fecha = (
+        SnapshotStock.objects
+        .filter(producto_id=OuterRef('producto_id'))
+        .order_by('-fecha')
+        .values('fecha')[:1]
+    )
+    cierres = SnapshotStock.objects.filter(producto_id__in=ids, fecha=Subquery(ultima_fecha))
+    return {cierre.producto_id: cierre for cierre in cierres}
+
+
+def stock_en(producto_id, momento):
+    """
+    Stock de un producto en un momento: el último cierre hasta ese día más
+    los movimientos sin compactar hasta el momento. Lee un cierre y la cola
+    de movimientos posteriores, no todo el libro. En los días ya compactados
+    la resolución es diaria (stock al cierre del día).
+    """
+    dia = timezone.localdate(momento)
+    cierre = SnapshotStock.objects.filter(producto_id=producto_id, fecha__lte=dia).order_by('-fecha').first()
+    movimientos = MovimientoStock.objects.filter(producto_id=producto_id, fecha__lte=momento)
+    if cierre is not None:
+        movimientos = movimientos.filter(fecha__gte=inicio_del_dia(cierre.fecha + datetime.timedelta(days=1)))
+    total = movimientos.aggregate(total=Sum('cantidad'))['total'] or 0
+    return (cierre.stock if cierre else 0) + total
+
+
+def historial(producto_id, desde=None):
+    """
+    Historia del stock de un producto, de la más antigua a la más reciente:
+    un dict por cierre diario compactado y uno por movimiento posterior,
+    con fecha, cantidad, stock resultante y motivo ('cierre' en los cierres).
+    """
+    cierres = list(SnapshotStock.objects.filter(producto_id=producto_id).order_by('fecha'))
+    entradas = []
+    stock = 0
+    for cierre in cierres:
+        entradas.append({
+            'fecha': inicio_del_dia(cierre.fecha),
+            'cantidad': cierre.stock - stock,
+            'stock': cierre.stock,
+            'motivo': 'cierre',
+        })
+        stock = cierre.stock
+
+    movimientos = MovimientoStock.objects.filter(producto_id=producto_id).order_by('fecha', 'pk')
+    if cierres:
+        movimientos = movimientos.filter(fecha__gte=inicio_del_dia(cierres[-1].fecha + datetime.timedelta(days=1)))
+    for fila in movimientos.values('fecha', 'cantidad', 'motivo'):
+        stock += fila['cantidad']
+        entradas.append({**fila, 'stock': stock})
+
+    if desde is not None:
+        entradas = [entrada for entrada in entradas if entrada['fecha'] >= desde]
+    return entradas
+
+
+def compactar_lote(ids, corte):
+    """
+    Compacta en cierres diarios los movimientos anteriores a `corte` de los
+    productos indicados. Retorna (cierres creados, movimientos compactados).
+    """
+    with transaction.atomic():
+        viejos = MovimientoStock.objects.filter(producto_id__in=ids, fecha__lt=corte)
+        diarios = (
+            viejos
+            .annotate(dia=TruncDate('fecha'))
+            .values('producto_id', 'dia')
+            .annotate(total=Sum('cantidad'), movimientos=Count('id'))
+            .order_by('producto_id', 'dia')
+        )
+        ultimos = ultimos_cierres(ids)
+        saldos = {producto_id: cierre.stock for producto_id, cierre in ultimos.items()}
+        nuevos = []
+        tardios = []
+        compactados = 0
+        for fila in diarios:
+            producto_id, dia = fila['producto_id'], fila['dia']
+            compactados += fila['movimientos']
+            ultimo = ultimos.get(producto_id)
+            if ultimo is not None and dia <= ultimo.fecha:
+                tardios.append(fila)
+                continue
+            saldos[producto_id] = saldos.get(producto_id, 0) + fila['total']
+            nuevos.append(SnapshotStock(
+                producto_id=producto_id, fecha=dia, stock=saldos[producto_id], movimientos=fila['movimientos'],
+            ))
+        SnapshotStock.objects.bulk_create(nuevos)
+
+        # Movimientos escritos después de compactar su día (transacciones
+        # largas): se suman a ese cierre y a todos los posteriores.
+        for fila in tardios:
+            producto_id, dia = fila['producto_id'], fila['dia']
+            if not SnapshotStock.objects.filter(producto_id=producto_id, fecha=dia).exists():
+                anterior = (
+                    SnapshotStock.objects.filter(producto_id=producto_id, fecha__lt=dia)
+                    .order_by('-fecha').values_list('stock', flat=True).first()
+                )
+                SnapshotStock.objects.create(producto_id=producto_id, fecha=dia, stock=anterior or 0)
+            SnapshotStock.objects.filter(producto_id=producto_id, fecha__gte=dia).update(stock=F('stock') + fila['total'])
+            SnapshotStock.objects.filter(producto_id=producto_id, fecha=dia).update(
+                movimientos=F('movimientos') + fila['movimientos'],
+            )
+        # Sin señales ni relaciones que apunten a los movimientos, delete() es un único DELETE.
+        viejos.delete()
+    return len(nuevos), compactados
+
+
+def compactar(antes_de, lote=TAMANO_LOTE):
+    """
+    Compacta los movimientos anteriores al día `antes_de` en un cierre por
+    producto y día, en transacciones de `lote` productos.
+    Retorna (cierres creados, movimientos compactados).
+    """
+    corte = inicio_del_dia(antes_de)
+    ids = list(
+        MovimientoStock.objects.filter(fecha__lt=corte)
+        .order_by('producto_id')
+        .values_list('producto_id', flat=True)
+        .distinct()
+    )
+    cierres = compactados = 0
+    for inicio in range(0, len(ids), lote):
+        creados, movimientos = compactar_lote(ids[inicio:inicio + lote], corte)
+        cierres += creados
+        compactados += movimientos
+    return cierres, compactados
+
+
+def descuadres(lote=TAMANO_LOTE):
+    """
+    Productos cuyo stock no coincide con el libro (último cierre más los
+    movimientos sin compactar), como [(id, stock, stock según el libro)].
+    Los productos borrados deben tener saldo cero.
+    """
+    resultado = []
+    ids = sorted(
+        set(Producto.objects.values_list('pk', flat=True))
+        | set(MovimientoStock.objects.values_list('producto_id', flat=True).distinct())
+        | set(SnapshotStock.objects.values_list('producto_id', flat=True).distinct())
+    )
+    for inicio in range(0, len(ids), lote):
+        grupo = ids[inicio:inicio + lote]
+        stocks = dict(Producto.objects.filter(pk__in=grupo).values_list('pk', 'stock'))
+        saldos = {producto_id: cierre.stock for producto_id, cierre in ultimos_cierres(grupo).items()}
+        cola = (
+            MovimientoStock.objects.filter(producto_id__in=grupo)
+            .values('producto_id')
+            .annotate(total=Sum('cantidad'))
+            .order_by()
+        )
+        for fila in cola:
+            saldos[fila['producto_id']] = saldos.get(fila['producto_id'], 0) + fila['total']
+        for producto_id in grupo:
+            esperado = stocks.get(producto_id, 0)
+            if saldos.get(producto_id, 0) != esperado:
+                resultado.append((producto_id, esperado, saldos.get(producto_id, 0)))
+    return resultado
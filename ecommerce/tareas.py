@@ -0,0 +1,30 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import send_mail
+from django.utils import timezone
+
+from cola_tareas.registro import tarea
+from . import stock
+from .models import Cliente
+
+
+@tarea(max_intentos=5)
+def notificar_cliente_vip(cliente_id):
+    """Envía al cliente el correo de bienvenida al programa VIP."""
+    cliente = Cliente.objects.filter(pk=cliente_id).first()
+    if cliente is None or not cliente.es_vip:
+        return
+    send_mail(
+        'Bienvenido/a al programa VIP',
+        f'Hola {cliente.name}, ya formas parte de nuestros clientes VIP.',
+        settings.DEFAULT_FROM_EMAIL,
+        [cliente.email],
+    )
+
+
+@tarea(max_intentos=1, concurrencia=1, cada=24 * 3600)
+def compactar_stock():
+    """Compacta en cierres diarios los movimientos de stock más viejos que STOCK_RETENCION_DIAS."""
+    dias = getattr(settings, 'STOCK_RETENCION_DIAS', 90)
+    stock.compactar(timezone.localdate() - timedelta(days=dias))
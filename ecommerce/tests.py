@@ -1,3 +1,1523 @@
-from django.test import TestCase
+import json
+import math
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from unittest import mock
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import caches
+from django.contrib import admin
+from django.core.management import call_command
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, IntegrityError, connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from main_usuarios.models import UsuarioSistema
+from . import (
+    archivo, auditoria, buscador, cache_escalonado, carga, duplicados, estadisticas, limite_tasa, operaciones, perfilador,
+    snippets, stock, trigramas, views,
+)
+from .api import ClienteApiMixin
+from .management.commands.bench_carga import ESCENARIO_BASICO
+from .admin_rapido import ConteoEstimadoPaginator
+from .mixins import ConflictoVersion
+from .models import (
+    Agregado, Cliente, ClienteArchivado, MovimientoStock, Producto, RegistroAuditoria, SnapshotStock, Trigrama,
+)
+
+
+@contextmanager
+def registrar_sql():
+    """Registra todas las sentencias SQL ejecutadas, incluso dentro de requests."""
+    sentencias = []
+
+    def wrapper(execute, sql, params, many, context):
+        sentencias.append(sql)
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(wrapper):
+        yield sentencias
+
+
+def columnas_actualizadas(sentencias, tabla):
+    """Devuelve, para cada UPDATE sobre la tabla, la lista de columnas asignadas."""
+    return [
+        re.findall(r'"(\w+)" = ', sql.split(' SET ', 1)[1].split(' WHERE ', 1)[0])
+        for sql in sentencias if sql.startswith(f'UPDATE "{tabla}"')
+    ]
+
+
+def agregados_panel():
+    """Agregados del panel distintos de cero, indexados por (grupo, clave)."""
+    filas = Agregado.objects.exclude(grupo=estadisticas.GRUPO_SESIONES).exclude(valor=0)
+    return {(fila.grupo, fila.clave): fila.valor for fila in filas}
+
+
+class EstadisticasTests(TestCase):
+    """Verifica que los agregados incrementales coincidan con una reconstrucción completa."""
+
+    def test_incrementales_coinciden_con_recalcular(self):
+        ana = Cliente.objects.create(name='Ana Pérez', age=40, email='ana@mail.com')
+        luis = Cliente.objects.create(name='Luis Gómez', age=41, email='luis@mail.com')
+        marta = Cliente.objects.create(name='Marta Ruiz', age=25, email='marta@mail.com')
+        camara = Producto.objects.create(nombre='Cámara', precio=Decimal('100.00'), stock=5)
+        lente = Producto.objects.create(nombre='Lente', precio=Decimal('40.50'), stock=2)
+
+        # Ana cruza el umbral VIP (40 no lo es) y Luis deja de serlo.
+        ana.age = 41
+        ana.save()
+        luis.age = 39
+        luis.save()
+        Cliente.objects.get(pk=marta.pk).delete()
+        camara.precio = Decimal('120.00')
+        camara.stock = 3
+        camara.save()
+        lente.activo = False
+        lente.save()
+        Producto.objects.create(nombre='Trípode', precio=Decimal('10.00'), stock=1).delete()
+
+        incrementales = agregados_panel()
+        self.assertEqual(incrementales[(estadisticas.GRUPO_CLIENTES, 'total')], 2)
+        self.assertEqual(incrementales[(estadisticas.GRUPO_CLIENTES, 'vip')], 1)
+        self.assertEqual(incrementales[(estadisticas.GRUPO_PRODUCTOS, 'valor_stock')], Decimal('441.00'))
+
+        call_command('recalcular_estadisticas', stdout=open(os.devnull, 'w'))
+        self.assertEqual(agregados_panel(), incrementales)
+
+    def test_panel_con_consultas_constantes(self):
+        usuario = UsuarioSistema.objects.create_user(email='panel@mail.com', password='clave123', username='panel')
+        self.client.force_login(usuario)
+        Cliente.objects.create(name='Ana Pérez', age=45, email='ana@mail.com')
+        with self.assertNumQueries(1):
+            resumen = estadisticas.obtener_resumen()
+        self.assertEqual((resumen['total_clientes'], resumen['clientes_vip']), (1, 1))
+
+        with registrar_sql() as pocos:
+            self.client.get(reverse('estadisticas'))
+        Cliente.objects.bulk_create(
+            Cliente(name=f'Cliente {numero}', age=20 + numero, email=f'c{numero}@mail.com') for numero in range(50)
+        )
+        with self.assertNumQueries(len(pocos)):
+            respuesta = self.client.get(reverse('estadisticas'))
+        self.assertEqual(respuesta.status_code, 200)
+
+
+class SegmentacionVipTests(TestCase):
+    """Verifica el umbral VIP (edad mayor a CLIENTE_EDAD_VIP) en consultas y en el admin."""
+
+    def setUp(self):
+        self.cuarenta = Cliente.objects.create(name='Ana Pérez', age=40, email='ana@mail.com')
+        self.cuarenta_y_uno = Cliente.objects.create(name='Luis Gómez', age=41, email='luis@mail.com')
+
+    def test_umbral_exclusivo(self):
+        self.assertEqual(list(Cliente.objects.vip()), [self.cuarenta_y_uno])
+        self.assertEqual(list(Cliente.objects.non_vip()), [self.cuarenta])
+        anotados = dict(Cliente.objects.anotar_vip().values_list('age', 'is_vip'))
+        self.assertEqual(anotados, {40: False, 41: True})
+        self.assertEqual([self.cuarenta.es_vip, self.cuarenta_y_uno.es_vip], [False, True])
+
+    @override_settings(CLIENTE_EDAD_VIP=39)
+    def test_umbral_configurable(self):
+        self.assertEqual(Cliente.objects.vip().count(), 2)
+        self.assertTrue(self.cuarenta.es_vip)
+
+    def test_filtro_del_admin(self):
+        staff = UsuarioSistema.objects.create_superuser(email='admin@mail.com', password='clave123', username='admin')
+        self.client.force_login(staff)
+        url = reverse('admin:ecommerce_cliente_changelist')
+        for valor, esperado in (('si', [self.cuarenta_y_uno.pk]), ('no', [self.cuarenta.pk])):
+            respuesta = self.client.get(url, {'vip': valor})
+            self.assertEqual([cliente.pk for cliente in respuesta.context['cl'].result_list], esperado)
+        respuesta = self.client.get(url)
+        self.assertEqual(len(respuesta.context['cl'].result_list), 2)
+
+
+class OperacionesMasivasTests(TestCase):
+    """Verifica los ajustes masivos de productos por lotes, el comando y las acciones del admin."""
+
+    def setUp(self):
+        self.productos = [
+            Producto.objects.create(nombre=f'Producto {numero}', precio=Decimal('10.00'), stock=numero)
+            for numero in range(5)
+        ]
+
+    def test_actualizar_en_lotes_un_update_por_lote(self):
+        with registrar_sql() as sentencias, self.captureOnCommitCallbacks(execute=True):
+            total = operaciones.actualizar_en_lotes(Producto.objects.all(), {'activo': False}, lote=2)
+
+        self.assertEqual(total, 5)
+        self.assertEqual(len(columnas_actualizadas(sentencias, 'ecommerce_producto')), 3)
+        self.assertEqual(set(Producto.objects.values_list('activo', 'version')), {(False, 2)})
+        self.assertEqual(agregados_panel()[(estadisticas.GRUPO_PRODUCTOS, 'inactivos')], 5)
+        masivo = RegistroAuditoria.objects.get(accion=RegistroAuditoria.MASIVO)
+        self.assertEqual(masivo.cambios['productos'], 5)
+
+    def test_stock_no_baja_de_cero_y_queda_en_el_libro(self):
+        total = operaciones.ajustar_stock(Producto.objects.all(), -3, lote=2)
+
+        self.assertEqual(total, 5)
+        self.assertEqual(list(Producto.objects.order_by('pk').values_list('stock', flat=True)), [0, 0, 0, 0, 1])
+        masivos = MovimientoStock.objects.filter(motivo=MovimientoStock.MASIVO)
+        self.assertEqual(sorted(masivos.values_list('cantidad', flat=True)), [-3, -3, -2, -1])
+        for producto in self.productos:
+            self.assertEqual(stock.stock_en(producto.pk, timezone.now()), Producto.objects.get(pk=producto.pk).stock)
+
+    def test_precio_por_porcentaje_y_monto(self):
+        operaciones.ajustar_precio_porcentaje(Producto.objects.filter(pk=self.productos[0].pk), Decimal('15'))
+        operaciones.ajustar_precio_monto(Producto.objects.filter(pk=self.productos[1].pk), Decimal('-25'))
+        precios = dict(Producto.objects.values_list('pk', 'precio'))
+        self.assertEqual(precios[self.productos[0].pk], Decimal('11.50'))
+        self.assertEqual(precios[self.productos[1].pk], Decimal('0'))
+
+    def test_comando_ajustar_productos(self):
+        salida = StringIO()
+        call_command('ajustar_productos', '--stock', '10', '--stock-menor', '2', '--dry-run', stdout=salida)
+        self.assertIn('Productos afectados: 2', salida.getvalue())
+        self.assertEqual(Producto.objects.filter(stock__gte=10).count(), 0)
+
+        salida = StringIO()
+        call_command('ajustar_productos', '--stock', '10', '--stock-menor', '2', '--lote', '1', stdout=salida)
+        self.assertIn('Se actualizaron 2 productos', salida.getvalue())
+        self.assertEqual(sorted(Producto.objects.values_list('stock', flat=True)), [2, 3, 4, 10, 11])
+
+        Producto.objects.filter(pk=self.productos[0].pk).update(activo=False)
+        salida = StringIO()
+        call_command('ajustar_productos', '--desactivar', stdout=salida)
+        self.assertIn('Productos afectados: 4', salida.getvalue())
+        self.assertFalse(Producto.objects.filter(activo=True).exists())
+
+    def test_acciones_de_estado_piden_confirmacion(self):
+        staff = UsuarioSistema.objects.create_superuser(email='admin@mail.com', password='clave123', username='admin')
+        self.client.force_login(staff)
+        Producto.objects.filter(pk=self.productos[0].pk).update(activo=False)
+        url = reverse('admin:ecommerce_producto_changelist')
+        datos = {'action': 'desactivar_productos', '_selected_action': [p.pk for p in self.productos[:3]]}
+
+        respuesta = self.client.post(url, datos)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual((respuesta.context['cantidad'], respuesta.context['seleccionados']), (2, 3))
+        self.assertEqual(Producto.objects.filter(activo=False).count(), 1)
+
+        respuesta = self.client.post(url, {**datos, 'aplicar': '1'})
+        self.assertRedirects(respuesta, url)
+        self.assertEqual(Producto.objects.filter(activo=False).count(), 3)
+
+        respuesta = self.client.post(url, {**datos, 'action': 'ajuste_masivo'})
+        self.assertContains(respuesta, 'value="ajuste_masivo"')
+        self.assertEqual(respuesta.context['cantidad'], 3)
+
+
+class AdminRapidoTests(TestCase):
+    """Verifica la paginación acotada con continuación por clave y la búsqueda del changelist."""
+
+    def setUp(self):
+        staff = UsuarioSistema.objects.create_superuser(email='admin@mail.com', password='clave123', username='admin')
+        self.client.force_login(staff)
+        nombres = ['De La Torre', 'de la Fuente', 'Delia Ruiz', 'Ana Pérez', 'Luis Gómez', 'Marta Díaz', 'Juan Sosa']
+        for numero, nombre in enumerate(nombres):
+            Cliente.objects.create(name=nombre, age=20 + numero % 3, email=f'c{numero}@mail.com')
+        self.url = reverse('admin:ecommerce_cliente_changelist')
+        # Dos filas por página y conteo exacto hasta 4 filas: solo 2 páginas numeradas.
+        self.enterContext(mock.patch.object(ConteoEstimadoPaginator, 'limite', 4))
+        self.enterContext(mock.patch.object(admin.site._registry[Cliente], 'list_per_page', 2))
+
+    def recorrer(self, parametros):
+        """Sigue las páginas numeradas y luego los enlaces "Siguiente"; retorna los ids vistos."""
+        respuesta = self.client.get(self.url, parametros)
+        listado = respuesta.context['cl']
+        self.assertEqual(listado.paginator.num_pages, 2)
+        vistos = [cliente.pk for cliente in listado.result_list]
+        respuesta = self.client.get(self.url, {**parametros, 'p': 2})
+        while True:
+            listado = respuesta.context['cl']
+            vistos += [cliente.pk for cliente in listado.result_list]
+            if not listado.pagina_siguiente:
+                return vistos
+            respuesta = self.client.get(self.url + listado.pagina_siguiente)
+            self.assertContains(respuesta, 'Primera página')
+
+    def test_todas_las_filas_accesibles_pasado_el_limite(self):
+        esperado = list(Cliente.objects.order_by('-created_at', '-pk').values_list('pk', flat=True))
+        self.assertEqual(self.recorrer({}), esperado)
+
+    def test_continuacion_respeta_orden_y_filtros(self):
+        esperado = list(Cliente.objects.order_by('age', '-created_at', '-pk').values_list('pk', flat=True))
+        self.assertEqual(self.recorrer({'o': '2'}), esperado)
+
+        Cliente.objects.create(name='Otro', age=41, email='otro@mail.com')
+        Cliente.objects.create(name='Otra', age=50, email='otra@mail.com')
+        respuesta = self.client.get(self.url, {'vip': 'no', 'p': 2})
+        filtrados = [cliente.pk for cliente in respuesta.context['cl'].result_list]
+        respuesta = self.client.get(self.url + respuesta.context['cl'].pagina_siguiente)
+        self.assertEqual(respuesta.context['cl'].get_query_string({'p': 1}), '?p=1&vip=no')
+        filtrados += [cliente.pk for cliente in respuesta.context['cl'].result_list]
+        self.assertFalse(Cliente.objects.filter(pk__in=filtrados, age__gt=40).exists())
+
+    def test_cursor_invalido(self):
+        respuesta = self.client.get(self.url, {'despues': 'no-es-json'})
+        self.assertRedirects(respuesta, self.url + '?e=1')
+
+    def test_busqueda_por_prefijo_sin_mayusculas(self):
+        for termino in ('dE lA', 'DE LA', 'de la'):
+            respuesta = self.client.get(self.url, {'q': termino})
+            nombres = sorted(cliente.name for cliente in respuesta.context['cl'].result_list)
+            self.assertEqual(nombres, ['De La Torre', 'de la Fuente'])
+        respuesta = self.client.get(self.url, {'q': 'C3@MAIL.COM'})
+        self.assertEqual([cliente.name for cliente in respuesta.context['cl'].result_list], ['Ana Pérez'])
+
+        # Rango sobre LOWER(name), que resuelve el índice cliente_name_lower_idx.
+        resultado, _ = admin.site._registry[Cliente].get_search_results(None, Cliente.objects.all(), 'De')
+        self.assertIn('LOWER("ecommerce_cliente"."name") >= de', str(resultado.query))
+
+
+class CamposModificadosTests(TestCase):
+    """Verifica que los guardados escriban solo las columnas modificadas."""
+
+    def setUp(self):
+        self.cliente = Cliente.objects.create(name='Ana Pérez', age=30, email='ana@mail.com')
+        self.producto = Producto.objects.create(nombre='Cámara', precio=Decimal('100.00'), stock=5)
+
+    def test_actualizar_email_escribe_solo_email_updated_at_y_version(self):
+        cliente = Cliente.objects.get(pk=self.cliente.pk)
+        with registrar_sql() as sentencias:
+            cliente.actualizar_email('ana.perez@mail.com')
+
+        self.assertEqual(
+            columnas_actualizadas(sentencias, 'ecommerce_cliente'),
+            [['email', 'updated_at', 'version']],
+        )
+
+    def test_guardar_sin_cambios_no_escribe(self):
+        cliente = Cliente.objects.get(pk=self.cliente.pk)
+        cliente.name = 'Ana Pérez'
+        with registrar_sql() as sentencias:
+            cliente.save()
+        self.assertEqual(sentencias, [])
+
+    def test_guardar_tras_create_sin_cambios_no_escribe(self):
+        with registrar_sql() as sentencias:
+            self.producto.save()
+        self.assertEqual(sentencias, [])
+
+    def test_producto_escribe_solo_stock(self):
+        producto = Producto.objects.get(pk=self.producto.pk)
+        producto.precio = Decimal('100')
+        producto.stock = 8
+        with registrar_sql() as sentencias:
+            producto.save()
+
+        self.assertEqual(columnas_actualizadas(sentencias, 'ecommerce_producto'), [['stock', 'version']])
+        producto.refresh_from_db()
+        self.assertEqual(producto.stock, 8)
+
+    def test_campo_diferido_cargado_luego_se_detecta(self):
+        producto = Producto.objects.defer('descripcion').get(pk=self.producto.pk)
+        producto.descripcion = 'Nueva descripción'
+        with registrar_sql() as sentencias:
+            producto.save()
+
+        self.assertEqual(
+            columnas_actualizadas(sentencias, 'ecommerce_producto'),
+            [['descripcion', 'descripcion_snippet', 'version']],
+        )
+
+    def test_update_view_escribe_solo_campos_editados(self):
+        usuario = UsuarioSistema.objects.create_user(email='staff@mail.com', password='clave123', username='staff')
+        self.client.force_login(usuario)
+        url = reverse('editar_cliente', args=[self.cliente.pk])
+        with registrar_sql() as sentencias:
+            respuesta = self.client.post(url, {'name': 'Ana Pérez', 'age': 45, 'email': 'ana@mail.com', 'version': 1})
+
+        self.assertRedirects(respuesta, reverse('listar_clientes'))
+        self.assertEqual(
+            columnas_actualizadas(sentencias, 'ecommerce_cliente'),
+            [['age', 'updated_at', 'version']],
+        )
+
+
+class VersionOptimistaTests(TransactionTestCase):
+    """Verifica que dos ediciones concurrentes no se pisen."""
+
+    def setUp(self):
+        self.cliente = Cliente.objects.create(name='Ana Pérez', age=30, email='ana@mail.com')
+
+    def test_guardados_concurrentes_uno_gana_y_otro_falla(self):
+        barrera = threading.Barrier(2)
+        resultados = {}
+
+        def editar(nombre, campo, valor):
+            try:
+                cliente = Cliente.objects.get(pk=self.cliente.pk)
+                # Ambos hilos cargan la misma versión antes de guardar.
+                barrera.wait(timeout=5)
+                setattr(cliente, campo, valor)
+                try:
+                    cliente.save()
+                    resultados[nombre] = 'guardado'
+                except ConflictoVersion:
+                    resultados[nombre] = 'conflicto'
+            finally:
+                connection.close()
+
+        hilos = [
+            threading.Thread(target=editar, args=('edad', 'age', 45)),
+            threading.Thread(target=editar, args=('nombre', 'name', 'Ana María Pérez')),
+        ]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        self.assertEqual(sorted(resultados.values()), ['conflicto', 'guardado'])
+        cliente = Cliente.objects.get(pk=self.cliente.pk)
+        self.assertEqual(cliente.version, 2)
+        ganador = next(nombre for nombre, resultado in resultados.items() if resultado == 'guardado')
+        if ganador == 'edad':
+            self.assertEqual((cliente.age, cliente.name), (45, 'Ana Pérez'))
+        else:
+            self.assertEqual((cliente.age, cliente.name), (30, 'Ana María Pérez'))
+
+    def test_update_view_con_version_vieja_muestra_conflicto(self):
+        usuario = UsuarioSistema.objects.create_user(email='staff@mail.com', password='clave123', username='staff')
+        self.client.force_login(usuario)
+        url = reverse('editar_cliente', args=[self.cliente.pk])
+        # Otro usuario guarda después de que se abrió el formulario (versión 1).
+        otro = Cliente.objects.get(pk=self.cliente.pk)
+        otro.age = 50
+        otro.save()
+
+        respuesta = self.client.post(url, {'name': 'Ana Pérez', 'age': 45, 'email': 'ana@mail.com', 'version': 1})
+
+        self.assertEqual(respuesta.status_code, 409)
+        self.assertContains(respuesta, 'Otro usuario modificó este cliente', status_code=409)
+        self.assertEqual(respuesta.context['form']['version'].value(), 2)
+        cliente = Cliente.objects.get(pk=self.cliente.pk)
+        self.assertEqual((cliente.age, cliente.version), (50, 2))
+
+
+class LibroStockTests(TestCase):
+    """Verifica el libro de movimientos de stock y su compactación en cierres diarios."""
+
+    def setUp(self):
+        self.producto = Producto.objects.create(nombre='Cámara', precio=Decimal('100.00'), stock=5)
+
+    def test_cada_cambio_de_stock_queda_en_el_libro(self):
+        producto = Producto.objects.get(pk=self.producto.pk)
+        producto.stock = 8
+        producto.save()
+        operaciones.ajustar_stock(Producto.objects.filter(pk=producto.pk), -10)
+
+        self.assertEqual(
+            list(MovimientoStock.objects.order_by('pk').values_list('cantidad', 'motivo')),
+            [(5, MovimientoStock.ALTA), (3, MovimientoStock.EDICION), (-8, MovimientoStock.MASIVO)],
+        )
+        self.assertEqual(stock.descuadres(), [])
+
+    def test_compactar_conserva_el_stock_en_cada_momento(self):
+        MovimientoStock.objects.all().delete()
+        ahora = timezone.now()
+        for dias, cantidad in ((10, 5), (10, 2), (8, -3), (1, 4)):
+            MovimientoStock.objects.create(
+                producto_id=self.producto.pk, cantidad=cantidad, motivo=MovimientoStock.EDICION,
+                fecha=ahora - timedelta(days=dias),
+            )
+        momentos = [ahora - timedelta(days=dias) for dias in (9, 7, 0)]
+        antes = [stock.stock_en(self.producto.pk, momento) for momento in momentos]
+        self.assertEqual(antes, [7, 4, 8])
+
+        with registrar_sql() as sentencias:
+            cierres, compactados = stock.compactar(timezone.localdate(ahora) - timedelta(days=5))
+
+        self.assertEqual((cierres, compactados), (2, 3))
+        borrados = [sql for sql in sentencias if 'ecommerce_movimientostock' in sql and 'DELETE' in sql]
+        self.assertEqual(len(borrados), 1)
+        self.assertFalse([sql for sql in sentencias if sql.startswith('SELECT "ecommerce_movimientostock"."id"')])
+        self.assertEqual(MovimientoStock.objects.count(), 1)
+        self.assertEqual(list(SnapshotStock.objects.order_by('fecha').values_list('stock', flat=True)), [7, 4])
+        with self.assertNumQueries(2):
+            self.assertEqual(stock.stock_en(self.producto.pk, momentos[-1]), 8)
+        self.assertEqual([stock.stock_en(self.producto.pk, momento) for momento in momentos], antes)
+        self.assertEqual([entrada['stock'] for entrada in stock.historial(self.producto.pk)], [7, 4, 8])
+
+
+class DuplicadosTests(TestCase):
+    """Verifica la detección de clientes duplicados y su fusión desde el admin."""
+
+    def setUp(self):
+        self.original = Cliente.objects.create(name='Valeria González', age=30, email='valeria.gonzalez@gmail.com')
+        self.variante = Cliente.objects.create(name='Baleria Gonsales', age=31, email='valeriagonzalez+promo@googlemail.com')
+        self.homonimo = Cliente.objects.create(name='Juan Pérez', age=40, email='juan.perez1@mail.com')
+        self.otro = Cliente.objects.create(name='Juan Pérez', age=40, email='juan.perez2@mail.com')
+
+    def test_encuentra_variantes_y_no_cuentas_distintas(self):
+        self.assertEqual(duplicados.clave_nombre('Valeria González'), duplicados.clave_nombre('Baleria Gonsales'))
+        for procesos in (1, 2):
+            pares = duplicados.buscar_pares(duplicados.cargar_registros(), procesos=procesos, tamano=2)
+            self.assertEqual(list(pares), [(self.original.pk, self.variante.pk)])
+        self.assertEqual(duplicados.agrupar(pares), [[self.original.pk, self.variante.pk]])
+        # Con varios procesos la transacción en curso sigue abierta y usable.
+        self.assertTrue(connection.in_atomic_block)
+        self.assertFalse(connection.needs_rollback)
+        self.assertEqual(Cliente.objects.count(), 4)
+
+    def test_accion_fusionar_conserva_el_elegido(self):
+        usuario = UsuarioSistema.objects.create_superuser(email='admin@mail.com', password='clave123', username='admin')
+        self.client.force_login(usuario)
+        url = reverse('admin:ecommerce_cliente_changelist')
+        datos = {'action': 'fusionar_clientes', '_selected_action': [self.original.pk, self.variante.pk]}
+
+        confirmacion = self.client.post(url, datos)
+        self.assertContains(confirmacion, 'Elija el cliente que se conserva')
+        self.assertEqual(Cliente.objects.count(), 4)
+
+        respuesta = self.client.post(url, {**datos, 'conservar': self.original.pk})
+        self.assertRedirects(respuesta, url)
+        self.assertFalse(Cliente.objects.filter(pk=self.variante.pk).exists())
+        self.assertTrue(Cliente.objects.filter(pk=self.original.pk).exists())
+
+
+class SnippetsTests(TestCase):
+    """Verifica el extracto de la descripción y su uso en los listados y la búsqueda."""
+
+    def setUp(self):
+        relleno = 'Producto de primera calidad con garantía oficial. ' * 8
+        self.producto = Producto.objects.create(
+            nombre='Taladro', precio=Decimal('100'), descripcion=relleno + 'Incluye maletín y brocas de acero.',
+        )
+
+    def test_extracto_se_mantiene_al_guardar_y_con_el_comando(self):
+        self.assertLessEqual(len(self.producto.descripcion_snippet), snippets.LARGO_SNIPPET)
+        self.assertTrue(self.producto.descripcion_snippet.endswith('…'))
+
+        self.producto.descripcion = 'Taladro percutor'
+        self.producto.save(update_fields=['descripcion'])
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.descripcion_snippet, 'Taladro percutor')
+
+        Producto.objects.update(descripcion_snippet='')
+        call_command('reconstruir_snippets', stdout=open(os.devnull, 'w'))
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.descripcion_snippet, 'Taladro percutor')
+
+    def test_busqueda_difiere_descripcion_y_resalta_la_pagina(self):
+        usuario = UsuarioSistema.objects.create_user(email='vendedor@mail.com', password='clave123', username='vendedor')
+        self.client.force_login(usuario)
+        with registrar_sql() as sentencias:
+            respuesta = self.client.get(reverse('busqueda'), {'q': 'brocas', 'tipo': 'productos'})
+        self.assertContains(respuesta, '<mark>brocas</mark>')
+        listado = [sql for sql in sentencias if 'LIKE' in sql and 'ecommerce_producto' in sql]
+        self.assertEqual(len(listado), 1)
+        self.assertNotIn('"descripcion",', listado[0].split(' FROM ', 1)[0])
+
+
+class CachePaginasTests(TestCase):
+    """Verifica el cache de páginas para anónimos y el fragmento cacheado de la navegación."""
+
+    def setUp(self):
+        caches['default'].clear()
+        self.ana = UsuarioSistema.objects.create_user(email='ana@mail.com', password='clave123', username='ana')
+        self.render = self.enterContext(mock.patch('ecommerce.views.render', wraps=views.render))
+
+    def test_anonimo_recibe_la_pagina_cacheada(self):
+        primera = self.client.get(reverse('home'))
+        segunda = self.client.get(reverse('home'))
+        self.assertEqual(self.render.call_count, 1)
+        self.assertEqual(segunda.content, primera.content)
+        self.assertContains(segunda, 'Iniciar Sesión')
+
+        # Con parámetros la página no se cachea.
+        self.client.get(reverse('home'), {'origen': 'correo'})
+        self.assertEqual(self.render.call_count, 2)
+
+    def test_autenticado_nunca_recibe_la_pagina_anonima(self):
+        self.client.get(reverse('home'))
+        respuesta = self.client.post(reverse('login'), {'email': 'ana@mail.com', 'password': 'clave123'}, follow=True)
+        self.assertContains(respuesta, 'Cerrar Sesión')
+        self.assertContains(respuesta, 'ana@mail.com')
+        self.assertNotContains(respuesta, 'Iniciar Sesión')
+        self.assertEqual(self.render.call_count, 2)
+
+        # La página de un autenticado tampoco queda en el cache de anónimos.
+        caches['default'].clear()
+        self.client.get(reverse('home'))
+        self.client.logout()
+        anonima = self.client.get(reverse('home'))
+        self.assertNotContains(anonima, 'ana@mail.com')
+        self.assertContains(anonima, 'Iniciar Sesión')
+
+    def test_navegacion_cambia_con_la_sesion_y_el_avatar(self):
+        self.client.force_login(self.ana)
+        self.assertContains(self.client.get(reverse('home')), 'ana@mail.com')
+
+        # La despedida es un mensaje pendiente: esa página no entra al cache.
+        despedida = self.client.get(reverse('logout'), follow=True)
+        self.assertContains(despedida, 'Hasta luego ana@mail.com')
+        self.assertNotContains(despedida, 'Cerrar Sesión')
+        anonima = self.client.get(reverse('home'))
+        self.assertNotContains(anonima, 'ana@mail.com')
+        self.assertContains(anonima, 'Iniciar Sesión')
+
+        luis = UsuarioSistema.objects.create_user(email='luis@mail.com', password='clave123', username='luis')
+        self.client.force_login(luis)
+        navegacion = self.client.get(reverse('home'))
+        self.assertContains(navegacion, 'luis@mail.com')
+        self.assertNotContains(navegacion, 'ana@mail.com')
+
+        UsuarioSistema.objects.filter(pk=luis.pk).update(avatar='avatars/luis.png')
+        self.assertContains(self.client.get(reverse('home')), 'avatars/luis.png')
+        UsuarioSistema.objects.filter(pk=luis.pk).update(avatar='avatars/luis_nuevo.png')
+        navegacion = self.client.get(reverse('home'))
+        self.assertContains(navegacion, 'avatars/luis_nuevo.png')
+        self.assertNotContains(navegacion, 'avatars/luis.png')
+
+
+class FragmentosTests(TestCase):
+    """Verifica las respuestas parciales de la búsqueda y el listado de clientes."""
+
+    def setUp(self):
+        Cliente.objects.bulk_create(
+            Cliente(name=f'Cliente {numero}', age=30, email=f'cliente{numero}@mail.com') for numero in range(60)
+        )
+        usuario = UsuarioSistema.objects.create_user(email='vendedor@mail.com', password='clave123', username='vendedor')
+        self.client.force_login(usuario)
+
+    def test_busqueda_responde_solo_los_resultados(self):
+        completa = self.client.get(reverse('busqueda'), {'q': 'Cliente 1'})
+        self.assertContains(completa, '<nav>')
+        self.assertIn('X-Fragmento', completa['Vary'])
+        self.assertNotIn('X-Fragmento', completa)
+
+        parcial = self.client.get(reverse('busqueda'), {'q': 'Cliente 1'}, HTTP_X_FRAGMENTO='resultados')
+        self.assertEqual(parcial['X-Fragmento'], 'resultados')
+        self.assertTrue(parcial.content.decode().lstrip().startswith('<div id="resultados"'))
+        self.assertNotContains(parcial, '<nav>')
+        self.assertContains(parcial, 'Se encontraron 11 resultado(s)')
+
+    def test_busqueda_cachea_solo_ids_acotados(self):
+        caches['default'].clear()
+        with registrar_sql() as sentencias:
+            primera = self.client.get(reverse('busqueda'), {'q': 'Cliente', 'tipo': 'clientes'})
+        listado = [sql for sql in sentencias if 'LIKE' in sql and 'ecommerce_cliente' in sql]
+        self.assertEqual(len(listado), 1)
+        self.assertIn(f'LIMIT {buscador.LIMITE_RESULTADOS + 1}', listado[0])
+        self.assertEqual(primera.context['total_clientes'], buscador.LIMITE_RESULTADOS)
+        self.assertEqual(len(primera.context['clientes']), buscador.POR_PAGINA)
+        self.assertContains(primera, 'Se muestran los primeros 50 resultados')
+
+        encontrados = buscador.resultados_cacheados('Cliente', 'clientes', False)
+        self.assertTrue(encontrados['hay_mas'])
+        self.assertTrue(all(archivado is False for _, _, archivado in encontrados['clientes']))
+        self.assertEqual(
+            [pk for pk, _, _ in encontrados['clientes']],
+            list(Cliente.objects.order_by('name').values_list('pk', flat=True)[:buscador.LIMITE_RESULTADOS]),
+        )
+
+        # La segunda página sale del cache: solo se cargan sus objetos por pk.
+        with registrar_sql() as sentencias:
+            segunda = self.client.get(reverse('busqueda'), {'q': 'Cliente', 'tipo': 'clientes', 'pagina': 2})
+        self.assertFalse([sql for sql in sentencias if 'LIKE' in sql])
+        self.assertEqual(
+            [cliente.pk for cliente in segunda.context['clientes']],
+            [pk for pk, _, _ in encontrados['clientes'][buscador.POR_PAGINA:]],
+        )
+
+        respuesta = self.client.get(reverse('api_busqueda'), {'q': 'Cliente', 'tipo': 'clientes'}).json()
+        self.assertTrue(respuesta['hay_mas'])
+        self.assertEqual(len(respuesta['clientes']), buscador.LIMITE_RESULTADOS)
+
+    def test_listado_paginado_por_fragmento(self):
+        parcial = self.client.get(reverse('listar_clientes'), {'pagina': 2}, HTTP_X_FRAGMENTO='clientes')
+        self.assertEqual(parcial['X-Fragmento'], 'clientes')
+        self.assertNotContains(parcial, '<nav>')
+        self.assertEqual(len(parcial.context['clientes']), 10)
+        self.assertContains(parcial, 'Página 2 de 2')
+
+        # Un id de bloque que la vista no conoce recibe la página completa.
+        completa = self.client.get(reverse('listar_clientes'), HTTP_X_FRAGMENTO='resultados')
+        self.assertContains(completa, '<nav>')
+
+
+class PerfiladorTests(TestCase):
+    """Verifica la activación del perfilador, la rotación y el listado en el admin."""
+
+    def setUp(self):
+        self.directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directorio, ignore_errors=True)
+        ajustes = override_settings(PERFILADOR_DIRECTORIO=self.directorio, PERFILADOR_MUESTREO=0)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        self.staff = UsuarioSistema.objects.create_superuser(email='admin@mail.com', password='clave123', username='admin')
+        Cliente.objects.create(name='Ana López', age=30, email='ana@mail.com')
+
+    def test_firma_de_staff_guarda_perfil_con_sql(self):
+        self.client.force_login(self.staff)
+        respuesta = self.client.get(reverse('listar_clientes'), {perfilador.PARAMETRO: perfilador.firmar(self.staff)})
+        nombre = respuesta['X-Perfil-Id']
+        datos = perfilador.cargar(nombre)
+        self.assertEqual((datos['motivo'], datos['ruta'], datos['status']), ('firma', reverse('listar_clientes'), 200))
+        self.assertTrue(any('ecommerce_cliente' in consulta['sql'] for consulta in datos['consultas']))
+        self.assertTrue(datos['acumuladas'] and datos['propias'])
+
+        listado = self.client.get(reverse('admin_perfiles'))
+        self.assertContains(listado, reverse('admin_perfil', args=[nombre]))
+        detalle = self.client.get(reverse('admin_perfil', args=[nombre]))
+        self.assertContains(detalle, 'Consultas más lentas')
+        self.assertEqual(self.client.get(reverse('admin_perfil', args=['..secreto'])).status_code, 404)
+
+    def test_sin_staff_o_firma_ajena_no_perfila(self):
+        vendedor = UsuarioSistema.objects.create_user(email='vendedor@mail.com', password='clave123', username='vendedor')
+        self.client.force_login(vendedor)
+        respuesta = self.client.get(reverse('listar_clientes'), {perfilador.PARAMETRO: perfilador.firmar(vendedor)})
+        self.assertNotIn('X-Perfil-Id', respuesta)
+
+        otro = UsuarioSistema.objects.create_superuser(email='otro@mail.com', password='clave123', username='otro')
+        self.client.force_login(self.staff)
+        respuesta = self.client.get(reverse('listar_clientes'), HTTP_X_PERFIL=perfilador.firmar(otro))
+        self.assertNotIn('X-Perfil-Id', respuesta)
+        self.assertEqual(perfilador.recientes(), [])
+
+    @override_settings(PERFILADOR_MUESTREO=1, PERFILADOR_MAXIMO=2)
+    def test_muestreo_y_rotacion(self):
+        nombres = [self.client.get(reverse('home'))['X-Perfil-Id'] for _ in range(3)]
+        self.assertEqual([perfil['nombre'] for perfil in perfilador.recientes()], nombres[:0:-1])
+        self.assertEqual(len(list(perfilador.directorio().glob('*.prof'))), 2)
+
+
+class AuditoriaTests(TestCase):
+    """Verifica los registros de auditoría y la cola que los escribe en lotes."""
+
+    def setUp(self):
+        self.usuario = UsuarioSistema.objects.create_user(email='auditor@mail.com', password='clave123', username='auditor')
+        self.client.force_login(self.usuario)
+
+    def registro(self, objeto_id=1):
+        return RegistroAuditoria(modelo=RegistroAuditoria.CLIENTE, objeto_id=objeto_id, accion=RegistroAuditoria.CREAR)
+
+    def test_alta_edicion_y_baja_con_usuario_y_vista(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('crear_cliente'), {'name': 'Ana Pérez', 'age': 30, 'email': 'ana@mail.com'})
+        cliente = Cliente.objects.get(email='ana@mail.com')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse('editar_cliente', args=[cliente.pk]),
+                {'name': 'Ana Pérez', 'age': 45, 'email': 'ana@mail.com', 'version': cliente.version},
+            )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('borrar_cliente', args=[cliente.pk]))
+
+        registros = list(RegistroAuditoria.objects.filter(objeto_id=cliente.pk).order_by('pk'))
+        self.assertEqual(
+            [(r.accion, r.usuario_id, r.usuario_texto, r.origen) for r in registros],
+            [
+                (RegistroAuditoria.CREAR, self.usuario.pk, 'auditor@mail.com', 'crear_cliente'),
+                (RegistroAuditoria.EDITAR, self.usuario.pk, 'auditor@mail.com', 'editar_cliente'),
+                (RegistroAuditoria.BORRAR, self.usuario.pk, 'auditor@mail.com', 'borrar_cliente'),
+            ],
+        )
+        self.assertEqual(registros[1].cambios, {'age': [30, 45]})
+        self.assertEqual(registros[2].cambios['email'], 'ana@mail.com')
+
+    def test_transaccion_revertida_no_se_audita(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    Cliente.objects.create(name='Ana Pérez', age=30, email='ana@mail.com')
+                    raise DatabaseError
+            except DatabaseError:
+                pass
+        self.assertEqual(callbacks, [])
+
+    @override_settings(AUDITORIA_LOTE=2)
+    def test_vaciar_escribe_en_lotes(self):
+        cola = auditoria.ColaAuditoria()
+        for objeto_id in range(5):
+            cola.encolar(self.registro(objeto_id), en_segundo_plano=False)
+        with registrar_sql() as sentencias:
+            self.assertEqual(cola.vaciar(), 5)
+
+        inserts = [sql for sql in sentencias if sql.startswith('INSERT INTO "ecommerce_registroauditoria"')]
+        self.assertEqual(len(inserts), 3)
+        self.assertEqual(len(cola), 0)
+        self.assertEqual(RegistroAuditoria.objects.count(), 5)
+
+    def test_fallo_de_escritura_reencola_en_orden(self):
+        cola = auditoria.ColaAuditoria()
+        for objeto_id in range(3):
+            cola.encolar(self.registro(objeto_id), en_segundo_plano=False)
+        with mock.patch.object(RegistroAuditoria.objects, 'bulk_create', side_effect=DatabaseError), \
+                self.assertLogs('ecommerce.auditoria', 'ERROR'):
+            self.assertEqual(cola.vaciar(), 0)
+        self.assertEqual([registro.objeto_id for registro in cola._pendientes], [0, 1, 2])
+
+        self.assertEqual(cola.vaciar(), 3)
+        self.assertEqual(
+            list(RegistroAuditoria.objects.order_by('pk').values_list('objeto_id', flat=True)), [0, 1, 2],
+        )
+
+    @override_settings(AUDITORIA_MAX_PENDIENTES=3, AUDITORIA_LOTE=100)
+    def test_contrapresion_escribe_al_superar_el_maximo(self):
+        cola = auditoria.ColaAuditoria()
+        for objeto_id in range(3):
+            cola.encolar(self.registro(objeto_id), en_segundo_plano=False)
+        self.assertEqual(RegistroAuditoria.objects.count(), 0)
+
+        cola.encolar(self.registro(3), en_segundo_plano=False)
+        self.assertEqual(len(cola), 0)
+        self.assertEqual(RegistroAuditoria.objects.count(), 4)
+
+
+class AuditoriaHiloTests(TransactionTestCase):
+    """
+    Verifica el hilo de la cola de auditoría, el vaciado al terminar el
+    proceso y los registros que la base rechaza (la clave foránea del
+    usuario se comprueba al confirmar, por eso no sirve TestCase).
+    """
+
+    @override_settings(AUDITORIA_INTERVALO=60)
+    def test_detener_escribe_lo_pendiente_y_termina_el_hilo(self):
+        cola = auditoria.ColaAuditoria()
+        for objeto_id in range(2):
+            cola.encolar(RegistroAuditoria(
+                modelo=RegistroAuditoria.CLIENTE, objeto_id=objeto_id, accion=RegistroAuditoria.CREAR,
+            ))
+        hilo = cola._hilo
+        self.assertTrue(hilo.is_alive())
+        self.assertEqual(RegistroAuditoria.objects.count(), 0)
+
+        # Lo que hace atexit con la cola global al terminar el proceso.
+        cola.detener()
+        hilo.join(5)
+        self.assertFalse(hilo.is_alive())
+        self.assertEqual(len(cola), 0)
+        self.assertEqual(RegistroAuditoria.objects.count(), 2)
+
+    def test_usuario_borrado_antes_de_vaciar_no_bloquea_la_cola(self):
+        usuario = UsuarioSistema.objects.create_user(email='borrado@mail.com', password='clave123', username='borrado')
+        cola = auditoria.ColaAuditoria()
+        for objeto_id in range(3):
+            cola.encolar(RegistroAuditoria(
+                modelo=RegistroAuditoria.CLIENTE, objeto_id=objeto_id, accion=RegistroAuditoria.CREAR,
+                usuario=usuario if objeto_id == 1 else None, usuario_texto='borrado@mail.com',
+            ), en_segundo_plano=False)
+        # Lo borra otra petición mientras los registros esperan en la cola.
+        UsuarioSistema.objects.filter(pk=usuario.pk).delete()
+
+        with self.assertLogs('ecommerce.auditoria', 'ERROR') as logs:
+            self.assertEqual(cola.vaciar(), 2)
+        self.assertIn('Se descarta el registro de auditoría de cliente 1', logs.output[0])
+        self.assertEqual(len(cola), 0)
+        self.assertEqual(sorted(RegistroAuditoria.objects.values_list('objeto_id', flat=True)), [0, 2])
+
+        # Lo que se encola después se escribe normalmente.
+        cola.encolar(RegistroAuditoria(
+            modelo=RegistroAuditoria.CLIENTE, objeto_id=3, accion=RegistroAuditoria.CREAR,
+        ), en_segundo_plano=False)
+        self.assertEqual(cola.vaciar(), 1)
+
+
+class LimiteTasaTests(TestCase):
+    """Verifica la respuesta 429 con Retry-After y el tope de claves del almacén local."""
+
+    def setUp(self):
+        ajustes = override_settings(
+            LIMITE_TASA={'busqueda': {'capacidad': 2, 'por_segundo': 0.25}},
+            LIMITE_TASA_ALMACEN='local',
+            LIMITE_TASA_HABILITADO=True,
+        )
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        self.usuario = UsuarioSistema.objects.create_user(email='tasa@mail.com', password='clave123', username='tasa')
+
+    def test_busqueda_responde_429_con_retry_after_por_usuario(self):
+        self.client.force_login(self.usuario)
+        for _ in range(2):
+            self.assertEqual(self.client.get(reverse('busqueda'), {'q': 'ana'}).status_code, 200)
+        rechazo = self.client.get(reverse('busqueda'), {'q': 'ana'})
+        self.assertEqual(rechazo.status_code, 429)
+        # Falta un token entero a 0.25 por segundo: 4 segundos.
+        self.assertEqual(rechazo['Retry-After'], '4')
+        self.assertContains(rechazo, 'Demasiadas solicitudes', status_code=429)
+
+        # El límite es por usuario: otro usuario tiene su propia ráfaga.
+        otro = UsuarioSistema.objects.create_user(email='otro@mail.com', password='clave123', username='otro')
+        self.client.force_login(otro)
+        self.assertEqual(self.client.get(reverse('busqueda'), {'q': 'ana'}).status_code, 200)
+
+    def test_login_limita_solo_post_por_ip(self):
+        datos = {'email': 'tasa@mail.com', 'password': 'incorrecta'}
+        for _ in range(5):
+            self.assertEqual(self.client.post(reverse('login'), datos, REMOTE_ADDR='10.0.0.1').status_code, 200)
+        rechazo = self.client.post(reverse('login'), datos, REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(rechazo.status_code, 429)
+        # Un token cada 12 s, menos lo que tardaron los intentos anteriores.
+        self.assertIn(int(rechazo['Retry-After']), range(1, 13))
+        self.assertEqual(self.client.get(reverse('login'), REMOTE_ADDR='10.0.0.1').status_code, 200)
+        self.assertEqual(self.client.post(reverse('login'), datos, REMOTE_ADDR='10.0.0.2').status_code, 200)
+
+    @override_settings(LIMITE_TASA_HABILITADO=False)
+    def test_deshabilitado_no_limita(self):
+        self.client.force_login(self.usuario)
+        for _ in range(4):
+            self.assertEqual(self.client.get(reverse('busqueda'), {'q': 'ana'}).status_code, 200)
+
+    def test_almacen_local_tope_estricto_con_lru(self):
+        almacen = limite_tasa.AlmacenLocal(max_claves=3)
+        with mock.patch('time.monotonic', return_value=100):
+            for clave in ('a', 'b', 'c'):
+                almacen.consumir(clave, 5, 1)
+            # 'a' pasa a ser la más usada; al insertar 'd' se desaloja 'b'.
+            almacen.consumir('a', 5, 1)
+            almacen.consumir('d', 5, 1)
+            self.assertEqual(len(almacen), 3)
+            self.assertEqual(list(almacen._buckets), ['c', 'a', 'd'])
+            # 'a' conserva sus tokens consumidos.
+            self.assertEqual(almacen._buckets['a'][0], 3)
+
+    def test_almacen_local_descarta_primero_los_vencidos(self):
+        almacen = limite_tasa.AlmacenLocal(max_claves=3)
+        with mock.patch('time.monotonic', return_value=100):
+            almacen.consumir('a', 2, 1)
+            almacen.consumir('b', 2, 1)
+        with mock.patch('time.monotonic', return_value=100.5):
+            almacen.consumir('c', 2, 1)
+        # A los 101 s 'a' y 'b' ya se recargaron: vencen y se descartan.
+        with mock.patch('time.monotonic', return_value=101.2):
+            almacen.consumir('d', 2, 1)
+        self.assertEqual(list(almacen._buckets), ['c', 'd'])
+
+    def test_almacen_cache_respeta_la_rafaga(self):
+        caches_prueba = {
+            **settings.CACHES,
+            'limite': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'limite'},
+        }
+        self.enterContext(override_settings(CACHES=caches_prueba, LIMITE_TASA_ALMACEN='limite'))
+        self.client.force_login(self.usuario)
+        self.assertIsInstance(limite_tasa.obtener_almacen(), limite_tasa.AlmacenCache)
+        estados = [self.client.get(reverse('busqueda'), {'q': 'ana'}).status_code for _ in range(3)]
+        self.assertEqual(estados, [200, 200, 429])
+
+
+class CacheEscalonadoTests(TestCase):
+    """Verifica el LRU local, su TTL, la protección contra estampidas, los grupos y las estadísticas."""
+
+    def setUp(self):
+        self.compartido = caches['compartido']
+        self.compartido.clear()
+        self.cache = self.crear_cache(MAX_ENTRADAS=3)
+
+    def crear_cache(self, **opciones):
+        # Un LOCATION propio por prueba: el nivel local se comparte por LOCATION.
+        location = f'prueba-{self.id()}-{len(cache_escalonado._niveles)}'
+        self.addCleanup(cache_escalonado._niveles.pop, location, None)
+        return cache_escalonado.CacheEscalonado(location, {
+            'TIMEOUT': 300,
+            'OPTIONS': {'SEGUNDO_NIVEL': 'compartido', 'TTL_LOCAL': 10, 'ESPERA_CALCULO': 2, **opciones},
+        })
+
+    def claves_locales(self):
+        return [clave.rsplit(':', 1)[-1] for clave in self.cache.local.entradas]
+
+    def test_pruebas_usan_cache_temporal(self):
+        self.assertNotEqual(str(settings.BASE_DIR / '.cache'), self.compartido._dir)
+        self.assertTrue(self.compartido._dir.startswith(tempfile.gettempdir()))
+
+    def test_lru_desaloja_la_menos_usada(self):
+        for clave in 'abc':
+            self.cache.set(clave, clave.upper())
+        self.cache.get('a')
+        self.cache.set('d', 'D')
+        self.assertEqual(self.claves_locales(), ['c', 'a', 'd'])
+        self.assertEqual(self.cache.estadisticas()['desalojos'], 1)
+
+        # La desalojada sigue en el nivel compartido y vuelve al local.
+        self.assertEqual(self.cache.get('b'), 'B')
+        self.assertEqual(self.cache.estadisticas()['aciertos_compartido'], 1)
+        self.assertIn('b', self.claves_locales())
+
+    def test_ttl_local_acota_la_desactualizacion(self):
+        with mock.patch('time.monotonic', return_value=1000):
+            self.cache.set('precio', 10)
+            self.cache.set('corto', 1, timeout=2)
+            # Otro proceso cambia el valor en el nivel compartido.
+            self.compartido.set('precio', 12)
+            self.assertEqual(self.cache.get('precio'), 10)
+        with mock.patch('time.monotonic', return_value=1003):
+            self.assertEqual(self.cache.local.obtener(self.cache.make_key('corto')), cache_escalonado._AUSENTE)
+            self.assertEqual(self.cache.get('precio'), 10)
+        with mock.patch('time.monotonic', return_value=1011):
+            self.assertEqual(self.cache.get('precio'), 12)
+
+    def test_excluir_local_solo_usa_el_compartido(self):
+        cache = self.crear_cache(EXCLUIR_LOCAL=('sesion',))
+        cache.set('sesion:1', 'datos')
+        self.assertFalse(cache.local.entradas)
+        self.compartido.set('sesion:1', 'otra')
+        self.assertEqual(cache.get('sesion:1'), 'otra')
+
+    def test_get_or_set_calcula_una_sola_vez_entre_hilos(self):
+        llamadas = []
+
+        def calcular():
+            llamadas.append(1)
+            time.sleep(0.2)
+            return 'valor'
+
+        resultados = []
+        hilos = [
+            threading.Thread(target=lambda: resultados.append(self.cache.get_or_set('lento', calcular)))
+            for _ in range(6)
+        ]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        self.assertEqual(resultados, ['valor'] * 6)
+        self.assertEqual(len(llamadas), 1)
+        self.assertFalse(self.compartido.has_key('lento:calculando'))
+
+    def test_get_or_set_espera_el_calculo_de_otro_proceso(self):
+        # Otro proceso tiene la marca de cálculo y publica el valor al terminar.
+        self.compartido.add('remoto:calculando', 1, 2)
+        publicar = threading.Timer(0.2, self.compartido.set, args=('remoto', 'de otro proceso'))
+        publicar.start()
+        self.addCleanup(publicar.cancel)
+        calcular = mock.Mock(return_value='propio')
+        self.assertEqual(self.cache.get_or_set('remoto', calcular), 'de otro proceso')
+        calcular.assert_not_called()
+        self.assertEqual(self.cache.estadisticas()['esperas'], 1)
+
+    def test_invalidar_grupo_cambia_las_claves(self):
+        clave = self.cache.clave_grupo('busqueda', 'ana')
+        self.assertEqual(self.cache.clave_grupo('busqueda', 'ana'), clave)
+        self.cache.set(clave, ['Ana'])
+
+        self.cache.invalidar_grupo('busqueda')
+        nueva = self.cache.clave_grupo('busqueda', 'ana')
+        self.assertNotEqual(nueva, clave)
+        self.assertIsNone(self.cache.get(nueva))
+        self.assertNotEqual(self.cache.clave_grupo('productos', 'ana').split(':')[1], nueva.split(':')[1])
+
+        # Si el cache descarta la versión, la nueva no coincide con ninguna anterior.
+        self.cache.delete('grupo:busqueda')
+        self.assertNotIn(self.cache.clave_grupo('busqueda', 'ana'), (clave, nueva))
+
+    def test_estadisticas(self):
+        self.cache.set('a', 1)
+        self.cache.get('a')
+        self.cache.local.limpiar()
+        self.cache.get('a')
+        self.cache.get('falta')
+        datos = self.cache.estadisticas()
+        self.assertEqual(
+            {nombre: datos[nombre] for nombre in ('aciertos_local', 'aciertos_compartido', 'fallos', 'escrituras')},
+            {'aciertos_local': 1, 'aciertos_compartido': 1, 'fallos': 1, 'escrituras': 1},
+        )
+        self.assertEqual((datos['lecturas'], datos['tasa_aciertos']), (3, 66.7))
+        self.assertEqual((datos['entradas_local'], datos['max_entradas_local']), (1, 3))
+
+        self.cache.reiniciar_estadisticas()
+        self.assertEqual(self.cache.estadisticas()['lecturas'], 0)
+
+
+class EmailClienteTests(TestCase):
+    """Verifica la restricción única sobre LOWER(email) de los clientes."""
+
+    def test_restriccion_unica_sin_mayusculas(self):
+        ana = Cliente.objects.create(name='Ana', age=30, email='Ana@Mail.com')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Cliente.objects.create(name='Ana', age=30, email='ana@mail.com')
+        with self.assertRaisesMessage(ValidationError, 'Ya existe un cliente con este email.'):
+            Cliente(name='Ana', age=30, email='ANA@MAIL.COM').validate_constraints()
+        self.assertEqual(list(Cliente.objects.por_email('ana@MAIL.com')), [ana])
+
+
+class ArchivoTests(TestCase):
+    """Verifica el archivo de clientes inactivos, su detalle, la búsqueda y la reserva de sus emails."""
+
+    def setUp(self):
+        self.viejo = Cliente.objects.create(name='Ana Archivada', age=50, email='Ana.Vieja@mail.com')
+        self.otro_viejo = Cliente.objects.create(name='Beto Archivado', age=30, email='beto@mail.com')
+        self.activo = Cliente.objects.create(name='Ana Activa', age=30, email='ana.activa@mail.com')
+        hace_tres_anios = timezone.now() - timedelta(days=3 * 365)
+        Cliente.objects.filter(pk__in=[self.viejo.pk, self.otro_viejo.pk]).update(updated_at=hace_tres_anios)
+        self.usuario = UsuarioSistema.objects.create_user(email='vendedor@mail.com', password='clave123', username='vendedor')
+        self.client.force_login(self.usuario)
+
+    def archivar(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return archivo.archivar(meses=24, lote=1)
+
+    def test_mueve_por_lotes_y_actualiza_agregados(self):
+        self.assertEqual(self.archivar(), 2)
+        self.assertEqual(list(Cliente.objects.values_list('pk', flat=True)), [self.activo.pk])
+        movido = ClienteArchivado.objects.get(pk=self.viejo.pk)
+        self.assertEqual((movido.name, movido.email), ('Ana Archivada', 'Ana.Vieja@mail.com'))
+        self.assertFalse(Trigrama.objects.filter(tipo=Trigrama.CLIENTE, objeto_id=self.viejo.pk).exists())
+        self.assertEqual(agregados_panel()[(estadisticas.GRUPO_CLIENTES, 'total')], 1)
+        registro = RegistroAuditoria.objects.get(accion=RegistroAuditoria.MASIVO)
+        self.assertEqual(registro.cambios['clientes'], 2)
+        # Una segunda corrida no encuentra nada más para archivar.
+        self.assertEqual(self.archivar(), 0)
+
+    def test_no_archiva_el_cliente_actualizado_durante_el_proceso(self):
+        limite = archivo.restar_meses(timezone.now(), 24)
+        ids = [self.viejo.pk, self.otro_viejo.pk]
+        self.otro_viejo.refresh_from_db()
+        self.otro_viejo.age = 31
+        self.otro_viejo.save()
+        self.assertEqual(archivo.archivar_lote(ids, limite), 1)
+        self.assertTrue(Cliente.objects.filter(pk=self.otro_viejo.pk).exists())
+        self.assertFalse(ClienteArchivado.objects.filter(pk=self.otro_viejo.pk).exists())
+
+    def test_detalle_y_busqueda_de_archivados(self):
+        self.archivar()
+        detalle = self.client.get(reverse('detalle_cliente', args=[self.viejo.pk]))
+        self.assertContains(detalle, 'Cliente archivado el')
+        self.assertNotContains(detalle, reverse('editar_cliente', args=[self.viejo.pk]))
+        self.assertEqual(self.client.get(reverse('detalle_cliente', args=[self.viejo.pk + 100])).status_code, 404)
+
+        sin_archivo = self.client.get(reverse('busqueda'), {'q': 'Ana', 'tipo': 'clientes'})
+        self.assertEqual([c.pk for c in sin_archivo.context['clientes']], [self.activo.pk])
+        con_archivo = self.client.get(reverse('busqueda'), {'q': 'Ana', 'tipo': 'clientes', 'archivados': '1'})
+        self.assertEqual([c.pk for c in con_archivo.context['clientes']], [self.activo.pk, self.viejo.pk])
+        self.assertContains(con_archivo, 'CLIENTE ARCHIVADO')
+
+    def test_email_de_archivado_sigue_reservado(self):
+        self.archivar()
+        datos = {'name': 'Ana Nueva', 'age': 25, 'email': 'ana.vieja@MAIL.com'}
+        respuesta = self.client.post(reverse('crear_cliente'), datos)
+        self.assertFormError(respuesta.context['form'], 'email', 'Ya existe un cliente archivado con este email.')
+        self.assertFalse(Cliente.objects.por_email(datos['email']).exists())
+
+        api = self.client.post(reverse('api_clientes'), [datos], content_type='application/json')
+        self.assertEqual(api.status_code, 400)
+        self.assertEqual(api.json()['errores'], {'0': {'email': ['Ya existe un cliente archivado con este email.']}})
+
+        edicion = self.client.post(reverse('editar_cliente', args=[self.activo.pk]), {
+            'name': 'Ana Activa', 'age': 30, 'email': 'ANA.VIEJA@mail.com', 'version': self.activo.version,
+        })
+        self.assertFormError(edicion.context['form'], 'email', 'Ya existe un cliente archivado con este email.')
+        self.activo.refresh_from_db()
+        self.assertEqual(self.activo.email, 'ana.activa@mail.com')
+
+
+class ApiTests(TestCase):
+    """Verifica la API JSON: paginación por clave, campos dispersos y operaciones masivas todo o nada."""
+
+    def setUp(self):
+        self.clientes = [
+            Cliente.objects.create(name=f'Cliente {numero}', age=20 + numero, email=f'cliente{numero}@mail.com')
+            for numero in range(5)
+        ]
+        usuario = UsuarioSistema.objects.create_user(email='api@mail.com', password='clave123', username='api')
+        self.client.force_login(usuario)
+        self.url = reverse('api_clientes')
+
+    def enviar(self, metodo, datos, url=None, **parametros):
+        url = url or self.url
+        if parametros:
+            url = f'{url}?' + '&'.join(f'{clave}={valor}' for clave, valor in parametros.items())
+        return getattr(self.client, metodo)(url, datos, content_type='application/json')
+
+    def test_sin_sesion_responde_401(self):
+        self.client.logout()
+        for respuesta in (
+            self.client.get(self.url),
+            self.enviar('post', [{'name': 'X', 'age': 30, 'email': 'x@mail.com'}]),
+            self.client.get(reverse('api_cliente', args=[self.clientes[0].pk])),
+        ):
+            self.assertEqual(respuesta.status_code, 401)
+            self.assertEqual(respuesta.json(), {'error': 'Autenticación requerida.'})
+
+    def test_paginacion_por_clave_hasta_el_final(self):
+        vistos = []
+        url = f'{self.url}?limite=2&fields=name'
+        while url:
+            datos = self.client.get(url).json()
+            self.assertLessEqual(len(datos['resultados']), 2)
+            vistos += datos['resultados']
+            url = datos['siguiente']
+            if url:
+                self.assertIn('fields=name', url)
+                self.assertIn(f'despues={vistos[-1]["id"]}', url)
+        self.assertEqual([fila['id'] for fila in vistos], [cliente.pk for cliente in self.clientes])
+        self.assertEqual(set(vistos[0]), {'id', 'name'})
+
+        # La página siguiente se pide por clave, sin OFFSET.
+        with registrar_sql() as sentencias:
+            self.client.get(self.url, {'despues': self.clientes[3].pk})
+        [consulta] = [sql for sql in sentencias if 'FROM "ecommerce_cliente"' in sql]
+        self.assertIn('WHERE "ecommerce_cliente"."id" > %s', consulta)
+        self.assertNotIn('OFFSET', consulta)
+
+    def test_campos_dispersos_y_desconocidos(self):
+        detalle = self.client.get(reverse('api_cliente', args=[self.clientes[0].pk]), {'fields': 'email,age'})
+        self.assertEqual(detalle.json(), {'id': self.clientes[0].pk, 'email': 'cliente0@mail.com', 'age': 20})
+
+        with registrar_sql() as sentencias:
+            self.client.get(self.url, {'fields': 'email'})
+        consulta = next(sql for sql in sentencias if 'FROM "ecommerce_cliente"' in sql)
+        self.assertNotIn('"name"', consulta)
+
+        error = self.client.get(self.url, {'fields': 'email,clave'})
+        self.assertEqual(error.status_code, 400)
+        self.assertEqual(error.json()['error'], 'Campos desconocidos: clave.')
+        self.assertIn('email', error.json()['campos_disponibles'])
+
+    def test_alta_masiva_todo_o_nada(self):
+        nuevos = [
+            {'name': 'Ana', 'age': 30, 'email': 'ana@mail.com'},
+            {'name': 'Beto', 'age': 0, 'email': 'beto@mail.com'},
+            {'name': 'Caro', 'age': 30, 'email': 'CLIENTE1@mail.com', 'version': 7},
+            {'name': 'Dani', 'age': 30, 'email': 'Ana@Mail.com'},
+        ]
+        respuesta = self.enviar('post', nuevos)
+        self.assertEqual(respuesta.status_code, 400)
+        errores = respuesta.json()['errores']
+        self.assertEqual(set(errores), {'1', '2'})
+        self.assertIn('age', errores['1'])
+        self.assertEqual(errores['2']['version'], ['Campo desconocido o de solo lectura.'])
+        self.assertEqual(Cliente.objects.count(), 5)
+
+        # Sin errores de formulario, la unicidad se valida para todo el lote.
+        del nuevos[1:3]
+        repetidos = self.enviar('post', nuevos + [{'name': 'Eva', 'age': 30, 'email': 'cliente2@MAIL.com'}])
+        self.assertEqual(repetidos.json()['errores'], {
+            '1': {'email': ['Email repetido dentro del arreglo.']},
+            '2': {'email': ['Ya existe un cliente con este email.']},
+        })
+        self.assertEqual(Cliente.objects.count(), 5)
+
+        creados = self.enviar('post', nuevos[:1], fields='email')
+        self.assertEqual(creados.status_code, 201)
+        [creado] = creados.json()['creados']
+        self.assertEqual(creado['email'], 'ana@mail.com')
+        self.assertTrue(Cliente.objects.filter(pk=creado['id']).exists())
+
+    def test_conflicto_en_la_base_responde_409_y_revierte(self):
+        # Sin la validación previa el duplicado llega a la restricción única.
+        nuevos = [
+            {'name': 'Ana', 'age': 30, 'email': 'ana@mail.com'},
+            {'name': 'Otra', 'age': 30, 'email': 'CLIENTE0@mail.com'},
+        ]
+        with mock.patch.object(ClienteApiMixin, 'validar_lote'):
+            respuesta = self.enviar('post', nuevos)
+        self.assertEqual(respuesta.status_code, 409)
+        self.assertFalse(Cliente.objects.filter(email='ana@mail.com').exists())
+        self.assertEqual(agregados_panel()[(estadisticas.GRUPO_CLIENTES, 'total')], 5)
+
+    def test_edicion_masiva_todo_o_nada(self):
+        primero, segundo = self.clientes[:2]
+        invalida = self.enviar('patch', [{'id': primero.pk, 'age': 50}, {'id': segundo.pk, 'email': 'no-es-email'}])
+        self.assertEqual(invalida.status_code, 400)
+        self.assertEqual(list(invalida.json()['errores']), ['1'])
+        primero.refresh_from_db()
+        self.assertEqual(primero.age, 20)
+
+        faltante = self.enviar('patch', [{'id': primero.pk, 'age': 50}, {'id': 999999, 'age': 50}])
+        self.assertEqual((faltante.status_code, faltante.json()['ids']), (404, [999999]))
+        duplicado = self.enviar('patch', [{'id': primero.pk, 'email': 'cliente1@mail.com'}])
+        self.assertEqual(duplicado.json()['errores'], {'0': {'email': ['Ya existe un cliente con este email.']}})
+
+        # Cambiar las mayúsculas del propio email no choca consigo mismo.
+        respuesta = self.enviar('patch', [
+            {'id': primero.pk, 'age': 50, 'email': 'Cliente0@mail.com'},
+            {'id': segundo.pk, 'name': 'Segundo'},
+        ])
+        self.assertEqual(respuesta.json()['actualizados'], 2)
+        primero.refresh_from_db()
+        self.assertEqual((primero.age, primero.email, primero.version), (50, 'Cliente0@mail.com', 2))
+
+    def test_baja_masiva(self):
+        ids = [self.clientes[0].pk, self.clientes[1].pk, 999999]
+        respuesta = self.enviar('delete', {'ids': ids})
+        self.assertEqual(respuesta.json(), {'borrados': 2, 'no_encontrados': [999999]})
+        self.assertEqual(Cliente.objects.count(), 3)
+        self.assertEqual(self.enviar('delete', {'ids': 'todos'}).status_code, 400)
+        self.assertEqual(self.client.delete(reverse('api_cliente', args=[999999])).status_code, 404)
+
+
+class OperacionesMasivasSenalesTests(TestCase):
+    """Verifica que las escrituras masivas de la API dejen el mismo estado que las señales por objeto."""
+
+    CLIENTE = {'name': 'Ana Pérez', 'age': 45, 'email': 'ana@mail.com'}
+    PRODUCTO = {
+        'nombre': 'Cámara réflex', 'descripcion': 'Cámara con lente', 'precio': Decimal('100.00'), 'stock': 5,
+    }
+    CAMBIOS = {
+        Cliente: {'name': 'Ana Gómez', 'age': 39},
+        Producto: {'nombre': 'Cámara compacta', 'precio': Decimal('120.00'), 'stock': 3},
+    }
+
+    def estado(self, paso):
+        """Ejecuta un paso y retorna lo que dejó: trigramas, agregados, auditoría, stock y cache."""
+        auditados = RegistroAuditoria.objects.count()
+        movimientos = MovimientoStock.objects.count()
+        version = caches['default'].version_grupo(buscador.GRUPO_BUSQUEDA)
+        with self.captureOnCommitCallbacks(execute=True):
+            objetos = paso()
+        return {
+            'trigramas': [
+                set(Trigrama.objects.filter(objeto_id=objeto.pk).values_list('tipo', 'trigrama')) for objeto in objetos
+            ],
+            'agregados': agregados_panel(),
+            'auditoria': [
+                (registro.modelo, registro.accion, {
+                    campo: valor for campo, valor in registro.cambios.items()
+                    if campo not in ('created_at', 'updated_at')
+                })
+                for registro in RegistroAuditoria.objects.order_by('pk')[auditados:]
+            ],
+            'stock': list(MovimientoStock.objects.order_by('pk').values_list('cantidad', 'motivo')[movimientos:]),
+            'cache_invalidado': caches['default'].version_grupo(buscador.GRUPO_BUSQUEDA) != version,
+        }
+
+    def recorrido(self, crear, editar, borrar):
+        objetos = []
+        pasos = [self.estado(lambda: objetos.extend(crear()) or objetos)]
+
+        def editados():
+            cargados = [type(objeto).objects.get(pk=objeto.pk) for objeto in objetos]
+            for objeto in cargados:
+                for campo, valor in self.CAMBIOS[type(objeto)].items():
+                    setattr(objeto, campo, valor)
+            editar(cargados)
+            return cargados
+
+        pasos.append(self.estado(editados))
+        pasos.append(self.estado(
+            lambda: borrar([type(objeto).objects.get(pk=objeto.pk) for objeto in objetos]) or objetos
+        ))
+        # Sin ids: cada recorrido crea objetos distintos.
+        for paso in pasos:
+            for _, _, cambios in paso['auditoria']:
+                cambios.pop('id', None)
+        return pasos
+
+    def test_mismo_estado_que_las_senales(self):
+        def crear_con_senales():
+            return [Cliente.objects.create(**self.CLIENTE), Producto.objects.create(**self.PRODUCTO)]
+
+        def editar_con_senales(objetos):
+            for objeto in objetos:
+                objeto.save()
+
+        def borrar_con_senales(objetos):
+            for objeto in objetos:
+                objeto.delete()
+
+        def crear_en_lote():
+            return [
+                *operaciones.crear_objetos(Cliente, [Cliente(**self.CLIENTE)]),
+                *operaciones.crear_objetos(Producto, [Producto(**self.PRODUCTO)]),
+            ]
+
+        def editar_en_lote(objetos):
+            for objeto in objetos:
+                operaciones.actualizar_objetos(type(objeto), [objeto])
+
+        def borrar_en_lote(objetos):
+            for objeto in objetos:
+                operaciones.borrar_objetos(type(objeto), [objeto])
+
+        con_senales = self.recorrido(crear_con_senales, editar_con_senales, borrar_con_senales)
+        en_lote = self.recorrido(crear_en_lote, editar_en_lote, borrar_en_lote)
+        for nombre, senales, lote in zip(('alta', 'edición', 'baja'), con_senales, en_lote):
+            with self.subTest(paso=nombre):
+                self.assertEqual(lote, senales)
+        self.assertTrue(con_senales[0]['trigramas'][0])
+        self.assertEqual(con_senales[2]['agregados'], {})
+
+
+class TrigramasTests(TestCase):
+    """Verifica el mantenimiento del índice de trigramas por señales y el orden de la búsqueda."""
+
+    def indice(self, objeto, tipo=Trigrama.CLIENTE):
+        return set(Trigrama.objects.filter(tipo=tipo, objeto_id=objeto.pk).values_list('trigrama', flat=True))
+
+    def fuerza_bruta(self, consulta, limite=50):
+        """Resultado esperado de buscar(), comparando la consulta con cada cliente."""
+        buscados = trigramas.trigramas(consulta)
+        minimo = max(1, math.ceil(len(buscados) * trigramas.UMBRAL_SIMILITUD))
+        puntajes = []
+        for cliente in Cliente.objects.all():
+            compartidos = len(buscados & trigramas.trigramas(trigramas.texto_de(Trigrama.CLIENTE, cliente)))
+            if compartidos >= minimo:
+                puntajes.append((compartidos, cliente.pk))
+        puntajes.sort(key=lambda item: (-item[0], item[1]))
+        return [(pk, compartidos / len(buscados)) for compartidos, pk in puntajes[:limite]]
+
+    def test_senales_mantienen_el_indice(self):
+        ana = Cliente.objects.create(name='Ana Pérez', age=30, email='ana@mail.com')
+        self.assertEqual(self.indice(ana), trigramas.trigramas('Ana Pérez ana@mail.com'))
+
+        ana.name = 'Ana Gómez'
+        ana.save()
+        self.assertEqual(self.indice(ana), trigramas.trigramas('Ana Gómez ana@mail.com'))
+
+        # Un guardado que no toca campos de texto no consulta ni escribe el índice.
+        ana.age = 31
+        with registrar_sql() as sentencias:
+            ana.save()
+        self.assertFalse([sql for sql in sentencias if 'ecommerce_trigrama' in sql])
+
+        camara = Producto.objects.create(
+            nombre='Cámara', descripcion='Réflex digital', precio=Decimal('10.00'), stock=1,
+        )
+        self.assertEqual(self.indice(camara, Trigrama.PRODUCTO), trigramas.trigramas('Cámara Réflex digital'))
+        pk = ana.pk
+        ana.delete()
+        self.assertFalse(Trigrama.objects.filter(tipo=Trigrama.CLIENTE, objeto_id=pk).exists())
+        self.assertTrue(self.indice(camara, Trigrama.PRODUCTO))
+
+    def test_orden_por_similitud(self):
+        exacto = Cliente.objects.create(name='Valeria González', age=30, email='vg@mail.com')
+        parecido = Cliente.objects.create(name='Valeria Gómez', age=30, email='vgomez@mail.com')
+        otro = Cliente.objects.create(name='Bruno Castro', age=30, email='bruno@mail.com')
+
+        resultados = trigramas.buscar(Trigrama.CLIENTE, 'valeria gonzales')
+        self.assertEqual([pk for pk, _ in resultados], [exacto.pk, parecido.pk])
+        self.assertGreater(resultados[0][1], resultados[1][1])
+        self.assertNotIn(otro.pk, [pk for pk, _ in resultados])
+        # Mayúsculas y acentos no cambian el resultado.
+        self.assertEqual(trigramas.buscar(Trigrama.CLIENTE, 'VALERIA GONZÁLES'), resultados)
+
+        [primero, *_] = trigramas.buscar_objetos(Trigrama.CLIENTE, 'valeria gonzales')
+        self.assertEqual((primero, primero.similitud), (exacto, round(resultados[0][1] * 100)))
+        self.assertEqual(trigramas.buscar(Trigrama.CLIENTE, '  '), [])
+
+    def test_coincide_con_la_fuerza_bruta(self):
+        nombres = ['Ana', 'Anabel', 'Juan', 'Juana', 'Valeria', 'Valentín', 'Mario', 'María']
+        apellidos = ['López', 'Lopes', 'Pérez', 'Paredes', 'González', 'Gonzalo', 'Ortiz', 'Ortega']
+        Cliente.objects.bulk_create(
+            Cliente(name=f'{nombre} {apellido}', age=30, email=f'{nombre[:3].lower()}{numero}@mail.com')
+            for numero, (nombre, apellido) in enumerate(
+                (nombre, apellido) for nombre in nombres for apellido in apellidos
+            )
+        )
+        trigramas.reconstruir(Trigrama.CLIENTE)
+        caches['default'].clear()
+        # Lotes de verificación y ventanas chicas para recorrer los cortes
+        # tempranos. Con LECTURA_COMPLETA 0 se recorren ventanas, y con
+        # FRECUENCIA_RARA 0 todos los trigramas se recorren por ventanas.
+        self.enterContext(mock.patch.object(trigramas, 'TAMANO_VERIFICACION', 3))
+        self.enterContext(mock.patch.object(trigramas, 'VENTANA_INICIAL', 4))
+        for lectura_completa, frecuencia_rara in ((50000, 1000), (0, 6), (0, 0)):
+            for consulta in ('ana lopez', 'juna perez', 'valria gonzales', 'maria ortga', 'mario', 'lopes'):
+                for limite in (1, 5, 50):
+                    with self.subTest(lectura_completa=lectura_completa, frecuencia_rara=frecuencia_rara,
+                                      consulta=consulta, limite=limite), \
+                            mock.patch.object(trigramas, 'LECTURA_COMPLETA', lectura_completa), \
+                            mock.patch.object(trigramas, 'FRECUENCIA_RARA', frecuencia_rara):
+                        esperado = self.fuerza_bruta(consulta, limite)
+                        self.assertEqual(trigramas.buscar(Trigrama.CLIENTE, consulta, limite), esperado)
+
+
+class CargaTests(TestCase):
+    """Verifica los percentiles, el resumen por ruta y la lectura de escenarios de bench_carga."""
+
+    def test_percentil_por_rango_mas_cercano(self):
+        tiempos = list(range(1, 11))
+        self.assertEqual(carga.percentil([], 95), 0)
+        self.assertEqual(
+            [carga.percentil(tiempos, p) for p in (0, 10, 50, 95, 99, 100)], [1, 1, 5, 10, 10, 10],
+        )
+        self.assertEqual(carga.percentil([7], 50), 7)
+
+    def test_resumir_agrupa_por_ruta_y_cuenta_errores(self):
+        muestras = [
+            ('home', 200, 10.0, True),
+            ('home', 200, 30.0, True),
+            ('home', 500, 20.0, False),
+            # Un formulario rechazado vuelve con 200 pero no era el status esperado.
+            ('crear_cliente', 200, 5.0, False),
+            ('crear_cliente', 302, 15.0, True),
+        ]
+        resumen = carga.resumir(muestras, 2)
+        self.assertEqual(list(resumen['rutas']), ['crear_cliente', 'home'])
+        home = resumen['rutas']['home']
+        self.assertEqual(
+            (home['peticiones'], home['errores'], home['por_segundo'], home['p50_ms'], home['max_ms']),
+            (3, 1, 1.5, 20.0, 30.0),
+        )
+        self.assertEqual(home['status'], {'200': 2, '500': 1})
+        self.assertEqual(resumen['rutas']['crear_cliente']['status'], {'200': 1, '302': 1})
+        self.assertEqual((resumen['total']['peticiones'], resumen['total']['errores']), (5, 2))
+        self.assertEqual(carga.resumir([], 0)['total']['por_segundo'], 0)
+
+    def test_escenario_descarta_pesos_cero_y_expande_valores(self):
+        escenario = carga.Escenario({
+            'usuarios': {'email': 'carga{i}@carga.example.com', 'password': 'clave{i}', 'cantidad': 2},
+            'pasos': [
+                {'nombre': 'login', 'ruta': '/usuarios/login/', 'metodo': 'POST'},
+                {'nombre': 'apagado', 'ruta': '/', 'peso': 0},
+                {'nombre': 'crear', 'ruta': '/crear_cliente/', 'peso': 3},
+            ],
+        })
+        self.assertEqual([paso['nombre'] for paso in escenario.pasos], ['login', 'crear'])
+        self.assertEqual(escenario.pesos, [1, 3])
+        self.assertIs(escenario.login, escenario.pasos[0])
+        self.assertEqual(escenario.credenciales(3), ('carga1@carga.example.com', 'clave1'))
+
+        azar = mock.Mock(choice=lambda valores: valores[-1])
+        self.assertEqual(escenario.expandir({'name': 'Carga {n}'}, azar), {'name': 'Carga 1'})
+        self.assertEqual(escenario.expandir({'name': 'Carga {n}'}, azar, {'extra': 1}), {'name': 'Carga 2', 'extra': 1})
+        datos = escenario.expandir({'email': '{aleatorio}@x', 'age': ['20', '30']}, azar)
+        self.assertEqual(datos['age'], '30')
+        self.assertRegex(datos['email'], r'^[0-9a-f]{12}@x$')
+        self.assertNotEqual(escenario.expandir({'email': '{aleatorio}@x'}, azar)['email'], datos['email'])
+
+    def test_escenario_invalido(self):
+        for pasos in ([], [{'nombre': 'home', 'ruta': '/', 'peso': 0}], [{'ruta': '/'}], [{'nombre': 'home'}]):
+            with self.subTest(pasos=pasos), self.assertRaises(ValueError):
+                carga.Escenario({'pasos': pasos})
+
+
+class BenchCargaTests(TransactionTestCase):
+    """
+    Corre bench_carga contra la base de pruebas. Los usuarios virtuales son
+    hilos con su propia conexión, por eso los datos sembrados deben quedar
+    confirmados (TransactionTestCase).
+    """
+
+    def test_corrida_corta_con_csrf(self):
+        # El escenario básico con el alta de clientes casi siempre elegida,
+        # para que la corrida corta incluya un POST protegido por CSRF.
+        with open(ESCENARIO_BASICO, encoding='utf-8') as archivo:
+            datos = json.load(archivo)
+        for paso in datos['pasos']:
+            if paso['nombre'] == 'crear_cliente':
+                paso['peso'] = 1000
+        directorio = self.enterContext(tempfile.TemporaryDirectory())
+        escenario = os.path.join(directorio, 'escenario.json')
+        with open(escenario, 'w', encoding='utf-8') as archivo:
+            json.dump(datos, archivo)
+
+        salida, avisos = StringIO(), StringIO()
+        call_command(
+            'bench_carga', '--escenario', escenario, '--sembrar', '--peticiones', '2', '--hilos', '2',
+            '--host', 'testserver', '--json', '-', '--limpiar', stdout=salida, stderr=avisos,
+        )
+        resultado = json.loads(salida.getvalue())
+
+        self.assertIn('Usuarios de carga creados: 16', avisos.getvalue())
+        self.assertEqual(set(resultado['rutas']), {'login', 'crear_cliente'})
+        for nombre, ruta in resultado['rutas'].items():
+            with self.subTest(ruta=nombre):
+                self.assertTrue({'p50_ms', 'p95_ms', 'p99_ms'} <= set(ruta))
+                self.assertEqual(ruta['errores'], 0)
+        self.assertEqual(resultado['rutas']['login']['status'], {'302': 2})
+        # 302 (alta y redirección), no 403 por CSRF.
+        self.assertEqual(resultado['rutas']['crear_cliente']['status'], {'302': 2})
+        self.assertEqual(resultado['total']['peticiones'], 4)
+        self.assertFalse(Cliente.objects.filter(email__iendswith=f'@{carga.DOMINIO_CARGA}').exists())
@@ -0,0 +1,276 @@
+import math
+import re
+import unicodedata
+from collections import Counter
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+
+from .models import Cliente, Producto, Trigrama
+
+
+# Campos indexados de cada modelo.
+CAMPOS = {
+    Trigrama.CLIENTE: ('name', 'email'),
+    Trigrama.PRODUCTO: ('nombre', 'descripcion'),
+}
+MODELOS = {
+    Trigrama.CLIENTE: Cliente,
+    Trigrama.PRODUCTO: Producto,
+}
+
+# Fracción mínima de trigramas de la consulta que debe tener un resultado.
+UMBRAL_SIMILITUD = 0.4
+
+# Filas por bulk_create al indexar en lote.
+TAMANO_LOTE = 2000
+
+# Tope al contar apariciones de un trigrama: alto, porque también ordena por
+# rareza a los comunes que se recorren por ventanas.
+TOPE_FRECUENCIA = 100000
+
+# Segundos que se cachean las frecuencias; solo afectan la velocidad, no el resultado.
+CACHE_FRECUENCIA = 3600
+
+# Candidatos verificados por consulta al puntuar los trigramas comunes.
+TAMANO_VERIFICACION = 500
+
+# Apariciones hasta las que se leen completos los trigramas del filtrado por prefijo.
+LECTURA_COMPLETA = 50000
+
+# Si se supera LECTURA_COMPLETA, solo se leen completos los trigramas con menos
+# apariciones que esto; los demás se recorren por ventanas de ids.
+FRECUENCIA_RARA = 1000
+
+# Ids de la primera ventana al recorrer los trigramas comunes; se duplica en cada vuelta.
+VENTANA_INICIAL = 20000
+
+_NO_ALFANUMERICO = re.compile(r'[^0-9a-z]+')
+
+
+def normalizar(texto):
+    """Minúsculas, sin acentos y con todo lo no alfanumérico como separador."""
+    texto = unicodedata.normalize('NFKD', texto or '').encode('ascii', 'ignore').decode('ascii')
+    return _NO_ALFANUMERICO.sub(' ', texto.lower()).strip()
+
+
+def trigramas(texto):
+    """
+    Conjunto de trigramas del texto, al estilo de pg_trgm: cada palabra se
+    rellena con dos espacios al inicio y uno al final, así las palabras
+    cortas y los comienzos de palabra también generan trigramas.
+    """
+    resultado = set()
+    for palabra in normalizar(texto).split():
+        palabra = f'  {palabra} '
+        resultado.update(palabra[i:i + 3] for i in range(len(palabra) - 2))
+    return resultado
+
+
+def texto_de(tipo, objeto):
+    return ' '.join(getattr(objeto, campo) or '' for campo in CAMPOS[tipo])
+
+
+def indexar(tipo, objeto):
+    """Actualiza los trigramas de un objeto aplicando solo las diferencias."""
+    nuevos = trigramas(texto_de(tipo, objeto))
+    existentes = set(
+        Trigrama.objects.filter(tipo=tipo, objeto_id=objeto.pk).values_list('trigrama', flat=True)
+    )
+    sobrantes = existentes - nuevos
+    faltantes = nuevos - existentes
+    with transaction.atomic():
+        if sobrantes:
+            Trigrama.objects.filter(tipo=tipo, objeto_id=objeto.pk, trigrama__in=sobrantes).delete()
+        if faltantes:
+            Trigrama.objects.bulk_create(
+                [Trigrama(tipo=tipo, objeto_id=objeto.pk, trigrama=t) for t in faltantes],
+                ignore_conflicts=True,
+            )
+
+
+def desindexar(tipo, objeto_id):
+    Trigrama.objects.filter(tipo=tipo, objeto_id=objeto_id).delete()
+
+
+def indexar_lote(tipo, objetos):
+    """Indexa objetos nuevos (sin trigramas previos) con inserciones masivas."""
+    filas = []
+    for objeto in objetos:
+        filas.extend(
+            Trigrama(tipo=tipo, objeto_id=objeto.pk, trigrama=t)
+            for t in trigramas(texto_de(tipo, objeto))
+        )
+        if len(filas) >= TAMANO_LOTE:
+            Trigrama.objects.bulk_create(filas, ignore_conflicts=True)
+            filas = []
+    if filas:
+        Trigrama.objects.bulk_create(filas, ignore_conflicts=True)
+
+
+def reconstruir(tipo, lote=1000):
+    """Reconstruye desde cero el índice de un tipo recorriendo la tabla por lotes."""
+    modelo = MODELOS[tipo]
+    campos = ('pk',) + CAMPOS[tipo]
+    Trigrama.objects.filter(tipo=tipo).delete()
+    total = 0
+    ultimo = 0
+    while True:
+        objetos = list(modelo.objects.filter(pk__gt=ultimo).order_by('pk').only(*campos)[:lote])
+        if not objetos:
+            return total
+        with transaction.atomic():
+            indexar_lote(tipo, objetos)
+        total += len(objetos)
+        ultimo = objetos[-1].pk
+
+
+def frecuencias(tipo, buscados):
+    """
+    Cantidad de objetos con cada trigrama, contada hasta TOPE_FRECUENCIA y
+    cacheada: un valor desactualizado solo cambia qué trigramas se usan
+    para generar candidatos, nunca los resultados.
+    """
+    claves = {f'trigramas:{tipo}:{trigrama.replace(" ", "_")}': trigrama for trigrama in buscados}
+    resultado = {claves[clave]: valor for clave, valor in cache.get_many(claves).items()}
+    nuevas = {}
+    for clave, trigrama in claves.items():
+        if trigrama not in resultado:
+            resultado[trigrama] = nuevas[clave] = (
+                Trigrama.objects.filter(tipo=tipo, trigrama=trigrama)[:TOPE_FRECUENCIA].count()
+            )
+    if nuevas:
+        cache.set_many(nuevas, CACHE_FRECUENCIA)
+    return resultado
+
+
+def buscar(tipo, consulta, limite=50, umbral=UMBRAL_SIMILITUD):
+    """
+    Busca objetos cuyo texto comparte trigramas con la consulta.
+    Retorna una lista de (objeto_id, similitud) ordenada de mayor a menor
+    (a igual similitud, por id), donde la similitud es la fracción de
+    trigramas de la consulta presentes en el objeto (tolera letras
+    cambiadas, faltantes o sobrantes).
+
+    Los trigramas de la consulta se separan por frecuencia:
+        - Raros: se leen completos y sus objetos se puntúan de forma exacta
+          verificando también los comunes. Son los n - minimo + 1 más raros
+          (filtrado por prefijo: un objeto con `minimo` de los `n` trigramas
+          tiene alguno de ellos, así que no se recorre ninguna ventana) si
+          suman hasta LECTURA_COMPLETA apariciones; si no, solo los de menos
+          de FRECUENCIA_RARA (ej: los que introduce un error de tipeo).
+        - Comunes: un objeto que no tiene ningún raro comparte a lo sumo
+          len(comunes) trigramas. Esos objetos se buscan por ventanas de
+          ids crecientes con filtrado por prefijo: el piso de cada ventana
+          es el peor puntaje ya encontrado, así que a medida que se llenan
+          los resultados alcanza con leer menos trigramas. El recorrido se
+          corta en cuanto ningún objeto de las ventanas siguientes puede
+          entrar entre los primeros `limite`.
+    Con muchos homónimos (nombres comunes) basta con recorrer las primeras
+    ventanas en lugar de todas las apariciones de cada trigrama.
+    """
+    buscados = trigramas(consulta)
+    if not buscados:
+        return []
+    total = len(buscados)
+    minimo = max(1, math.ceil(total * umbral))
+
+    conteos = frecuencias(tipo, buscados)
+    ordenados = sorted(buscados, key=lambda trigrama: (conteos[trigrama], trigrama))
+    raros = ordenados[:total - minimo + 1]
+    if sum(conteos[trigrama] for trigrama in raros) > LECTURA_COMPLETA:
+        raros = [trigrama for trigrama in raros if conteos[trigrama] < FRECUENCIA_RARA]
+    comunes = ordenados[len(raros):]
+
+    # Las frecuencias cacheadas pueden estar desactualizadas: los raros se
+    # leen siempre completos, así ningún objeto queda sin puntuar.
+    parciales = Counter(
+        Trigrama.objects.filter(tipo=tipo, trigrama__in=raros).values_list('objeto_id', flat=True)
+    ) if raros else Counter()
+    resultados = verificar_candidatos(tipo, parciales, comunes, minimo, limite)
+
+    ultimo = Trigrama.objects.filter(tipo=tipo).order_by('-objeto_id').values_list('objeto_id', flat=True).first()
+    desde = 0
+    ventana = VENTANA_INICIAL
+    while ultimo is not None and desde <= ultimo:
+        piso = minimo
+        if len(resultados) >= limite:
+            peor, peor_id = resultados[limite - 1]
+            # Los objetos sin trigramas raros de aquí en adelante comparten a
+            # lo sumo len(comunes) y, a igual puntaje, pierden por id.
+            if len(comunes) < peor or (len(comunes) == peor and peor_id < desde):
+                break
+            piso = max(minimo, peor)
+        elif len(comunes) < minimo:
+            break
+        hasta = desde + ventana
+        # Filtrado por prefijo dentro de la ventana: quien tiene `piso` de
+        # los comunes tiene alguno de los len(comunes) - piso + 1 más raros.
+        # Se consulta un trigrama por vez para que la base use el índice
+        # (trigrama, tipo, objeto_id) y lea solo el rango de la ventana.
+        generadores = comunes[:len(comunes) - piso + 1]
+        candidatos = Counter()
+        for trigrama in generadores:
+            candidatos.update(
+                objeto_id for objeto_id in Trigrama.objects.filter(
+                    tipo=tipo, trigrama=trigrama, objeto_id__gte=desde, objeto_id__lt=hasta,
+                ).values_list('objeto_id', flat=True)
+                if objeto_id not in parciales
+            )
+        resultados.extend(
+            verificar_candidatos(tipo, candidatos, comunes[len(generadores):], piso, limite)
+        )
+        resultados.sort(key=lambda item: (-item[0], item[1]))
+        del resultados[limite:]
+        desde = hasta
+        ventana *= 2
+
+    return [(objeto_id, compartidos / total) for compartidos, objeto_id in resultados]
+
+
+def verificar_candidatos(tipo, parciales, comunes, minimo, limite):
+    """
+    Puntaje exacto de los candidatos con trigramas raros, sumando los
+    comunes que tiene cada uno. Se verifican de mayor a menor puntaje
+    posible y se corta cuando ningún candidato restante puede entrar
+    entre los primeros. Retorna [(compartidos, objeto_id)] ordenada.
+    """
+    candidatos = sorted(parciales.items(), key=lambda item: (-item[1], item[0]))
+    resultados = []
+    for desde in range(0, len(candidatos), TAMANO_VERIFICACION):
+        lote = candidatos[desde:desde + TAMANO_VERIFICACION]
+        # El mejor puntaje posible del lote es su primer candidato con todos los comunes.
+        if len(resultados) >= limite and lote[0][1] + len(comunes) < resultados[limite - 1][0]:
+            break
+        extra = Counter()
+        if comunes:
+            extra = dict(
+                Trigrama.objects
+                .filter(tipo=tipo, trigrama__in=comunes, objeto_id__in=[objeto_id for objeto_id, _ in lote])
+                .values('objeto_id')
+                .annotate(compartidos=Count('pk'))
+                .values_list('objeto_id', 'compartidos')
+            )
+        for objeto_id, compartidos in lote:
+            compartidos += extra.get(objeto_id, 0)
+            if compartidos >= minimo:
+                resultados.append((compartidos, objeto_id))
+        resultados.sort(key=lambda item: (-item[0], item[1]))
+        del resultados[limite:]
+    return resultados
+
+
+def buscar_objetos(tipo, consulta, queryset=None, limite=50, umbral=UMBRAL_SIMILITUD):
+    """Como buscar(), pero retorna los objetos con el atributo `similitud`."""
+    resultados = buscar(tipo, consulta, limite, umbral)
+    if queryset is None:
+        queryset = MODELOS[tipo].objects.all()
+    objetos = queryset.in_bulk([objeto_id for objeto_id, _ in resultados])
+    encontrados = []
+    for objeto_id, similitud in resultados:
+        objeto = objetos.get(objeto_id)
+        if objeto is not None:
+            objeto.similitud = round(similitud * 100)
+            encontrados.append(objeto)
+    return encontrados
@@ -1,8 +1,12 @@
 from django.urls import path
 from .views import (
-    home, crear_cliente, crear_producto, busqueda, about,
+    home, crear_cliente, crear_producto, busqueda, about, panel_estadisticas,
     ClienteListView, ClienteDetailView, ClienteUpdateView, ClienteDeleteView
 )
+from .api import (
+    ClienteListaApiView, ClienteDetalleApiView, ProductoListaApiView, ProductoDetalleApiView,
+    BusquedaApiView
+)
 
 urlpatterns = [
     path('', home, name='home'),
@@ -14,4 +18,10 @@ urlpatterns = [
     path('crear-producto/', crear_producto, name='crear_producto'),
     path('busqueda/', busqueda, name='busqueda'),
     path('about/', about, name='about'),
+    path('estadisticas/', panel_estadisticas, name='estadisticas'),
+    path('api/clientes/', ClienteListaApiView.as_view(), name='api_clientes'),
+    path('api/clientes/<int:pk>/', ClienteDetalleApiView.as_view(), name='api_cliente'),
+    path('api/productos/', ProductoListaApiView.as_view(), name='api_productos'),
+    path('api/productos/<int:pk>/', ProductoDetalleApiView.as_view(), name='api_producto'),
+    path('api/busqueda/', BusquedaApiView.as_view(), name='api_busqueda'),
 ]
\ No newline at end of file
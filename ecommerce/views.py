@@ -1,21 +1,34 @@
 from django.shortcuts import render, redirect
 from django.contrib import messages
-from django.db.models import Q
-from .forms import formularioCliente, formularioProductos
-from .models import Cliente, Producto
+from django.db import IntegrityError, transaction
+from .forms import formularioCliente, formularioEdicionCliente, formularioProductos
+from .mixins import ConflictoVersion
+from .models import Cliente, ClienteArchivado, Producto, edad_vip
+from . import buscador, estadisticas, perfilador
+from cola_tareas.registro import encolar
+from .limite_tasa import limitar_tasa
+from .cache_paginas import cache_anonimo
+from .fragmentos import FragmentoMixin, render_fragmento
 from django.contrib.auth.decorators import login_required
 from django.views.generic import ListView, DetailView, UpdateView, DeleteView
 from django.urls import reverse_lazy
+from django.http import FileResponse, Http404
 from django.contrib.auth.mixins import LoginRequiredMixin
+from django.contrib import admin
+from django.core.cache import caches
+from django.core.paginator import Paginator
+from django.conf import settings
 
 
 
 
+@cache_anonimo
 def home(request):
     """
     Vista principal del sistema e-commerce.
     Renderiza la página de inicio con información general del sistema.
     No requiere autenticación.
+    Para visitantes anónimos se sirve la respuesta cacheada.
     """
     return render(request, 'commerce/home.html')
 
@@ -26,13 +39,18 @@ def crear_cliente(request):
     Muestra el formulario de creación de clientes con validación.
     Requiere autenticación.
     Features:
-        - Validación de email único.
+        - Validación de email único (sin distinguir mayúsculas).
         - Detección automática de clientes VIP.
         - Mensajes informativos de estado.
-        - Manejo de errores de duplicación.
+        - Duplicados detectados al insertar (IntegrityError), sin consulta
+          previa, e informados como error del campo email.
+        - Los emails de clientes archivados siguen reservados (la restricción
+          única no alcanza a la tabla de archivo: se consulta aparte).
     """
     if request.method == 'POST':
         form = formularioCliente(request.POST)
+        if form.is_valid() and ClienteArchivado.objects.por_email(form.cleaned_data['email']).exists():
+            form.add_error('email', 'Ya existe un cliente archivado con este email.')
         if form.is_valid():
             # Extraer datos del formulario.
             name = form.cleaned_data['name']
@@ -40,32 +58,36 @@ def crear_cliente(request):
             email = form.cleaned_data['email']
             
             try:
-                # Crear el cliente en la base de datos.
-                cliente = Cliente.objects.create(
-                    name=name,
-                    age=age,
-                    email=email
-                )
-                
+                # Crear el cliente; la unicidad del email la garantiza la base de datos.
+                with transaction.atomic():
+                    cliente = Cliente.objects.create(
+                        name=name,
+                        age=age,
+                        email=email
+                    )
+            except IntegrityError:
+                if Cliente.objects.por_email(email).exists():
+                    form.add_error('email', 'Ya existe un cliente con este email.')
+                else:
+                    messages.error(request, 'Error al crear el cliente. Intente nuevamente.')
+            else:
                 messages.success(request, f'Cliente "{name}" creado exitosamente!')
                 
                 # Información sobre quién lo creó.
                 messages.info(request, f'Cliente registrado por: {request.user.username}')
                 
                 # Verificar si es VIP y mostrar mensaje adicional.
-                if age > 40:
-                    messages.info(request, f'¡{name} es un cliente VIP por ser mayor de 40 años!')
+                if cliente.es_vip:
+                    messages.info(request, f'¡{name} es un cliente VIP por ser mayor de {edad_vip()} años!')
+                    # El correo de bienvenida VIP se envía en segundo plano.
+                    encolar('notificar_cliente_vip', cliente_id=cliente.pk)
                 
                 # Redirigir para limpiar el formulario.
                 return redirect('crear_cliente')
-                
-            except Exception as e:
-                # Manejar errores.
-                messages.error(request, 'Error al crear el cliente. Verifique que el email no esté duplicado.')
     else:
         form = formularioCliente()
     
-    return render(request, 'commerce/crear_cliente.html', {'form': form})
+    return render(request, 'commerce/crear_cliente.html', {'form': form, 'edad_vip': edad_vip()})
 
 @login_required
 def crear_producto(request):
@@ -126,6 +148,7 @@ def crear_producto(request):
 
 
 @login_required
+@limitar_tasa('busqueda', capacidad=20, por_segundo=0.5, clave='usuario')
 def busqueda(request):
     """
     Vista para búsqueda avanzada de clientes y productos.
@@ -136,66 +159,270 @@ def busqueda(request):
         - Productos: búsqueda por nombre y descripción.
         - Búsqueda insensible a mayúsculas/minúsculas.
         - Estadísticas de resultados en tiempo real.
+        - Límite de tasa por usuario (respuesta 429 al superarlo).
+        - Opción de búsqueda tolerante a errores (índice de trigramas),
+          con resultados ordenados por similitud.
+        - Resultados cacheados (solo los ids, hasta LIMITE_RESULTADOS por
+          tipo), invalidados al modificar clientes o productos.
+        - Opción para incluir clientes archivados.
+        - Resultados paginados; los productos no cargan la descripción
+          completa y muestran un extracto con las palabras buscadas
+          resaltadas, calculado solo para la página actual.
+        - Con el header X-Fragmento: resultados (static/js/fragmentos.js)
+          responde solo el bloque de resultados, sin base.html.
     """
     query = request.GET.get('q', '').strip()
     tipo_busqueda = request.GET.get('tipo', 'todos')
+    difusa = request.GET.get('difusa') == '1'
+    archivados = request.GET.get('archivados') == '1'
     
     clientes = []
     productos = []
+    hay_mas = False
     
     if query:
-        if tipo_busqueda == 'clientes' or tipo_busqueda == 'todos':
-            # Buscar en clientes por nombre o email.
-            clientes = Cliente.objects.filter(
-                Q(name__icontains=query) | 
-                Q(email__icontains=query)
-            ).order_by('name')
-        
-        if tipo_busqueda == 'productos' or tipo_busqueda == 'todos':
-            # Buscar en productos por nombre o descripción.
-            productos = Producto.objects.filter(
-                Q(nombre__icontains=query) | 
-                Q(descripcion__icontains=query)
-            ).order_by('nombre')
+        encontrados = buscador.resultados_cacheados(query, tipo_busqueda, difusa, archivados)
+        clientes, productos, hay_mas = encontrados['clientes'], encontrados['productos'], encontrados['hay_mas']
         
         # Mensajes informativos.
         total_resultados = len(clientes) + len(productos)
-        if total_resultados > 0:
+        if hay_mas:
+            messages.info(
+                request,
+                f'Se muestran los primeros {buscador.LIMITE_RESULTADOS} resultados de cada tipo para "{query}"; '
+                'refina la búsqueda para ver otros',
+            )
+        elif total_resultados > 0:
             messages.success(request, f'Se encontraron {total_resultados} resultado(s) para "{query}"')
         else:
             messages.warning(request, f'No se encontraron resultados para "{query}"')
     
+    # Ambas listas comparten el número de página; solo se cargan los objetos de la página.
+    pagina = Paginator(range(max(len(clientes), len(productos))), buscador.POR_PAGINA).get_page(
+        request.GET.get('pagina')
+    )
+    desde = (pagina.number - 1) * buscador.POR_PAGINA
+    hasta = desde + buscador.POR_PAGINA
+    parametros = request.GET.copy()
+    parametros.pop('pagina', None)
+
     context = {
         'query': query,
         'tipo_busqueda': tipo_busqueda,
-        'clientes': clientes,
-        'productos': productos,
+        'difusa': difusa,
+        'archivados': archivados,
+        'clientes': buscador.cargar_clientes(clientes[desde:hasta]),
+        'productos': buscador.resaltar_productos(buscador.cargar_productos(productos[desde:hasta]), query),
         'total_clientes': len(clientes),
         'total_productos': len(productos),
+        'pagina': pagina,
+        'parametros': parametros.urlencode(),
     }
     
-    return render(request, 'commerce/busqueda.html', context)
+    return render_fragmento(
+        request, 'commerce/busqueda.html', 'commerce/parciales/busqueda_resultados.html', 'resultados', context,
+    )
 
+@cache_anonimo
 def about(request):
     return render(request, 'commerce/about.html')
 
+@login_required
+def panel_estadisticas(request):
+    """
+    Vista del panel de estadísticas de clientes y productos.
+    Lee los agregados mantenidos incrementalmente por señales, por lo que
+    el costo de la página no depende del tamaño de las tablas.
+    Requiere autenticación.
+    Features:
+        - Total de clientes y clientes VIP.
+        - Histograma de edades y altas por día.
+        - Productos activos/inactivos y valor total del stock.
+    """
+    return render(request, 'commerce/estadisticas.html', estadisticas.obtener_resumen())
+
 
-class ClienteListView(LoginRequiredMixin, ListView):
+def panel_cache(request):
+    """
+    Vista del admin con las estadísticas de los caches escalonados.
+    Se registra con admin.site.admin_view, que exige un usuario staff.
+    Features:
+        - Aciertos en memoria local y en el cache compartido, fallos y tasa de aciertos.
+        - Desalojos del LRU local y esperas por cálculos en curso.
+        - Reinicio de las estadísticas (por proceso).
+    """
+    escalonados = [
+        (alias, caches[alias]) for alias in caches.settings
+        if hasattr(caches[alias], 'estadisticas')
+    ]
+    if request.method == 'POST':
+        for alias, backend in escalonados:
+            backend.reiniciar_estadisticas()
+        messages.success(request, 'Estadísticas de cache reiniciadas.')
+        return redirect('admin_cache')
+
+    context = {
+        **admin.site.each_context(request),
+        'title': 'Estadísticas de cache',
+        'caches': [(alias, backend.estadisticas()) for alias, backend in escalonados],
+    }
+    return render(request, 'admin/cache.html', context)
+
+
+
+def panel_perfiles(request):
+    """
+    Vista del admin con los últimos perfiles de peticiones.
+    Se registra con admin.site.admin_view, que exige un usuario staff.
+    Features:
+        - Duración, tiempo en SQL, cantidad de consultas y la función con
+          más tiempo propio de cada petición perfilada.
+        - Firma del usuario para perfilar una petición (parámetro _perfil
+          o header X-Perfil).
+        - Borrado de todos los perfiles guardados.
+    """
+    if request.method == 'POST':
+        borrados = perfilador.borrar_todos()
+        messages.success(request, f'Se borraron {borrados} perfiles.')
+        return redirect('admin_perfiles')
+
+    context = {
+        **admin.site.each_context(request),
+        'title': 'Perfiles de peticiones',
+        'perfiles': perfilador.recientes(),
+        'firma': perfilador.firmar(request.user),
+        'parametro': perfilador.PARAMETRO,
+        'cabecera': perfilador.CABECERA,
+        'validez_minutos': getattr(settings, 'PERFILADOR_FIRMA_SEGUNDOS', 3600) // 60,
+        'muestreo': getattr(settings, 'PERFILADOR_MUESTREO', 0),
+    }
+    return render(request, 'admin/perfiles.html', context)
+
+
+def detalle_perfil(request, nombre):
+    """
+    Vista del admin con el detalle de un perfil: funciones con más tiempo
+    acumulado y propio, consultas más lentas, consultas repetidas y la
+    línea de tiempo SQL. Con ?descargar=1 entrega el .prof completo.
+    """
+    datos = perfilador.cargar(nombre)
+    if datos is None:
+        raise Http404('Perfil no encontrado.')
+    if request.GET.get('descargar'):
+        archivo = perfilador.ruta(nombre, 'prof')
+        if not archivo.exists():
+            raise Http404('Perfil no encontrado.')
+        return FileResponse(open(archivo, 'rb'), as_attachment=True, filename=f'{nombre}.prof')
+
+    repetidas = {}
+    for consulta in datos['consultas']:
+        cantidad, total = repetidas.get(consulta['sql'], (0, 0))
+        repetidas[consulta['sql']] = (cantidad + 1, total + consulta['duracion_ms'])
+    duracion = datos['duracion_ms'] or 1
+    context = {
+        **admin.site.each_context(request),
+        'title': f'Perfil de {datos["metodo"]} {datos["ruta"]}',
+        'perfil': datos,
+        'lentas': sorted(datos['consultas'], key=lambda consulta: consulta['duracion_ms'], reverse=True)[:20],
+        'repetidas': sorted(
+            ((sql, cantidad, round(total, 3)) for sql, (cantidad, total) in repetidas.items() if cantidad > 1),
+            key=lambda fila: fila[2], reverse=True,
+        )[:10],
+        'linea_de_tiempo': [
+            {
+                **consulta,
+                'desde': round(consulta['inicio_ms'] * 100 / duracion, 2),
+                'ancho': max(round(consulta['duracion_ms'] * 100 / duracion, 2), 0.2),
+            }
+            for consulta in datos['consultas']
+        ],
+    }
+    return render(request, 'admin/perfil.html', context)
+
+
+class ClienteListView(LoginRequiredMixin, FragmentoMixin, ListView):
+    """
+    Listado paginado de clientes, del más reciente al más antiguo.
+    El cambio de página pide solo la tabla (header X-Fragmento) si el
+    navegador ejecuta static/js/fragmentos.js.
+    """
     model = Cliente
     template_name = 'commerce/listar_clientes.html'
     context_object_name = 'clientes'
+    paginate_by = 50
+    page_kwarg = 'pagina'
+    fragmento = 'clientes'
+    plantilla_fragmento = 'commerce/parciales/clientes_tabla.html'
 
 class ClienteDetailView(LoginRequiredMixin, DetailView):
     model = Cliente
     template_name = 'commerce/detalle_cliente.html'
     context_object_name = 'cliente'
 
+    def get_object(self, queryset=None):
+        """Si el cliente fue archivado, se muestra desde la tabla de archivo."""
+        try:
+            return super().get_object(queryset)
+        except Http404:
+            archivado = ClienteArchivado.objects.filter(pk=self.kwargs['pk']).first()
+            if archivado is None:
+                raise
+            return archivado
+
 class ClienteUpdateView(LoginRequiredMixin, UpdateView):
+    """
+    Edición de un cliente con control de concurrencia optimista.
+    Features:
+        - El formulario lleva la versión con la que se abrió; si otro
+          usuario guardó mientras tanto no se pisan sus cambios.
+        - Ante un conflicto se vuelve a mostrar el formulario con los datos
+          enviados, sobre la versión vigente, y una tabla con lo que cambió
+          el otro usuario. Guardar de nuevo confirma los cambios propios.
+    """
     model = Cliente
-    fields = ['name', 'age', 'email']
+    form_class = formularioEdicionCliente
     template_name = 'commerce/editar_cliente.html'
     success_url = reverse_lazy('listar_clientes')
 
+    def form_valid(self, form):
+        try:
+            return super().form_valid(form)
+        except ConflictoVersion as conflicto:
+            return self.conflicto(form, conflicto)
+
+    def conflicto(self, form, conflicto):
+        actual = conflicto.actual
+        if actual is None:
+            messages.error(self.request, 'Otro usuario eliminó este cliente mientras lo editaba.')
+            return redirect('listar_clientes')
+
+        base = form.valores_base()
+        cambios = []
+        for campo, propio, vigente in conflicto.diferencias(form.CAMPOS):
+            original = base.get(campo.name, '')
+            cambios.append({
+                'campo': campo.verbose_name,
+                'original': original,
+                'vigente': vigente,
+                'propio': propio,
+            })
+
+        # Los datos enviados, ahora sobre la versión vigente.
+        datos = form.data.copy()
+        datos['version'] = actual.version
+        datos['base'] = form.serializar_base(actual)
+        nuevo = self.get_form_class()(data=datos, instance=actual)
+        nuevo.is_valid()
+        nuevo.add_error(
+            None,
+            'Otro usuario modificó este cliente mientras lo editaba. '
+            'Revise las diferencias y vuelva a guardar para confirmar sus cambios.',
+        )
+        self.object = actual
+        return self.render_to_response(
+            self.get_context_data(form=nuevo, cambios_concurrentes=cambios), status=409,
+        )
+
 class ClienteDeleteView(LoginRequiredMixin, DeleteView):
     model = Cliente
     template_name = 'commerce/borrar_cliente.html'
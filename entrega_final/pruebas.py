@@ -0,0 +1,48 @@
+import copy
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class EjecutorPruebas(DiscoverRunner):
+    """
+    Ejecutor de pruebas con la configuración que las vuelve deterministas.
+    Features:
+        - Auditoría sincrónica: sin el hilo de la cola, ningún registro se
+          escribe desde otra conexión ni sobrevive a la base de pruebas.
+        - Límite de tasa deshabilitado: sus buckets viven en memoria del
+          proceso y se acumularían entre pruebas (ej: logins desde la misma
+          IP). Las pruebas del límite lo habilitan explícitamente.
+        - Caches en archivos en un directorio temporal: las pruebas no leen
+          ni escriben el cache real (BASE_DIR/.cache) y empiezan vacías.
+    """
+
+    configuracion = {
+        'AUDITORIA_MODO': 'sincrono',
+        'LIMITE_TASA_HABILITADO': False,
+    }
+
+    def caches_temporales(self, directorio):
+        """Copia de CACHES con cada cache en archivos apuntando a `directorio`."""
+        caches = copy.deepcopy(settings.CACHES)
+        for alias, config in caches.items():
+            if config['BACKEND'].endswith('FileBasedCache'):
+                config['LOCATION'] = f'{directorio}/{alias}'
+        return caches
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._directorio_cache = tempfile.mkdtemp(prefix='cache-pruebas-')
+        self._configuracion = override_settings(
+            CACHES=self.caches_temporales(self._directorio_cache),
+            **self.configuracion,
+        )
+        self._configuracion.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._configuracion.disable()
+        shutil.rmtree(self._directorio_cache, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
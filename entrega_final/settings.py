@@ -39,6 +39,7 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'ecommerce',
     'main_usuarios',
+    'cola_tareas',
 ]
 
 MIDDLEWARE = [
@@ -47,6 +48,8 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'ecommerce.middleware.PerfiladorMiddleware',
+    'ecommerce.middleware.AuditoriaMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -57,8 +60,14 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # Plantillas compiladas una sola vez por proceso.
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
@@ -78,9 +87,17 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Base de pruebas en archivo: la base en memoria compartida de SQLite
+        # no espera los locks entre conexiones y las pruebas con hilos fallarían.
+        'TEST': {
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
     }
 }
 
+# Ajustes que las pruebas necesitan para ser deterministas (ver entrega_final/pruebas.py).
+TEST_RUNNER = 'entrega_final.pruebas.EjecutorPruebas'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -133,16 +150,93 @@ import os
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Segundos de cache de los archivos de media sin hash en el nombre (los
+# avatares procesados llevan el hash del contenido y se cachean un año).
+MEDIA_CACHE_SEGUNDOS = 300
+
+# Con un proxy nginx delante, prefijo de la ubicación interna que sirve
+# MEDIA_ROOT (ej: '/media-interna/'); None envía los archivos desde Django.
+MEDIA_X_ACCEL_REDIRECT = None
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Edad a partir de la cual (exclusive) un cliente se considera VIP
+CLIENTE_EDAD_VIP = 40
+
 # Configuración de login/logout
 LOGIN_URL = '/usuarios/login/'
 LOGIN_REDIRECT_URL = '/'
 LOGOUT_REDIRECT_URL = '/'
 
+# Días de movimientos de stock que se conservan completos; los anteriores
+# se compactan en cierres diarios (tarea compactar_stock o el comando).
+STOCK_RETENCION_DIAS = 90
+
+# Límite de tasa: 'local' (memoria del proceso) o alias de cache compartido.
+# Con un alias de cache el límite es exacto entre procesos solo si el incr
+# del backend es atómico (Memcached, Redis); en archivos es aproximado.
+# LIMITE_TASA permite sobrescribir capacidad/por_segundo/clave por vista,
+# ej: LIMITE_TASA = {'busqueda': {'capacidad': 40, 'por_segundo': 1}}
+LIMITE_TASA_HABILITADO = True
+LIMITE_TASA_ALMACEN = 'local'
+LIMITE_TASA = {}
+
+# Correo: en desarrollo los correos se muestran en la consola
+EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+DEFAULT_FROM_EMAIL = 'no-responder@gestor-ecommerce.local'
+
+# Cache en dos niveles: LRU en memoria de cada proceso delante de un cache
+# en archivos compartido entre procesos (ver ecommerce/cache_escalonado.py).
+# Las sesiones solo usan el nivel compartido para que un logout se vea
+# de inmediato en todos los procesos.
+CACHES = {
+    'default': {
+        'BACKEND': 'ecommerce.cache_escalonado.CacheEscalonado',
+        'LOCATION': 'escalonado',
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'SEGUNDO_NIVEL': 'compartido',
+            'MAX_ENTRADAS': 1000,
+            'TTL_LOCAL': 10,
+            'EXCLUIR_LOCAL': ('django.contrib.sessions.cached_db',),
+        },
+    },
+    'compartido': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / '.cache',
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+}
+
+# Segundos que se cachean los resultados de /busqueda/ (se invalidan al
+# guardar o borrar clientes y productos).
+BUSQUEDA_CACHE_SEGUNDOS = 300
+
+# Segundos que se cachean home y about para visitantes anónimos (0 lo desactiva).
+CACHE_PAGINAS_SEGUNDOS = 600
+
+# Auditoría de clientes y productos: 'cola' escribe en lotes desde un hilo
+# en segundo plano, 'sincrono' escribe al confirmar cada transacción y
+# 'desactivado' no registra nada.
+AUDITORIA_MODO = 'cola'
+AUDITORIA_LOTE = 200
+AUDITORIA_INTERVALO = 1.0
+AUDITORIA_MAX_PENDIENTES = 100000
+
+# Perfilador por petición (ver ecommerce/perfilador.py): fracción del tráfico
+# que se perfila al azar (0 lo desactiva), validez de las firmas que usa el
+# staff para perfilar una petición, carpeta y cantidad de perfiles guardados.
+PERFILADOR_MUESTREO = 0
+PERFILADOR_FIRMA_SEGUNDOS = 3600
+PERFILADOR_DIRECTORIO = BASE_DIR / 'perfiles'
+PERFILADOR_MAXIMO = 200
+
 # Configuración de sesiones
 # Duración de la sesión en segundos (30 minutos para desarrollo)
 SESSION_COOKIE_AGE = 1800  # 30 minutos
@@ -153,5 +247,12 @@ SESSION_EXPIRE_AT_BROWSER_CLOSE = True
 # Regenerar session key en cada login (mayor seguridad)
 SESSION_REGENERATE_WHEN_LOGIN = True
 
-# Para desarrollo: sesiones en caché en lugar de base de datos (opcional)
-# SESSION_ENGINE = 'django.contrib.sessions.backends.cache'
+# Sesiones en caché con respaldo en base de datos: las lecturas no consultan
+# la tabla de sesiones mientras la sesión esté en el cache compartido. El
+# store de main_usuarios/sesiones.py además lleva la cuenta de sesiones
+# activas por usuario (ver /metricas/).
+SESSION_ENGINE = 'main_usuarios.sesiones'
+
+# Token para leer /metricas/ sin sesión de staff (Authorization: Bearer <token>).
+# None deja el endpoint solo para el staff.
+METRICAS_TOKEN = os.environ.get('METRICAS_TOKEN') or None
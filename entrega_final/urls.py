@@ -15,16 +15,23 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 
+import re
+
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings
-from django.conf.urls.static import static
+from ecommerce.views import detalle_perfil, panel_cache, panel_perfiles
+from main_usuarios.media import servir_media
+from main_usuarios.views import metricas
 
 urlpatterns = [
+    path('admin/cache/', admin.site.admin_view(panel_cache), name='admin_cache'),
+    path('admin/perfiles/', admin.site.admin_view(panel_perfiles), name='admin_perfiles'),
+    path('admin/perfiles/<str:nombre>/', admin.site.admin_view(detalle_perfil), name='admin_perfil'),
     path('admin/', admin.site.urls),
+    path('metricas/', metricas, name='metricas'),
     path('', include('ecommerce.urls')),
     path('usuarios/', include('main_usuarios.urls')),
+    # Avatares y demás archivos subidos, también en producción (ver main_usuarios/media.py).
+    re_path(rf'^{re.escape(settings.MEDIA_URL.lstrip("/"))}(?P<ruta>.+)$', servir_media, name='media'),
 ]
-
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -1,4 +1,5 @@
 from django.contrib import admin
+from ecommerce.admin_rapido import AdminRapidoMixin
 from .models import UsuarioSistema
 
 
@@ -7,10 +8,13 @@ from .models import UsuarioSistema
 
 
 @admin.register(UsuarioSistema)
-class UsuarioSistemaAdmin(admin.ModelAdmin):
+class UsuarioSistemaAdmin(AdminRapidoMixin, admin.ModelAdmin):
     list_display = ('username', 'email', 'avatar', 'is_active', 'created_at')
-    list_filter = ('is_active', 'created_at')
-    search_fields = ('email', 'created_at', 'username')
+    list_filter = ('is_active',)
+    search_fields = ('=email', '^username')
+    busqueda_sin_mayusculas = ('email', 'username')
+    search_help_text = 'Busca por email completo o por inicio del nombre de usuario (sin distinguir mayúsculas).'
+    date_hierarchy = 'created_at'
     readonly_fields = ('created_at', 'is_active')
     ordering = ('-created_at',)
 
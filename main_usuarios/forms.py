@@ -1,5 +1,8 @@
 from .models import UsuarioSistema
 from django import forms
+from django.db import transaction
+from django.db.models import Q
+from ecommerce.mixins import filtro_email
 from django.contrib.auth.forms import UserCreationForm, UserChangeForm
 from django.contrib.auth import authenticate
 from django.forms.widgets import ClearableFileInput
@@ -15,23 +18,32 @@ class formularioRegistro(UserCreationForm):
         - Contraseñas coincidentes.
         - Longitud mínima de contraseña (6 caracteres).
         - Campos de contraseña con widget PasswordInput.
-        - Validación de unicidad antes del guardado.
+        - Validación de unicidad de usuario y email en una sola consulta.
+        - Unicidad garantizada por la base de datos: un IntegrityError de
+          un alta concurrente se traduce en errores (ver errores_de_unicidad).
     """
     class Meta:
         model = UsuarioSistema
-        fields = ['username', 'email', 'avatar', 'password1', 'password2']
+        # Usuario y email son campos propios del formulario: su unicidad (y la
+        # restricción sobre LOWER(email)) la valida validate_unique() con una
+        # sola consulta, y save() los toma de cleaned_data.
+        fields = ['avatar', 'password1', 'password2']
+
+    field_order = ['username', 'email', 'avatar', 'password1', 'password2']
 
     def save(self, commit=True):
         username = self.cleaned_data["username"]
         email = self.cleaned_data["email"]
         password = self.cleaned_data["password1"]
         avatar = self.cleaned_data.get("avatar")
-        user = UsuarioSistema.objects.create_user(
-            username=username,
-            email=email,
-            password=password,
-            avatar=avatar
-        )
+        # Savepoint propio: un IntegrityError no invalida la transacción del llamador.
+        with transaction.atomic():
+            user = UsuarioSistema.objects.create_user(
+                username=username,
+                email=email,
+                password=password,
+                avatar=avatar
+            )
         return user
 
     username = forms.CharField(
@@ -44,6 +56,7 @@ class formularioRegistro(UserCreationForm):
 
     email = forms.EmailField(
         label='Correo electrónico',
+        max_length=254,
         widget=forms.EmailInput(attrs={
             'placeholder': 'ejemplo@correo.com'
         })
@@ -72,28 +85,70 @@ class formularioRegistro(UserCreationForm):
     )
 
     def clean_username(self):
-        username = self.cleaned_data['username']
-        if UsuarioSistema.objects.filter(username=username).exists():
-            raise forms.ValidationError('Este nombre de usuario ya está en uso.')
-        return username
+        # La unicidad se valida junto con el email en validate_unique().
+        return self.cleaned_data['username']
 
-    def clean_email(self):
+    def validar_unicidad(self):
         """
-        Valida que el email no esté ya registrado en el sistema.
-        Features:
-            - Verificación de unicidad en la base de datos.
+        Valida que el usuario y el email no estén registrados con una única
+        consulta. El email se compara sin distinguir mayúsculas
+        ("Ana@x.com" equivale a "ana@x.com").
+        Retorna True si encontró algún conflicto.
+        """
+        username = self.cleaned_data.get('username')
+        email = self.cleaned_data.get('email')
+        condicion = Q()
+        if username:
+            condicion |= Q(username=username)
+        if email:
+            condicion |= filtro_email(email)
+        if not condicion:
+            return False
+
+        conflictos = list(UsuarioSistema.objects.filter(condicion).values_list('username', 'email')[:2])
+        campos = set()
+        for existente_usuario, existente_email in conflictos:
+            if username and existente_usuario == username:
+                campos.add('username')
+            if email and existente_email.lower() == email.lower():
+                campos.add('email')
+        if conflictos and not campos:
+            # LOWER() de la base y lower() de Python difieren en algunos caracteres.
+            campos.add('email')
+        if 'username' in campos:
+            self.add_error('username', 'Este nombre de usuario ya está en uso.')
+        if 'email' in campos:
+            self.add_error('email', 'Este email ya está registrado.')
+        return bool(conflictos)
+
+    def errores_de_unicidad(self):
+        """
+        Traduce el IntegrityError de un alta concurrente en errores del
+        formulario, repitiendo la consulta de unicidad.
+        """
+        if not self.validar_unicidad():
+            self.add_error(None, 'No se pudo completar el registro. Intenta nuevamente.')
+
+    def validate_unique(self):
+        """
+        Reemplaza las consultas de unicidad por campo del ModelForm por la
+        consulta combinada de validar_unicidad().
         """
-        email = self.cleaned_data['email']
-        if UsuarioSistema.objects.filter(email=email).exists():
-            raise forms.ValidationError('Este email ya está registrado.')
-        return email
+        self.validar_unicidad()
 
+    def validate_password_for_user(self, user, **kwargs):
+        # La instancia no recibe usuario ni email del ModelForm: se copian para
+        # que UserAttributeSimilarityValidator los compare con la contraseña.
+        user.username = self.cleaned_data.get('username', user.username)
+        user.email = self.cleaned_data.get('email', user.email)
+        super().validate_password_for_user(user, **kwargs)
 
     def clean(self):
         """
         Validación global del formulario de registro.
         Verifica que las contraseñas coincidan y cumplan con los
-        requisitos mínimos de seguridad.
+        requisitos mínimos de seguridad. La disponibilidad de usuario y
+        email se valida después, en validate_unique().
         Features:
             - Contraseñas coincidentes.
         """
@@ -0,0 +1,160 @@
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+
+# Nombres con hash del contenido (ej: avatars/ana.3f2a9c41d0b7.png):
+# el archivo nunca cambia sin cambiar de nombre.
+NOMBRE_CON_HASH = re.compile(r'\.(?P<hash>[0-9a-f]{12})\.[^./]+$')
+
+# Un año: lo máximo que recomiendan los navegadores y proxies.
+UN_ANIO = 365 * 24 * 3600
+
+RANGO = re.compile(r'^bytes=(?P<inicio>\d*)-(?P<fin>\d*)$')
+
+
+class LectorParcial:
+    """Lee como máximo `restantes` bytes de un archivo ya posicionado."""
+
+    def __init__(self, archivo, restantes):
+        self.archivo = archivo
+        self.restantes = restantes
+
+    def read(self, tamano=-1):
+        if self.restantes <= 0:
+            return b''
+        if tamano < 0 or tamano > self.restantes:
+            tamano = self.restantes
+        datos = self.archivo.read(tamano)
+        self.restantes -= len(datos)
+        return datos
+
+    def close(self):
+        self.archivo.close()
+
+
+def cabeceras_cache(ruta, estado):
+    """ETag, Last-Modified y Cache-Control de un archivo de media."""
+    coincidencia = NOMBRE_CON_HASH.search(ruta)
+    if coincidencia:
+        etag = f'"{coincidencia["hash"]}"'
+        cache_control = f'public, max-age={UN_ANIO}, immutable'
+    else:
+        etag = f'"{estado.st_mtime_ns:x}-{estado.st_size:x}"'
+        segundos = getattr(settings, 'MEDIA_CACHE_SEGUNDOS', 300)
+        cache_control = f'public, max-age={segundos}'
+    return {
+        'ETag': etag,
+        'Last-Modified': http_date(estado.st_mtime),
+        'Cache-Control': cache_control,
+    }
+
+
+def rango_pedido(request, tamano, cabeceras):
+    """
+    (inicio, fin) inclusivos del header Range, None para enviar el archivo
+    completo o 'invalido' si el rango no se puede satisfacer. Solo se
+    atienden rangos simples; varios rangos se responden con el archivo
+    completo, como permite la especificación.
+    """
+    pedido = request.headers.get('Range', '')
+    coincidencia = RANGO.match(pedido.replace(' ', ''))
+    if not coincidencia or not tamano:
+        return None
+    # If-Range: el rango vale solo si el archivo sigue siendo el mismo.
+    condicion = request.headers.get('If-Range')
+    if condicion:
+        if condicion.startswith(('"', 'W/')):
+            if condicion != cabeceras['ETag']:
+                return None
+        elif parse_http_date_safe(condicion) != parse_http_date_safe(cabeceras['Last-Modified']):
+            return None
+
+    inicio, fin = coincidencia['inicio'], coincidencia['fin']
+    if not inicio:
+        if not fin or int(fin) == 0:
+            return 'invalido'
+        # Sufijo: los últimos `fin` bytes.
+        return max(0, tamano - int(fin)), tamano - 1
+    inicio = int(inicio)
+    fin = min(int(fin), tamano - 1) if fin else tamano - 1
+    if inicio >= tamano or fin < inicio:
+        return 'invalido'
+    return inicio, fin
+
+
+@require_safe
+def servir_media(request, ruta):
+    """
+    Sirve los archivos subidos por los usuarios (avatares) en producción.
+    Features:
+        - Envío por streaming con FileResponse: el servidor WSGI puede usar
+          sendfile y el archivo nunca se lee completo en memoria.
+        - ETag y Last-Modified con respuestas 304 a las peticiones condicionales.
+        - Cache de un año (immutable) para nombres con hash del contenido;
+          MEDIA_CACHE_SEGUNDOS para el resto.
+        - Peticiones parciales (Range / If-Range) con respuestas 206 y 416.
+        - Con MEDIA_X_ACCEL_REDIRECT (ej: '/media-interna/') delega el
+          envío a nginx con X-Accel-Redirect y solo resuelve los headers.
+        - Los archivos que no son imágenes se descargan como adjuntos.
+    """
+    try:
+        camino = safe_join(settings.MEDIA_ROOT, ruta)
+        estado = os.stat(camino)
+    except (SuspiciousFileOperation, OSError, ValueError):
+        raise Http404('Archivo no encontrado.')
+    if not os.path.isfile(camino):
+        raise Http404('Archivo no encontrado.')
+
+    cabeceras = cabeceras_cache(ruta, estado)
+    condicional = get_conditional_response(
+        request, etag=cabeceras['ETag'], last_modified=int(estado.st_mtime),
+    )
+    if condicional is not None:
+        for nombre, valor in cabeceras.items():
+            condicional.headers[nombre] = valor
+        return condicional
+
+    tipo, _ = mimetypes.guess_type(camino)
+    tipo = tipo or 'application/octet-stream'
+    adjunto = not tipo.startswith('image/') or tipo == 'image/svg+xml'
+
+    prefijo = getattr(settings, 'MEDIA_X_ACCEL_REDIRECT', None)
+    if prefijo:
+        # nginx envía el archivo (y atiende los Range) desde una ubicación interna.
+        respuesta = HttpResponse(content_type=tipo)
+        respuesta['X-Accel-Redirect'] = prefijo.rstrip('/') + '/' + quote(ruta)
+    elif request.method == 'HEAD':
+        respuesta = HttpResponse(content_type=tipo)
+        respuesta['Content-Length'] = estado.st_size
+    else:
+        rango = rango_pedido(request, estado.st_size, cabeceras)
+        if rango == 'invalido':
+            respuesta = HttpResponse(status=416)
+            respuesta['Content-Range'] = f'bytes */{estado.st_size}'
+            return respuesta
+        archivo = open(camino, 'rb')
+        if rango is None:
+            respuesta = FileResponse(archivo, content_type=tipo)
+        else:
+            inicio, fin = rango
+            archivo.seek(inicio)
+            respuesta = FileResponse(LectorParcial(archivo, fin - inicio + 1), status=206, content_type=tipo)
+            respuesta['Content-Length'] = fin - inicio + 1
+            respuesta['Content-Range'] = f'bytes {inicio}-{fin}/{estado.st_size}'
+
+    for nombre, valor in cabeceras.items():
+        respuesta[nombre] = valor
+    respuesta['Accept-Ranges'] = 'bytes'
+    if adjunto:
+        respuesta['Content-Disposition'] = f"attachment; filename*=utf-8''{quote(os.path.basename(camino))}"
+    return respuesta
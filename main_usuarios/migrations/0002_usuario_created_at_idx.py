@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-19 12:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('main_usuarios', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='usuariosistema',
+            index=models.Index(fields=['created_at'], name='usuario_created_at_idx'),
+        ),
+    ]
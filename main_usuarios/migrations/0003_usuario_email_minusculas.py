@@ -0,0 +1,54 @@
+# Generated by Django 5.2.4 on 2026-10-19 12:39
+
+import logging
+
+import django.db.models.functions.text
+from django.db import migrations, models
+from django.db.models import Count, F
+from django.db.models.functions import Lower
+
+logger = logging.getLogger(__name__)
+
+
+def resolver_usuarios_duplicados(apps, schema_editor):
+    """
+    Resuelve las cuentas cuyo email solo difiere en mayúsculas. Se conserva
+    la usada más recientemente; las demás no se borran (perderían su
+    historial en el admin) sino que se desactivan y su email pasa a
+    "nombre+duplicado<id>@dominio" para que un administrador las revise.
+    """
+    Usuario = apps.get_model('main_usuarios', 'UsuarioSistema')
+    usuarios = Usuario.objects.annotate(email_minusculas=Lower('email'))
+    duplicados = (
+        usuarios.values('email_minusculas')
+        .annotate(cantidad=Count('id'))
+        .filter(cantidad__gt=1)
+        .values_list('email_minusculas', flat=True)
+    )
+    desactivados = 0
+    for email in list(duplicados):
+        grupo = usuarios.filter(email_minusculas=email).order_by(F('last_login').desc(nulls_last=True), 'pk')
+        for usuario in list(grupo)[1:]:
+            local, _, dominio = usuario.email.rpartition('@')
+            usuario.email = f'{local}+duplicado{usuario.pk}@{dominio}'
+            usuario.is_active = False
+            usuario.save(update_fields=['email', 'is_active'])
+            desactivados += 1
+    if desactivados:
+        logger.warning('Se desactivaron %s usuarios con emails duplicados (email "+duplicado<id>").', desactivados)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('main_usuarios', '0002_usuario_created_at_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(resolver_usuarios_duplicados, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='usuariosistema',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('email'), name='usuario_email_minusculas_unico', violation_error_message='Este email ya está registrado.'),
+        ),
+    ]
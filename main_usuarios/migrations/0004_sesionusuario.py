@@ -0,0 +1,72 @@
+# Generated by Django 5.2.4 on 2026-10-19 18:02
+
+from django.contrib.sessions.backends.base import SessionBase
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def copiar_sesiones(apps, schema_editor):
+    """
+    Copia las sesiones vigentes de django_session (SESSION_ENGINE anterior)
+    con su usuario, así nadie pierde la sesión, e inicializa los contadores
+    de sesiones activas del grupo 'sesiones' de Agregado.
+    """
+    Session = apps.get_model('sessions', 'Session')
+    SesionUsuario = apps.get_model('main_usuarios', 'SesionUsuario')
+    Agregado = apps.get_model('ecommerce', 'Agregado')
+    decodificador = SessionBase()
+
+    contadores = {'total': 0, 'autenticadas': 0}
+    nuevas = []
+    for sesion in Session.objects.filter(expire_date__gt=timezone.now()).iterator(chunk_size=2000):
+        try:
+            usuario_id = int(decodificador.decode(sesion.session_data).get('_auth_user_id'))
+        except (TypeError, ValueError):
+            usuario_id = None
+        nuevas.append(SesionUsuario(
+            session_key=sesion.session_key,
+            session_data=sesion.session_data,
+            expire_date=sesion.expire_date,
+            usuario_id=usuario_id,
+        ))
+        contadores['total'] += 1
+        if usuario_id is not None:
+            contadores['autenticadas'] += 1
+            clave = f'usuario:{usuario_id}'
+            contadores[clave] = contadores.get(clave, 0) + 1
+    SesionUsuario.objects.bulk_create(nuevas, batch_size=2000)
+
+    Agregado.objects.filter(grupo='sesiones').delete()
+    Agregado.objects.bulk_create(
+        Agregado(grupo='sesiones', clave=clave, valor=valor) for clave, valor in contadores.items()
+    )
+
+
+def borrar_contadores(apps, schema_editor):
+    apps.get_model('ecommerce', 'Agregado').objects.filter(grupo='sesiones').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0002_agregado'),
+        ('main_usuarios', '0003_usuario_email_minusculas'),
+        ('sessions', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SesionUsuario',
+            fields=[
+                ('session_key', models.CharField(max_length=40, primary_key=True, serialize=False, verbose_name='session key')),
+                ('session_data', models.TextField(verbose_name='session data')),
+                ('expire_date', models.DateTimeField(db_index=True, verbose_name='expire date')),
+                ('usuario_id', models.BigIntegerField(blank=True, db_index=True, null=True, verbose_name='Usuario')),
+            ],
+            options={
+                'verbose_name': 'Sesión',
+                'verbose_name_plural': 'Sesiones',
+            },
+        ),
+        migrations.RunPython(copiar_sesiones, borrar_contadores),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.4 on 2026-10-19 13:36
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('main_usuarios', '0004_sesionusuario'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='usuariosistema',
+            index=models.Index(django.db.models.functions.text.Lower('username'), name='usuario_username_lower_idx'),
+        ),
+    ]
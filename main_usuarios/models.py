@@ -1,5 +1,8 @@
 from django.contrib.auth.models import BaseUserManager, AbstractUser
+from django.contrib.sessions.base_session import AbstractBaseSession
 from django.db import models
+from django.db.models.functions import Lower
+from ecommerce.mixins import CamposModificadosMixin, filtro_email
 
 
 
@@ -29,10 +32,19 @@ class UsuarioSistemaManager(BaseUserManager):
 
         return self.create_user(email, password, **extra_fields)
 
-class UsuarioSistema(AbstractUser):
+    def por_email(self, email):
+        """Usuarios con el email indicado, sin distinguir mayúsculas."""
+        return self.filter(filtro_email(email))
+
+    def get_by_natural_key(self, email):
+        # Login sin distinguir mayúsculas, resuelto con el índice sobre LOWER(email).
+        return self.get(filtro_email(email))
+
+class UsuarioSistema(CamposModificadosMixin, AbstractUser):
     """
     Modelo simple de usuario para el sistema de login.
     Incluye campos básicos como usuario, email y contraseña.
+    Al guardar solo se escriben las columnas modificadas.
     """
     username = models.CharField(max_length=30, unique=True, verbose_name="Usuario", default="usuario_temp")
     email = models.EmailField(unique=True, verbose_name="Correo electrónico")
@@ -49,6 +61,37 @@ class UsuarioSistema(AbstractUser):
         verbose_name = "Usuario del Sistema"
         verbose_name_plural = "Usuarios del Sistema"
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at'], name='usuario_created_at_idx'),
+            # Búsqueda por prefijo del nombre de usuario sin distinguir mayúsculas (admin).
+            models.Index(Lower('username'), name='usuario_username_lower_idx'),
+        ]
+        constraints = [
+            # "Ana@x.com" y "ana@x.com" son la misma cuenta.
+            models.UniqueConstraint(
+                Lower('email'),
+                name='usuario_email_minusculas_unico',
+                violation_error_message='Este email ya está registrado.',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.email}"
+
+
+class SesionUsuario(AbstractBaseSession):
+    """
+    Sesión con el usuario autenticado en una columna indexada, para contar
+    las sesiones de cada usuario sin decodificar session_data.
+    La mantiene main_usuarios.sesiones.SessionStore (SESSION_ENGINE).
+    """
+    usuario_id = models.BigIntegerField(null=True, blank=True, db_index=True, verbose_name="Usuario")
+
+    class Meta:
+        verbose_name = "Sesión"
+        verbose_name_plural = "Sesiones"
+
+    @classmethod
+    def get_session_store_class(cls):
+        from .sesiones import SessionStore
+        return SessionStore
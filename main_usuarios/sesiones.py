@@ -0,0 +1,162 @@
+from django.contrib.auth import SESSION_KEY
+from django.contrib.sessions.backends.cached_db import SessionStore as CachedDBStore
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from ecommerce import estadisticas
+from ecommerce.models import Agregado
+
+
+GRUPO = estadisticas.GRUPO_SESIONES
+PREFIJO_USUARIO = 'usuario:'
+
+
+def usuario_de(datos):
+    """Id del usuario autenticado en los datos de una sesión, o None si es anónima."""
+    try:
+        return int(datos.get(SESSION_KEY))
+    except (TypeError, ValueError):
+        return None
+
+
+def deltas(usuario_id, signo):
+    """Contribución de una sesión a los contadores (signo +1 alta, -1 baja)."""
+    resultado = {(GRUPO, 'total'): signo}
+    if usuario_id is not None:
+        resultado[(GRUPO, 'autenticadas')] = signo
+        resultado[(GRUPO, f'{PREFIJO_USUARIO}{usuario_id}')] = signo
+    return resultado
+
+
+class SessionStore(CachedDBStore):
+    """
+    Sesiones cached_db sobre SesionUsuario que mantienen los contadores de
+    sesiones activas (grupo 'sesiones' de Agregado) de forma incremental.
+    Features:
+        - Alta de una sesión: suma al total (y al usuario si está autenticada).
+        - Login y cambio de usuario: mueve la sesión entre contadores al
+          guardarse, sin releer la fila (el usuario anterior se conoce de load()).
+        - Logout y borrado: resta lo que tenía la fila borrada.
+        - Vencimiento: clear_expired() resta las sesiones que purga.
+        - Los guardados que no cambian el usuario no escriben contadores.
+    """
+
+    @classmethod
+    def get_model_class(cls):
+        from .models import SesionUsuario
+        return SesionUsuario
+
+    def load(self):
+        datos = super().load()
+        self._usuario_guardado = usuario_de(datos)
+        return datos
+
+    def create_model_instance(self, data):
+        sesion = super().create_model_instance(data)
+        sesion.usuario_id = usuario_de(data)
+        return sesion
+
+    def save(self, must_create=False):
+        if self.session_key is None:
+            return self.create()
+        usuario_id = usuario_de(self._get_session(no_load=must_create))
+        anterior = None if must_create else getattr(self, '_usuario_guardado', None)
+        super().save(must_create)
+        if must_create:
+            estadisticas.aplicar(deltas(usuario_id, +1))
+        elif usuario_id != anterior:
+            estadisticas.aplicar(deltas(anterior, -1), deltas(usuario_id, +1))
+        self._usuario_guardado = usuario_id
+
+    def delete(self, session_key=None):
+        if session_key is None:
+            if self.session_key is None:
+                return
+            session_key = self.session_key
+        self._cache.delete(self.cache_key_prefix + session_key)
+        filas = self.model.objects.filter(session_key=session_key)
+        usuario_id = filas.values_list('usuario_id', flat=True).first()
+        # Solo quien borró la fila descuenta: dos logouts simultáneos restan una vez.
+        borradas, _ = filas.delete()
+        if borradas:
+            estadisticas.aplicar(deltas(usuario_id, -1))
+
+    @classmethod
+    def clear_expired(cls):
+        purgar_vencidas()
+
+
+def purgar_vencidas():
+    """
+    Borra las sesiones vencidas y las descuenta de los contadores, agrupadas
+    por usuario (un UPDATE por usuario con sesiones vencidas). Retorna cuántas borró.
+    """
+    modelo = SessionStore.get_model_class()
+    ahora = timezone.now()
+    vencidas = modelo.objects.filter(expire_date__lt=ahora)
+    with transaction.atomic():
+        por_usuario = list(vencidas.values('usuario_id').annotate(cantidad=Count('pk')).order_by())
+        borradas, _ = vencidas.delete()
+        estadisticas.aplicar(*(deltas(fila['usuario_id'], -fila['cantidad']) for fila in por_usuario))
+    return borradas
+
+
+def conciliar():
+    """
+    Recalcula los contadores contando las sesiones no vencidas (después de
+    purgar las vencidas) y los reemplaza. Corrige los desvíos de escrituras
+    interrumpidas, sesiones borradas por SQL o usuarios eliminados.
+    Retorna (sesiones activas, contadores corregidos).
+    """
+    purgar_vencidas()
+    modelo = SessionStore.get_model_class()
+    filas = (
+        modelo.objects.filter(expire_date__gt=timezone.now())
+        .values('usuario_id').annotate(cantidad=Count('pk')).order_by()
+    )
+    esperados = {'total': 0, 'autenticadas': 0}
+    for fila in filas:
+        for (_, clave), valor in deltas(fila['usuario_id'], fila['cantidad']).items():
+            esperados[clave] = esperados.get(clave, 0) + valor
+
+    with transaction.atomic():
+        actuales = dict(Agregado.objects.filter(grupo=GRUPO).values_list('clave', 'valor'))
+        # Solo se escriben los contadores desviados; los usuarios sin sesiones pierden su fila.
+        sobrantes = [clave for clave in actuales if clave not in esperados]
+        Agregado.objects.filter(grupo=GRUPO, clave__in=sobrantes).delete()
+        corregidos = len(sobrantes)
+        for clave, valor in esperados.items():
+            if clave not in actuales:
+                Agregado.objects.create(grupo=GRUPO, clave=clave, valor=valor)
+            elif actuales[clave] != valor:
+                Agregado.objects.filter(grupo=GRUPO, clave=clave).update(valor=valor)
+            else:
+                continue
+            corregidos += 1
+    return esperados['total'], corregidos
+
+
+def activas():
+    """Sesiones activas en total y autenticadas (lectura de dos filas de Agregado)."""
+    valores = dict(
+        Agregado.objects.filter(grupo=GRUPO, clave__in=['total', 'autenticadas']).values_list('clave', 'valor')
+    )
+    return {'total': int(valores.get('total', 0)), 'autenticadas': int(valores.get('autenticadas', 0))}
+
+
+def activas_de(usuario_id):
+    """Sesiones activas de un usuario (una fila por índice único)."""
+    valor = (
+        Agregado.objects.filter(grupo=GRUPO, clave=f'{PREFIJO_USUARIO}{usuario_id}')
+        .values_list('valor', flat=True).first()
+    )
+    return int(valor or 0)
+
+
+def activas_por_usuario():
+    """{id de usuario: sesiones activas} de los usuarios con alguna sesión."""
+    filas = Agregado.objects.filter(
+        grupo=GRUPO, clave__startswith=PREFIJO_USUARIO, valor__gt=0,
+    ).values_list('clave', 'valor')
+    return {int(clave[len(PREFIJO_USUARIO):]): int(valor) for clave, valor in filas}
@@ -0,0 +1,70 @@
+import hashlib
+from io import BytesIO
+from pathlib import PurePosixPath
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+from cola_tareas.registro import tarea
+from . import sesiones
+from .media import NOMBRE_CON_HASH
+from .models import UsuarioSistema
+
+
+# Tamaño máximo (en píxeles) del lado mayor del avatar.
+TAMANO_AVATAR = 256
+
+
+@tarea(max_intentos=3, concurrencia=2)
+def procesar_avatar(usuario_id):
+    """
+    Normaliza el avatar subido por el usuario fuera del ciclo del request.
+    Features:
+        - Corrige la orientación según los datos EXIF.
+        - Reduce la imagen a TAMANO_AVATAR píxeles de lado mayor.
+        - Guarda en formato PNG y reemplaza el archivo original.
+        - El nombre lleva el hash del contenido (ej: ana.3f2a9c41d0b7.png),
+          así la URL cambia con la imagen y puede cachearse por un año.
+    """
+    usuario = UsuarioSistema.objects.filter(pk=usuario_id).first()
+    if usuario is None or not usuario.avatar:
+        return
+
+    original = usuario.avatar.name
+    with usuario.avatar.open('rb') as archivo:
+        imagen = ImageOps.exif_transpose(Image.open(archivo))
+        imagen.thumbnail((TAMANO_AVATAR, TAMANO_AVATAR))
+        if imagen.mode not in ('RGB', 'RGBA', 'L', 'LA', 'P'):
+            imagen = imagen.convert('RGBA')
+        salida = BytesIO()
+        imagen.save(salida, format='PNG')
+
+    contenido = salida.getvalue()
+    nombre_original = PurePosixPath(original).name
+    # Un avatar ya procesado pierde el hash anterior en lugar de acumularlos.
+    base = NOMBRE_CON_HASH.sub('', nombre_original)
+    if base == nombre_original:
+        base = PurePosixPath(nombre_original).stem
+    nombre = f'{base}.{hashlib.sha256(contenido).hexdigest()[:12]}.png'
+    if nombre == nombre_original:
+        return
+    usuario.avatar.save(nombre, ContentFile(contenido), save=False)
+    usuario.save()
+    if usuario.avatar.name != original:
+        usuario.avatar.storage.delete(original)
+
+
+@tarea(max_intentos=1, concurrencia=1, cada=300)
+def limpiar_sesiones():
+    """
+    Elimina periódicamente las sesiones expiradas y las descuenta de las
+    sesiones activas. Corre seguido para que el contador no incluya por
+    mucho tiempo sesiones ya vencidas.
+    """
+    sesiones.purgar_vencidas()
+
+
+@tarea(max_intentos=1, concurrencia=1, cada=3600)
+def conciliar_sesiones():
+    """Recalcula los contadores de sesiones activas y corrige los desvíos."""
+    sesiones.conciliar()
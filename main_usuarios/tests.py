@@ -1,3 +1,292 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+import threading
+from unittest import mock
 
-# Create your tests here.
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, connection, transaction
+from django.test import Client, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from ecommerce import estadisticas
+from ecommerce.models import Agregado
+from ecommerce.tests import columnas_actualizadas, registrar_sql
+from . import sesiones
+from .forms import formularioRegistro
+from .models import SesionUsuario, UsuarioSistema, UsuarioSistemaManager
+
+
+TABLA = 'main_usuarios_usuariosistema'
+
+
+class CamposModificadosUsuarioTests(TestCase):
+    """Verifica que la edición del usuario escriba solo las columnas modificadas."""
+
+    def setUp(self):
+        self.usuario = UsuarioSistema.objects.create_user(
+            email='usuario@mail.com', password='clave123', username='usuario'
+        )
+        self.client.force_login(self.usuario)
+
+    def test_administracion_sin_cambios_no_escribe(self):
+        with registrar_sql() as sentencias:
+            respuesta = self.client.post(reverse('administracion'), {
+                'username': 'usuario',
+                'email': 'usuario@mail.com',
+            })
+        self.assertRedirects(respuesta, reverse('administracion'))
+        self.assertEqual(columnas_actualizadas(sentencias, TABLA), [])
+
+    def test_administracion_escribe_solo_username(self):
+        with registrar_sql() as sentencias:
+            self.client.post(reverse('administracion'), {
+                'username': 'nuevo_nombre',
+                'email': 'usuario@mail.com',
+            })
+
+        self.assertEqual(columnas_actualizadas(sentencias, TABLA), [['username']])
+        self.assertEqual(UsuarioSistema.objects.get(pk=self.usuario.pk).username, 'nuevo_nombre')
+
+    def test_cambio_de_contrasena_escribe_solo_password(self):
+        usuario = UsuarioSistema.objects.get(pk=self.usuario.pk)
+        usuario.set_password('otra_clave456')
+        with registrar_sql() as sentencias:
+            usuario.save()
+
+        self.assertEqual(columnas_actualizadas(sentencias, TABLA), [['password']])
+
+
+def datos_registro(username, email):
+    return {
+        'username': username,
+        'email': email,
+        'password1': 'Zq8#xkLm2p',
+        'password2': 'Zq8#xkLm2p',
+    }
+
+
+class UnicidadRegistroTests(TestCase):
+    """Verifica la validación de usuario y email únicos del registro."""
+
+    def setUp(self):
+        UsuarioSistema.objects.create_user(email='ana@mail.com', password='clave123', username='ana')
+
+    def test_usuario_y_email_se_validan_en_una_consulta(self):
+        form = formularioRegistro(data=datos_registro('ana', 'ana@mail.com'))
+        with self.assertNumQueries(1):
+            self.assertFalse(form.is_valid())
+        self.assertEqual(form.errors['username'], ['Este nombre de usuario ya está en uso.'])
+        self.assertEqual(form.errors['email'], ['Este email ya está registrado.'])
+
+    def test_email_sin_distinguir_mayusculas(self):
+        form = formularioRegistro(data=datos_registro('otra', 'ANA@Mail.com'))
+        self.assertFalse(form.is_valid())
+        self.assertEqual(list(form.errors), ['email'])
+
+    def test_datos_libres_son_validos(self):
+        form = formularioRegistro(data=datos_registro('otra', 'otra@mail.com'))
+        self.assertTrue(form.is_valid())
+
+    def test_sin_validate_unique_no_se_consulta_la_unicidad(self):
+        form = formularioRegistro(data=datos_registro('ana', 'ana@mail.com'))
+        form.validate_unique = lambda: None
+        with self.assertNumQueries(0):
+            self.assertTrue(form.is_valid())
+
+    def test_contrasena_parecida_al_email_se_rechaza(self):
+        datos = datos_registro('otra', 'marcelo.gonzalez@mail.com')
+        datos['password1'] = datos['password2'] = 'marcelogonzalez'
+        form = formularioRegistro(data=datos)
+        self.assertFalse(form.is_valid())
+        self.assertIn('password2', form.errors)
+
+
+class EmailSinMayusculasTests(TestCase):
+    """Verifica la restricción única sobre LOWER(email) y el login sin distinguir mayúsculas."""
+
+    def setUp(self):
+        self.usuario = UsuarioSistema.objects.create_user(email='Ana@Mail.com', password='clave123', username='ana')
+
+    def test_restriccion_unica_sin_mayusculas(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            UsuarioSistema.objects.create_user(email='ana@mail.COM', password='clave123', username='otra')
+        duplicado = UsuarioSistema(email='ANA@mail.com', username='otra')
+        with self.assertRaisesMessage(ValidationError, 'Este email ya está registrado.'):
+            duplicado.validate_constraints()
+        UsuarioSistema(email='otra@mail.com', username='otra').validate_constraints()
+
+    def test_get_by_natural_key_sin_mayusculas(self):
+        self.assertEqual(UsuarioSistema.objects.get_by_natural_key('ana@mail.com'), self.usuario)
+        self.assertEqual(UsuarioSistema.objects.get_by_natural_key('ANA@MAIL.COM'), self.usuario)
+        with self.assertRaises(UsuarioSistema.DoesNotExist):
+            UsuarioSistema.objects.get_by_natural_key('ana@mail.co')
+        self.assertEqual(list(UsuarioSistema.objects.por_email('aNa@mail.com')), [self.usuario])
+
+    def test_login_con_otras_mayusculas(self):
+        respuesta = self.client.post(reverse('login'), {'email': 'ana@MAIL.com', 'password': 'clave123'})
+        self.assertRedirects(respuesta, reverse('home'))
+        self.assertEqual(int(self.client.session['_auth_user_id']), self.usuario.pk)
+
+
+class RegistroConcurrenteTests(TransactionTestCase):
+    """Registros duplicados en paralelo: uno se crea y el resto recibe el error del formulario."""
+
+    hilos = 4
+
+    def test_registros_duplicados_en_paralelo(self):
+        barrera = threading.Barrier(self.hilos)
+        crear_user = UsuarioSistemaManager.create_user
+
+        def crear_tras_validar(manager, *args, **kwargs):
+            # Todas las altas pasan la validación antes de que alguna inserte.
+            barrera.wait(timeout=10)
+            return crear_user(manager, *args, **kwargs)
+
+        respuestas = []
+        errores = []
+
+        def registrar(numero):
+            try:
+                respuestas.append(Client().post(
+                    reverse('registro'),
+                    datos_registro(f'usuario{numero}', 'Repetido@mail.com' if numero % 2 else 'repetido@mail.com'),
+                ))
+            except Exception as error:
+                errores.append(error)
+            finally:
+                connection.close()
+
+        with mock.patch.object(UsuarioSistemaManager, 'create_user', crear_tras_validar):
+            hilos = [threading.Thread(target=registrar, args=(numero,)) for numero in range(self.hilos)]
+            for hilo in hilos:
+                hilo.start()
+            for hilo in hilos:
+                hilo.join()
+
+        self.assertEqual(errores, [])
+        self.assertEqual(UsuarioSistema.objects.por_email('repetido@mail.com').count(), 1)
+        self.assertEqual(sorted(respuesta.status_code for respuesta in respuestas), [200] * (self.hilos - 1) + [302])
+        for respuesta in respuestas:
+            if respuesta.status_code == 200:
+                self.assertContains(respuesta, 'Este email ya está registrado.')
+
+
+class ServirMediaTests(SimpleTestCase):
+    """Verifica los headers de cache y las peticiones condicionales y parciales de /media/."""
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        os.makedirs(os.path.join(self.media, 'avatars'))
+        for nombre in ('ana.png', 'ana.3f2a9c41d0b7.png'):
+            with open(os.path.join(self.media, 'avatars', nombre), 'wb') as archivo:
+                archivo.write(b'0123456789')
+        ajustes = override_settings(MEDIA_ROOT=self.media)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+    def test_archivo_completo_con_validadores(self):
+        respuesta = self.client.get('/media/avatars/ana.png')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(b''.join(respuesta.streaming_content), b'0123456789')
+        self.assertEqual(respuesta['Accept-Ranges'], 'bytes')
+        self.assertEqual(respuesta['Content-Type'], 'image/png')
+        self.assertIn('ETag', respuesta)
+        self.assertIn('Last-Modified', respuesta)
+
+        condicional = self.client.get('/media/avatars/ana.png', HTTP_IF_NONE_MATCH=respuesta['ETag'])
+        self.assertEqual(condicional.status_code, 304)
+        self.assertEqual(condicional['ETag'], respuesta['ETag'])
+
+    def test_nombre_con_hash_se_cachea_un_anio(self):
+        respuesta = self.client.get('/media/avatars/ana.3f2a9c41d0b7.png')
+        self.assertEqual(respuesta['ETag'], '"3f2a9c41d0b7"')
+        self.assertIn('immutable', respuesta['Cache-Control'])
+        self.assertIn('max-age=31536000', respuesta['Cache-Control'])
+        respuesta.close()
+
+    def test_rangos(self):
+        parcial = self.client.get('/media/avatars/ana.png', HTTP_RANGE='bytes=2-5')
+        self.assertEqual(parcial.status_code, 206)
+        self.assertEqual(b''.join(parcial.streaming_content), b'2345')
+        self.assertEqual(parcial['Content-Range'], 'bytes 2-5/10')
+        self.assertEqual(parcial['Content-Length'], '4')
+
+        sufijo = self.client.get('/media/avatars/ana.png', HTTP_RANGE='bytes=-3')
+        self.assertEqual(b''.join(sufijo.streaming_content), b'789')
+
+        fuera = self.client.get('/media/avatars/ana.png', HTTP_RANGE='bytes=20-')
+        self.assertEqual(fuera.status_code, 416)
+        self.assertEqual(fuera['Content-Range'], 'bytes */10')
+
+        distinto = self.client.get('/media/avatars/ana.png', HTTP_RANGE='bytes=2-5', HTTP_IF_RANGE='"otro"')
+        self.assertEqual(distinto.status_code, 200)
+        distinto.close()
+
+    @override_settings(MEDIA_X_ACCEL_REDIRECT='/media-interna/')
+    def test_x_accel_redirect(self):
+        respuesta = self.client.get('/media/avatars/ana.png')
+        self.assertEqual(respuesta['X-Accel-Redirect'], '/media-interna/avatars/ana.png')
+        self.assertEqual(respuesta.content, b'')
+
+    def test_rutas_fuera_de_media(self):
+        self.assertEqual(self.client.get('/media/../settings.py').status_code, 404)
+        self.assertEqual(self.client.get('/media/avatars/').status_code, 404)
+        self.assertEqual(self.client.get('/media/avatars/nadie.png').status_code, 404)
+
+
+class SesionesActivasTests(TestCase):
+    """Verifica los contadores incrementales de sesiones activas."""
+
+    def setUp(self):
+        self.usuario = UsuarioSistema.objects.create_user(
+            email='sesiones@mail.com', password='clave123', username='sesiones'
+        )
+
+    def iniciar_sesion(self):
+        cliente = Client()
+        respuesta = cliente.post(reverse('login'), {'email': 'sesiones@mail.com', 'password': 'clave123'})
+        self.assertRedirects(respuesta, reverse('home'), fetch_redirect_response=False)
+        return cliente
+
+    def test_login_y_logout_actualizan_contadores(self):
+        primero = self.iniciar_sesion()
+        self.iniciar_sesion()
+        self.assertEqual(sesiones.activas(), {'total': 2, 'autenticadas': 2})
+        self.assertEqual(sesiones.activas_de(self.usuario.pk), 2)
+
+        primero.get(reverse('logout'))
+        self.assertEqual(sesiones.activas(), {'total': 1, 'autenticadas': 1})
+        self.assertEqual(sesiones.activas_por_usuario(), {self.usuario.pk: 1})
+        self.assertEqual(SesionUsuario.objects.filter(usuario_id=self.usuario.pk).count(), 1)
+
+    def test_purga_descuenta_vencidas(self):
+        self.iniciar_sesion()
+        SesionUsuario.objects.update(expire_date=timezone.now() - timezone.timedelta(minutes=1))
+        self.assertEqual(sesiones.purgar_vencidas(), 1)
+        self.assertEqual(sesiones.activas(), {'total': 0, 'autenticadas': 0})
+        self.assertEqual(sesiones.activas_por_usuario(), {})
+
+    def test_conciliar_corrige_desvios(self):
+        self.iniciar_sesion()
+        estadisticas.incrementar(sesiones.GRUPO, 'total', 5)
+        estadisticas.incrementar(sesiones.GRUPO, 'usuario:999', 1)
+        self.assertEqual(sesiones.conciliar(), (1, 2))
+        self.assertEqual(sesiones.activas(), {'total': 1, 'autenticadas': 1})
+        self.assertFalse(Agregado.objects.filter(grupo=sesiones.GRUPO, clave='usuario:999').exists())
+        self.assertEqual(sesiones.conciliar(), (1, 0))
+
+    @override_settings(METRICAS_TOKEN='secreto')
+    def test_metricas(self):
+        self.iniciar_sesion()
+        self.assertEqual(self.client.get(reverse('metricas')).status_code, 403)
+        self.assertEqual(
+            self.client.get(reverse('metricas'), HTTP_AUTHORIZATION='Bearer otro').status_code, 403,
+        )
+        respuesta = self.client.get(reverse('metricas'), HTTP_AUTHORIZATION='Bearer secreto')
+        self.assertEqual(respuesta.status_code, 200)
+        contenido = respuesta.content.decode()
+        self.assertIn('sesiones_activas 1\n', contenido)
+        self.assertIn(f'sesiones_activas_usuario{{usuario="{self.usuario.pk}"}} 1\n', contenido)
@@ -1,8 +1,12 @@
+import hmac
+
 from django.shortcuts import render, redirect
 from django.contrib import messages
-from django.contrib.sessions.models import Session
-from django.utils import timezone
+from django.conf import settings
 from django.contrib.auth import authenticate, login, logout
+from django.db import IntegrityError
+from django.http import HttpResponse, HttpResponseForbidden
+from django.views.decorators.cache import never_cache
 from functools import wraps
 from .forms import formularioRegistro, formularioLogin
 from .models import UsuarioSistema
@@ -11,6 +15,9 @@ from django.views.generic import UpdateView, View
 from django.urls import reverse_lazy
 from .forms import UsuarioEditForm, UsuarioPasswordChangeForm
 from django.contrib.auth.views import PasswordChangeView
+from cola_tareas.registro import encolar
+from ecommerce.limite_tasa import limitar_tasa
+from . import sesiones
 
 
 
@@ -31,14 +38,18 @@ def debug_session_info(request):
     """
     if hasattr(request, 'session'):
         session_key = request.session.session_key
-        active_sessions = Session.objects.filter(expire_date__gt=timezone.now()).count()
+        # Contadores incrementales (main_usuarios/sesiones.py): no recorre la tabla.
+        active_sessions = sesiones.activas()
 
         print(f"=== DEBUG SESIÓN ===")
         print(f"Session Key: {session_key}")
         print(f"User autenticado: {request.user.is_authenticated}")
         print(f"User ID: {request.user.id}")
         print(f"Email: {getattr(request.user, 'email', None)}")
-        print(f"Sesiones activas totales: {active_sessions}")
+        print(f"Sesiones activas totales: {active_sessions['total']}")
+        print(f"Sesiones autenticadas: {active_sessions['autenticadas']}")
+        if request.user.is_authenticated:
+            print(f"Sesiones del usuario: {sesiones.activas_de(request.user.id)}")
         print(f"==================")
 
 
@@ -64,20 +75,30 @@ def registro(request):
         - Creación de sesión automática.
         - Contraseñas hasheadas antes del almacenamiento.
         - Validación de campos únicos (email, usuario).
+        - Altas concurrentes duplicadas informadas como errores del formulario.
     """
     if request.method == 'POST':
         form = formularioRegistro(request.POST, request.FILES)
         if form.is_valid():
-            user = form.save()
-            login(request, user)
-            messages.success(request, f'¡Usuario "{user.email}" creado exitosamente!')
-            return redirect('home')
+            try:
+                user = form.save()
+            except IntegrityError:
+                # Un registro concurrente tomó el usuario o el email después de validar.
+                form.errores_de_unicidad()
+            else:
+                if user.avatar:
+                    # El procesamiento de la imagen se hace en segundo plano.
+                    encolar('procesar_avatar', usuario_id=user.pk)
+                login(request, user)
+                messages.success(request, f'¡Usuario "{user.email}" creado exitosamente!')
+                return redirect('home')
     else:
         form = formularioRegistro()
     
     return render(request, 'commerce/registro.html', {'form': form})
 
 
+@limitar_tasa('login', capacidad=5, por_segundo=5 / 60, clave='ip', metodos=('POST',))
 def login_view(request):
     """
     Vista para autenticación de usuarios existentes.
@@ -88,6 +109,7 @@ def login_view(request):
         - Creación de sesión segura.
         - Verificación de contraseña hasheada.
         - Control de usuarios activos únicamente.
+        - Límite de intentos por IP (respuesta 429 al superarlo).
     """
     if request.method == 'POST':
         form = formularioLogin(request.POST)
@@ -137,10 +159,55 @@ class UserAdministrationView(LoginRequiredMixin, UpdateView):
 
     def form_valid(self, form):
         messages.success(self.request, 'Datos actualizados correctamente.')
-        return super().form_valid(form)
+        respuesta = super().form_valid(form)
+        if 'avatar' in form.changed_data and self.object.avatar:
+            # El procesamiento de la imagen se hace en segundo plano.
+            encolar('procesar_avatar', usuario_id=self.object.pk)
+        return respuesta
 
 class UserDeleteView(LoginRequiredMixin, View):
     def post(self, request, *args, **kwargs):
         request.user.delete()
         messages.success(request, 'Tu cuenta ha sido eliminada.')
-        return redirect('home')
\ No newline at end of file
+        return redirect('home')
+
+
+
+def token_metricas_valido(request):
+    token = getattr(settings, 'METRICAS_TOKEN', None)
+    tipo, _, enviado = request.headers.get('Authorization', '').partition(' ')
+    return bool(token) and tipo == 'Bearer' and hmac.compare_digest(enviado.encode(), token.encode())
+
+
+@never_cache
+def metricas(request):
+    """
+    Métricas en formato de texto de Prometheus para los tableros.
+    Features:
+        - Sesiones activas totales, autenticadas y usuarios con sesión.
+        - Sesiones activas por usuario (etiqueta usuario).
+        - Lee los contadores de Agregado: no cuenta la tabla de sesiones.
+        - Acceso para el staff o con METRICAS_TOKEN (Authorization: Bearer <token>).
+    """
+    if not (request.user.is_staff or token_metricas_valido(request)):
+        return HttpResponseForbidden('Acceso denegado.')
+    totales = sesiones.activas()
+    por_usuario = sesiones.activas_por_usuario()
+    lineas = [
+        '# HELP sesiones_activas Sesiones no vencidas.',
+        '# TYPE sesiones_activas gauge',
+        f'sesiones_activas {totales["total"]}',
+        '# HELP sesiones_autenticadas Sesiones no vencidas con un usuario autenticado.',
+        '# TYPE sesiones_autenticadas gauge',
+        f'sesiones_autenticadas {totales["autenticadas"]}',
+        '# HELP usuarios_con_sesion Usuarios con al menos una sesión activa.',
+        '# TYPE usuarios_con_sesion gauge',
+        f'usuarios_con_sesion {len(por_usuario)}',
+        '# HELP sesiones_activas_usuario Sesiones activas de cada usuario.',
+        '# TYPE sesiones_activas_usuario gauge',
+    ]
+    lineas += [
+        f'sesiones_activas_usuario{{usuario="{usuario_id}"}} {cantidad}'
+        for usuario_id, cantidad in sorted(por_usuario.items())
+    ]
+    return HttpResponse('\n'.join(lineas) + '\n', content_type='text/plain; version=0.0.4; charset=utf-8')
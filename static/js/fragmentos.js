@@ -0,0 +1,110 @@
+/*
+ * Navegación por fragmentos (mejora progresiva).
+ *
+ * Los formularios GET con data-fragmento-destino="<id>" y los enlaces con
+ * data-fragmento-enlace dentro de un bloque [data-fragmento] piden solo ese
+ * bloque: la petición lleva el header X-Fragmento con el id y la vista
+ * responde el bloque sin base.html, que se reemplaza en el lugar. La URL
+ * se actualiza con history.pushState, así atrás/adelante y recargar siguen
+ * funcionando. Sin JavaScript (o si la respuesta no es el fragmento, por
+ * ejemplo una redirección al login) se navega a la página completa.
+ */
+(function () {
+    'use strict';
+
+    var CABECERA = 'X-Fragmento';
+
+    if (!window.fetch || !window.history || !history.pushState) {
+        return;
+    }
+
+    function cargar(id, url, apilar) {
+        var bloque = document.getElementById(id);
+        if (!bloque) {
+            window.location.href = url;
+            return;
+        }
+        bloque.setAttribute('aria-busy', 'true');
+        fetch(url, {headers: {'X-Fragmento': id}, credentials: 'same-origin'})
+            .then(function (respuesta) {
+                if (!respuesta.ok || respuesta.headers.get(CABECERA) !== id) {
+                    throw new Error('Respuesta sin fragmento');
+                }
+                return respuesta.text();
+            })
+            .then(function (html) {
+                bloque.outerHTML = html;
+                if (apilar) {
+                    history.pushState({fragmento: id}, '', url);
+                }
+                var nuevo = document.getElementById(id);
+                if (nuevo && nuevo.getBoundingClientRect().top < 0) {
+                    nuevo.scrollIntoView();
+                }
+            })
+            .catch(function () {
+                window.location.href = url;
+            });
+    }
+
+    document.addEventListener('click', function (evento) {
+        var enlace = evento.target.closest('a[data-fragmento-enlace]');
+        if (!enlace || evento.button !== 0 || evento.ctrlKey || evento.metaKey || evento.shiftKey || evento.altKey) {
+            return;
+        }
+        var bloque = enlace.closest('[data-fragmento]');
+        if (!bloque || !bloque.id) {
+            return;
+        }
+        evento.preventDefault();
+        cargar(bloque.id, enlace.href, true);
+    });
+
+    document.addEventListener('submit', function (evento) {
+        var formulario = evento.target;
+        var destino = formulario.getAttribute('data-fragmento-destino');
+        if (!destino || (formulario.method || 'get').toLowerCase() !== 'get') {
+            return;
+        }
+        evento.preventDefault();
+        var url = new URL(formulario.action || window.location.href, window.location.href);
+        url.search = new URLSearchParams(new FormData(formulario)).toString();
+        cargar(destino, url.href, true);
+    });
+
+    // Al volver atrás, los formularios del bloque muestran los parámetros de esa URL.
+    function sincronizar(id, url) {
+        var parametros = new URL(url).searchParams;
+        document.querySelectorAll('form[data-fragmento-destino="' + id + '"]').forEach(function (formulario) {
+            Array.prototype.forEach.call(formulario.elements, function (campo) {
+                if (!campo.name) {
+                    return;
+                }
+                if (campo.type === 'checkbox') {
+                    campo.checked = parametros.getAll(campo.name).indexOf(campo.value) !== -1;
+                } else if (campo.type === 'radio') {
+                    if (parametros.has(campo.name)) {
+                        campo.checked = parametros.get(campo.name) === campo.value;
+                    }
+                } else if (campo.type !== 'submit' && campo.type !== 'button') {
+                    campo.value = parametros.get(campo.name) || '';
+                }
+            });
+        });
+    }
+
+    window.addEventListener('popstate', function (evento) {
+        if (evento.state && evento.state.fragmento) {
+            sincronizar(evento.state.fragmento, window.location.href);
+            cargar(evento.state.fragmento, window.location.href, false);
+        }
+    });
+
+    // La entrada inicial del historial también vuelve por fragmento.
+    document.addEventListener('DOMContentLoaded', function () {
+        var bloque = document.querySelector('[data-fragmento][id]');
+        if (bloque && !history.state) {
+            history.replaceState({fragmento: bloque.id}, '', window.location.href);
+        }
+    });
+})();